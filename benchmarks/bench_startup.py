@@ -0,0 +1,105 @@
+"""Benchmark the start-up time of the topmodelpy cli and modules.
+
+Each module is imported in a fresh interpreter with `python -X importtime`,
+and the cumulative import time of the module and of the heavy third party
+packages it pulled in is reported. The wall time of `topmodelpy --help` is
+reported too. Use --json to save the results for tracking regressions across
+commits.
+
+Usage:
+
+    $ python benchmarks/bench_startup.py [--repeat 5] [--json startup.json]
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+
+
+MODULES = [
+    "topmodelpy.cli",
+    "topmodelpy.main",
+    "topmodelpy.plots",
+    "topmodelpy.report",
+]
+
+# Packages that should only be imported by the code paths that need them
+HEAVY_PACKAGES = [
+    "pandas",
+    "scipy",
+    "matplotlib",
+    "jinja2",
+    "h5py",
+    "rasterio",
+]
+
+
+def import_times(module):
+    """Return a dict of the cumulative import time in seconds of a module,
+    and of each heavy package it imports, in a fresh interpreter."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import " + module],
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+        check=True,
+    )
+
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        name = name.strip()
+        if name == module or name in HEAVY_PACKAGES:
+            times[name] = int(cumulative) / 1e6
+
+    return times
+
+
+def help_time():
+    """Return the wall time in seconds of `topmodelpy --help`."""
+    start = time.perf_counter()
+    subprocess.run(
+        [sys.executable, "-c",
+         "from topmodelpy.cli import main; main()", "--help"],
+        stdout=subprocess.DEVNULL,
+        check=True,
+    )
+
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--json", default=None,
+                        help="File path to save the results as json.")
+    args = parser.parse_args()
+
+    results = {"python": sys.version.split()[0], "modules": {}}
+    for module in MODULES:
+        runs = [import_times(module) for _ in range(args.repeat)]
+        results["modules"][module] = {
+            "seconds": statistics.median(run[module] for run in runs),
+            "imports": sorted(set().union(*runs) - {module}),
+        }
+    results["help_seconds"] = statistics.median(
+        help_time() for _ in range(args.repeat))
+
+    for module, result in results["modules"].items():
+        print("{:<20} {:.3f} s  {}".format(module,
+                                           result["seconds"],
+                                           ", ".join(result["imports"])))
+    print("{:<20} {:.3f} s".format("topmodelpy --help",
+                                   results["help_seconds"]))
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Benchmark reading a 100-year hourly timeseries file.
+
+Compares the read time of the previous timeseries reader, which relied on
+pandas date inference and computed each null mask twice, with the current
+reader using an explicit date format and the fastest available csv engine.
+
+Usage:
+
+    $ python benchmarks/bench_timeseriesfile.py [--years 100] [--repeat 3]
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from topmodelpy import timeseriesfile
+
+
+def write_timeseries_file(filepath, years):
+    """Write a synthetic hourly timeseries file."""
+    index = pd.date_range("1900-01-01", periods=years * 8766, freq="H")
+    rng = np.random.default_rng(0)
+    data = pd.DataFrame({
+        "temperature (celsius)": rng.normal(10, 8, len(index)).round(1),
+        "precipitation (mm/day)": rng.gamma(0.3, 4, len(index)).round(2),
+        "pet (mm/day)": rng.uniform(0, 5, len(index)).round(2),
+        "flow_observed (mm/day)": rng.gamma(2, 1, len(index)).round(2),
+    }, index=pd.Index(index, name="date"))
+    data.to_csv(filepath, date_format="%Y-%m-%d %H:%M:%S")
+
+    return len(index)
+
+
+def read_legacy(filepath):
+    """Read a timeseries file the way the previous reader did."""
+    with open(filepath, "r") as f:
+        data = pd.read_csv(f, index_col=0, parse_dates=True, dtype=float)
+    data.columns = data.columns.str.strip()
+    if data.index.isna().any():
+        np.where(data.index.isna())[0]
+    if data.isna().values.any():
+        data[data.isna().any(axis=1)]
+
+    return data
+
+
+def read_current(filepath):
+    """Read a timeseries file with an explicit date format."""
+    with open(filepath, "r") as f:
+        return timeseriesfile.read_in(f, date_format="%Y-%m-%d %H:%M:%S")
+
+
+def best_time(function, filepath, repeat):
+    """Return the best wall time of repeated calls in seconds."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(filepath)
+        times.append(time.perf_counter() - start)
+
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--years", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        filepath = os.path.join(tmpdir, "timeseries.csv")
+        num_rows = write_timeseries_file(filepath, args.years)
+
+        legacy = best_time(read_legacy, filepath, args.repeat)
+        current = best_time(read_current, filepath, args.repeat)
+
+    print("rows: {}".format(num_rows))
+    print("engine: {}".format(timeseriesfile.get_engine()))
+    print("before: {:.3f} s".format(legacy))
+    print("after:  {:.3f} s".format(current))
+    print("speedup: {:.1f}x".format(legacy / current))
+
+
+if __name__ == "__main__":
+    main()
@@ -23,6 +23,12 @@ requirements = [
     "pandas",
 ]
 
+extra_requirements = {
+    "geotiff": ["rasterio"],
+    "hdf5": ["h5py"],
+    "zstd": ["zstandard"],
+}
+
 test_requirements = [
     "pytest",
 ]
@@ -44,6 +50,7 @@ setup(
     entry_points={"console_scripts": ["topmodelpy = topmodelpy.cli:main"]},
     include_package_data=True,
     install_requires=requirements,
+    extras_require=extra_requirements,
     license=license,
     zip_safe=False,
     keywords="topmodelpy",
@@ -95,6 +95,33 @@ def parameters_wolock():
     return data
 
 
+@pytest.fixture(scope="module")
+def topmodel_kwargs_wolock(parameters_wolock,
+                           timeseries_wolock,
+                           twi_wolock,
+                           twi_weighted_mean_wolock):
+    """Return a dictionary of Topmodel keyword arguments of the test data
+    from Dave Wolock's Topmodel version"""
+
+    return dict(
+        scaling_parameter=parameters_wolock["scaling_parameter"],
+        saturated_hydraulic_conductivity=(
+            parameters_wolock["saturated_hydraulic_conductivity"]
+        ),
+        macropore_fraction=parameters_wolock["macropore_fraction"],
+        soil_depth_total=parameters_wolock["soil_depth_total"],
+        soil_depth_ab_horizon=parameters_wolock["soil_depth_ab_horizon"],
+        field_capacity_fraction=parameters_wolock["field_capacity_fraction"],
+        latitude=parameters_wolock["latitude"],
+        basin_area_total=parameters_wolock["basin_area_total"],
+        impervious_area_fraction=parameters_wolock["impervious_area_fraction"],
+        twi_values=twi_wolock["twi"].values,
+        twi_saturated_areas=twi_wolock["proportion"].values,
+        twi_mean=twi_weighted_mean_wolock,
+        precip_available=timeseries_wolock["precip_minus_pet"].values,
+    )
+
+
 @pytest.fixture(scope="module")
 def modelconfig_obj():
     config = ConfigParser(interpolation=ExtendedInterpolation())
@@ -315,3 +342,44 @@ def observed_data():
 @pytest.fixture(scope="module")
 def modeled_data():
     return np.array([55.5, 62.1, 65.3, 64.4, 61.2])
+
+
+@pytest.fixture(scope="module")
+def parameters_table_file():
+    return ("""member,scaling_parameter,macropore_fraction
+a,10,0.2
+b,20,0.4
+c,5,0.1
+""")
+
+
+@pytest.fixture
+def modelconfig_file(tmp_path):
+    inputs = Path(__file__).parents[1] / "data" / "inputs"
+    (tmp_path / "outputs").mkdir()
+
+    config = ConfigParser()
+    config["Inputs"] = {
+        "parameters_file": inputs / "parameters_wolock.csv",
+        "timeseries_file": inputs / "timeseries_wolock.csv",
+        "twi_file": inputs / "twi_wolock.csv",
+    }
+    config["Outputs"] = {
+        "output_dir": tmp_path / "outputs",
+        "output_filename": "output.csv",
+        "output_filename_saturation_deficit_locals": "output_sdl.csv",
+        "output_filename_unsaturated_zone_storages": "output_uzs.csv",
+        "output_filename_root_zone_storages": "output_rzs.csv",
+        "output_report": "report.html",
+    }
+    config["Options"] = {
+        "option_pet": "hamon",
+        "option_snowmelt": "no",
+        "option_write_output_matrices": "no",
+    }
+
+    filepath = tmp_path / "modelconfig.ini"
+    with open(filepath, "w") as f:
+        config.write(f)
+
+    return filepath
@@ -0,0 +1,105 @@
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from topmodelpy import api, main, modelconfigfile
+from topmodelpy.exceptions import (ParametersFileErrorInvalidLatitude,
+                                   TwiFileErrorInvalidProportion)
+
+
+@pytest.fixture
+def input_data(modelconfig_file):
+    config_data = modelconfigfile.read(modelconfig_file)
+    return main.read_input_files(config_data)
+
+
+def test_run(input_data, tmp_path, monkeypatch):
+    parameters, timeseries, twi = input_data
+    preprocessed_data = main.preprocess(
+        modelconfigfile.read(tmp_path / "modelconfig.ini"),
+        parameters, timeseries, twi)
+    topmodel_data = main.run_topmodel(parameters, twi, preprocessed_data)
+
+    monkeypatch.chdir(tmp_path)
+    files = sorted(Path(tmp_path).rglob("*"))
+    results = api.run(
+        parameters={name: parameter["value"]
+                    for name, parameter in parameters.items()},
+        timeseries=timeseries,
+        twi=twi,
+    )
+
+    # Nothing is written
+    assert sorted(Path(tmp_path).rglob("*")) == files
+    np.testing.assert_allclose(results.flows.to_numpy(),
+                               topmodel_data["flow_predicted"])
+    assert results.flows.index.equals(timeseries.index)
+    assert list(results.output.columns) == list(timeseries.columns) + [
+        "precip_minus_pet", "flow_predicted", "saturation_deficit_avgs"]
+    assert results.states["root_zone_storages"].shape == (len(timeseries),
+                                                          len(twi))
+    assert list(results.states["saturation_deficit_locals"].columns) == (
+        twi["bin"].astype(int).tolist())
+    assert set(results.metrics) == {"nash_sutcliffe", "mean_squared_error"}
+
+
+def test_run_file_column_names(input_data):
+    parameters, timeseries, twi = input_data
+    timeseries = timeseries.rename(columns={
+        "temperature": "temperature (celsius)",
+        "precipitation": "precipitation (mm/day)",
+    }).drop(columns=["pet", "flow_observed"])
+
+    results = api.run(parameters, timeseries, twi, snowmelt=True)
+
+    assert "pet" in results.output.columns
+    assert "snowprecip" in results.output.columns
+    assert results.metrics == {}
+    # Inputs are not modified
+    assert "temperature (celsius)" in timeseries.columns
+
+
+def test_run_invalid(input_data):
+    parameters, timeseries, twi = input_data
+
+    with pytest.raises(ValueError, match="flow_initial"):
+        api.run({name: parameter for name, parameter in parameters.items()
+                 if name != "flow_initial"}, timeseries, twi)
+    with pytest.raises(ParametersFileErrorInvalidLatitude):
+        api.run(dict(parameters, latitude=100), timeseries, twi)
+    with pytest.raises(TwiFileErrorInvalidProportion):
+        api.run(parameters, timeseries, twi.assign(proportion=1.0))
+    with pytest.raises(ValueError, match="DatetimeIndex"):
+        api.run(parameters, timeseries.reset_index(), twi)
+
+
+def test_forecast(input_data):
+    parameters, timeseries, twi = input_data
+    history, future = timeseries.iloc[:400], timeseries.iloc[400:]
+    results = api.run(
+        parameters={name: parameter["value"]
+                    for name, parameter in parameters.items()},
+        timeseries=timeseries,
+        twi=twi,
+    )
+
+    forecast = api.forecast(
+        parameters={name: parameter["value"]
+                    for name, parameter in parameters.items()},
+        timeseries=history,
+        twi=twi,
+        scenarios=[future, future.assign(temperature=future["temperature"]
+                                         + 2)],
+        percentiles=[10, 90],
+    )
+
+    assert list(forecast.flows.columns) == [0, 1]
+    np.testing.assert_allclose(forecast.flows[0].to_numpy(),
+                               results.flows.to_numpy()[400:])
+    assert list(forecast.bands.columns) == ["p10", "p90", "mean"]
+    assert set(forecast.state) == {"saturation_deficit_avg",
+                                   "unsaturated_zone_storage",
+                                   "root_zone_storage",
+                                   "snowpack"}
+    assert "scenarios=2" in repr(forecast)
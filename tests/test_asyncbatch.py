@@ -0,0 +1,111 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from configparser import ConfigParser
+import pickle
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from topmodelpy import asyncbatch, main
+
+
+def write_configfiles(modelconfig_file, num_models):
+    configfiles = []
+    for i in range(num_models):
+        config = ConfigParser()
+        config.read(modelconfig_file)
+        output_dir = modelconfig_file.parent / "outputs_{}".format(i)
+        output_dir.mkdir()
+        config["Outputs"]["output_dir"] = str(output_dir)
+        config["Options"]["option_plots"] = "no"
+        configfile = modelconfig_file.parent / "model_{}.ini".format(i)
+        with open(configfile, "w") as f:
+            config.write(f)
+        configfiles.append(configfile)
+
+    return configfiles
+
+
+def test_run_many(modelconfig_file):
+    configfiles = write_configfiles(modelconfig_file, 2)
+    invalid = modelconfig_file.parent / "invalid.ini"
+    invalid.write_text("[Inputs]\n")
+    finished = []
+
+    results = asyncbatch.run_many(configfiles + [invalid],
+                                  jobs=1,
+                                  queue_size=1,
+                                  callback=finished.append)
+
+    assert [result["status"] for result in results] == ["ok", "ok", "failed"]
+    assert sorted(result["configfile"] for result in finished) == sorted(
+        str(configfile) for configfile in configfiles + [invalid])
+    assert set(results[0]["stages"]) == {"read", "compute", "write"}
+
+    main.topmodelpy(str(modelconfig_file), options=None)
+    expected = pd.read_csv(modelconfig_file.parent / "outputs" / "output.csv")
+    for i in range(2):
+        output = pd.read_csv(modelconfig_file.parent / "outputs_{}".format(i)
+                             / "output.csv")
+        pd.testing.assert_frame_equal(output, expected)
+
+
+def test_run_pipeline_bounded(monkeypatch):
+    lock = threading.Lock()
+    in_memory = []
+    counts = {"read": 0, "written": 0}
+
+    def read_job(configfile, plots=None):
+        with lock:
+            counts["read"] += 1
+            in_memory.append(counts["read"] - counts["written"])
+        return configfile
+
+    def compute_job(data):
+        time.sleep(0.02)
+        return {}, {}
+
+    def write_job(data, preprocessed_data, topmodel_data):
+        with lock:
+            counts["written"] += 1
+
+    monkeypatch.setattr(asyncbatch, "read_job", read_job)
+    monkeypatch.setattr(asyncbatch, "compute_job", compute_job)
+    monkeypatch.setattr(asyncbatch, "write_job", write_job)
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        results = asyncio.run(asyncbatch.run_pipeline(
+            ["model_{}.ini".format(i) for i in range(20)],
+            executor, executor, executor,
+            jobs=1, write_jobs=1, queue_size=2))
+
+    assert len(results) == 20
+    assert all(result["status"] == "ok" for result in results.values())
+    # Models in memory are bounded by the queues and the running stages:
+    # reading, 2 queued, computing, 2 queued, and writing
+    assert max(in_memory) <= 7
+
+
+def test_compute_job_matrix_files(modelconfig_file):
+    config = ConfigParser()
+    config.read(modelconfig_file)
+    config["Options"]["option_plots"] = "no"
+    config["Options"]["option_write_output_matrices"] = "yes"
+    config["Options"]["option_output_matrices_format"] = "npy"
+    with open(modelconfig_file, "w") as f:
+        config.write(f)
+
+    data = asyncbatch.read_job(modelconfig_file)
+    preprocessed_data, topmodel_data = asyncbatch.compute_job(data)
+
+    # Memory-mapped matrices are pickled as their file paths
+    matrix = topmodel_data["saturation_deficit_locals"]
+    assert isinstance(matrix, asyncbatch.MatrixFile)
+    assert len(pickle.dumps(topmodel_data)) < 100000
+
+    asyncbatch.write_job(data, preprocessed_data, topmodel_data)
+    actual = np.load(matrix.filepath)
+    assert actual.shape == (len(data["timeseries"]), len(data["twi"]))
+    assert not np.isnan(actual).any()
@@ -0,0 +1,94 @@
+import os
+
+from topmodelpy import batch, main, modelconfigfile, twifile
+
+
+def test_find_configfiles(tmp_path):
+    (tmp_path / "a").mkdir()
+    (tmp_path / "a" / "model1.ini").write_text("")
+    (tmp_path / "a" / "model2.ini").write_text("")
+    (tmp_path / "b.ini").write_text("")
+    (tmp_path / "notes.txt").write_text("")
+
+    expected = [tmp_path / "a" / "model1.ini",
+                tmp_path / "a" / "model2.ini",
+                tmp_path / "b.ini"]
+
+    assert batch.find_configfiles([tmp_path]) == expected
+    assert batch.find_configfiles([str(tmp_path / "a" / "*.ini"),
+                                   tmp_path / "b.ini",
+                                   tmp_path / "b.ini"]) == expected
+
+
+def test_input_cache(tmp_path):
+    fname = os.path.join(os.path.dirname(__file__),
+                         "testdata/twi_wolock.csv")
+    filepath = tmp_path / "twi.csv"
+    filepath.write_text(open(fname).read())
+
+    cache = batch.InputCache()
+    first = cache.read(twifile.read, filepath)
+    second = cache.read(twifile.read, str(filepath))
+
+    assert first is second
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    # A changed file is read again
+    filepath.write_text(open(fname).read() + "\n")
+    os.utime(filepath, ns=(0, 0))
+    third = cache.read(twifile.read, filepath)
+
+    assert third is not first
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_preload_inputs(modelconfig_file):
+    # The same input files, with their paths spelled differently
+    configfile = modelconfig_file.parent / "modelconfig2.ini"
+    config_data = modelconfigfile.read(modelconfig_file)
+    for name, filepath in config_data["Inputs"].items():
+        config_data["Inputs"][name] = os.path.join(
+            os.path.dirname(filepath), "..", "inputs",
+            os.path.basename(filepath))
+    with open(configfile, "w") as f:
+        config_data.write(f)
+
+    cache = batch.InputCache()
+    batch.preload_inputs([modelconfig_file, configfile], cache=cache)
+
+    assert (cache.hits, cache.misses) == (0, 3)
+    main.read_input_files(modelconfigfile.read(configfile), cache=cache)
+    assert (cache.hits, cache.misses) == (3, 3)
+
+
+def test_format_summary():
+    results = [
+        {"configfile": "model1.ini", "status": "ok", "seconds": 1.5,
+         "error": ""},
+        {"configfile": "model2.ini", "status": "failed", "seconds": 0.25,
+         "error": "Invalid file path"},
+    ]
+
+    summary = batch.format_summary(results).splitlines()
+
+    assert summary[1].split() == ["model1.ini", "ok", "1.50"]
+    assert summary[2].endswith("Invalid file path")
+    assert summary[-1] == "1 of 2 model runs ok, 1.75 seconds total"
+
+
+def test_run_job_plots(modelconfig_file):
+    output_dir = modelconfig_file.parent / "outputs"
+
+    result = batch.run_job(modelconfig_file, plots=False)
+
+    assert result["status"] == "ok", result["error"]
+    assert (output_dir / "output.csv").exists()
+    assert not list(output_dir.glob("*.png"))
+    assert not (output_dir / "report.html").exists()
+
+    result = batch.run_job(modelconfig_file, plots=True, plot_jobs=2)
+
+    assert result["status"] == "ok", result["error"]
+    assert (output_dir / "flow_predicted.png").exists()
+    assert (output_dir / "flow_duration_curve.png").exists()
+    assert (output_dir / "report.html").exists()
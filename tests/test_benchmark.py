@@ -0,0 +1,21 @@
+import pytest
+
+from topmodelpy import benchmark
+
+
+def test_parse_sizes():
+    assert benchmark.parse_sizes("1k, 10K,1M,2000") == [1000, 10000,
+                                                        1000000, 2000]
+
+    with pytest.raises(ValueError):
+        benchmark.parse_sizes("1")
+
+
+def test_run_case():
+    result = benchmark.run_case(num_timesteps=100, num_bins=5, repeat=1)
+
+    assert (result["timesteps"], result["bins"]) == (100, 5)
+    assert list(result["seconds"]) == benchmark.STAGES
+    assert all(seconds > 0 for seconds in result["seconds"].values())
+    assert result["run_cells_per_second"] == pytest.approx(
+        500 / result["seconds"]["run"])
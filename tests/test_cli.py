@@ -0,0 +1,66 @@
+import subprocess
+import sys
+
+
+def test_cli_lazy_imports():
+    code = (
+        "import sys\n"
+        "import topmodelpy.cli\n"
+        "heavy = ['pandas', 'scipy', 'matplotlib', 'jinja2', 'h5py',"
+        " 'rasterio', 'topmodelpy.main']\n"
+        "print(','.join(name for name in heavy if name in sys.modules))\n"
+    )
+    result = subprocess.run([sys.executable, "-c", code],
+                            stdout=subprocess.PIPE,
+                            universal_newlines=True,
+                            check=True)
+
+    assert result.stdout.strip() == ""
+
+
+def test_run_profile(modelconfig_file, tmp_path):
+    from click.testing import CliRunner
+
+    from topmodelpy.cli import main
+
+    filepath = tmp_path / "run.prof"
+    result = CliRunner().invoke(main, ["--verbose", "run",
+                                       str(modelconfig_file),
+                                       "--no-plots",
+                                       "--profile",
+                                       "--profile-output", str(filepath)])
+
+    assert result.exit_code == 0, result.output
+    assert filepath.exists()
+    assert "topmodelpy/topmodel.py" in result.output
+    # --verbose prints the run profile summary
+    assert "postprocess" in result.output
+
+
+def test_run_watch_profile(modelconfig_file):
+    from click.testing import CliRunner
+
+    from topmodelpy.cli import main
+
+    result = CliRunner().invoke(main, ["run", str(modelconfig_file),
+                                       "--watch", "--profile"])
+
+    assert result.exit_code == 2
+    assert "--profile can not be used with --watch" in result.output
+
+
+def test_stream(modelconfig_file):
+    from click.testing import CliRunner
+
+    from topmodelpy.cli import main
+
+    result = CliRunner().invoke(main, ["stream", str(modelconfig_file)],
+                                input="1980-01-22,-1.9,2.5,0.39\n"
+                                      "1980-01-23,-0.3,0,0.44\n")
+
+    assert result.exit_code == 0, result.output
+    assert result.output.splitlines() == [
+        "date,pet,precip_minus_pet,flow_predicted,saturation_deficit_avgs",
+        "1980-01-22,0.39,2.11,1.48,19.43",
+        "1980-01-23,0.44,-0.44,0.77,20.52",
+    ]
@@ -0,0 +1,31 @@
+"""Tests for demfile module."""
+
+import numpy as np
+import pytest
+
+from topmodelpy import demfile
+
+
+def test_dem_file_read_rows(tmp_path):
+    dem = np.arange(12, dtype=float).reshape(4, 3)
+    dem[1, 1] = -9999
+    filepath = tmp_path / "dem.npy"
+    np.save(str(filepath), dem)
+
+    with demfile.read(filepath, cellsize=30, nodata=-9999) as actual:
+        rows = actual.read_rows(1, 3)
+
+    assert actual.shape == (4, 3)
+    assert actual.cellsize == 30
+    assert np.isnan(rows[0, 1])
+    np.testing.assert_array_equal(rows[1], [6, 7, 8])
+
+
+def test_dem_file_invalid_cellsize(tmp_path):
+    filepath = tmp_path / "dem.npy"
+    np.save(str(filepath), np.zeros((2, 2)))
+
+    with pytest.raises(ValueError) as err:
+        demfile.read(filepath)
+
+    assert "Invalid DEM cell size" in str(err.value)
@@ -0,0 +1,68 @@
+"""Tests for hdf5file module."""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from topmodelpy import hdf5file
+
+pytest.importorskip("h5py")
+
+
+def test_hdf5file_write_and_read(tmp_path, modelconfig_obj, twi_wolock):
+    index = pd.date_range("2000-01-01", periods=100, freq="D", name="date")
+    output_df = pd.DataFrame({
+        "precipitation": np.arange(100, dtype=float),
+        "flow_predicted": np.linspace(0, 1, 100),
+    }, index=index)
+    matrices = {
+        "root_zone_storages": np.arange(100 * 3, dtype=float).reshape(100, 3),
+    }
+    parameters = {
+        "scaling_parameter": {
+            "value": 10.0,
+            "units": "millimeters",
+            "description": "a description",
+        },
+    }
+    filepath = tmp_path / "output.h5"
+
+    hdf5file.write(filepath,
+                   output_df,
+                   matrices=matrices,
+                   bins=[1, 2, 3],
+                   parameters=parameters,
+                   config_data=modelconfig_obj,
+                   twi=twi_wolock,
+                   chunksize=10)
+
+    actual_df, actual_matrices = hdf5file.read(filepath,
+                                               start="2000-01-11",
+                                               end="2000-01-20")
+
+    assert list(actual_df.columns) == ["precipitation", "flow_predicted"]
+    assert len(actual_df) == 10
+    assert actual_df.index[0] == pd.Timestamp("2000-01-11")
+    np.testing.assert_allclose(actual_df["precipitation"], np.arange(10, 20))
+    assert list(actual_matrices["root_zone_storages"].columns) == [1, 2, 3]
+    np.testing.assert_allclose(actual_matrices["root_zone_storages"],
+                               matrices["root_zone_storages"][10:20])
+
+
+def test_hdf5file_write_maps(tmp_path):
+    import h5py
+
+    dates = pd.date_range("2000-01-01", periods=3, freq="D")
+    bin_raster = np.array([[0, 1], [2, 1]], dtype=np.uint16)
+    matrix = np.array([[0.0, 1.0], [2.0, 3.0], [4.0, 5.0]])
+    filepath = tmp_path / "output.h5"
+
+    hdf5file.write_maps(filepath, bin_raster, np.array([1, 2]), matrix,
+                        dates, indices=[2])
+
+    with h5py.File(str(filepath), "r") as f:
+        maps = f["maps/saturation_deficit_locals"][:]
+        map_dates = pd.to_datetime(f["maps/date"][:])
+
+    np.testing.assert_array_equal(maps[0], [[np.nan, 4], [5, 4]])
+    assert list(map_dates) == [dates[2]]
@@ -0,0 +1,95 @@
+import json
+from configparser import ConfigParser
+
+from topmodelpy import instrument, main
+
+
+def test_stage_without_recorder():
+    with instrument.stage("read"):
+        pass
+    instrument.record("png:plot.png", 1.0, 1.0)
+
+    assert not instrument.is_recording()
+    assert instrument.stop() is None
+
+
+def test_recorder_nested_stages():
+    recorder = instrument.start(trace_memory=True)
+    try:
+        with instrument.stage("postprocess"):
+            with instrument.stage("csv:output.csv"):
+                data = bytearray(2 * 10 ** 6)
+                del data
+            with instrument.stage("plots"):
+                instrument.record("png:plot.png", 0.5, 0.25)
+    finally:
+        assert instrument.stop() is recorder
+
+    names = [record["stage"] for record in recorder.stages]
+    assert names == [
+        "postprocess",
+        "postprocess/csv:output.csv",
+        "postprocess/plots",
+        "postprocess/plots/png:plot.png",
+    ]
+    records = {record["stage"]: record for record in recorder.stages}
+    # Peak memory of a stage includes the peak memory of nested stages
+    assert records["postprocess/csv:output.csv"]["peak_memory_bytes"] >= 10 ** 6
+    assert records["postprocess"]["peak_memory_bytes"] >= 10 ** 6
+    assert records["postprocess/plots"]["peak_memory_bytes"] < 10 ** 6
+    assert records["postprocess/plots/png:plot.png"]["wall_seconds"] == 0.5
+    assert "peak_memory_bytes" not in records["postprocess/plots/png:plot.png"]
+
+    summary = recorder.format_summary()
+    assert "    png:plot.png" in summary
+    assert summary.splitlines()[-1].startswith("Total")
+
+
+def test_topmodelpy_run_profile(modelconfig_file):
+    config = ConfigParser()
+    config.read(modelconfig_file)
+    config["Options"]["option_plots"] = "no"
+    config["Options"]["option_run_profile"] = "yes"
+    with open(modelconfig_file, "w") as f:
+        config.write(f)
+
+    recorder = main.topmodelpy(str(modelconfig_file), options=None)
+
+    assert not instrument.is_recording()
+    filepath = modelconfig_file.parent / "outputs" / "run_profile.json"
+    with open(filepath, "r") as f:
+        profile = json.load(f)
+    assert profile == json.loads(json.dumps(recorder.to_dict()))
+    assert not profile["trace_memory"]
+    names = [record["stage"] for record in profile["stages"]]
+    assert names == [
+        "read",
+        "preprocess",
+        "run",
+        "postprocess",
+        "postprocess/csv:output.csv",
+        "postprocess/saturation_maps",
+    ]
+    assert all(record["wall_seconds"] >= 0 for record in profile["stages"])
+
+
+def test_recorder_cache_report():
+    recorder = instrument.start()
+    try:
+        with instrument.stage("read"):
+            instrument.annotate(cache="hit")
+        with instrument.stage("run"):
+            instrument.annotate(cache="miss")
+        with instrument.stage("postprocess"):
+            pass
+    finally:
+        instrument.stop()
+    instrument.annotate(cache="hit")
+
+    assert recorder.stages[0]["cache"] == "hit"
+    assert "cache" not in recorder.stages[2]
+    assert recorder.format_cache_report() == (
+        "Cache hits: read\nCache misses: run"
+    )
+    assert recorder.format_summary().splitlines()[0].endswith("Cache")
+    assert instrument.Recorder().format_cache_report() == ""
@@ -0,0 +1,134 @@
+import ctypes
+import ctypes.util
+import gc
+
+import numpy as np
+import pandas as pd
+import pytest
+from matplotlib.figure import Figure
+
+from topmodelpy import main, modelconfigfile
+from topmodelpy.exceptions import TimeseriesFileErrorDiscontinuity
+
+
+def test_postprocess_memory(modelconfig_file):
+    resource = pytest.importorskip("resource")
+
+    config_data = modelconfigfile.read(modelconfig_file)
+    main.set_plot_options(config_data, plots=True, plot_jobs=1)
+    parameters, timeseries, twi = main.read_input_files(config_data)
+    timeseries = timeseries.iloc[:90]
+
+    preprocessed_data = main.preprocess(config_data, parameters, timeseries,
+                                        twi)
+    topmodel_data = main.run_topmodel(parameters, twi, preprocessed_data)
+
+    # glibc malloc keeps the freed render buffers of the png plots in a
+    # fragmented heap, so peak resident memory grows by 30-40 MB over the
+    # first runs even though tracemalloc finds less than 1 MB more python
+    # memory; trimming the heap after each run keeps it flat. Return freed
+    # memory to the system, so peak resident memory measures memory in use.
+    libc = ctypes.CDLL(ctypes.util.find_library("c"))
+    malloc_trim = getattr(libc, "malloc_trim", None)
+
+    def run_postprocess():
+        main.postprocess(config_data, timeseries, preprocessed_data,
+                         topmodel_data, parameters, twi)
+        gc.collect()
+        if malloc_trim:
+            malloc_trim(0)
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # Warm up caches of fonts, converters, and templates
+    baseline = run_postprocess()
+    peaks = [run_postprocess() for _ in range(4)]
+
+    # Peak resident memory, in kilobytes, stays flat; each leaked png
+    # figure would hold a render buffer of about 5 MB
+    assert peaks[-1] - baseline < 20000
+    gc.collect()
+    assert not [obj for obj in gc.get_objects() if isinstance(obj, Figure)]
+
+
+def test_compute_model_streamed(modelconfig_file):
+    config_data = modelconfigfile.read(modelconfig_file)
+    config_data["Options"]["option_plots"] = "no"
+    parameters, timeseries, twi = main.read_input_files(config_data)
+    main.run_model(config_data, parameters, timeseries, twi)
+    output_filepath = modelconfig_file.parent / "outputs" / "output.csv"
+    expected = output_filepath.read_text()
+
+    config_data["Options"]["option_stream_output"] = "yes"
+    config_data["Options"]["option_stream_chunksize"] = "100"
+    preprocessed_data, topmodel_data = main.compute_model(config_data,
+                                                          parameters,
+                                                          timeseries,
+                                                          twi)
+
+    # The output matrices are held in temporary files, not in memory
+    assert isinstance(topmodel_data["saturation_deficit_locals"], np.memmap)
+    assert output_filepath.read_text() == expected
+    main.postprocess(config_data, timeseries, preprocessed_data,
+                     topmodel_data, parameters, twi)
+    assert output_filepath.read_text() == expected
+
+
+def test_run_forecast(modelconfig_file):
+    config_data = modelconfigfile.read(modelconfig_file)
+    config_data["Options"]["option_snowmelt"] = "yes"
+    parameters, timeseries, twi = main.read_input_files(config_data)
+    preprocessed_data = main.preprocess(config_data, parameters, timeseries,
+                                        twi)
+    topmodel_data = main.run_topmodel(parameters, twi, preprocessed_data)
+
+    # Split with snow on the ground, so the snowpack carries over
+    history, future = timeseries.iloc[:330], timeseries.iloc[330:]
+    assert preprocessed_data["snowpack"][329] > 0
+    scenarios = {
+        "trace_0": future,
+        "trace_1": future.assign(precipitation=future["precipitation"] * 2),
+    }
+    forecast_data = main.run_forecast(config_data, parameters, history, twi,
+                                      scenarios)
+
+    flows = forecast_data["flow_predicted"]
+    assert list(flows.columns) == ["trace_0", "trace_1"]
+    assert flows.index.equals(future.index)
+    np.testing.assert_allclose(flows["trace_0"].to_numpy(),
+                               topmodel_data["flow_predicted"][330:],
+                               rtol=1e-12)
+    np.testing.assert_allclose(forecast_data["history_flow_predicted"],
+                               topmodel_data["flow_predicted"][:330],
+                               rtol=1e-12)
+    assert forecast_data["state"]["snowpack"] == (
+        preprocessed_data["snowpack"][329])
+
+    bands = forecast_data["bands"]
+    assert list(bands.columns) == ["p5", "p25", "p50", "p75", "p95", "mean"]
+    assert (bands["p5"] <= bands["p95"]).all()
+    np.testing.assert_allclose(bands["mean"], flows.mean(axis=1))
+
+
+def test_run_forecast_discontinuity(modelconfig_file):
+    config_data = modelconfigfile.read(modelconfig_file)
+    parameters, timeseries, twi = main.read_input_files(config_data)
+
+    with pytest.raises(TimeseriesFileErrorDiscontinuity):
+        main.run_forecast(config_data, parameters, timeseries.iloc[:300],
+                          twi, {"trace": timeseries.iloc[301:]})
+    with pytest.raises(ValueError, match="same dates"):
+        main.run_forecast(config_data, parameters, timeseries.iloc[:300],
+                          twi, {"trace_0": timeseries.iloc[300:],
+                                "trace_1": timeseries.iloc[300:400]})
+
+
+def test_get_forecast_bands():
+    flows = pd.DataFrame({"a": [1.0, 2.0], "b": [3.0, 4.0], "c": [5.0, 9.0]})
+    bands = main.get_forecast_bands(flows, [0, 50, 100])
+
+    assert bands.to_dict("list") == {
+        "p0": [1.0, 2.0],
+        "p50": [3.0, 4.0],
+        "p100": [5.0, 9.0],
+        "mean": [3.0, 5.0],
+    }
@@ -0,0 +1,47 @@
+"""Tests for mapfile module."""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from topmodelpy import mapfile
+
+
+@pytest.fixture
+def bin_raster():
+    return np.array([[0, 1, 2],
+                     [3, 2, 1]], dtype=np.uint16)
+
+
+@pytest.mark.parametrize("suffix", [".npz", ".npy"])
+def test_mapfile_write_and_read(tmp_path, bin_raster, suffix):
+    dates = pd.date_range("2000-01-01", periods=4, freq="D")
+    bins = np.array([1, 2, 3])
+    matrix = np.array([[0.0, 1.0, 2.0],
+                       [3.0, 4.0, 5.0],
+                       [6.0, 7.0, 8.0],
+                       [9.0, 10.0, 11.0]])
+
+    mapfile.write(tmp_path / ("maps" + suffix),
+                  tmp_path / "maps.json",
+                  bin_raster,
+                  bins,
+                  matrix,
+                  dates,
+                  indices=[1, 3],
+                  tile_rows=1)
+    maps, metadata = mapfile.read(tmp_path / "maps.json")
+
+    assert maps.shape == (2, 2, 3)
+    assert metadata["dates"] == ["2000-01-02T00:00:00", "2000-01-04T00:00:00"]
+    np.testing.assert_array_equal(maps[0], [[np.nan, 3, 4], [5, 4, 3]])
+    np.testing.assert_array_equal(maps[1], [[np.nan, 9, 10], [11, 10, 9]])
+    np.testing.assert_array_equal(maps[-1], maps[1])
+    assert isinstance(maps, np.memmap) == (suffix == ".npy")
+
+
+def test_mapfile_invalid_bin_raster(bin_raster):
+    with pytest.raises(ValueError) as err:
+        mapfile.check_bin_raster(bin_raster, np.array([1, 2]))
+
+    assert "Invalid bin raster" in str(err.value)
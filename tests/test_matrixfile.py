@@ -0,0 +1,63 @@
+"""Tests for matrixfile module."""
+
+import numpy as np
+import pandas as pd
+
+from topmodelpy import matrixfile
+
+
+def test_matrixfile_create_and_read(tmp_path):
+    dates = pd.date_range("2019-01-01", periods=5, freq="D")
+    bins = np.array([1, 2, 3])
+    filepaths = {
+        "saturation_deficit_locals": tmp_path / "sdl.npy",
+        "root_zone_storages": tmp_path / "rzs.npy",
+    }
+
+    matrices = matrixfile.create(filepath=tmp_path / "matrices.json",
+                                 filepaths=filepaths,
+                                 dates=dates,
+                                 bins=bins)
+    assert np.isnan(matrices["saturation_deficit_locals"]).all()
+
+    matrices["saturation_deficit_locals"][:] = 1.5
+    matrices["root_zone_storages"][2] = [1.0, 2.0, 3.0]
+    matrixfile.flush(matrices)
+
+    actual, metadata = matrixfile.read(tmp_path / "matrices.json")
+
+    assert isinstance(actual["saturation_deficit_locals"], np.memmap)
+    np.testing.assert_allclose(actual["saturation_deficit_locals"], 1.5)
+    np.testing.assert_allclose(actual["root_zone_storages"][2],
+                               [1.0, 2.0, 3.0])
+    assert metadata["shape"] == [5, 3]
+    assert metadata["dtype"] == "float64"
+    assert metadata["bins"] == [1, 2, 3]
+    assert metadata["dates"].equals(dates)
+    assert metadata["matrices"]["root_zone_storages"] == "rzs.npy"
+
+
+def test_matrixfile_dates_metadata():
+    hourly = pd.date_range("1900-01-01", periods=24 * 365 * 100, freq="H")
+    irregular = pd.DatetimeIndex(["2019-01-01", "2019-01-02", "2019-01-04"])
+
+    assert matrixfile.get_dates_metadata(hourly) == {
+        "start": "1900-01-01T00:00:00", "freq": "H", "periods": 876000,
+    }
+    assert matrixfile.get_dates_metadata(irregular) == {
+        "values": [date.isoformat() for date in irregular],
+    }
+    for dates in [hourly, irregular, hourly[:1], hourly[:0]]:
+        actual = matrixfile.get_dates(matrixfile.get_dates_metadata(dates))
+        assert actual.equals(dates)
+
+
+def test_matrixfile_create_temporary(tmp_path):
+    matrices = matrixfile.create_temporary(["a", "b"], (4, 2),
+                                           directory=tmp_path)
+
+    assert isinstance(matrices["a"], np.memmap)
+    assert matrices["b"].shape == (4, 2)
+    assert np.isnan(matrices["a"]).all()
+    matrices["a"][1] = [1.0, 2.0]
+    np.testing.assert_allclose(matrices["a"][1], [1.0, 2.0])
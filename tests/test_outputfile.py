@@ -0,0 +1,47 @@
+"""Tests for outputfile module."""
+
+import gzip
+import numpy as np
+import pandas as pd
+
+from topmodelpy import outputfile
+
+
+def test_stream_writer_matches_to_csv(tmp_path):
+    index = pd.date_range("2019-01-01", periods=10, freq="D", name="date")
+    df = pd.DataFrame({
+        "flow_predicted": np.linspace(0, 1, 10),
+        "saturation_deficit_avgs": np.linspace(10, 20, 10),
+    }, index=index)
+    expected = tmp_path / "expected.csv"
+    df.to_csv(expected, float_format="%.2f")
+
+    actual = tmp_path / "actual.csv"
+    date_format = outputfile.get_date_format(index)
+    with outputfile.StreamWriter(actual,
+                                 columns=df.columns,
+                                 date_format=date_format) as writer:
+        for start in range(0, len(df), 3):
+            chunk = df.iloc[start:start+3]
+            writer.write(chunk.index, chunk.to_numpy())
+
+    assert writer.num_rows == 10
+    assert actual.read_text() == expected.read_text()
+
+
+def test_stream_writer_gzip(tmp_path):
+    index = pd.date_range("2019-01-01", periods=4, freq="6H", name="date")
+    values = np.arange(8, dtype=float).reshape(4, 2)
+
+    with outputfile.StreamWriter(tmp_path / "output.csv",
+                                 columns=["bin_1", "bin_2"],
+                                 date_format=outputfile.get_date_format(index),
+                                 compression="gzip") as writer:
+        writer.write(index, values)
+
+    assert writer.filepath == str(tmp_path / "output.csv.gz")
+    with gzip.open(writer.filepath, "rt") as f:
+        lines = f.read().splitlines()
+
+    assert lines[0] == "date,bin_1,bin_2"
+    assert lines[2] == "2019-01-01 06:00:00,2.00,3.00"
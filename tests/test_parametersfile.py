@@ -107,3 +107,56 @@ def test_parameters_file_invalid_impervious_area_fraction():
         parametersfile.check_impervious_area(invalid_value)
 
     assert "Invalid impervious area" in str(err.value)
+
+
+def test_parameters_file_read_table_in(parameters_file,
+                                       parameters_table_file):
+    parameters = parametersfile.read_in(StringIO(parameters_file))
+    table = parametersfile.read_table_in(StringIO(parameters_table_file))
+    actual = parametersfile.get_parameter_sets(parameters, table)
+
+    assert list(actual.index) == ["a", "b", "c"]
+    assert list(actual.columns) == list(parameters.keys())
+    assert list(actual["scaling_parameter"]) == [10, 20, 5]
+    assert list(actual["macropore_fraction"]) == [0.2, 0.4, 0.1]
+    assert (actual["latitude"] == parameters["latitude"]["value"]).all()
+
+    parameter_set = parametersfile.get_parameter_set(parameters, actual, "b")
+    assert parameter_set["scaling_parameter"]["value"] == 20
+    assert parameter_set["scaling_parameter"]["units"] == "millimeters"
+
+
+def test_parameters_file_table_invalid_header(parameters_file):
+    parameters = parametersfile.read_in(StringIO(parameters_file))
+    table = parametersfile.read_table_in(StringIO("not_a_parameter\n1\n"))
+
+    with pytest.raises(ParametersFileErrorInvalidHeader):
+        parametersfile.get_parameter_sets(parameters, table)
+
+
+def test_parameters_file_table_invalid_values(parameters_file):
+    parameters = parametersfile.read_in(StringIO(parameters_file))
+    table = parametersfile.read_table_in(
+        StringIO("macropore_fraction\n0.2\n1.5\n0.3\n"))
+    parameter_sets = parametersfile.get_parameter_sets(parameters, table)
+
+    with pytest.raises(ParametersFileErrorInvalidMacropore) as err:
+        parametersfile.check_data(
+            parametersfile.get_parameter_set(parameters, parameter_sets))
+
+    assert "1.5" in str(err.value)
+
+
+def test_parameters_file_table_missing_values(parameters_file, tmp_path,
+                                              capsys):
+    parameters = parametersfile.read_in(StringIO(parameters_file))
+    filepath = tmp_path / "parameters_table.csv"
+    filepath.write_text("member,scaling_parameter,macropore_fraction\n"
+                        "1,,0.3\n"
+                        "2,20,0.4\n")
+
+    assert parametersfile.read_table(filepath, parameters) is None
+
+    output = capsys.readouterr().out
+    assert "Missing values" in output
+    assert "0.3" in output
@@ -0,0 +1,140 @@
+import shutil
+from configparser import ConfigParser
+
+import numpy as np
+
+from topmodelpy import main, mapfile, pipeline
+
+
+def write_config(modelconfig_file, **options):
+    config = ConfigParser()
+    config.read(modelconfig_file)
+    config["Options"]["option_plots"] = "no"
+    config["Options"]["option_cache"] = "yes"
+    for key, value in options.items():
+        config["Options"][key] = value
+    with open(modelconfig_file, "w") as f:
+        config.write(f)
+
+
+def run(modelconfig_file):
+    recorder = main.topmodelpy(str(modelconfig_file), options=None)
+
+    return {record["stage"]: record["cache"] for record in recorder.stages
+            if "cache" in record}
+
+
+def test_topmodelpy_cache_hits(modelconfig_file):
+    write_config(modelconfig_file)
+    output_filepath = modelconfig_file.parent / "outputs" / "output.csv"
+
+    assert set(run(modelconfig_file).values()) == {"miss"}
+    output = output_filepath.read_text()
+
+    assert run(modelconfig_file) == {
+        "read": "hit",
+        "preprocess/pet": "hit",
+        "run": "hit",
+        "postprocess": "hit",
+    }
+    assert output_filepath.read_text() == output
+    assert (modelconfig_file.parent / "outputs" / ".topmodelpy_cache").is_dir()
+    # Run profile is only written with option_run_profile
+    assert not (modelconfig_file.parent / "outputs"
+                / "run_profile.json").exists()
+
+    # A missing output file reruns postprocess
+    output_filepath.unlink()
+    assert run(modelconfig_file)["postprocess"] == "miss"
+    assert output_filepath.read_text() == output
+
+
+def test_topmodelpy_cache_output_option(modelconfig_file):
+    write_config(modelconfig_file)
+    run(modelconfig_file)
+    write_config(modelconfig_file, option_output_compression="gzip")
+
+    assert run(modelconfig_file) == {
+        "read": "hit",
+        "preprocess/pet": "hit",
+        "run": "hit",
+        "postprocess": "miss",
+    }
+    assert (modelconfig_file.parent / "outputs" / "output.csv.gz").exists()
+
+
+def test_topmodelpy_cache_snowmelt_parameter(modelconfig_file):
+    config = ConfigParser()
+    config.read(modelconfig_file)
+    parameters_filepath = modelconfig_file.parent / "parameters.csv"
+    shutil.copy(config["Inputs"]["parameters_file"], parameters_filepath)
+    config["Inputs"]["parameters_file"] = str(parameters_filepath)
+    with open(modelconfig_file, "w") as f:
+        config.write(f)
+    write_config(modelconfig_file, option_snowmelt="yes")
+    run(modelconfig_file)
+
+    lines = parameters_filepath.read_text().splitlines()
+    lines = [line.replace("snowmelt_rate_coeff,0.06",
+                          "snowmelt_rate_coeff,0.09") for line in lines]
+    parameters_filepath.write_text("\n".join(lines) + "\n")
+
+    assert run(modelconfig_file) == {
+        "read": "miss",
+        "preprocess/pet": "hit",
+        "preprocess/snowmelt": "miss",
+        "run": "miss",
+        "postprocess": "miss",
+    }
+
+
+def test_topmodelpy_cache_twi_bin_raster(modelconfig_file):
+    raster_filepath = modelconfig_file.parent / "bins.npy"
+    np.save(raster_filepath, np.array([[1, 2], [3, 0]], dtype=np.uint16))
+    config = ConfigParser()
+    config.read(modelconfig_file)
+    config["Inputs"]["twi_bin_raster_file"] = str(raster_filepath)
+    with open(modelconfig_file, "w") as f:
+        config.write(f)
+    write_config(modelconfig_file,
+                 option_saturation_maps_dates="1980-01-22")
+    maps_filepath = (modelconfig_file.parent / "outputs"
+                     / "output_saturation_maps.npz")
+    run(modelconfig_file)
+    assert mapfile.CompressedMaps(maps_filepath).shape == (1, 2, 2)
+
+    # Postprocess reads the bin raster, so a changed raster reruns it
+    np.save(raster_filepath, np.array([[1, 2, 3], [3, 2, 1], [0, 0, 1]],
+                                      dtype=np.uint16))
+    stages = run(modelconfig_file)
+
+    assert stages["read"] == "miss"
+    assert stages["run"] == "hit"
+    assert stages["postprocess"] == "miss"
+    assert mapfile.CompressedMaps(maps_filepath).shape == (1, 3, 3)
+
+
+def test_disk_cache(tmp_path):
+    cache = pipeline.DiskCache(tmp_path, max_entries=2)
+    for key in ["a", "b", "c"]:
+        cache.set("run", key, {"key": key})
+
+    assert cache.get("run", "c") == (True, {"key": "c"})
+    assert cache.get("run", "a") == (False, None)
+    assert len(list(tmp_path.glob("run-*.pkl"))) == 2
+
+    cache.get_filepath("run", "c").write_bytes(b"truncated")
+    assert cache.get("run", "c") == (False, None)
+
+
+def test_pipeline_keys(tmp_path):
+    stages = pipeline.Pipeline(pipeline.DiskCache(tmp_path))
+    stages.run_stage("pet", lambda: 1, params={"latitude": 40.5})
+    stages.run_stage("run", lambda: 2, dependencies=["pet"])
+    run_key = stages.keys["run"]
+
+    assert stages.run_stage("pet", lambda: 3, params={"latitude": 40.5}) == 1
+    assert stages.status["pet"] == "hit"
+    stages.run_stage("pet", lambda: 3, params={"latitude": 41.0})
+    assert stages.status["pet"] == "miss"
+    assert stages.get_key("run", dependencies=["pet"]) != run_key
@@ -0,0 +1,52 @@
+import pstats
+
+import pytest
+
+from topmodelpy import profiling
+from topmodelpy.exceptions import DependencyErrorMissingPackage
+
+
+def slow_sum(n):
+    return sum(i * i for i in range(n))
+
+
+def sort_values(n):
+    return sorted(range(n, 0, -1))
+
+
+def test_profile_cprofile(tmp_path):
+    filepath = tmp_path / "run.prof"
+
+    result, table = profiling.profile(slow_sum, filepath, top=5, n=10000)
+
+    assert result == slow_sum(10000)
+    stats = pstats.Stats(str(filepath))
+    assert any(name == "slow_sum" for _, _, name in stats.stats)
+    assert "test_profiling.py" in table
+    assert "Top 5 functions by tottime:" in table
+    assert (tmp_path / "run.txt").read_text() == table + "\n"
+
+
+def test_format_stats_packages(tmp_path):
+    filepath = tmp_path / "run.prof"
+    profiling.profile(sort_values, filepath, n=100000)
+
+    table = profiling.format_stats(pstats.Stats(str(filepath)), top=3)
+
+    # Time in the built-in sorted() is attributed to its caller
+    packages = table.split("packages by tottime:")[1].splitlines()
+    assert packages[2].split()[-1] == "tests"
+    with pytest.raises(ValueError):
+        profiling.format_stats(pstats.Stats(str(filepath)), sort="ncalls")
+
+
+def test_profile_pyinstrument_missing(tmp_path):
+    try:
+        import pyinstrument  # noqa: F401
+        pytest.skip("pyinstrument is installed")
+    except ImportError:
+        pass
+
+    with pytest.raises(DependencyErrorMissingPackage):
+        profiling.profile(slow_sum, tmp_path / "run.html",
+                          profiler="pyinstrument", n=10)
@@ -0,0 +1,65 @@
+import base64
+import zlib
+
+import numpy as np
+import pandas as pd
+
+from topmodelpy import report
+
+
+def decode(payload):
+    data = base64.b64decode(payload["data"])
+    if payload["compression"] == "deflate":
+        data = zlib.decompress(data)
+
+    arrays = {}
+    offset = 0
+    for array in payload["arrays"]:
+        dtype = np.dtype("<f8" if array["dtype"] == "float64" else "<f4")
+        arrays[array["name"]] = np.frombuffer(
+            data, dtype=dtype, count=array["length"], offset=offset)
+        offset += array["length"] * dtype.itemsize
+
+    return arrays
+
+
+def test_encode_payload():
+    df = pd.DataFrame(
+        {"flow_observed": [1.0, 2.0, np.nan, 4.0],
+         "flow_predicted": [1.5, 2.5, 3.5, 4.5]},
+        index=pd.date_range("2019-01-01", periods=4))
+    comparison_data = {"absolute_error": [-0.5, -0.5, np.nan, -0.5]}
+
+    for compression in report.COMPRESSIONS:
+        arrays = decode(report.encode_payload(
+            report.get_payload_arrays(df, comparison_data),
+            compression=compression))
+
+        assert (pd.to_datetime(arrays["date"], unit="ms")
+                == df.index).all()
+        np.testing.assert_array_equal(arrays["flow_observed"],
+                                      df["flow_observed"].to_numpy())
+        np.testing.assert_array_equal(arrays["absolute_error"],
+                                      comparison_data["absolute_error"])
+        np.testing.assert_array_equal(arrays["flow_duration_flow_predicted"],
+                                      [1.5, 2.5, 3.5, 4.5])
+
+
+def test_payload_downsampled():
+    dates = pd.date_range("1980-01-01", periods=20000)
+    values = np.sin(np.arange(20000) / 100)
+    df = pd.DataFrame({"flow_predicted": values, "pet": values ** 2},
+                      index=dates)
+
+    arrays = dict(report.get_payload_arrays(df, {}, max_points=500))
+
+    # Columns share one date array of the union of the kept rows
+    assert 500 <= len(arrays["date"]) <= 1000
+    assert len(arrays["pet"]) == len(arrays["date"])
+    assert len(arrays["flow_duration_flow_predicted"]) == 500
+
+    # Each chart reads the shared payload rather than embedding its own data
+    charts = report.get_charts(df, {})
+    assert len(charts) == 3
+    html = report.render_report(df, {}, max_points=500)
+    assert html.count('"data":') == 1
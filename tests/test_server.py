@@ -0,0 +1,184 @@
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import http.client
+import json
+import os
+import socket
+import threading
+
+import numpy as np
+import pytest
+
+from topmodelpy import api, main, modelconfigfile, server
+from topmodelpy.exceptions import ServerErrorInvalidSocketPath
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path):
+        super().__init__("localhost")
+        self.path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(self.path)
+
+
+@pytest.fixture(scope="module")
+def model_server():
+    model_server = server.ModelServer(jobs=1, max_queue=1)
+    yield model_server
+    model_server.close()
+
+
+def serve(model_server, **kwargs):
+    http_server = server.create_server(model_server, port=0, **kwargs)
+    thread = threading.Thread(target=http_server.serve_forever, daemon=True)
+    thread.start()
+    return http_server
+
+
+def request(connection, method, path, body=None):
+    connection.request(method, path,
+                       body=json.dumps(body) if body is not None else None)
+    response = connection.getresponse()
+    return response.status, json.loads(response.read())
+
+
+def test_serve_run(model_server, modelconfig_file):
+    http_server = serve(model_server)
+    connection = http.client.HTTPConnection(*http_server.server_address[:2])
+    try:
+        status, result = request(connection, "POST", "/run", {
+            "config": str(modelconfig_file),
+            "parameters": {"scaling_parameter": 12},
+        })
+        assert status == 200, result
+
+        config_data = modelconfigfile.read(modelconfig_file)
+        parameters, timeseries, twi = main.read_input_files(config_data)
+        parameters["scaling_parameter"] = dict(
+            parameters["scaling_parameter"], value=12)
+        expected = api.run(parameters, timeseries, twi)
+        np.testing.assert_allclose(result["flows"], expected.flows)
+        assert len(result["dates"]) == len(timeseries)
+        assert result["metrics"] == pytest.approx(expected.metrics)
+
+        status, result = request(connection, "POST", "/run", {
+            "config": str(modelconfig_file),
+            "parameters": {"not_a_parameter": 1},
+        })
+        assert status == 400
+        assert "not_a_parameter" in result["error"]
+
+        status, result = request(connection, "POST", "/run", {"path": "x"})
+        assert status == 400
+
+        status, stats = request(connection, "GET", "/stats")
+        assert status == 200
+        assert stats["completed"] >= 1 and stats["failed"] >= 1
+        assert stats["running"] == 0 and stats["queued"] == 0
+        assert stats["latency_seconds"]["p50"] > 0
+    finally:
+        connection.close()
+        http_server.shutdown()
+        http_server.server_close()
+
+
+def test_serve_unix_socket(model_server, tmp_path):
+    socket_path = str(tmp_path / "topmodelpy.sock")
+    http_server = serve(model_server, socket_path=socket_path)
+    connection = UnixHTTPConnection(socket_path)
+    try:
+        assert request(connection, "GET", "/health") == (200,
+                                                         {"status": "ok"})
+        assert request(connection, "GET", "/nothing")[0] == 404
+    finally:
+        connection.close()
+        http_server.shutdown()
+        http_server.server_close()
+
+
+def test_serve_unix_socket_path(model_server, tmp_path):
+    socket_path = tmp_path / "topmodelpy.sock"
+    socket_path.write_text("user data")
+
+    # A file that is not a socket is not replaced
+    with pytest.raises(ServerErrorInvalidSocketPath, match="not a socket"):
+        server.create_server(model_server, socket_path=str(socket_path))
+    assert socket_path.read_text() == "user data"
+
+    # A stale socket is replaced
+    socket_path.unlink()
+    stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    stale.bind(str(socket_path))
+    stale.close()
+    http_server = serve(model_server, socket_path=str(socket_path))
+    try:
+        # A socket in use is not replaced
+        with pytest.raises(ServerErrorInvalidSocketPath, match="in use"):
+            server.create_server(model_server, socket_path=str(socket_path))
+    finally:
+        http_server.shutdown()
+        http_server.server_close()
+
+    # Only the socket that the server created is removed on shutdown
+    socket_path.unlink()
+    socket_path.write_text("user data")
+    server.remove_socket(http_server)
+    assert socket_path.read_text() == "user data"
+    socket_path.unlink()
+    http_server = server.create_server(model_server,
+                                       socket_path=str(socket_path))
+    http_server.server_close()
+    server.remove_socket(http_server)
+    assert not socket_path.exists()
+
+
+def test_model_server_queue_full(model_server):
+    # Take the slots of the worker and of the queue
+    model_server.slots.acquire()
+    model_server.slots.acquire()
+    try:
+        status, result = model_server.run("modelconfig.ini")
+    finally:
+        model_server.slots.release()
+        model_server.slots.release()
+
+    assert status == 503
+    assert model_server.get_stats()["rejected"] == 1
+
+
+def test_model_server_broken_pool(model_server, modelconfig_file):
+    # Kill the worker process, which breaks the pool
+    with pytest.raises(BrokenProcessPool):
+        model_server.executor.submit(os._exit, 1).result()
+
+    status, result = model_server.run(str(modelconfig_file))
+    assert status == 500
+
+    # The pool is replaced, so later requests run
+    status, result = model_server.run(str(modelconfig_file))
+    assert status == 200, result
+
+
+def test_model_server_error_status(model_server, monkeypatch):
+    def run_request(configfile, parameters=None):
+        if configfile == "invalid.ini":
+            raise ValueError("Invalid model config file")
+        raise RuntimeError("Server error")
+
+    # Run requests on a thread, which sees the patched run_request
+    monkeypatch.setattr(server, "run_request", run_request)
+    monkeypatch.setattr(model_server, "executor", ThreadPoolExecutor(1))
+    try:
+        assert model_server.run("invalid.ini")[0] == 400
+        assert model_server.run("modelconfig.ini") == (
+            500, {"error": "Server error"})
+    finally:
+        model_server.executor.shutdown()
+
+
+def test_get_percentile():
+    assert server.get_percentile([], 50) is None
+    assert server.get_percentile([1, 2, 3, 4, 5], 50) == 3
+    assert server.get_percentile([1, 2, 3, 4, 5], 95) == 5
@@ -0,0 +1,76 @@
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from topmodelpy import main, modelconfigfile, stream
+from topmodelpy.exceptions import TimeseriesStreamErrorInvalidRow
+
+
+@pytest.mark.parametrize("snowmelt", ["no", "yes"])
+def test_run_stream(modelconfig_file, snowmelt):
+    config_data = modelconfigfile.read(modelconfig_file)
+    config_data["Options"]["option_snowmelt"] = snowmelt
+    parameters, timeseries, twi = main.read_input_files(config_data)
+    # Without the pet column, so pet is calculated for each row
+    timeseries = timeseries[["temperature", "precipitation"]]
+    preprocessed_data = main.preprocess(config_data, parameters, timeseries,
+                                        twi)
+    topmodel_data = main.run_topmodel(parameters, twi, preprocessed_data)
+
+    infile = io.StringIO(timeseries.to_csv())
+    outfile = io.StringIO()
+    model_stream = stream.create_stream(config_data)
+    num_timesteps = stream.run_stream(model_stream, infile, outfile)
+
+    assert num_timesteps == len(timeseries)
+    outputs = pd.read_csv(io.StringIO(outfile.getvalue()),
+                          index_col="date",
+                          parse_dates=True)
+    assert outputs.index.equals(timeseries.index)
+    np.testing.assert_allclose(model_stream.topmodel.flow_predicted[0],
+                               topmodel_data["flow_predicted"][-1],
+                               rtol=1e-12)
+    # Outputs are written with 2 decimals, like the output *.csv file
+    np.testing.assert_allclose(outputs["flow_predicted"],
+                               topmodel_data["flow_predicted"],
+                               atol=0.005)
+    if snowmelt == "yes":
+        np.testing.assert_allclose(model_stream.snowpack,
+                                   preprocessed_data["snowpack"][-1])
+
+
+def test_iter_rows():
+    lines = ["1980-01-22,-1.9,2.5,0.39\n",
+             "\n",
+             "1980-01-23 06:00,-0.3,0\n"]
+    rows = [row for _, _, row in stream.iter_rows(lines)]
+
+    assert rows == [
+        {"date": pd.Timestamp("1980-01-22"), "temperature": -1.9,
+         "precipitation": 2.5, "pet": 0.39},
+        {"date": pd.Timestamp("1980-01-23 06:00"), "temperature": -0.3,
+         "precipitation": 0.0, "pet": None},
+    ]
+
+
+def test_run_stream_invalid_rows(modelconfig_file):
+    config_data = modelconfigfile.read(modelconfig_file)
+    model_stream = stream.create_stream(config_data)
+    infile = io.StringIO("date,temperature,precipitation\n"
+                         "1980-01-22,-1.9,2.5\n"
+                         "1980-01-24,-0.3,0\n")
+    outfile = io.StringIO()
+
+    with pytest.raises(TimeseriesStreamErrorInvalidRow,
+                       match="line 3:\n.*\nDiscontinuity"):
+        stream.run_stream(model_stream, infile, outfile)
+    # Rows before the invalid row are already written
+    assert outfile.getvalue().count("\n") == 2
+
+    with pytest.raises(TimeseriesStreamErrorInvalidRow, match="line 1:"):
+        list(stream.iter_rows(["date,temperature\n"]))
+    with pytest.raises(TimeseriesStreamErrorInvalidRow, match="line 2:"):
+        list(stream.iter_rows(["1980-01-22,-1.9,2.5\n",
+                               "1980-01-23,cold,2.5\n"]))
@@ -0,0 +1,92 @@
+"""Tests for terrain module."""
+
+import numpy as np
+import pytest
+
+from topmodelpy import demfile, terrain
+
+
+@pytest.fixture
+def plane_dem(tmp_path):
+    """Return a DEM of a plane sloping down along the rows, so each cell
+    drains to the cell below it."""
+    rows, columns = 7, 5
+    dem = np.repeat(np.arange(rows, 0, -1, dtype=float)[:, None],
+                    columns,
+                    axis=1)
+    filepath = tmp_path / "dem.npy"
+    np.save(str(filepath), dem)
+
+    return demfile.read(filepath, cellsize=10)
+
+
+def test_flow_direction_plane(plane_dem):
+    directions = np.zeros(plane_dem.shape, dtype=np.uint8)
+    slopes = np.zeros(plane_dem.shape)
+    terrain.flow_direction(plane_dem, directions, slopes, tile_rows=2)
+
+    down = terrain.D8_OFFSETS.index((1, 0))
+    assert (directions[:-1] == down).all()
+    assert (directions[-1] == terrain.NO_FLOW).all()
+    np.testing.assert_allclose(slopes[:-1], 0.1)
+
+
+def test_compute_twi_plane(plane_dem, tmp_path):
+    twi = np.zeros(plane_dem.shape)
+    terrain.compute_twi(plane_dem, twi, tmp_path, tile_rows=2)
+
+    accumulation = np.load(str(tmp_path / "accumulation.npy"))
+    expected = np.repeat(np.arange(1, 8, dtype=float)[:, None], 5, axis=1)
+    np.testing.assert_array_equal(accumulation, expected)
+    np.testing.assert_allclose(twi[:-1], np.log(expected[:-1] * 10 / 0.1))
+
+
+def test_compute_twi_tiles(tmp_path):
+    """Test that the twi does not depend on the number of rows of each
+    tile, for a random DEM with nodata cells."""
+    rng = np.random.default_rng(0)
+    dem = -rng.random((40, 30)).cumsum(axis=0).cumsum(axis=1)
+    dem[10:13, 5:8] = np.nan
+    np.save(str(tmp_path / "dem.npy"), dem)
+
+    results = []
+    for tile_rows in [3, 100]:
+        work_dir = tmp_path / str(tile_rows)
+        work_dir.mkdir()
+        twi = np.zeros(dem.shape)
+        terrain.compute_twi(demfile.read(tmp_path / "dem.npy", cellsize=1),
+                            twi,
+                            work_dir,
+                            tile_rows=tile_rows)
+        results.append(twi)
+
+    np.testing.assert_array_equal(results[0], results[1])
+    assert np.isnan(results[0][10:13, 5:8]).all()
+
+
+
+def test_flow_accumulation_chunks(plane_dem, tmp_path):
+    """Test that the flow accumulation does not depend on the number of
+    cells of each chunk of the frontier files."""
+    directions = np.zeros(plane_dem.shape, dtype=np.uint8)
+    slopes = np.zeros(plane_dem.shape)
+    terrain.flow_direction(plane_dem, directions, slopes)
+    work_dir = tmp_path / "work"
+    work_dir.mkdir()
+
+    results = []
+    for chunksize in [2, 1000]:
+        indegree = np.zeros(plane_dem.shape, dtype=np.uint8)
+        terrain.flow_indegree(directions, indegree)
+        accumulation = np.zeros(plane_dem.shape)
+        terrain.flow_accumulation(directions,
+                                  indegree,
+                                  accumulation,
+                                  chunksize=chunksize,
+                                  work_dir=work_dir)
+        results.append(accumulation)
+
+    np.testing.assert_array_equal(results[0], results[1])
+    assert results[0][-1, 0] == 7
+    # The frontier files are removed
+    assert not list(work_dir.iterdir())
@@ -9,7 +9,8 @@ import pytest
 from topmodelpy.exceptions import (TimeseriesFileErrorInvalidHeader,
                                    TimeseriesFileErrorMissingValues,
                                    TimeseriesFileErrorMissingDates,
-                                   TimeseriesFileErrorInvalidTimestep)
+                                   TimeseriesFileErrorInvalidTimestep,
+                                   TimeseriesFileErrorDiscontinuity)
 from topmodelpy import timeseriesfile
 
 
@@ -77,3 +78,53 @@ def test_timeseries_file_invalid_timestep(timeseries_file_invalid_timestep):
 
     print(err.value)
     assert "Invalid timestep" in str(err.value)
+
+
+def test_timeseries_file_read_in_date_format(timeseries_file):
+    expected = timeseriesfile.read_in(StringIO(timeseries_file))
+    actual = timeseriesfile.read_in(StringIO(timeseries_file),
+                                    date_format="%Y-%m-%d")
+
+    pd.testing.assert_frame_equal(actual, expected)
+    assert actual.index[0] == datetime(2019, 1, 1)
+
+
+def test_timeseries_file_read_in_engines(timeseries_file):
+    expected = timeseriesfile.read_in(StringIO(timeseries_file), engine="c")
+    actual = timeseriesfile.read_in(StringIO(timeseries_file),
+                                    engine=timeseriesfile.get_engine())
+
+    pd.testing.assert_frame_equal(actual, expected)
+    assert list(actual.columns) == ["temperature",
+                                    "precipitation",
+                                    "pet",
+                                    "flow_observed"]
+
+
+def test_timeseries_file_iter_read(tmp_path, timeseries_file):
+    lines = timeseries_file.splitlines()
+    header = lines[0]
+    # Name files so that sorting by filename is not date order
+    (tmp_path / "b.csv").write_text("\n".join([header] + lines[1:3]) + "\n")
+    (tmp_path / "a.csv").write_text("\n".join([header] + lines[3:6]) + "\n")
+    filepaths = [tmp_path / "a.csv", tmp_path / "b.csv"]
+
+    chunks = list(timeseriesfile.iter_read(filepaths))
+    actual = timeseriesfile.read_many(filepaths)
+
+    assert [len(chunk) for chunk in chunks] == [2, 3]
+    pd.testing.assert_frame_equal(
+        actual, timeseriesfile.read_in(StringIO(timeseries_file)))
+
+
+def test_timeseries_file_iter_read_discontinuity(tmp_path, timeseries_file):
+    lines = timeseries_file.splitlines()
+    header = lines[0]
+    (tmp_path / "a.csv").write_text("\n".join([header] + lines[1:3]) + "\n")
+    (tmp_path / "b.csv").write_text("\n".join([header] + lines[4:6]) + "\n")
+    filepaths = [tmp_path / "a.csv", tmp_path / "b.csv"]
+
+    with pytest.raises(TimeseriesFileErrorDiscontinuity) as err:
+        list(timeseriesfile.iter_read(filepaths))
+
+    assert "Discontinuity" in str(err.value)
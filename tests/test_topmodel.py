@@ -114,3 +114,45 @@ def test_topmodel_run(parameters_wolock,
     np.testing.assert_allclose(topmodel.flow_predicted,
                                timeseries_wolock["flow_predicted"].values,
                                rtol=0.05)
+
+
+def test_topmodel_run_preallocated_matrices(tmp_path,
+                                            timeseries_wolock,
+                                            twi_wolock,
+                                            topmodel_kwargs_wolock):
+    """Test Topmodel run writing into preallocated memory-mapped matrices."""
+    shape = (len(timeseries_wolock), len(twi_wolock))
+    matrices = {
+        name: np.lib.format.open_memmap(str(tmp_path / "{}.npy".format(name)),
+                                        mode="w+",
+                                        shape=shape)
+        for name in ["saturation_deficit_locals",
+                     "unsaturated_zone_storages",
+                     "root_zone_storages"]
+    }
+
+    expected = Topmodel(**topmodel_kwargs_wolock)
+    expected.run()
+
+    actual = Topmodel(**topmodel_kwargs_wolock, **matrices)
+    actual.run()
+
+    for name, matrix in matrices.items():
+        assert getattr(actual, name) is matrix
+        np.testing.assert_allclose(matrix, getattr(expected, name))
+
+
+def test_topmodel_run_chunks(timeseries_wolock, topmodel_kwargs_wolock):
+    """Test Topmodel run in chunks is the same as a single run."""
+    expected = Topmodel(**topmodel_kwargs_wolock)
+    expected.run()
+
+    actual = Topmodel(**topmodel_kwargs_wolock)
+    chunks = list(actual.run_chunks(chunksize=100))
+
+    assert chunks[0] == (0, 100)
+    assert chunks[-1][1] == len(timeseries_wolock)
+    np.testing.assert_array_equal(actual.flow_predicted,
+                                  expected.flow_predicted)
+    np.testing.assert_array_equal(actual.root_zone_storages,
+                                  expected.root_zone_storages)
@@ -0,0 +1,113 @@
+"""Test TopmodelBatch class."""
+
+import numpy as np
+
+from topmodelpy.topmodel import Topmodel
+from topmodelpy.topmodelbatch import TopmodelBatch
+
+
+def test_topmodelbatch_run(parameters_wolock,
+                           timeseries_wolock,
+                           twi_wolock,
+                           twi_weighted_mean_wolock):
+    """Test that each member of a TopmodelBatch run matches a Topmodel run
+    with the parameters of the member."""
+
+    scaling_parameters = np.array([10, 5, 40])
+    macropore_fractions = np.array([0.2, 0.6, 0.05])
+    field_capacity_fractions = np.array([0.2, 0.1, 0.4])
+
+    parameters = {
+        "saturated_hydraulic_conductivity": (
+            parameters_wolock["saturated_hydraulic_conductivity"]
+        ),
+        "soil_depth_total": parameters_wolock["soil_depth_total"],
+        "soil_depth_ab_horizon": parameters_wolock["soil_depth_ab_horizon"],
+        "latitude": parameters_wolock["latitude"],
+        "basin_area_total": parameters_wolock["basin_area_total"],
+        "impervious_area_fraction": (
+            parameters_wolock["impervious_area_fraction"]
+        ),
+        "twi_values": twi_wolock["twi"].values,
+        "twi_saturated_areas": twi_wolock["proportion"].values,
+        "twi_mean": twi_weighted_mean_wolock,
+        "precip_available": timeseries_wolock["precip_minus_pet"].values,
+    }
+
+    topmodelbatch = TopmodelBatch(
+        scaling_parameter=scaling_parameters,
+        macropore_fraction=macropore_fractions,
+        field_capacity_fraction=field_capacity_fractions,
+        **parameters
+    )
+    topmodelbatch.run()
+
+    assert topmodelbatch.flow_predicted.shape == (len(timeseries_wolock), 3)
+
+    for member in range(3):
+        topmodel = Topmodel(
+            scaling_parameter=scaling_parameters[member],
+            macropore_fraction=macropore_fractions[member],
+            field_capacity_fraction=field_capacity_fractions[member],
+            **parameters
+        )
+        topmodel.run()
+
+        np.testing.assert_allclose(topmodelbatch.flow_predicted[:, member],
+                                   topmodel.flow_predicted,
+                                   rtol=1e-12)
+        np.testing.assert_allclose(
+            topmodelbatch.saturation_deficit_avgs[:, member],
+            topmodel.saturation_deficit_avgs,
+            rtol=1e-12)
+
+
+def test_topmodelbatch_initial_state(parameters_wolock,
+                                     timeseries_wolock,
+                                     twi_wolock,
+                                     twi_weighted_mean_wolock):
+    """Test that members started from the state at the end of a Topmodel run
+    continue the run, with a member for each column of precip_available."""
+
+    parameters = {
+        name: parameters_wolock[name] for name in [
+            "scaling_parameter",
+            "saturated_hydraulic_conductivity",
+            "macropore_fraction",
+            "soil_depth_total",
+            "soil_depth_ab_horizon",
+            "field_capacity_fraction",
+            "latitude",
+            "basin_area_total",
+            "impervious_area_fraction",
+        ]
+    }
+    parameters["twi_values"] = twi_wolock["twi"].values
+    parameters["twi_saturated_areas"] = twi_wolock["proportion"].values
+    parameters["twi_mean"] = twi_weighted_mean_wolock
+    precip_available = timeseries_wolock["precip_minus_pet"].values
+
+    topmodel = Topmodel(precip_available=precip_available, **parameters)
+    topmodel.run()
+    history = Topmodel(precip_available=precip_available[:300], **parameters)
+    history.run()
+    state = history.get_state()
+
+    topmodelbatch = TopmodelBatch(
+        precip_available=np.column_stack([precip_available[300:],
+                                          precip_available[300:] * 2]),
+        initial_state=state,
+        **parameters
+    )
+    topmodelbatch.run()
+
+    assert topmodelbatch.num_members == 2
+    np.testing.assert_allclose(topmodelbatch.flow_predicted[:, 0],
+                               topmodel.flow_predicted[300:],
+                               rtol=1e-12)
+    assert not np.allclose(topmodelbatch.flow_predicted[:, 1],
+                           topmodel.flow_predicted[300:])
+    # The state is a copy
+    np.testing.assert_array_equal(state["root_zone_storage"],
+                                  history.root_zone_storage)
+    assert state["root_zone_storage"] is not history.root_zone_storage
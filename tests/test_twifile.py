@@ -58,3 +58,25 @@ def test_twi_file_invalid_proportion(twi_file_invalid_proportion):
         twifile.read_in(filestream)
 
     assert "Invalid sum of proportion" in str(err.value)
+
+
+def test_twi_file_write(tmp_path, twi_file):
+    expected = twifile.read_in(StringIO(twi_file))
+    filepath = tmp_path / "twi.csv"
+    twifile.write(filepath, expected)
+
+    actual = twifile.read(filepath)
+
+    pd.testing.assert_frame_equal(actual, expected)
+
+
+def test_twi_file_read_raster(tmp_path):
+    filepath = tmp_path / "twi.npy"
+    np.save(str(filepath), np.array([[1.0, 2.0, np.nan],
+                                     [3.0, 4.0, 4.0]]))
+
+    actual = twifile.read_raster(filepath, num_bins=3)
+
+    assert twifile.is_raster(filepath)
+    assert list(actual.columns) == ["bin", "twi", "proportion", "cells"]
+    np.testing.assert_allclose(actual["proportion"], [0.6, 0.2, 0.2])
@@ -0,0 +1,76 @@
+"""Tests for twihistogram module."""
+
+import numpy as np
+import pytest
+
+from topmodelpy import twihistogram
+
+
+def test_bin_twi_fixed():
+    twi = np.array([[1.0, 2.0, np.nan],
+                    [3.0, 4.0, 4.0]])
+    actual, twi_weighted_mean = twihistogram.bin_twi(twi,
+                                                     num_bins=3,
+                                                     tile_rows=1)
+
+    assert list(actual["bin"]) == [1, 2, 3]
+    np.testing.assert_allclose(actual["twi"], [11 / 3, 2.0, 1.0])
+    np.testing.assert_allclose(actual["cells"], [3, 1, 1])
+    np.testing.assert_allclose(actual["proportion"], [0.6, 0.2, 0.2])
+    np.testing.assert_allclose(twi_weighted_mean, 2.8)
+
+
+def test_bin_twi_quantile():
+    rng = np.random.default_rng(0)
+    twi = rng.lognormal(2, 0.5, size=(200, 100))
+    twi[0, :10] = np.nan
+
+    actual, twi_weighted_mean = twihistogram.bin_twi(twi,
+                                                     num_bins=10,
+                                                     method="quantile",
+                                                     tile_rows=7)
+
+    assert len(actual) == 10
+    np.testing.assert_allclose(actual["proportion"], 0.1, rtol=0.1)
+    np.testing.assert_allclose(twi_weighted_mean, np.nanmean(twi))
+    np.testing.assert_allclose(
+        (actual["twi"] * actual["proportion"]).sum(), np.nanmean(twi))
+
+
+def test_quantile_edges_sample():
+    twi = np.arange(10000, dtype=float).reshape(100, 100)
+
+    edges = twihistogram.quantile_edges(twi,
+                                        num_bins=4,
+                                        tile_rows=10,
+                                        sample_size=1000)
+
+    assert edges[0] == 0 and edges[-1] == 9999
+    np.testing.assert_allclose(edges[1:-1], [2500, 5000, 7500], rtol=0.05)
+
+
+def test_bin_twi_bin_raster():
+    twi = np.array([[1.0, 2.0, np.nan],
+                    [3.0, 4.0, 4.0]])
+    bin_raster = np.zeros(twi.shape, dtype=np.uint16)
+    actual, _ = twihistogram.bin_twi(twi,
+                                     num_bins=4,
+                                     tile_rows=1,
+                                     bin_raster=bin_raster)
+
+    # Bins are ordered from the highest twi, so the highest twi is bin 1
+    np.testing.assert_array_equal(bin_raster, [[4, 3, 0],
+                                               [2, 1, 1]])
+    np.testing.assert_allclose(actual["twi"], [4.0, 3.0, 2.0, 1.0])
+
+
+def test_bin_twi_invalid():
+    nodata = np.full((3, 2), np.nan)
+    for method in twihistogram.BIN_METHODS:
+        with pytest.raises(ValueError, match="no valid cells"):
+            twihistogram.bin_twi(nodata, method=method)
+
+    twi = np.array([[1.0, 2.0]])
+    for num_bins in [0, twihistogram.MAX_BINS + 1]:
+        with pytest.raises(ValueError, match="number of twi bins"):
+            twihistogram.bin_twi(twi, num_bins=num_bins)
@@ -0,0 +1,23 @@
+import numpy as np
+
+from topmodelpy import utils
+
+
+def test_lttb():
+    x = np.arange(10000.0)
+    y = np.sin(x / 300)
+    y[5000] = 10
+    y[7000] = np.nan
+
+    index = utils.lttb(x, y, 500)
+
+    assert len(index) == 500
+    assert index[0] == 0 and index[-1] == 9999
+    assert np.all(np.diff(index) > 0)
+    # Peaks are kept and nan values are not
+    assert 5000 in index
+    assert 7000 not in index
+    assert y[index].max() == 10
+
+    # Short series are kept whole
+    np.testing.assert_array_equal(utils.lttb(x[:5], y[:5], 10), np.arange(5))
@@ -0,0 +1,78 @@
+import os
+import threading
+
+import pytest
+
+from topmodelpy import watch
+
+
+def edit_later(filepath, text, delay=0.3):
+    """Save a file like an editor, by writing a new file and renaming it
+    over the old file."""
+    def edit():
+        tmp_filepath = filepath.with_name(filepath.name + ".tmp")
+        tmp_filepath.write_text(text)
+        os.replace(tmp_filepath, filepath)
+
+    timer = threading.Timer(delay, edit)
+    timer.start()
+
+    return timer
+
+
+def test_get_watched_filepaths(modelconfig_file):
+    filepaths = watch.get_watched_filepaths(modelconfig_file)
+
+    assert [filepath.name for filepath in filepaths] == [
+        "parameters_wolock.csv",
+        "timeseries_wolock.csv",
+        "twi_wolock.csv",
+        "modelconfig.ini",
+    ]
+    assert all(filepath.is_absolute() for filepath in filepaths)
+
+
+def test_get_watched_filepaths_invalid_config(tmp_path):
+    filepath = tmp_path / "modelconfig.ini"
+    filepath.write_text("not a config file")
+
+    assert watch.get_watched_filepaths(filepath) == [filepath.resolve()]
+
+
+def test_polling_watcher(tmp_path):
+    filepath = tmp_path / "parameters.csv"
+    filepath.write_text("name,value\nscaling_parameter,10\n")
+    watcher = watch.PollingWatcher([filepath], interval=0.05)
+
+    assert watcher.wait(timeout=0.1) == set()
+    edit_later(filepath, "name,value\nscaling_parameter,12\n").join()
+    assert watcher.wait(timeout=1) == {filepath}
+    assert watcher.wait(timeout=0.1) == set()
+
+
+def test_inotify_watcher(tmp_path):
+    libc = watch.load_inotify()
+    if libc is None:
+        pytest.skip("inotify is not available")
+    filepath = tmp_path / "parameters.csv"
+    other_filepath = tmp_path / "other.csv"
+    filepath.write_text("name,value\nscaling_parameter,10\n")
+    watcher = watch.InotifyWatcher([filepath], libc)
+    try:
+        other_filepath.write_text("not watched")
+        assert watcher.wait(timeout=0.1) == set()
+
+        timer = edit_later(filepath, "name,value\nscaling_parameter,12\n")
+        assert watcher.wait(timeout=5) == {filepath}
+        timer.join()
+    finally:
+        watcher.close()
+
+
+def test_iter_changes(modelconfig_file):
+    changes = watch.iter_changes(modelconfig_file, interval=0.05,
+                                 timeout=0.5)
+    edit_later(modelconfig_file, modelconfig_file.read_text())
+
+    assert next(changes) == {modelconfig_file.resolve()}
+    assert list(changes) == []
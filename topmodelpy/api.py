@@ -0,0 +1,303 @@
+"""Module that contains functions to run Topmodel on input data that is
+already in memory, such as in a Python service, without reading or writing
+any files.
+
+Example:
+
+    from topmodelpy import api
+
+    results = api.run(parameters={"scaling_parameter": 10, ...},
+                      timeseries=timeseries_df,
+                      twi=twi_df)
+    results.flows.plot()
+    results.metrics["nash_sutcliffe"]
+
+A forecast runs the historical timeseries once, and then all scenario
+timeseries, such as weather traces, from the state at the end of it:
+
+    forecast = api.forecast(parameters, timeseries_df, twi_df,
+                            scenarios={"1981": trace_1981_df, ...})
+    forecast.bands[["p5", "p50", "p95"]].plot()
+
+The input data is checked like the input files, with the same exceptions,
+see parametersfile, timeseriesfile, and twifile, and is not modified.
+"""
+
+from configparser import ConfigParser
+
+import pandas as pd
+
+from topmodelpy import main, parametersfile, timeseriesfile, twifile
+
+
+# Parameters used by a model run, and by the snowmelt routine
+PARAMETER_NAMES = [
+    "scaling_parameter",
+    "saturated_hydraulic_conductivity",
+    "macropore_fraction",
+    "soil_depth_total",
+    "soil_depth_ab_horizon",
+    "field_capacity_fraction",
+    "latitude",
+    "basin_area_total",
+    "impervious_area_fraction",
+    "flow_initial",
+]
+
+SNOWMELT_PARAMETER_NAMES = [
+    "snowmelt_temperature_cutoff",
+    "snowmelt_rate_coeff_with_rain",
+    "snowmelt_rate_coeff",
+]
+
+# Column names of the timeseries file, and the column names of the data
+TIMESERIES_COLUMNS = {
+    "temperature (celsius)": "temperature",
+    "precipitation (mm/day)": "precipitation",
+    "pet (mm/day)": "pet",
+    "flow_observed (mm/day)": "flow_observed",
+}
+
+TWI_COLUMNS = ["bin", "twi", "proportion", "cells"]
+
+STATE_NAMES = [
+    "saturation_deficit_locals",
+    "unsaturated_zone_storages",
+    "root_zone_storages",
+]
+
+
+class Results:
+    """The results of a model run.
+
+    :param output: Dataframe of the timeseries and the output data, the
+                   same columns as the output file.
+    :type output: pandas.DataFrame
+    :param states: Dict of a dataframe of each output matrix, of size
+                   len(timeseries) x len(twi) with a column per twi bin.
+    :type states: dict
+    :param metrics: Dict of the comparison statistics of the observed and
+                    predicted flow, empty without observed flow.
+    :type metrics: dict
+
+    Attributes:
+        output: the output dataframe.
+        flows: series of the predicted flow.
+        states: dict of the output matrices dataframes.
+        metrics: dict of the nash_sutcliffe and mean_squared_error.
+    """
+    def __init__(self, output, states, metrics):
+        self.output = output
+        self.flows = output["flow_predicted"]
+        self.states = states
+        self.metrics = metrics
+
+    def __repr__(self):
+        return "Results(timesteps={}, bins={}, metrics={})".format(
+            len(self.output),
+            self.states["saturation_deficit_locals"].shape[1],
+            self.metrics)
+
+
+class Forecast:
+    """The results of a forecast.
+
+    :param history: Series of the flow predicted of the historical
+                    timeseries.
+    :type history: pandas.Series
+    :param state: Dict of the model state and snowpack at the end of the
+                  historical timeseries, see Topmodel.get_state().
+    :type state: dict
+    :param flows: Dataframe of the flow predicted with a column per
+                  scenario.
+    :type flows: pandas.DataFrame
+    :param bands: Dataframe of the percentile bands and the mean of the flow
+                  predicted of the scenarios.
+    :type bands: pandas.DataFrame
+    """
+    def __init__(self, history, state, flows, bands):
+        self.history = history
+        self.state = state
+        self.flows = flows
+        self.bands = bands
+
+    def __repr__(self):
+        return "Forecast(scenarios={}, timesteps={}, bands={})".format(
+            self.flows.shape[1],
+            len(self.flows),
+            list(self.bands.columns))
+
+
+def get_parameters(parameters, snowmelt=False):
+    """Return a parameters dict like the dict from the parameters file.
+
+    :param parameters: Dict of the parameter values, or of dicts with a
+                       value key like the dict from the parameters file.
+    :type parameters: dict
+    :param snowmelt: Include the snowmelt parameters.
+    :type snowmelt: bool
+    :return data: A dict like the dict from the parameters file.
+    :rtype: dict
+    """
+    names = PARAMETER_NAMES + (SNOWMELT_PARAMETER_NAMES if snowmelt else [])
+    missing = [name for name in names if name not in parameters]
+    if missing:
+        raise ValueError(
+            "Missing parameters: {}\n"
+            "Required parameters: {}".format(missing, names)
+        )
+
+    data = {}
+    for name, parameter in parameters.items():
+        if isinstance(parameter, dict):
+            data[name] = dict(parameter, value=float(parameter["value"]))
+        else:
+            data[name] = {"value": float(parameter)}
+    parametersfile.check_data(data)
+
+    return data
+
+
+def get_timeseries(timeseries):
+    """Return a timeseries dataframe like the dataframe from the timeseries
+    file, with short column names.
+
+    :param timeseries: Dataframe with a DatetimeIndex and temperature,
+                       precipitation, and optional pet and flow_observed
+                       columns, with short names or the timeseries file
+                       names, such as temperature (celsius).
+    :type timeseries: pandas.DataFrame
+    :return data: A dataframe of all the timeseries data.
+    :rtype: pandas.DataFrame
+    """
+    if not isinstance(timeseries.index, pd.DatetimeIndex):
+        raise ValueError("Invalid timeseries: the index must be a "
+                         "DatetimeIndex of the dates")
+
+    data = timeseries.rename(columns=lambda name: name.strip())
+    data = data.rename(columns={name: short_name for short_name, name
+                                in TIMESERIES_COLUMNS.items()})
+    data = data.astype(float)
+    timeseriesfile.check_header(data.columns.values.tolist(),
+                                list(TIMESERIES_COLUMNS))
+    timeseriesfile.check_missing_dates(data)
+    timeseriesfile.check_missing_values(data)
+    timeseriesfile.check_timestep(data)
+
+    return data.rename(columns=TIMESERIES_COLUMNS)
+
+
+def get_twi(twi):
+    """Return a twi dataframe like the dataframe from the twi file.
+
+    :param twi: Dataframe with bin, twi, proportion, and cells columns.
+    :type twi: pandas.DataFrame
+    :return data: A dataframe of all the twi data.
+    :rtype: pandas.DataFrame
+    """
+    data = twi.rename(columns=lambda name: name.strip()).astype(float)
+    twifile.check_header(data.columns.values.tolist(), TWI_COLUMNS)
+    twifile.check_missing_values(data)
+    twifile.check_proportion(data)
+
+    return data
+
+
+def run(parameters, timeseries, twi, snowmelt=False):
+    """Preprocess data and run Topmodel on input data in memory, and return
+    the results without writing any files.
+
+    Pet is calculated with the hamon method if the timeseries has no pet
+    column, see main.preprocess().
+
+    :param parameters: Dict of the parameter values, see get_parameters().
+    :type parameters: dict
+    :param timeseries: Dataframe of the timeseries data, see
+                       get_timeseries().
+    :type timeseries: pandas.DataFrame
+    :param twi: Dataframe of the twi data, see get_twi().
+    :type twi: pandas.DataFrame
+    :param snowmelt: Adjust the precipitation with the snowmelt routine.
+    :type snowmelt: bool
+    :return results: The results of the model run.
+    :rtype: Results
+    """
+    parameters = get_parameters(parameters, snowmelt=snowmelt)
+    timeseries = get_timeseries(timeseries)
+    twi = get_twi(twi)
+
+    config_data = ConfigParser()
+    config_data["Options"] = {
+        "option_pet": "hamon",
+        "option_snowmelt": "yes" if snowmelt else "no",
+    }
+    preprocessed_data = main.preprocess(config_data, parameters, timeseries,
+                                        twi)
+    topmodel_data = main.run_topmodel(parameters, twi, preprocessed_data)
+
+    output = main.get_output_dataframe(timeseries,
+                                       preprocessed_data,
+                                       topmodel_data)
+    comparison_data = main.get_comparison_data(output)
+    metrics = {key: value for key, value in comparison_data.items()
+               if key != "absolute_error"}
+    columns = twi["bin"].astype(int).to_numpy()
+    states = {
+        name: pd.DataFrame(topmodel_data[name],
+                           index=timeseries.index,
+                           columns=columns)
+        for name in STATE_NAMES
+    }
+
+    return Results(output, states, metrics)
+
+
+def forecast(parameters, timeseries, twi, scenarios, snowmelt=False,
+             percentiles=(5, 25, 50, 75, 95)):
+    """Run Topmodel on the historical timeseries once, then run all the
+    scenario timeseries at once from the model state at the end of the
+    historical timeseries, see main.run_forecast().
+
+    :param parameters: Dict of the parameter values, see get_parameters().
+    :type parameters: dict
+    :param timeseries: Dataframe of the historical timeseries data, see
+                       get_timeseries().
+    :type timeseries: pandas.DataFrame
+    :param twi: Dataframe of the twi data, see get_twi().
+    :type twi: pandas.DataFrame
+    :param scenarios: Dict of a dataframe of each scenario timeseries, or a
+                      list of dataframes, each starting one timestep after
+                      the historical timeseries ends, with the same dates.
+    :type scenarios: dict
+    :param snowmelt: Adjust the precipitation with the snowmelt routine.
+    :type snowmelt: bool
+    :param percentiles: The percentiles of the bands, from 0 to 100.
+    :type percentiles: list
+    :return forecast: The results of the forecast.
+    :rtype: Forecast
+    """
+    parameters = get_parameters(parameters, snowmelt=snowmelt)
+    timeseries = get_timeseries(timeseries)
+    twi = get_twi(twi)
+    if not isinstance(scenarios, dict):
+        scenarios = dict(enumerate(scenarios))
+    scenarios = {name: get_timeseries(scenario)
+                 for name, scenario in scenarios.items()}
+
+    config_data = ConfigParser()
+    config_data["Options"] = {
+        "option_pet": "hamon",
+        "option_snowmelt": "yes" if snowmelt else "no",
+        "option_forecast_percentiles": ", ".join(
+            str(percentile) for percentile in percentiles),
+    }
+    forecast_data = main.run_forecast(config_data,
+                                      parameters,
+                                      timeseries,
+                                      twi,
+                                      scenarios)
+
+    return Forecast(history=forecast_data["history_flow_predicted"],
+                    state=forecast_data["state"],
+                    flows=forecast_data["flow_predicted"],
+                    bands=forecast_data["bands"])
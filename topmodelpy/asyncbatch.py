@@ -0,0 +1,296 @@
+"""Module that contains an asyncio batch runner, which runs many model
+configuration files as a pipeline of three stages:
+
+    - read: read the model configuration file and input files, on threads
+    - compute: preprocess data and run Topmodel, on a pool of processes
+    - write: postprocess, write output files and plots, on a pool of
+      processes
+
+Stages are connected by bounded queues, so while one model is computed, the
+inputs of the next models are read and the outputs of the previous models
+are written, and the number of models held in memory is capped by the queue
+sizes. Throughput approaches the throughput of the slowest stage, rather
+than the sum of the stages of each model run as in batch.run_many().
+
+The results of the compute stage are pickled to the parent process and
+then to a write process. Output matrices that are memory-mapped *.npy
+files, with option_output_matrices_format = npy, are passed by file path
+and reopened by the write process, see MatrixFile; other output matrices
+are passed, and held in the queues, as full copies.
+"""
+
+import asyncio
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import os
+import time
+
+import numpy as np
+
+from topmodelpy import batch, main, modelconfigfile
+
+
+class MatrixFile:
+    """File path of a memory-mapped *.npy matrix, which is pickled in place
+    of the matrix, since a numpy memmap pickles its whole contents.
+
+    :param filepath: File path of the matrix.
+    :type filepath: string
+    """
+    def __init__(self, filepath):
+        self.filepath = filepath
+
+    def open(self):
+        """Open the matrix without loading it into memory."""
+        return np.load(self.filepath, mmap_mode="r+")
+
+
+def pack_matrices(topmodel_data):
+    """Return the Topmodel data dict with each matrix that is a
+    memory-mapped file replaced by a MatrixFile.
+
+    Matrices in unnamed temporary files, see matrixfile.create_temporary(),
+    have no file path and are left as they are.
+    """
+    return {
+        name: (MatrixFile(value.filename)
+               if isinstance(value, np.memmap) and value.filename
+               else value)
+        for name, value in topmodel_data.items()
+    }
+
+
+def unpack_matrices(topmodel_data):
+    """Return the Topmodel data dict with each MatrixFile opened, see
+    pack_matrices()."""
+    return {
+        name: value.open() if isinstance(value, MatrixFile) else value
+        for name, value in topmodel_data.items()
+    }
+
+
+def read_job(configfile, plots=None):
+    """Read a model configuration file and its input files, reading input
+    files through the cache of this process.
+
+    :return: A dict of the config data, parameters, timeseries, twi, and
+             parameter sets.
+    :rtype: dict
+    """
+    config_data = modelconfigfile.read(configfile)
+    if config_data is None:
+        raise ValueError("Invalid model config file: {}".format(configfile))
+    # Plots are rendered in the write stage process
+    main.set_plot_options(config_data, plots=plots, plot_jobs=1)
+
+    cache = batch.get_input_cache()
+    inputs = main.read_input_files(config_data, cache=cache)
+    if any(data is None for data in inputs):
+        raise ValueError(
+            "Invalid input files of model config file: {}".format(configfile)
+        )
+    parameters, timeseries, twi = inputs
+
+    return {
+        "config_data": config_data,
+        "parameters": parameters,
+        "timeseries": timeseries,
+        "twi": twi,
+        "parameter_sets": main.read_parameter_sets(config_data,
+                                                   parameters,
+                                                   cache=cache),
+    }
+
+
+def compute_job(data):
+    """Preprocess data and run Topmodel, or TopmodelBatch for a parameters
+    table, see main.compute_model().
+
+    :param data: A dict from read_job().
+    :type data: dict
+    :return: Tuple of the preprocessed data dict and the Topmodel data dict,
+             with memory-mapped matrices as MatrixFiles, see
+             pack_matrices().
+    :rtype: tuple
+    """
+    if data["parameter_sets"] is not None:
+        preprocessed_data = main.preprocess_ensemble(data["config_data"],
+                                                     data["parameters"],
+                                                     data["parameter_sets"],
+                                                     data["timeseries"],
+                                                     data["twi"])
+        topmodel_data = main.run_topmodel_ensemble(data["parameter_sets"],
+                                                   data["twi"],
+                                                   preprocessed_data)
+        return preprocessed_data, topmodel_data
+
+    preprocessed_data, topmodel_data = main.compute_model(data["config_data"],
+                                                          data["parameters"],
+                                                          data["timeseries"],
+                                                          data["twi"])
+
+    return preprocessed_data, pack_matrices(topmodel_data)
+
+
+def write_job(data, preprocessed_data, topmodel_data):
+    """Write the output files and plots of a model run, see
+    main.postprocess().
+
+    :param data: A dict from read_job().
+    :type data: dict
+    """
+    if data["parameter_sets"] is not None:
+        main.write_output_ensemble(data["config_data"],
+                                   data["timeseries"],
+                                   data["parameter_sets"],
+                                   topmodel_data)
+        return
+
+    main.postprocess(data["config_data"],
+                     data["timeseries"],
+                     preprocessed_data,
+                     unpack_matrices(topmodel_data),
+                     data["parameters"],
+                     data["twi"])
+
+
+def start_workers(executor, jobs):
+    """Start the worker processes of a pool before the pipeline starts any
+    threads, since forking a process with running threads is unsafe."""
+    for future in [executor.submit(time.sleep, 0) for _ in range(jobs)]:
+        future.result()
+
+
+async def run_pipeline(configfiles, read_executor, compute_executor,
+                       write_executor, jobs, write_jobs, queue_size=2,
+                       plots=None, callback=None):
+    """Run model configuration files through the read, compute, and write
+    stages, see run_many().
+
+    :return: A dict of result dicts keyed by model configuration file.
+    :rtype: dict
+    """
+    loop = asyncio.get_running_loop()
+    computing = asyncio.Queue(maxsize=queue_size)
+    writing = asyncio.Queue(maxsize=queue_size)
+    results = {}
+
+    def finish(job, error=""):
+        results[job["configfile"]] = {
+            "configfile": job["configfile"],
+            "status": "failed" if error else "ok",
+            # Seconds of work, without waiting between stages
+            "seconds": sum(job["stages"].values()),
+            "stages": job["stages"],
+            "error": error,
+        }
+        if callback:
+            callback(results[job["configfile"]])
+
+    async def run_stage(job, name, executor, function, *args):
+        start = time.perf_counter()
+        try:
+            return await loop.run_in_executor(executor, function, *args)
+        finally:
+            job["stages"][name] = time.perf_counter() - start
+
+    async def read_stage():
+        for configfile in configfiles:
+            job = {"configfile": str(configfile), "stages": {}}
+            try:
+                job["data"] = await run_stage(job, "read", read_executor,
+                                              read_job, configfile, plots)
+            except Exception as err:
+                finish(job, str(err) or type(err).__name__)
+                continue
+            await computing.put(job)
+        for _ in range(jobs):
+            await computing.put(None)
+
+    async def compute_stage():
+        while True:
+            job = await computing.get()
+            if job is None:
+                return
+            try:
+                job["output"] = await run_stage(job, "compute",
+                                                compute_executor,
+                                                compute_job, job["data"])
+            except Exception as err:
+                finish(job, str(err) or type(err).__name__)
+                continue
+            await writing.put(job)
+
+    async def write_stage():
+        while True:
+            job = await writing.get()
+            if job is None:
+                return
+            try:
+                await run_stage(job, "write", write_executor, write_job,
+                                job["data"], *job["output"])
+            except Exception as err:
+                finish(job, str(err) or type(err).__name__)
+                continue
+            # Release the data of the model run
+            del job["data"], job["output"]
+            finish(job)
+
+    async def compute_then_stop_writers():
+        await asyncio.gather(*[compute_stage() for _ in range(jobs)])
+        for _ in range(write_jobs):
+            await writing.put(None)
+
+    await asyncio.gather(read_stage(),
+                         compute_then_stop_writers(),
+                         *[write_stage() for _ in range(write_jobs)])
+
+    return results
+
+
+def run_many(configfiles, jobs=None, write_jobs=1, read_jobs=1, queue_size=2,
+             callback=None, plots=None):
+    """Run many model configuration files as a pipeline of read, compute,
+    and write stages.
+
+    :param configfiles: A list of model configuration file paths.
+    :type configfiles: list
+    :param jobs: Number of processes that compute model runs, defaults to
+                 the number of cpus.
+    :type jobs: int
+    :param write_jobs: Number of processes that write output files.
+    :type write_jobs: int
+    :param read_jobs: Number of threads that read input files.
+    :type read_jobs: int
+    :param queue_size: Maximum number of model runs waiting between stages.
+    :type queue_size: int
+    :param callback: Optional function called with the result of each model
+                     run as it finishes.
+    :type callback: function
+    :param plots: Optionally override option_plots of all model
+                  configuration files.
+    :type plots: bool
+    :return: A list of result dicts in the order of configfiles, with the
+             configfile, status, seconds of all stages, seconds of each
+             stage, and error message, see batch.format_summary().
+    :rtype: list
+    """
+    jobs = jobs or os.cpu_count() or 1
+    jobs = min(jobs, len(configfiles)) or 1
+    write_jobs = min(write_jobs, len(configfiles)) or 1
+
+    with ProcessPoolExecutor(max_workers=jobs) as compute_executor, \
+            ProcessPoolExecutor(max_workers=write_jobs) as write_executor, \
+            ThreadPoolExecutor(max_workers=read_jobs) as read_executor:
+        start_workers(compute_executor, jobs)
+        start_workers(write_executor, write_jobs)
+        results = asyncio.run(run_pipeline(configfiles,
+                                           read_executor,
+                                           compute_executor,
+                                           write_executor,
+                                           jobs=jobs,
+                                           write_jobs=write_jobs,
+                                           queue_size=queue_size,
+                                           plots=plots,
+                                           callback=callback))
+
+    return [results[str(configfile)] for configfile in configfiles]
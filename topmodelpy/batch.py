@@ -0,0 +1,290 @@
+"""Module that contains functions to run many model configuration files in
+parallel.
+
+Model runs are spread across a pool of worker processes, so import costs are
+paid once per worker rather than once per model run. Input files are read
+through an InputCache in each worker, so identical input files shared by
+several model configuration files are only parsed once. Input files that are
+shared by more than one model configuration file are read before the workers
+start, so that on platforms where workers are forked they inherit the parsed
+data instead of reading it again.
+"""
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import glob
+import os
+from pathlib import Path
+import time
+
+from topmodelpy import main, modelconfigfile
+
+
+def resolve_filepaths(filepath):
+    """Return a tuple of the resolved file paths of an input, the same input
+    files however their paths are spelled.
+
+    :param filepath: File path, or a tuple of file paths, of the input.
+    :type filepath: string or tuple
+    :rtype: tuple
+    """
+    filepaths = filepath if isinstance(filepath, tuple) else (filepath,)
+
+    return tuple(Path(path).resolve() for path in filepaths)
+
+
+class InputCache:
+    """Cache of parsed input files keyed by reader, file path, file
+    modification time and file size.
+
+    A changed input file has a new key, so it is read again instead of being
+    served from the cache.
+    """
+    def __init__(self):
+        self.data = {}
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(reader, filepath, **kwargs):
+        """Return the cache key of an input file.
+
+        :param reader: Function that reads the input file.
+        :type reader: function
+        :param filepath: File path, or a tuple of file paths, of the input.
+        :type filepath: string or tuple
+        :return: The cache key, or None if a file does not exist.
+        :rtype: tuple
+        """
+        stats = []
+        for path in resolve_filepaths(filepath):
+            try:
+                stat = path.stat()
+            except OSError:
+                return None
+            stats.append((str(path), stat.st_mtime_ns, stat.st_size))
+
+        return (reader.__module__,
+                reader.__name__,
+                tuple(stats),
+                tuple(sorted((name, repr(value))
+                             for name, value in kwargs.items())))
+
+    def read(self, reader, filepath, **kwargs):
+        """Return the parsed input file from the cache, reading it with
+        reader if it is not in the cache.
+
+        :param reader: Function that reads the input file.
+        :type reader: function
+        :param filepath: File path, or a tuple of file paths, of the input.
+        :type filepath: string or tuple
+        :return: The parsed input file.
+        """
+        key = self.key(reader, filepath, **kwargs)
+        if key is None:
+            # Let the reader report the missing file
+            return reader(filepath, **kwargs)
+        if key in self.data:
+            self.hits += 1
+            return self.data[key]
+
+        self.misses += 1
+        data = reader(filepath, **kwargs)
+        # Readers print errors and return None, so do not cache failed reads
+        if data is not None:
+            self.data[key] = data
+
+        return data
+
+
+# Cache of each worker process
+_cache = InputCache()
+
+
+def get_input_cache():
+    """Return the InputCache of this process, such as to read input files
+    through it in a worker process of another pool.
+
+    :rtype: InputCache
+    """
+    return _cache
+
+
+def find_configfiles(paths):
+    """Find model configuration files from a list of directories, glob
+    patterns, or file paths.
+
+    Directories are searched recursively for *.ini files.
+
+    :param paths: A list of directories, glob patterns, or file paths.
+    :type paths: list
+    :return: A sorted list of unique model configuration file paths.
+    :rtype: list
+    """
+    configfiles = set()
+    for path in paths:
+        path = str(path)
+        if os.path.isdir(path):
+            configfiles.update(Path(path).rglob("*.ini"))
+        elif any(char in path for char in "*?["):
+            configfiles.update(Path(item)
+                               for item in glob.glob(path, recursive=True))
+        else:
+            configfiles.add(Path(path))
+
+    return sorted(configfiles)
+
+
+def preload_inputs(configfiles, cache=None):
+    """Read input files that are shared by more than one model configuration
+    file into the cache.
+
+    :param configfiles: A list of model configuration file paths.
+    :type configfiles: list
+    :param cache: Cache to read into, defaults to the cache of this process.
+    :type cache: InputCache
+    """
+    cache = _cache if cache is None else cache
+
+    config_datas = []
+    counts = {}
+    for configfile in configfiles:
+        try:
+            config_data = modelconfigfile.read(configfile)
+            inputs = config_data["Inputs"]
+            filepaths = (
+                inputs["parameters_file"],
+                inputs["twi_file"],
+                tuple(modelconfigfile.get_filepaths(inputs["timeseries_file"])),
+            )
+        except Exception:
+            # Errors are reported when the model configuration file is run
+            continue
+        # Count by resolved file paths, like the keys of the cache
+        for filepath in filepaths:
+            counts.setdefault(resolve_filepaths(filepath),
+                              []).append(len(config_datas))
+        config_datas.append(config_data)
+
+    # Read the input files of the first model configuration file that
+    # shares each input file, once per model configuration file
+    shared = sorted({indices[0] for indices in counts.values()
+                     if len(indices) > 1})
+    for index in shared:
+        try:
+            main.read_input_files(config_datas[index], cache=cache)
+        except Exception:
+            continue
+
+
+def run_job(configfile, plots=None, plot_jobs=None):
+    """Run a single model configuration file, reading input files through
+    the cache of this process.
+
+    :param configfile: File path of the model configuration file.
+    :type configfile: string
+    :param plots: Optionally override option_plots of the model
+                  configuration file.
+    :type plots: bool
+    :param plot_jobs: Optionally override option_plot_jobs of the model
+                      configuration file.
+    :type plot_jobs: int
+    :return: A dict of the configfile, status, seconds, and error message.
+    :rtype: dict
+    """
+    start = time.perf_counter()
+    try:
+        config_data = modelconfigfile.read(configfile)
+        main.set_plot_options(config_data, plots=plots, plot_jobs=plot_jobs)
+        parameters, timeseries, twi = main.read_input_files(config_data,
+                                                            cache=_cache)
+        parameter_sets = main.read_parameter_sets(config_data,
+                                                  parameters,
+                                                  cache=_cache)
+        main.run_model(config_data, parameters, timeseries, twi,
+                       parameter_sets)
+        status, error = "ok", ""
+    except Exception as err:
+        status, error = "failed", str(err) or type(err).__name__
+
+    return {
+        "configfile": str(configfile),
+        "status": status,
+        "seconds": time.perf_counter() - start,
+        "error": error,
+    }
+
+
+def run_many(configfiles, jobs=None, callback=None, plots=None):
+    """Run many model configuration files across a pool of processes.
+
+    :param configfiles: A list of model configuration file paths.
+    :type configfiles: list
+    :param jobs: Maximum number of model runs at once, defaults to the number
+                 of cpus. With 1 job, model runs are run in this process.
+    :type jobs: int
+    :param callback: Optional function called with the result of each model
+                     run as it finishes.
+    :type callback: function
+    :param plots: Optionally override option_plots of all model
+                  configuration files.
+    :type plots: bool
+    :return: A list of result dicts from run_job in the order of configfiles.
+    :rtype: list
+    """
+    jobs = jobs or os.cpu_count() or 1
+    jobs = min(jobs, len(configfiles)) or 1
+
+    if len(configfiles) > 1:
+        preload_inputs(configfiles)
+
+    results = {}
+    if jobs == 1:
+        for configfile in configfiles:
+            results[configfile] = run_job(configfile, plots=plots)
+            if callback:
+                callback(results[configfile])
+    else:
+        # Forked workers share the preloaded cache; otherwise each worker
+        # fills its own cache. Model runs are already in parallel, so each
+        # worker renders its plots in its own process.
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            futures = {
+                executor.submit(run_job, configfile, plots, 1): configfile
+                for configfile in configfiles
+            }
+            for future in as_completed(futures):
+                results[futures[future]] = future.result()
+                if callback:
+                    callback(results[futures[future]])
+
+    return [results[configfile] for configfile in configfiles]
+
+
+def format_summary(results):
+    """Format a summary table of the status and timing of each model run.
+
+    :param results: A list of result dicts from run_job.
+    :type results: list
+    :return: The summary table.
+    :rtype: string
+    """
+    width = max([len("configfile")] +
+                [len(result["configfile"]) for result in results])
+    lines = ["{:<{width}}  {:<6}  {:>9}".format("configfile",
+                                                "status",
+                                                "seconds",
+                                                width=width)]
+    for result in results:
+        line = "{:<{width}}  {:<6}  {:>9.2f}".format(result["configfile"],
+                                                     result["status"],
+                                                     result["seconds"],
+                                                     width=width)
+        if result["error"]:
+            line = "{}  {}".format(line, result["error"])
+        lines.append(line)
+
+    num_ok = sum(result["status"] == "ok" for result in results)
+    lines.append("{} of {} model runs ok, {:.2f} seconds total".format(
+        num_ok, len(results), sum(result["seconds"] for result in results)))
+
+    return "\n".join(lines)
@@ -0,0 +1,336 @@
+"""Module that contains functions to benchmark the throughput of model runs
+on synthetic inputs of configurable size.
+
+For each number of timesteps and number of twi bins, a synthetic hourly
+timeseries file, twi file, parameters file, and model configuration file are
+written to a temporary directory, and each stage of a model run is timed:
+
+    - read: read the input files
+    - preprocess: pet, snowmelt, and the twi weighted mean
+    - run: Topmodel.run()
+    - postprocess: write the output files, and plots when enabled
+
+Synthetic inputs are generated from a fixed random seed, and the best time
+of repeated runs is reported, so results are comparable across commits on
+the same machine. Throughput is reported as timesteps x bins per second of
+Topmodel.run() and of the whole model run.
+"""
+
+import os
+import platform
+import subprocess
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from topmodelpy import main, modelconfigfile
+
+
+STAGES = ["read", "preprocess", "run", "postprocess"]
+
+# Parameters of the Wolock example model
+PARAMETERS = [
+    ("scaling_parameter", 10, "millimeters"),
+    ("saturated_hydraulic_conductivity", 150, "millimeters/day"),
+    ("macropore_fraction", 0.2, "fraction"),
+    ("soil_depth_total", 1, "mm"),
+    ("soil_depth_ab_horizon", 0.5, "mm"),
+    ("field_capacity_fraction", 0.2, "fraction"),
+    ("latitude", 40.5, "degrees"),
+    ("basin_area_total", 3.07, "square kilometers"),
+    ("impervious_area_fraction", 0.3, "fraction"),
+    ("snowmelt_temperature_cutoff", 32, "degrees fahrenheit"),
+    ("snowmelt_rate_coeff", 0.06, "1/degrees fahrenheit"),
+    ("snowmelt_rate_coeff_with_rain", 0.007, "inches per degree fahrenheit"),
+    ("channel_length_max", 1.98, "kilometers"),
+    ("channel_velocity_avg", 10, "kilometers/day"),
+    ("flow_initial", 1, "millimeters/day"),
+]
+
+SIZE_SUFFIXES = {"k": 1000, "m": 1000000}
+
+
+def parse_sizes(value):
+    """Parse a comma separated list of sizes, with optional k and M
+    suffixes, such as 1k,10k,1M.
+
+    :param value: The list of sizes.
+    :type value: string
+    :return: List of sizes.
+    :rtype: list
+    """
+    sizes = []
+    for item in value.split(","):
+        item = item.strip().lower()
+        if not item:
+            continue
+        multiplier = SIZE_SUFFIXES.get(item[-1], 1)
+        if item[-1] in SIZE_SUFFIXES:
+            item = item[:-1]
+        size = int(float(item) * multiplier)
+        if size < 2:
+            raise ValueError(
+                "Invalid size: {}\n"
+                "Sizes must be at least 2".format(item)
+            )
+        sizes.append(size)
+
+    return sizes
+
+
+def write_parameters_file(filepath):
+    """Write the parameters file of the Wolock example model."""
+    data = pd.DataFrame(PARAMETERS, columns=["name", "value", "units"])
+    data["description"] = ""
+    data.to_csv(filepath, index=False)
+
+
+def write_timeseries_file(filepath, num_timesteps, seed=0):
+    """Write a synthetic hourly timeseries file without pet, so pet is
+    calculated during preprocessing.
+
+    :param filepath: File path of the timeseries file.
+    :type filepath: string
+    :param num_timesteps: Number of timesteps.
+    :type num_timesteps: int
+    :param seed: Seed of the random values.
+    :type seed: int
+    """
+    rng = np.random.default_rng(seed)
+    index = pd.date_range("1900-01-01", periods=num_timesteps, freq="H")
+    day_of_year = index.dayofyear.to_numpy()
+    temperature = (10 - 12 * np.cos(2 * np.pi * day_of_year / 365.25)
+                   + rng.normal(0, 3, num_timesteps))
+    precipitation = np.where(rng.random(num_timesteps) < 0.1,
+                             rng.gamma(0.8, 10, num_timesteps),
+                             0)
+    data = pd.DataFrame({
+        "temperature (celsius)": temperature.round(1),
+        "precipitation (mm/day)": precipitation.round(2),
+        "flow_observed (mm/day)": rng.gamma(2, 1, num_timesteps).round(2),
+    }, index=pd.Index(index, name="date"))
+    data.to_csv(filepath, date_format="%Y-%m-%d %H:%M:%S")
+
+
+def write_twi_file(filepath, num_bins):
+    """Write a synthetic twi file of bins from the highest to the lowest
+    twi, with proportions of a bell shaped distribution.
+
+    :param filepath: File path of the twi file.
+    :type filepath: string
+    :param num_bins: Number of twi bins.
+    :type num_bins: int
+    """
+    twi = np.linspace(12, 3, num_bins)
+    proportion = np.exp(-0.5 * ((twi - 6.5) / 1.5) ** 2)
+    proportion = proportion / proportion.sum()
+    data = pd.DataFrame({
+        "bin": np.arange(1, num_bins + 1),
+        "twi": twi,
+        "proportion": proportion,
+        "cells": proportion * 100,
+    })
+    data.to_csv(filepath, index=False)
+
+
+def write_inputs(directory, num_timesteps, num_bins, plots=False, seed=0):
+    """Write synthetic input files and a model configuration file.
+
+    :param directory: Directory of the input and output files.
+    :type directory: string
+    :param num_timesteps: Number of timesteps.
+    :type num_timesteps: int
+    :param num_bins: Number of twi bins.
+    :type num_bins: int
+    :param plots: Write output plots and the html report.
+    :type plots: bool
+    :param seed: Seed of the random timeseries values.
+    :type seed: int
+    :return: File path of the model configuration file.
+    :rtype: string
+    """
+    output_dir = os.path.join(directory, "outputs")
+    os.makedirs(output_dir, exist_ok=True)
+
+    write_parameters_file(os.path.join(directory, "parameters.csv"))
+    write_timeseries_file(os.path.join(directory, "timeseries.csv"),
+                          num_timesteps,
+                          seed=seed)
+    write_twi_file(os.path.join(directory, "twi.csv"), num_bins)
+
+    configfile = os.path.join(directory, "modelconfig.ini")
+    with open(configfile, "w") as f:
+        f.write(
+            "[Inputs]\n"
+            "input_dir = {directory}\n"
+            "parameters_file = ${{Inputs:input_dir}}/parameters.csv\n"
+            "timeseries_file = ${{Inputs:input_dir}}/timeseries.csv\n"
+            "timeseries_date_format = %Y-%m-%d %H:%M:%S\n"
+            "twi_file = ${{Inputs:input_dir}}/twi.csv\n"
+            "\n"
+            "[Outputs]\n"
+            "output_dir = {output_dir}\n"
+            "output_filename = output.csv\n"
+            "output_report = report.html\n"
+            "\n"
+            "[Options]\n"
+            "option_pet = hamon\n"
+            "option_snowmelt = yes\n"
+            "option_write_output_matrices = no\n"
+            "option_plots = {plots}\n"
+            "option_plot_jobs = 1\n"
+            "".format(directory=directory,
+                      output_dir=output_dir,
+                      plots="yes" if plots else "no")
+        )
+
+    return configfile
+
+
+def time_stages(configfile):
+    """Run a model configuration file and time each stage.
+
+    :param configfile: File path of the model configuration file.
+    :type configfile: string
+    :return: Dict of the seconds of each stage, see STAGES.
+    :rtype: dict
+    """
+    seconds = {}
+
+    start = time.perf_counter()
+    config_data = modelconfigfile.read(configfile)
+    parameters, timeseries, twi = main.read_input_files(config_data)
+    seconds["read"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    preprocessed_data = main.preprocess(config_data, parameters, timeseries,
+                                        twi)
+    seconds["preprocess"] = time.perf_counter() - start
+
+    topmodel = main.create_topmodel(parameters, twi, preprocessed_data)
+    start = time.perf_counter()
+    topmodel.run()
+    seconds["run"] = time.perf_counter() - start
+    topmodel_data = main.get_topmodel_data(topmodel)
+
+    start = time.perf_counter()
+    main.postprocess(config_data, timeseries, preprocessed_data,
+                     topmodel_data, parameters, twi)
+    seconds["postprocess"] = time.perf_counter() - start
+
+    return seconds
+
+
+def run_case(num_timesteps, num_bins, repeat=3, plots=False):
+    """Benchmark model runs of one size of synthetic inputs.
+
+    :param num_timesteps: Number of timesteps.
+    :type num_timesteps: int
+    :param num_bins: Number of twi bins.
+    :type num_bins: int
+    :param repeat: Number of model runs, the best time of each stage is
+                   reported.
+    :type repeat: int
+    :param plots: Write output plots and the html report.
+    :type plots: bool
+    :return: Dict of the size, the best seconds of each stage, and the
+             throughput.
+    :rtype: dict
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        configfile = write_inputs(directory, num_timesteps, num_bins, plots)
+        runs = [time_stages(configfile) for _ in range(repeat)]
+
+    seconds = {stage: min(run[stage] for run in runs) for stage in STAGES}
+    total = sum(seconds.values())
+    cells = num_timesteps * num_bins
+
+    return {
+        "timesteps": num_timesteps,
+        "bins": num_bins,
+        "repeat": repeat,
+        "plots": plots,
+        "seconds": seconds,
+        "total_seconds": total,
+        "run_cells_per_second": cells / seconds["run"],
+        "total_cells_per_second": cells / total,
+    }
+
+
+def get_commit():
+    """Return the git commit of the topmodelpy source, or None."""
+    try:
+        result = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            universal_newlines=True,
+            check=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+    return result.stdout.strip() or None
+
+
+def get_environment():
+    """Return a dict of the software and machine of the benchmark."""
+    return {
+        "commit": get_commit(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def run(timesteps, bins, repeat=3, plots=False, callback=None):
+    """Benchmark model runs of each combination of the number of timesteps
+    and the number of twi bins.
+
+    :param timesteps: List of the number of timesteps.
+    :type timesteps: list
+    :param bins: List of the number of twi bins.
+    :type bins: list
+    :param repeat: Number of model runs of each size.
+    :type repeat: int
+    :param plots: Write output plots and the html report.
+    :type plots: bool
+    :param callback: Optional function called with the result of each size
+                     as it finishes.
+    :type callback: function
+    :return: Dict of the environment and the list of results of each size.
+    :rtype: dict
+    """
+    results = []
+    for num_timesteps in timesteps:
+        for num_bins in bins:
+            result = run_case(num_timesteps, num_bins, repeat, plots)
+            results.append(result)
+            if callback:
+                callback(result)
+
+    return {
+        "environment": get_environment(),
+        "results": results,
+    }
+
+
+def format_result(result):
+    """Format a one line summary of the result of one size."""
+    return (
+        "{timesteps:>9} timesteps x {bins:>5} bins: "
+        "read {read:.3f} s, preprocess {preprocess:.3f} s, "
+        "run {run:.3f} s, postprocess {postprocess:.3f} s, "
+        "{rate:.3g} timesteps*bins/s"
+        "".format(timesteps=result["timesteps"],
+                  bins=result["bins"],
+                  rate=result["run_cells_per_second"],
+                  **result["seconds"])
+    )
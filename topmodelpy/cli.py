@@ -3,14 +3,20 @@
 
 import click
 import sys
+import time
 
-from topmodelpy.main import topmodelpy
+# The model modules, and pandas, matplotlib, and scipy with them, are
+# imported by each command rather than here, so the cli starts fast
 
 
 class Options:
     def __init__(self):
         self.verbose = False
         self.show = False
+        self.plots = None
+        self.plot_jobs = None
+        self.cache = None
+        self.scenarios = None
 
 
 # Create a decorator to pass options to each command
@@ -23,38 +29,450 @@ pass_options = click.make_pass_decorator(Options, ensure=True)
 @click.option("-s", "--show", is_flag=True,
               help="Show output plots.")
 @click.pass_context
-def main(options, verbose, show):
+def main(ctx, verbose, show):
     """Topmodelpy is a command line tool for a rainfall-runoff
     model that predicts the amount of water flow in rivers.
     """
+    options = ctx.ensure_object(Options)
     options.verbose = verbose
     options.show = show
 
 
 @main.command()
 @click.argument("configfile", type=click.Path(exists=True))
+@click.option("--plots/--no-plots", default=None,
+              help="Write output plots and the html report. "
+                   "Defaults to option_plots of the model config file.")
+@click.option("--cache/--no-cache", default=None,
+              help="Cache the results of each stage, and rerun only the "
+                   "stages whose inputs changed. "
+                   "Defaults to option_cache of the model config file.")
+@click.option("--watch", is_flag=True,
+              help="Watch the model config file and input files, and rerun "
+                   "the stages affected by each change until interrupted. "
+                   "Turns on --cache unless --no-cache.")
+@click.option("--poll", is_flag=True,
+              help="Poll the watched files for changes rather than use "
+                   "inotify, such as on network file systems.")
+@click.option("--poll-interval", type=click.FloatRange(min=0.1), default=1.0,
+              show_default=True,
+              help="Seconds between polls of the watched files.")
+@click.option("--profile", is_flag=True,
+              help="Profile the model run, and print the functions with "
+                   "the most time. Plots are rendered in the model process.")
+@click.option("--profiler", type=click.Choice(["cprofile", "pyinstrument"]),
+              default="cprofile", show_default=True,
+              help="Deterministic cProfile profiler, or low overhead "
+                   "pyinstrument sampling profiler, which requires the "
+                   "pyinstrument package.")
+@click.option("--profile-output", type=click.Path(dir_okay=False),
+              default=None,
+              help="File path of the profile, *.prof for cprofile or *.html "
+                   "for pyinstrument; the report is saved with a .txt "
+                   "suffix. Defaults to topmodelpy.prof or topmodelpy.html.")
+@click.option("--profile-top", type=click.IntRange(min=1), default=25,
+              show_default=True,
+              help="Number of functions in the cprofile report.")
+@click.option("--profile-sort", type=click.Choice(["tottime", "cumtime"]),
+              default="tottime", show_default=True,
+              help="Sort the functions of the cprofile report by the time in "
+                   "the function itself, or with the functions it calls.")
 @pass_options
-def run(options, configfile):
+def run(options, configfile, plots, cache, watch, poll, poll_interval,
+        profile, profiler, profile_output, profile_top, profile_sort):
     """Run Topmodel with a model configuration file.
 
     The model configuration file contains the specifications for a model run.
-    This command takes in the path to model configuration file.
+    This command takes in the path to model configuration file. With
+    --verbose, prints the time of each stage of the model run, see
+    option_run_profile of the model config file. With --cache, prints which
+    stages were cache hits, see option_cache of the model config file.
+    With --watch, reruns the model each time the model config file or an
+    input file changes, such as while calibrating parameters by hand.
     """
+    from topmodelpy.main import topmodelpy
+
+    options.plots = plots
+    options.cache = cache
+    if watch:
+        if profile:
+            raise click.UsageError("--profile can not be used with --watch")
+        run_watch(options, configfile, poll, poll_interval)
+        return
+
     try:
         click.echo("Running model...")
-        topmodelpy(configfile, options)
+        if profile:
+            from topmodelpy import profiling
+
+            options.plot_jobs = 1
+            profile_output = (profile_output
+                              or profiling.PROFILE_FILEPATHS[profiler])
+            recorder, report = profiling.profile(topmodelpy,
+                                                 profile_output,
+                                                 profiler=profiler,
+                                                 top=profile_top,
+                                                 sort=profile_sort,
+                                                 configfile=configfile,
+                                                 options=options)
+        else:
+            recorder = topmodelpy(configfile, options)
         click.echo("Finished!")
         click.echo("Output saved as specified in the model config file.")
     except Exception as err:
         click.echo(err)
         sys.exit(1)
 
-    if options.verbose:
-        click.echo("Verbose on")
+    if options.verbose and recorder is not None:
+        click.echo(recorder.format_summary())
+    if recorder is not None and recorder.format_cache_report():
+        click.echo(recorder.format_cache_report())
+    if profile:
+        click.echo(report)
+        click.echo("Profile saved to {}".format(profile_output))
     if options.show:
         click.echo("Show on")
 
 
+def run_watch(options, configfile, poll, poll_interval):
+    """Run a model configuration file, then rerun it each time the model
+    configuration file or its input files change, until interrupted.
+
+    The results of each stage are cached unless --no-cache, so a change only
+    reruns the stages it affects, and the output files and the html report
+    are rewritten in place.
+    """
+    from topmodelpy import watch
+    from topmodelpy.main import topmodelpy
+
+    if options.cache is None:
+        options.cache = True
+
+    def run_once():
+        start = time.perf_counter()
+        try:
+            recorder = topmodelpy(configfile, options)
+        except Exception as err:
+            # Keep watching, such as while a file is half edited
+            click.echo("Failed: {}".format(err))
+            return
+        if options.verbose and recorder is not None:
+            click.echo(recorder.format_summary())
+        if recorder is not None and recorder.format_cache_report():
+            click.echo(recorder.format_cache_report())
+        click.echo("Finished in {:.2f} s".format(time.perf_counter() - start))
+
+    click.echo("Running model...")
+    run_once()
+    click.echo("Watching for changes, press Ctrl+C to stop...")
+    try:
+        for changed in watch.iter_changes(configfile,
+                                          interval=poll_interval,
+                                          polling=poll):
+            click.echo("Changed: {}".format(
+                ", ".join(sorted(filepath.name for filepath in changed))))
+            run_once()
+    except KeyboardInterrupt:
+        click.echo("Stopped watching.")
+
+
+@main.command()
+@click.argument("configfile", type=click.Path(exists=True))
+@click.option("--scenarios", default=None,
+              help="Scenario timeseries files, a glob pattern such as "
+                   "'traces/trace_*.csv' or a list of files separated by "
+                   "commas. Defaults to forecast_timeseries_file of the "
+                   "model config file.")
+@pass_options
+def forecast(options, configfile, scenarios):
+    """Run a forecast of many scenario timeseries, such as weather traces.
+
+    Runs Topmodel on the timeseries_file of the model configuration file
+    once, then runs all the scenario timeseries at once from the model state
+    at the end of it, and writes the percentile bands and the flow predicted
+    of each scenario, see option_forecast_percentiles of the model config
+    file.
+    """
+    from topmodelpy.main import forecast as run_forecast
+
+    options.scenarios = scenarios
+    try:
+        click.echo("Running forecast...")
+        forecast_data = run_forecast(configfile, options)
+        click.echo("Finished!")
+        click.echo("Output saved as specified in the model config file.")
+    except Exception as err:
+        click.echo(err)
+        sys.exit(1)
+
+    if options.verbose:
+        flows = forecast_data["flow_predicted"]
+        click.echo("Scenarios: {}, timesteps: {}, from {} to {}".format(
+            flows.shape[1], len(flows), flows.index[0], flows.index[-1]))
+
+
+@main.command("stream")
+@click.argument("configfile", type=click.Path(exists=True))
+@click.option("-i", "--input", "infile", type=click.File("r", lazy=False),
+              default="-", show_default=True,
+              help="Input forcing rows, such as a named pipe; '-' is stdin.")
+@click.option("-o", "--output", "outfile", type=click.File("w"),
+              default="-", show_default=True,
+              help="Output flow rows; '-' is stdout.")
+@click.option("--timestep-hours", type=click.FloatRange(min=0, max=24,
+                                                        min_open=True),
+              default=24, show_default=True,
+              help="Model timestep, in hours, of the input rows.")
+@pass_options
+def stream(options, configfile, infile, outfile, timestep_hours):
+    """Run Topmodel on forcing rows as they arrive, such as real-time data.
+
+    Reads rows of date, temperature, precipitation, and optional pet, with
+    an optional timeseries file header, and writes a row of the flow
+    predicted of each row as soon as it is computed. The parameters file
+    and twi file of the model configuration file are used; its timeseries
+    file is not.
+    """
+    from topmodelpy.stream import stream as run_stream
+
+    start = time.perf_counter()
+    try:
+        num_timesteps = run_stream(configfile,
+                                   infile,
+                                   outfile,
+                                   timestep_hours=timestep_hours)
+    except KeyboardInterrupt:
+        click.echo("Stopped.", err=True)
+        return
+    except Exception as err:
+        click.echo(err, err=True)
+        sys.exit(1)
+
+    if options.verbose and num_timesteps:
+        seconds = time.perf_counter() - start
+        click.echo("Timesteps: {}, {:.3f} ms per timestep with start-up"
+                   "".format(num_timesteps, seconds / num_timesteps * 1000),
+                   err=True)
+
+
+@main.command("run-many")
+@click.argument("paths", nargs=-1, required=True)
+@click.option("-j", "--jobs", type=click.IntRange(min=1), default=None,
+              help="Maximum number of model runs at once. "
+                   "Defaults to the number of cpus.")
+@click.option("--plots/--no-plots", default=None,
+              help="Write output plots and html reports. "
+                   "Defaults to option_plots of each model config file.")
+@click.option("--pipeline", is_flag=True,
+              help="Overlap reading inputs and writing outputs of other "
+                   "models with the compute of each model. --jobs is then "
+                   "the number of compute processes.")
+@click.option("--write-jobs", type=click.IntRange(min=1), default=1,
+              show_default=True,
+              help="Number of processes that write outputs with --pipeline.")
+@click.option("--queue-size", type=click.IntRange(min=1), default=2,
+              show_default=True,
+              help="Maximum number of models waiting between stages with "
+                   "--pipeline, which caps memory.")
+@pass_options
+def run_many(options, paths, jobs, plots, pipeline, write_jobs, queue_size):
+    """Run Topmodel with many model configuration files in parallel.
+
+    Takes in directories, glob patterns, or paths of model configuration
+    files. Directories are searched for *.ini files. Prints a summary of the
+    status and timing of each model run.
+    """
+    from topmodelpy import asyncbatch, batch
+
+    configfiles = batch.find_configfiles(paths)
+    if not configfiles:
+        click.echo("No model config files found.")
+        sys.exit(1)
+
+    def echo_result(result):
+        click.echo("{}: {} ({:.2f} s)".format(result["configfile"],
+                                             result["status"],
+                                             result["seconds"]))
+
+    click.echo("Running {} models...".format(len(configfiles)))
+    if pipeline:
+        results = asyncbatch.run_many(configfiles,
+                                      jobs=jobs,
+                                      write_jobs=write_jobs,
+                                      queue_size=queue_size,
+                                      callback=echo_result,
+                                      plots=plots)
+    else:
+        results = batch.run_many(configfiles,
+                                 jobs=jobs,
+                                 callback=echo_result,
+                                 plots=plots)
+    click.echo(batch.format_summary(results))
+
+    if any(result["status"] != "ok" for result in results):
+        sys.exit(1)
+
+
+@main.command()
+@click.argument("demfile", type=click.Path(exists=True))
+@click.argument("twifile", type=click.Path())
+@click.option("--bins", type=click.IntRange(min=1, max=65535), default=30,
+              show_default=True,
+              help="Number of twi bins.")
+@click.option("--bin-method", type=click.Choice(["fixed", "quantile"]),
+              default="fixed", show_default=True,
+              help="Bins of equal twi width, or of about equal number of "
+                   "cells at approximate twi quantiles.")
+@click.option("--cellsize", type=float, default=None,
+              help="DEM cell size in meters. Required for *.npy DEMs, "
+                   "defaults to the cell size of GeoTIFF DEMs.")
+@click.option("--nodata", type=float, default=None,
+              help="DEM nodata value, defaults to the nodata value of "
+                   "GeoTIFF DEMs.")
+@click.option("--min-slope", type=float, default=0.0001, show_default=True,
+              help="Minimum slope, tan(beta), of flats and pits.")
+@click.option("--tile-rows", type=click.IntRange(min=1), default=256,
+              show_default=True,
+              help="Number of DEM rows processed at a time.")
+@click.option("--twi-raster", type=click.Path(), default=None,
+              help="Optional *.npy file to save the twi of each cell.")
+@click.option("--bin-raster", type=click.Path(), default=None,
+              help="Optional *.npy file to save the twi bin id of each "
+                   "cell, for saturation maps.")
+@click.option("--work-dir", type=click.Path(exists=True, file_okay=False),
+              default=None,
+              help="Directory of intermediate rasters, defaults to a "
+                   "temporary directory.")
+@pass_options
+def twi(options, demfile, twifile, bins, bin_method, cellsize, nodata,
+        min_slope, tile_rows, twi_raster, bin_raster, work_dir):
+    """Compute a twi file from a digital elevation model (DEM).
+
+    Takes in the path to a DEM, a GeoTIFF (*.tif) or numpy binary file
+    (*.npy), and the path of the twi file (*.csv) to write. The DEM should be
+    hydrologically conditioned (pits filled).
+    """
+    from topmodelpy.main import compute_twi_file
+
+    try:
+        click.echo("Computing twi...")
+        compute_twi_file(demfile,
+                         twifile,
+                         num_bins=bins,
+                         bin_method=bin_method,
+                         cellsize=cellsize,
+                         nodata=nodata,
+                         min_slope=min_slope,
+                         tile_rows=tile_rows,
+                         twi_raster=twi_raster,
+                         bin_raster=bin_raster,
+                         work_dir=work_dir)
+        click.echo("Finished!")
+        click.echo("Twi saved to {}".format(twifile))
+    except Exception as err:
+        click.echo(err)
+        sys.exit(1)
+
+
+@main.command()
+@click.option("--timesteps", default="1k,10k", show_default=True,
+              help="Comma separated numbers of timesteps, with optional k "
+                   "and M suffixes, e.g. 1k,10k,1M.")
+@click.option("--bins", default="10,100", show_default=True,
+              help="Comma separated numbers of twi bins.")
+@click.option("--repeat", type=click.IntRange(min=1), default=3,
+              show_default=True,
+              help="Number of model runs of each size; the best time of "
+                   "each stage is reported.")
+@click.option("--plots/--no-plots", default=False, show_default=True,
+              help="Include output plots and the html report in the "
+                   "postprocess stage.")
+@click.option("-o", "--output", type=click.Path(), default=None,
+              help="File path to save the results as json, otherwise the "
+                   "json is printed.")
+@pass_options
+def bench(options, timesteps, bins, repeat, plots, output):
+    """Benchmark model runs on synthetic inputs of each size.
+
+    Times each stage of a model run, read, preprocess, run, and postprocess,
+    for each combination of the number of timesteps and the number of twi
+    bins, and reports the throughput in timesteps x bins per second as json.
+    """
+    import json
+
+    from topmodelpy import benchmark
+
+    try:
+        timesteps = benchmark.parse_sizes(timesteps)
+        bins = benchmark.parse_sizes(bins)
+        results = benchmark.run(
+            timesteps,
+            bins,
+            repeat=repeat,
+            plots=plots,
+            callback=lambda result: click.echo(
+                benchmark.format_result(result), err=True)
+        )
+    except Exception as err:
+        click.echo(err, err=True)
+        sys.exit(1)
+
+    if output:
+        with open(output, "w") as f:
+            json.dump(results, f, indent=2)
+        click.echo("Results saved to {}".format(output), err=True)
+    else:
+        click.echo(json.dumps(results, indent=2))
+
+
+@main.command()
+@click.option("--host", default="127.0.0.1", show_default=True,
+              help="Host of the http server.")
+@click.option("--port", type=click.IntRange(min=0), default=8765,
+              show_default=True,
+              help="Port of the http server.")
+@click.option("--socket", "socket_path", type=click.Path(dir_okay=False),
+              default=None,
+              help="Serve on a Unix socket at this path instead of the host "
+                   "and port.")
+@click.option("-j", "--jobs", type=click.IntRange(min=1), default=None,
+              help="Number of worker processes, the maximum number of model "
+                   "runs at once. Defaults to the number of cpus.")
+@click.option("--max-queue", type=click.IntRange(min=0), default=100,
+              show_default=True,
+              help="Maximum number of model runs waiting for a worker; "
+                   "further requests are rejected with 503.")
+@pass_options
+def serve(options, host, port, socket_path, jobs, max_queue):
+    """Serve model runs over a local json api on warm worker processes.
+
+    POST /run with {"config": FILE, "parameters": {NAME: VALUE}} returns the
+    predicted flows and metrics of the model config file, with optional
+    parameter overrides, without writing output files. GET /stats returns
+    the throughput and latency of the requests.
+    """
+    from topmodelpy import server
+
+    try:
+        server.serve(
+            host=host,
+            port=port,
+            socket_path=socket_path,
+            jobs=jobs,
+            max_queue=max_queue,
+            verbose=options.verbose,
+            callback=lambda http_server: click.echo(
+                "Serving on {} with {} workers, press Ctrl+C to stop".format(
+                    server.get_address(http_server),
+                    http_server.model_server.jobs))
+        )
+    except KeyboardInterrupt:
+        click.echo("Stopped.")
+    except Exception as err:
+        click.echo(err)
+        sys.exit(1)
+
+
 @main.command()
 @pass_options
 def runexample(options):
@@ -0,0 +1,120 @@
+"""Module that contains functions to read a digital elevation model (DEM)
+raster from a GeoTIFF file (*.tif) or a numpy binary file (*.npy).
+
+A DEM is read in strips of rows, so DEMs larger than memory are possible.
+GeoTIFF files are read with windowed reads and require the optional rasterio
+package. Numpy binary files are memory-mapped and have no georeferencing, so
+the cell size must be given.
+"""
+
+from pathlib import Path
+
+import numpy as np
+
+from .exceptions import DependencyErrorMissingPackage
+
+
+GEOTIFF_SUFFIXES = [".tif", ".tiff"]
+
+
+class Dem:
+    """A DEM raster that is read in strips of rows.
+
+    Cell values equal to nodata, and nan values, are returned as nan.
+
+    :param filepath: File path of the DEM, *.tif, *.tiff, or *.npy.
+    :type filepath: string
+    :param cellsize: Cell size in meters, required for *.npy files, otherwise
+                     defaults to the cell size of the GeoTIFF.
+    :type cellsize: float
+    :param nodata: Optional nodata value, defaults to the nodata value of the
+                   GeoTIFF.
+    :type nodata: float
+    """
+    def __init__(self, filepath, cellsize=None, nodata=None):
+        self.filepath = Path(filepath)
+        self.dataset = None
+        self.array = None
+
+        if self.filepath.suffix.lower() in GEOTIFF_SUFFIXES:
+            # Imported here since rasterio is slow to import
+            try:
+                import rasterio
+            except ImportError:
+                raise DependencyErrorMissingPackage("rasterio",
+                                                    "twi with a GeoTIFF DEM")
+            self.dataset = rasterio.open(str(self.filepath))
+            self.shape = (self.dataset.height, self.dataset.width)
+            cellsize = cellsize or abs(self.dataset.transform.a)
+            nodata = nodata if nodata is not None else self.dataset.nodata
+        elif self.filepath.suffix.lower() == ".npy":
+            self.array = np.load(str(self.filepath), mmap_mode="r")
+            if self.array.ndim != 2:
+                raise ValueError(
+                    "Invalid DEM shape: {}\n"
+                    "DEM must be a 2 dimensional grid".format(self.array.shape)
+                )
+            self.shape = self.array.shape
+        else:
+            raise ValueError(
+                "Invalid DEM file: {}\n"
+                "DEM file must be a GeoTIFF (*.tif) or a numpy binary file "
+                "(*.npy)".format(self.filepath)
+            )
+
+        if not cellsize or cellsize <= 0:
+            raise ValueError(
+                "Invalid DEM cell size: {}\n"
+                "Cell size must be greater than 0".format(cellsize)
+            )
+        self.cellsize = float(cellsize)
+        self.nodata = nodata
+
+    def read_rows(self, start, stop):
+        """Read a strip of rows of the DEM.
+
+        :param start: First row to read.
+        :type start: int
+        :param stop: Row to read up to, exclusive.
+        :type stop: int
+        :return: Array of the strip of rows with nodata as nan.
+        :rtype: numpy.ndarray
+        """
+        if self.dataset is not None:
+            from rasterio.windows import Window
+            window = Window(0, start, self.shape[1], stop - start)
+            rows = self.dataset.read(1, window=window).astype(float)
+        else:
+            rows = np.array(self.array[start:stop], dtype=float)
+
+        if self.nodata is not None:
+            rows[rows == self.nodata] = np.nan
+
+        return rows
+
+    def close(self):
+        """Close the DEM file."""
+        if self.dataset is not None:
+            self.dataset.close()
+        self.array = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def read(filepath, cellsize=None, nodata=None):
+    """Open a DEM file to read in strips of rows.
+
+    :param filepath: File path of the DEM, *.tif, *.tiff, or *.npy.
+    :type filepath: string
+    :param cellsize: Cell size in meters, required for *.npy files.
+    :type cellsize: float
+    :param nodata: Optional nodata value.
+    :type nodata: float
+    :return dem: The DEM.
+    :rtype: Dem
+    """
+    return Dem(filepath, cellsize=cellsize, nodata=nodata)
@@ -41,19 +41,13 @@ class ModelConfigFileErrorInvalidOption(TopmodelpyException):
     Raised when a model config file does not contain valid options.
     """
     def __init__(self, invalid_options, valid_options):
-        self.message = (
-            "Error with model config file.\n"
-            "Invalid option(s):\n"
-            "  option_pet = {pet}\n"
-            "  option_snowmelt = {snowmelt}\n"
-            "".format(**invalid_options)
-        )
-        self.message = self.message + (
-            "Valid options (contained in each respective list):\n"
-            "  option_pet = {pet}\n"
-            "  option_snowmelt = {snowmelt}\n"
-            "".format(**valid_options)
-        )
+        self.message = "Error with model config file.\nInvalid option(s):\n"
+        for key, value in invalid_options.items():
+            self.message += "  option_{} = {}\n".format(key, value)
+
+        self.message += "Valid options (contained in each respective list):\n"
+        for key, value in valid_options.items():
+            self.message += "  option_{} = {}\n".format(key, value)
 
 
 class ParametersFileErrorInvalidHeader(TopmodelpyException):
@@ -177,6 +171,19 @@ class ParametersFileErrorInvalidImperviousArea(TopmodelpyException):
         )
 
 
+class ParametersFileErrorMissingValues(TopmodelpyException):
+    """
+    Raised when a parameters table file has missing values.
+    """
+    def __init__(self, missing_values):
+        self.message = (
+            "Error with parameters table file.\n"
+            "Missing values:\n"
+            "  {}\n"
+            "".format(missing_values)
+        )
+
+
 class TimeseriesFileErrorInvalidHeader(TopmodelpyException):
     """
     Raised when a file is not a properly formatted timeseries csv file.
@@ -233,6 +240,50 @@ class TimeseriesFileErrorInvalidTimestep(TopmodelpyException):
         )
 
 
+class TimeseriesFileErrorDiscontinuity(TopmodelpyException):
+    """
+    Raised when consecutive timeseries csv files are not continuous.
+    """
+    def __init__(self,
+                 filepath,
+                 previous_end,
+                 start,
+                 timestep,
+                 previous_timestep):
+        self.message = (
+            "Error with timeseries file.\n"
+            "Discontinuity between files at:\n"
+            "  {}\n"
+            "Previous file ends at:\n"
+            "  {} (timestep {})\n"
+            "File starts at:\n"
+            "  {} (timestep {})\n"
+            "Valid continuity:\n"
+            "  file starts one timestep after the previous file ends, "
+            "with the same timestep\n"
+            "".format(filepath,
+                      previous_end,
+                      previous_timestep,
+                      start,
+                      timestep)
+        )
+
+
+class TimeseriesStreamErrorInvalidRow(TopmodelpyException):
+    """
+    Raised when a row of a timeseries stream cannot be read or does not
+    continue one timestep after the previous row.
+    """
+    def __init__(self, line_number, line, reason):
+        self.message = (
+            "Error with timeseries stream.\n"
+            "Invalid row at line {}:\n"
+            "  {}\n"
+            "{}\n"
+            "".format(line_number, line.rstrip("\r\n"), reason)
+        )
+
+
 class TwiFileErrorInvalidHeader(TopmodelpyException):
     """
     Raised when a file is not a properly formatted twi csv file.
@@ -274,3 +325,32 @@ class TwiFileErrorInvalidProportion(TopmodelpyException):
             "  1.0\n"
             "".format(invalid_proportion)
         )
+
+
+class ServerErrorInvalidSocketPath(TopmodelpyException):
+    """
+    Raised when the path of a Unix socket to serve on is in use.
+    """
+    def __init__(self, socket_path, reason):
+        self.message = (
+            "Error with server socket.\n"
+            "Invalid socket path:\n"
+            "  {}\n"
+            "{}\n"
+            "".format(socket_path, reason)
+        )
+
+
+class DependencyErrorMissingPackage(TopmodelpyException):
+    """
+    Raised when an optional package required by an option is not installed.
+    """
+    def __init__(self, package, option):
+        self.message = (
+            "Error with optional dependency.\n"
+            "Missing package:\n"
+            "  {}\n"
+            "Required by:\n"
+            "  {}\n"
+            "".format(package, option)
+        )
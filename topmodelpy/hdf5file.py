@@ -0,0 +1,239 @@
+"""Module that contains functions to write and read all the outputs of a
+model run in a single HDF5 file.
+
+Requires the optional h5py package.
+
+File layout:
+
+    /timeseries/date                      dates as int64 nanoseconds
+                                          since 1970-01-01
+    /timeseries/<column>                  one dataset per output column,
+                                          in the order of the columns
+                                          attribute
+    /matrices/bin                         twi bin ids
+    /matrices/saturation_deficit_locals   len(timeseries) x len(twi_bins)
+    /matrices/unsaturated_zone_storages   len(timeseries) x len(twi_bins)
+    /matrices/root_zone_storages          len(timeseries) x len(twi_bins)
+    /metadata/parameters/<name>           parameter value, with units and
+                                          description attributes
+    /metadata/config/<section>            attributes of each key and value
+    /metadata/twi/<column>                one dataset per twi column
+    /maps/date                            dates of the maps, see write_maps
+    /maps/saturation_deficit_locals       len(dates) x raster rows x
+                                          raster columns
+
+All timeseries and matrices datasets are chunked along time and compressed,
+so a range of dates can be read without reading the whole file.
+"""
+
+import numpy as np
+import pandas as pd
+
+from . import mapfile
+from .exceptions import DependencyErrorMissingPackage
+
+DATE_UNITS = "nanoseconds since 1970-01-01 00:00:00"
+
+
+def import_h5py():
+    """Import the optional h5py package, which is only imported when a HDF5
+    file is written or read since it is slow to import.
+
+    :return: The h5py module.
+    :rtype: module
+    """
+    try:
+        import h5py
+    except ImportError:
+        raise DependencyErrorMissingPackage("h5py", "output_format = hdf5")
+
+    return h5py
+
+
+def write(filepath,
+          output_df,
+          matrices=None,
+          bins=None,
+          parameters=None,
+          config_data=None,
+          twi=None,
+          chunksize=4096,
+          compression="gzip"):
+    """Write outputs of a model run to a HDF5 file.
+
+    :param filepath: File path of the HDF5 file.
+    :type filepath: string
+    :param output_df: A dataframe of the output timeseries.
+    :type output_df: pandas.DataFrame
+    :param matrices: Optional dict of matrix names and matrices of size
+                     len(timeseries) x len(twi_bins).
+    :type matrices: dict
+    :param bins: The twi bin ids of the matrix columns.
+    :type bins: numpy.ndarray
+    :param parameters: Optional dict from the parameters file.
+    :type parameters: dict
+    :param config_data: Optional model configuration.
+    :type config_data: ConfigParser
+    :param twi: Optional dataframe of all the twi data.
+    :type twi: pandas.DataFrame
+    :param chunksize: Number of timesteps in each chunk of a dataset.
+    :type chunksize: int
+    :param compression: Compression filter of each dataset.
+    :type compression: string
+    """
+    h5py = import_h5py()
+
+    num_timesteps = len(output_df)
+    chunk_rows = max(1, min(chunksize, num_timesteps))
+    dataset_options = {
+        "compression": compression,
+        "shuffle": compression is not None,
+    }
+
+    with h5py.File(str(filepath), "w") as f:
+        group = f.create_group("timeseries")
+        dates = group.create_dataset(
+            "date",
+            data=output_df.index.values.astype("datetime64[ns]").view("int64"),
+            chunks=(chunk_rows,),
+            **dataset_options
+        )
+        dates.attrs["units"] = DATE_UNITS
+        group.attrs["columns"] = [str(column) for column in output_df.columns]
+        for column in output_df.columns:
+            group.create_dataset(column,
+                                 data=output_df[column].to_numpy(dtype=float),
+                                 chunks=(chunk_rows,),
+                                 **dataset_options)
+
+        if matrices:
+            group = f.create_group("matrices")
+            group.create_dataset("bin", data=np.asarray(bins, dtype="int64"))
+            for name, matrix in matrices.items():
+                dataset = group.create_dataset(
+                    name,
+                    shape=matrix.shape,
+                    dtype=matrix.dtype,
+                    chunks=(chunk_rows, matrix.shape[1]),
+                    **dataset_options
+                )
+                # Copy one chunk at a time so memory-mapped matrices are
+                # never read into memory all at once
+                for start in range(0, num_timesteps, chunk_rows):
+                    stop = min(start + chunk_rows, num_timesteps)
+                    dataset[start:stop] = matrix[start:stop]
+
+        metadata = f.create_group("metadata")
+        if parameters:
+            group = metadata.create_group("parameters")
+            for name, parameter in parameters.items():
+                dataset = group.create_dataset(name, data=parameter["value"])
+                dataset.attrs["units"] = parameter["units"]
+                dataset.attrs["description"] = parameter["description"]
+
+        if config_data:
+            group = metadata.create_group("config")
+            for section in config_data.sections():
+                section_group = group.create_group(section)
+                for key, value in config_data[section].items():
+                    section_group.attrs[key] = value
+
+        if twi is not None:
+            group = metadata.create_group("twi")
+            for column in twi.columns:
+                group.create_dataset(column, data=twi[column].to_numpy())
+
+
+def write_maps(filepath, bin_raster, bins, matrix, dates, indices,
+               tile_rows=256, compression="gzip"):
+    """Append maps of the selected timesteps to a HDF5 file, see mapfile.
+
+    Each map is chunked in strips of rows and compressed.
+
+    :param filepath: File path of the HDF5 file.
+    :type filepath: string
+    :param bin_raster: The bin raster.
+    :type bin_raster: numpy.ndarray
+    :param bins: The twi bin ids of the matrix columns.
+    :type bins: numpy.ndarray
+    :param matrix: Matrix of size len(timeseries) x len(twi_bins).
+    :type matrix: numpy.ndarray
+    :param dates: The dates of the matrix rows.
+    :type dates: pandas.DatetimeIndex
+    :param indices: The timestep indices of the maps.
+    :type indices: list
+    :param tile_rows: Number of rows of each strip.
+    :type tile_rows: int
+    :param compression: Compression filter of the maps dataset.
+    :type compression: string
+    """
+    h5py = import_h5py()
+
+    num_rows, num_columns = bin_raster.shape
+    with h5py.File(str(filepath), "a") as f:
+        group = f.require_group("maps")
+        map_dates = group.create_dataset(
+            "date",
+            data=dates[indices].values.astype("datetime64[ns]").view("int64")
+        )
+        map_dates.attrs["units"] = DATE_UNITS
+        dataset = group.create_dataset(
+            "saturation_deficit_locals",
+            shape=(len(indices), num_rows, num_columns),
+            dtype="float32",
+            chunks=(1, min(tile_rows, num_rows), num_columns),
+            compression=compression,
+            shuffle=compression is not None,
+        )
+        for k, start, stop, strip in mapfile.iter_maps(bin_raster, bins,
+                                                       matrix, indices,
+                                                       tile_rows):
+            dataset[k, start:stop] = strip
+
+
+def read(filepath, start=None, end=None):
+    """Read outputs of a model run from a HDF5 file for a range of dates.
+
+    Only the chunks of each dataset within the range of dates are read.
+
+    :param filepath: File path of the HDF5 file.
+    :type filepath: string
+    :param start: Optional first date to read, inclusive.
+    :type start: string or datetime
+    :param end: Optional last date to read, inclusive.
+    :type end: string or datetime
+    :return: Tuple of a dataframe of the output timeseries, and a dict of
+             matrix names and dataframes with one column per twi bin.
+    :rtype: tuple
+    """
+    h5py = import_h5py()
+
+    with h5py.File(str(filepath), "r") as f:
+        dates = pd.to_datetime(f["timeseries/date"][:])
+        index_start = 0 if start is None else (
+            dates.searchsorted(pd.Timestamp(start), side="left"))
+        index_stop = len(dates) if end is None else (
+            dates.searchsorted(pd.Timestamp(end), side="right"))
+        index = pd.DatetimeIndex(dates[index_start:index_stop], name="date")
+
+        output_df = pd.DataFrame(
+            {
+                column: f["timeseries"][column][index_start:index_stop]
+                for column in f["timeseries"].attrs["columns"]
+            },
+            index=index,
+        )
+
+        matrices = {}
+        if "matrices" in f:
+            bins = f["matrices/bin"][:]
+            for name, dataset in f["matrices"].items():
+                if name == "bin":
+                    continue
+                matrices[name] = pd.DataFrame(
+                    dataset[index_start:index_stop],
+                    index=index,
+                    columns=bins,
+                )
+
+    return output_df, matrices
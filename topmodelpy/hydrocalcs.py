@@ -10,7 +10,6 @@ https://www.wcc.nrcs.usda.gov/ftpref/wntsc/H&H/snow/COEemSnowmeltRunoff.pdf
 """
 
 import numpy as np
-from scipy import stats
 
 
 def pet(dates, temperatures, latitude, method="hamon"):
@@ -160,7 +159,8 @@ def snowmelt(precipitation,
              temperature_cutoff,
              snowmelt_rate_coeff_with_rain,
              snowmelt_rate_coeff,
-             timestep_daily_fraction):
+             timestep_daily_fraction,
+             snowpack_initial=0):
     """Snow melt routine.
 
     :param precipitation: Precipitation rates, in millimeters per day
@@ -178,6 +178,9 @@ def snowmelt(precipitation,
     :type snowmelt_rate_coeff: float
     :param timestep_daily_fraction: Model timestep as a fraction of a day
     :type timestep_daily_fraction: float
+    :param snowpack_initial: Snowpack at the start, in millimeters, such as
+                             the last snowpack of a previous period
+    :type snowpack_initial: float
     :return: Tuple of arrays of adjusted precipitation, snowmelt,
              and snowpack values, each array is in millimeters per day
     :rtype: Tuple
@@ -190,7 +193,7 @@ def snowmelt(precipitation,
     snowpacks = []
 
     snowmelt = 0
-    snowpack = 0
+    snowpack = snowpack_initial / 25.4  # mm to inches
     for temp, precip_inch in zip(temperatures, precip_inches):
 
         # If temp is high enough then there is snowmelt,
@@ -533,6 +536,9 @@ def flow_duration(values):
     :return tuple: Tuple of probabilities, sorted values
     :rtype: tuple
     """
+    # Imported here since scipy is slow to import and only needed here
+    from scipy import stats
+
     # Sort the values
     values_sorted = np.sort(values)
 
@@ -0,0 +1,254 @@
+"""Module that contains functions to record the wall time, cpu time, and
+peak memory of each stage of a model run, as a run profile.
+
+Stages are recorded with the stage() context manager, which does nothing
+unless a Recorder is started with start(), so the model functions are
+instrumented without passing a recorder around. Stages nest, and the name
+of a nested stage is the path of the names of its parent stages, such as
+postprocess/csv:output.csv.
+
+Peak memory is measured with tracemalloc, which slows down pure Python code
+such as Topmodel.run() many times over, so it is only traced when a
+Recorder is started with trace_memory=True. The peak memory of a stage is
+the peak of traced memory during the stage above the traced memory at the
+start of the stage.
+
+Stages can be annotated with other fields, such as whether the result of a
+stage was a cache hit, see pipeline.
+"""
+
+from contextlib import contextmanager
+from datetime import datetime
+import json
+import time
+import tracemalloc
+
+
+_recorder = None
+
+
+class Recorder:
+    """A recorder of the wall time, cpu time, and peak memory of stages.
+
+    :param trace_memory: Trace the peak memory of each stage with
+                         tracemalloc.
+    :type trace_memory: bool
+    """
+    def __init__(self, trace_memory=False):
+        self.trace_memory = trace_memory
+        self.started = datetime.now().isoformat(timespec="seconds")
+        self.stages = []
+        self._stack = []
+
+    @contextmanager
+    def stage(self, name):
+        """Record a stage, nested in the current stage.
+
+        :param name: Name of the stage.
+        :type name: string
+        """
+        frame = {
+            "name": "/".join([parent["name"] for parent in self._stack[-1:]]
+                             + [name]),
+            "wall": time.perf_counter(),
+            "cpu": time.process_time(),
+        }
+        if self.trace_memory:
+            current, peak = tracemalloc.get_traced_memory()
+            if self._stack:
+                self._stack[-1]["peak"] = max(self._stack[-1]["peak"], peak)
+            tracemalloc.reset_peak()
+            frame["memory"] = current
+            frame["peak"] = current
+
+        # Record stages in the order they start
+        record = {"stage": frame["name"]}
+        frame["record"] = record
+        self.stages.append(record)
+        self._stack.append(frame)
+        try:
+            yield
+        finally:
+            self._stack.pop()
+            record["wall_seconds"] = time.perf_counter() - frame["wall"]
+            record["cpu_seconds"] = time.process_time() - frame["cpu"]
+            if self.trace_memory:
+                peak = max(frame["peak"], tracemalloc.get_traced_memory()[1])
+                record["peak_memory_bytes"] = peak - frame["memory"]
+                if self._stack:
+                    self._stack[-1]["peak"] = max(self._stack[-1]["peak"],
+                                                  peak)
+                tracemalloc.reset_peak()
+
+    def record(self, name, wall_seconds, cpu_seconds):
+        """Record a stage that ran elsewhere, such as in a worker process,
+        nested in the current stage.
+
+        :param name: Name of the stage.
+        :type name: string
+        :param wall_seconds: Wall time of the stage.
+        :type wall_seconds: float
+        :param cpu_seconds: Cpu time of the stage.
+        :type cpu_seconds: float
+        """
+        parents = [parent["name"] for parent in self._stack[-1:]]
+        self.stages.append({
+            "stage": "/".join(parents + [name]),
+            "wall_seconds": wall_seconds,
+            "cpu_seconds": cpu_seconds,
+        })
+
+    def annotate(self, **fields):
+        """Add fields to the record of the current stage, such as
+        cache="hit"."""
+        if self._stack:
+            self._stack[-1]["record"].update(fields)
+
+    def to_dict(self):
+        """Return the run profile as a dict."""
+        return {
+            "started": self.started,
+            "trace_memory": self.trace_memory,
+            "stages": self.stages,
+        }
+
+    def write(self, filepath):
+        """Write the run profile to a json file.
+
+        :param filepath: File path of the json file.
+        :type filepath: string
+        """
+        with open(filepath, "w") as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    def format_summary(self):
+        """Format a table of the wall time, cpu time, and peak memory of
+        each stage, with nested stages indented."""
+        labels = []
+        for record in self.stages:
+            names = record["stage"].split("/")
+            labels.append("  " * (len(names) - 1) + names[-1])
+        width = max([len(label) for label in labels] + [len("Stage")])
+
+        # Cache column only if a stage was cached, see pipeline
+        cached = any("cache" in record for record in self.stages)
+        lines = ["{:<{}} {:>9} {:>9} {:>10}".format("Stage",
+                                                    width,
+                                                    "Wall (s)",
+                                                    "Cpu (s)",
+                                                    "Peak (MB)")
+                 + (" {:>6}".format("Cache") if cached else "")]
+        for label, record in zip(labels, self.stages):
+            peak = record.get("peak_memory_bytes")
+            lines.append("{:<{}} {:>9.3f} {:>9.3f} {:>10}".format(
+                label,
+                width,
+                record.get("wall_seconds", 0.0),
+                record.get("cpu_seconds", 0.0),
+                "{:.1f}".format(peak / 1e6) if peak is not None else "-")
+                + (" {:>6}".format(record.get("cache", "-"))
+                   if cached else ""))
+
+        top_level = [record for record in self.stages
+                     if "/" not in record["stage"]]
+        lines.append("{:<{}} {:>9.3f} {:>9.3f}".format(
+            "Total",
+            width,
+            sum(record.get("wall_seconds", 0.0) for record in top_level),
+            sum(record.get("cpu_seconds", 0.0) for record in top_level)))
+
+        return "\n".join(lines)
+
+    def format_cache_report(self):
+        """Format the cache hits and misses of the stages, or an empty
+        string if no stage was cached."""
+        cached = [record for record in self.stages if "cache" in record]
+        if not cached:
+            return ""
+
+        def names(status):
+            return ", ".join([record["stage"] for record in cached
+                              if record["cache"] == status]) or "none"
+
+        return "Cache hits: {}\nCache misses: {}".format(names("hit"),
+                                                          names("miss"))
+
+
+def start(trace_memory=False):
+    """Start recording stages, see stage().
+
+    :param trace_memory: Trace the peak memory of each stage.
+    :type trace_memory: bool
+    :return: The recorder.
+    :rtype: Recorder
+    """
+    global _recorder
+    _recorder = Recorder(trace_memory=trace_memory)
+    if trace_memory:
+        tracemalloc.start()
+
+    return _recorder
+
+
+def stop():
+    """Stop recording stages.
+
+    :return: The recorder, or None if recording was not started.
+    :rtype: Recorder
+    """
+    global _recorder
+    recorder, _recorder = _recorder, None
+    if recorder is not None and recorder.trace_memory:
+        tracemalloc.stop()
+
+    return recorder
+
+
+def is_recording():
+    """Return True if stages are being recorded."""
+    return _recorder is not None
+
+
+@contextmanager
+def stage(name):
+    """Record a stage if recording was started, otherwise do nothing.
+
+    :param name: Name of the stage.
+    :type name: string
+    """
+    if _recorder is None:
+        yield
+        return
+
+    with _recorder.stage(name):
+        yield
+
+
+def record(name, wall_seconds, cpu_seconds):
+    """Record a stage that ran elsewhere if recording was started, see
+    Recorder.record()."""
+    if _recorder is not None:
+        _recorder.record(name, wall_seconds, cpu_seconds)
+
+
+def annotate(**fields):
+    """Add fields to the record of the current stage if recording was
+    started, see Recorder.annotate()."""
+    if _recorder is not None:
+        _recorder.annotate(**fields)
+
+
+def timed_call(function, **kwargs):
+    """Call a function and return its wall and cpu time, such as to time a
+    function in a worker process.
+
+    :param function: The function to call.
+    :type function: function
+    :return: Tuple of the wall time and cpu time in seconds.
+    :rtype: tuple
+    """
+    wall = time.perf_counter()
+    cpu = time.process_time()
+    function(**kwargs)
+
+    return time.perf_counter() - wall, time.process_time() - cpu
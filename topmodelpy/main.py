@@ -8,21 +8,46 @@ This module contains functionality that:
         - Calculate pet if not in timeseries
         - Calculates adjusted precipitation from snowmelt
         - Calculate the twi weighted mean
-    - Run Topmodel
+    - Run Topmodel, or TopmodelBatch for a table of many parameter sets
+    - Or run a forecast of many scenario timeseries from the state at the
+      end of the historical timeseries
     - Post process results
-        - Write output *.csv file of results
-        - Plot output
+        - Write output *.csv file of results, optionally streamed in chunks
+          while Topmodel runs
+        - Write output matrices as *.csv or memory-mapped *.npy files
+        - Or write all outputs in a single HDF5 file
+        - Write maps of the saturation deficit of each cell
+        - Plot output, across a pool of processes
+    - Optionally record a run profile of the wall time, cpu time, and peak
+      memory of each stage, see instrument
+    - Optionally cache the results of each stage, and rerun only the stages
+      whose inputs changed, see pipeline
+
+It also computes a twi file from a digital elevation model (DEM).
 """
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack
+import numpy as np
+import os
 import pandas as pd
-from pathlib import PurePath
-from topmodelpy import (hydrocalcs,
+from pathlib import Path, PurePath
+import tempfile
+from topmodelpy import (demfile,
+                        hydrocalcs,
+                        hdf5file,
+                        instrument,
+                        mapfile,
+                        matrixfile,
                         modelconfigfile,
+                        outputfile,
                         parametersfile,
                         timeseriesfile,
                         twifile,
-                        plots,
-                        report)
+                        terrain,
+                        twihistogram,
+                        utils)
 from topmodelpy.topmodel import Topmodel
+from topmodelpy.topmodelbatch import TopmodelBatch
 
 
 def topmodelpy(configfile, options):
@@ -34,16 +59,126 @@ def topmodelpy(configfile, options):
     :type param: string
     :param options: The options sent from the cli
     :type options: Click.obj
+    :return recorder: The run profile, see instrument.Recorder, or None if
+                      the run profile and the cache are off.
+    :rtype: instrument.Recorder
     """
     config_data = modelconfigfile.read(configfile)
-    parameters, timeseries, twi = read_input_files(config_data)
+    set_plot_options(config_data,
+                     plots=getattr(options, "plots", None),
+                     plot_jobs=getattr(options, "plot_jobs", None))
+    cache = getattr(options, "cache", None)
+    if cache is not None:
+        config_data["Options"]["option_cache"] = "yes" if cache else "no"
+    run_profile = get_run_profile(config_data)
+    if run_profile == "no" and getattr(options, "verbose", False):
+        run_profile = "yes"
+
+    # The cache status of each stage is recorded on the run profile
+    recorder = None
+    if run_profile != "no" or is_cached_run(config_data):
+        recorder = instrument.start(trace_memory=run_profile == "memory")
+    try:
+        if is_cached_run(config_data):
+            # Imported here since pipeline imports this module
+            from topmodelpy import pipeline
+            pipeline.run_model(config_data)
+        else:
+            with instrument.stage("read"):
+                parameters, timeseries, twi = read_input_files(config_data)
+                parameter_sets = read_parameter_sets(config_data, parameters)
+
+            run_model(config_data, parameters, timeseries, twi,
+                      parameter_sets)
+    finally:
+        instrument.stop()
+
+    if run_profile != "no":
+        recorder.write(PurePath(
+            config_data["Outputs"]["output_dir"],
+            config_data["Outputs"].get("output_filename_run_profile",
+                                       "run_profile.json")
+        ))
+
+    return recorder
 
-    preprocessed_data = preprocess(config_data, parameters, timeseries, twi)
-    topmodel_data = run_topmodel(parameters, twi, preprocessed_data)
-    postprocess(config_data, timeseries, preprocessed_data, topmodel_data)
 
+def run_model(config_data, parameters, timeseries, twi, parameter_sets=None):
+    """Preprocess data, run Topmodel, and postprocess results for input data
+    that is already read.
 
-def read_input_files(configdata):
+    :param config_data: A ConfigParser object that behaves much like a
+                        dictionary.
+    :type config_data: ConfigParser
+    :param parameters: The parameters for the model.
+    :type parameters: dict
+    :param timeseries: A dataframe of all the timeseries data.
+    :type timeseries: pandas.DataFrame
+    :param twi: A dataframe of all the twi data.
+    :type twi: pandas.DataFrame
+    :param parameter_sets: Optional dataframe of many parameter sets, see
+                           read_parameter_sets(), to run as an ensemble.
+    :type parameter_sets: pandas.DataFrame
+    """
+    if parameter_sets is not None:
+        run_ensemble(config_data, parameters, parameter_sets, timeseries, twi)
+        return
+
+    preprocessed_data, topmodel_data = compute_model(config_data,
+                                                     parameters,
+                                                     timeseries,
+                                                     twi)
+    with instrument.stage("postprocess"):
+        postprocess(config_data,
+                    timeseries,
+                    preprocessed_data,
+                    topmodel_data,
+                    parameters,
+                    twi)
+
+
+def compute_model(config_data, parameters, timeseries, twi):
+    """Preprocess data and run Topmodel, the compute stages of a model run
+    before postprocess().
+
+    Output csv files are written while Topmodel runs if the output is
+    streamed, see run_topmodel_streaming(), and output matrices in the *.npy
+    format are flushed to disk, so another process can postprocess them by
+    reopening their files, see asyncbatch.pack_matrices(). When the output
+    is streamed, the other output matrices are held in temporary files
+    rather than in memory, see create_temporary_matrices().
+
+    :return: Tuple of the preprocessed data dict and the Topmodel data dict.
+    :rtype: tuple
+    """
+    with instrument.stage("preprocess"):
+        preprocessed_data = preprocess(config_data, parameters, timeseries,
+                                       twi)
+    with instrument.stage("run"):
+        output_matrices = create_output_matrices(config_data, timeseries, twi)
+        if is_streamed_output(config_data):
+            topmodel_data = run_topmodel_streaming(
+                config_data,
+                parameters,
+                timeseries,
+                twi,
+                preprocessed_data,
+                output_matrices or create_temporary_matrices(config_data,
+                                                             timeseries,
+                                                             twi)
+            )
+        else:
+            topmodel_data = run_topmodel(parameters,
+                                         twi,
+                                         preprocessed_data,
+                                         output_matrices)
+        if output_matrices:
+            matrixfile.flush(output_matrices)
+
+    return preprocessed_data, topmodel_data
+
+
+def read_input_files(configdata, cache=None):
     """Read input files from model configuration file.
 
     Returns a tuple of:
@@ -53,16 +188,93 @@ def read_input_files(configdata):
 
     :param config: A ConfigParser object that behaves much like a dictionary.
     :type config: ConfigParser
+    :param cache: Optional cache of already read input files, such as a
+                  batch.InputCache, shared between model runs. The returned
+                  data must then be treated as read-only.
+    :type cache: batch.InputCache
     :return: Tuple of parameters dict, timeseries dataframe, twi dataframe
     :rtype: tuple
     """
-    parameters = parametersfile.read(configdata["Inputs"]["parameters_file"])
-    timeseries = timeseriesfile.read(configdata["Inputs"]["timeseries_file"])
-    twi = twifile.read(configdata["Inputs"]["twi_file"])
+    def read(reader, filepath, **kwargs):
+        if cache is None:
+            return reader(filepath, **kwargs)
+        return cache.read(reader, filepath, **kwargs)
+
+    parameters = read(parametersfile.read,
+                      configdata["Inputs"]["parameters_file"])
+    timeseries_filepaths = modelconfigfile.get_filepaths(
+        configdata["Inputs"]["timeseries_file"])
+    timeseries_date_format = (
+        configdata["Inputs"].get("timeseries_date_format", "").strip() or None
+    )
+    if len(timeseries_filepaths) == 1:
+        timeseries = read(timeseriesfile.read,
+                          timeseries_filepaths[0],
+                          date_format=timeseries_date_format)
+    else:
+        timeseries = read(timeseriesfile.read_many,
+                          tuple(timeseries_filepaths),
+                          date_format=timeseries_date_format)
+    twi = read_twi_file(configdata, cache=cache)
 
     return parameters, timeseries, twi
 
 
+def read_twi_file(configdata, cache=None):
+    """Read the twi file of the model configuration file, a twi *.csv file
+    or a raster of the twi of each cell, see read_input_files().
+
+    :return twi: A dataframe of all the twi data.
+    :rtype: pandas.DataFrame
+    """
+    def read(reader, filepath, **kwargs):
+        if cache is None:
+            return reader(filepath, **kwargs)
+        return cache.read(reader, filepath, **kwargs)
+
+    twi_filepath = configdata["Inputs"]["twi_file"]
+    if twifile.is_raster(twi_filepath):
+        return read(twifile.read_raster,
+                    twi_filepath,
+                    num_bins=configdata["Options"].getint("option_twi_bins",
+                                                          30),
+                    method=configdata["Options"].get("option_twi_bin_method",
+                                                     "fixed").lower().strip())
+
+    return read(twifile.read, twi_filepath)
+
+
+def read_parameter_sets(config_data, parameters, cache=None):
+    """Read the optional parameters table of many parameter sets.
+
+    :param config_data: A ConfigParser object that behaves much like a
+                        dictionary.
+    :type config_data: ConfigParser
+    :param parameters: The parameters for the model.
+    :type parameters: dict
+    :param cache: Optional cache of already read input files.
+    :type cache: batch.InputCache
+    :return parameter_sets: A dataframe of parameter sets, or None if the
+                            model configuration has no parameters table.
+    :rtype: pandas.DataFrame
+    """
+    filepath = config_data["Inputs"].get("parameters_table_file", "").strip()
+    if not filepath:
+        return None
+
+    if cache is None:
+        parameter_sets = parametersfile.read_table(filepath, parameters)
+    else:
+        parameter_sets = cache.read(parametersfile.read_table, filepath,
+                                    parameters=parameters)
+
+    # Do not fall back to a single model run for an invalid parameters table
+    if parameter_sets is None:
+        raise ValueError("Invalid parameters table file: {}".format(filepath))
+
+    return parameter_sets
+
+
 def preprocess(config_data, parameters, timeseries, twi):
     """Preprocess data for topmodel run.
 
@@ -87,46 +299,101 @@ def preprocess(config_data, parameters, timeseries, twi):
                                preprocessing.
     :rtype: dict
     """
-    # Calculate the daily timestep as a fraction
-    timestep_daily_fraction = (
-        (timeseries.index[1] - timeseries.index[0]).total_seconds() / 86400.0
-    )
+    timestep_daily_fraction = get_timestep_daily_fraction(timeseries)
 
     # Get pet as a numpy array from the input timeseries if it exists,
     # otherwise calculate it.
     if "pet" in timeseries.columns:
-        pet = timeseries["pet"].to_numpy() * timestep_daily_fraction
+        pet = preprocess_pet(parameters, timeseries, timestep_daily_fraction)
     else:
-        pet = hydrocalcs.pet(
-            dates=timeseries.index.to_pydatetime(),
-            temperatures=timeseries["temperature"].to_numpy(),
-            latitude=parameters["latitude"]["value"],
-            method="hamon"
-        )
-        pet = pet * timestep_daily_fraction
+        with instrument.stage("pet"):
+            pet = preprocess_pet(parameters,
+                                 timeseries,
+                                 timestep_daily_fraction)
 
     # If snowmelt option is turned on, then compute snowmelt and the difference
     # between the adjusted precip with pet.
-    # Otherwise, just compute the difference between the original precip with
-    # pet.
-    snowprecip, snowmelt, snowpack = None, None, None
+    snowmelt_data = None
     if config_data["Options"].getboolean("option_snowmelt"):
-        # Calculate the adjusted precipitation based on snowmelt
-        # Note: snowmelt function needs temperatures in Fahrenheit
-        snowprecip, snowmelt, snowpack = hydrocalcs.snowmelt(
-            timeseries["precipitation"].to_numpy(),
-            timeseries["temperature"].to_numpy() * (9/5) + 32,
-            parameters["snowmelt_temperature_cutoff"]["value"],
-            parameters["snowmelt_rate_coeff_with_rain"]["value"],
-            parameters["snowmelt_rate_coeff"]["value"],
-            timestep_daily_fraction
-        )
+        with instrument.stage("snowmelt"):
+            snowmelt_data = preprocess_snowmelt(parameters,
+                                                timeseries,
+                                                timestep_daily_fraction)
+
+    return get_preprocessed_data(timeseries,
+                                 twi,
+                                 timestep_daily_fraction,
+                                 pet,
+                                 snowmelt_data)
 
-        # Calculate the difference between the adjusted precip (snowprecip)
-        # and pet.
+
+def get_timestep_daily_fraction(timeseries):
+    """Return the timestep as a fraction of a day, usually 1 for daily
+    timesteps."""
+    return (timeseries.index[1] - timeseries.index[0]).total_seconds() / 86400.0
+
+
+def preprocess_pet(parameters, timeseries, timestep_daily_fraction):
+    """Return pet of each timestep, from the input timeseries if it exists,
+    otherwise calculated with the hamon method.
+
+    :return pet: The pet of each timestep.
+    :rtype: numpy.ndarray
+    """
+    if "pet" in timeseries.columns:
+        return timeseries["pet"].to_numpy() * timestep_daily_fraction
+
+    pet = hydrocalcs.pet(
+        dates=timeseries.index.to_pydatetime(),
+        temperatures=timeseries["temperature"].to_numpy(),
+        latitude=parameters["latitude"]["value"],
+        method="hamon"
+    )
+
+    return pet * timestep_daily_fraction
+
+
+def preprocess_snowmelt(parameters, timeseries, timestep_daily_fraction,
+                        snowpack_initial=0):
+    """Return the adjusted precipitation from the snowmelt routine.
+
+    Note: snowmelt function needs temperatures in Fahrenheit
+
+    :param snowpack_initial: Snowpack at the start of the timeseries, in
+                             millimeters.
+    :type snowpack_initial: float
+    :return snowmelt_data: Tuple of the snowprecip, snowmelt, and snowpack.
+    :rtype: tuple
+    """
+    return hydrocalcs.snowmelt(
+        timeseries["precipitation"].to_numpy(),
+        timeseries["temperature"].to_numpy() * (9/5) + 32,
+        parameters["snowmelt_temperature_cutoff"]["value"],
+        parameters["snowmelt_rate_coeff_with_rain"]["value"],
+        parameters["snowmelt_rate_coeff"]["value"],
+        timestep_daily_fraction,
+        snowpack_initial=snowpack_initial
+    )
+
+
+def get_preprocessed_data(timeseries, twi, timestep_daily_fraction, pet,
+                          snowmelt_data=None):
+    """Return a dict of the preprocessed data for a Topmodel run, see
+    preprocess().
+
+    :param snowmelt_data: Optional tuple of the snowprecip, snowmelt, and
+                          snowpack, see preprocess_snowmelt().
+    :type snowmelt_data: tuple
+    :return preprocessed_data: A dict of the calculated variables from
+                               preprocessing.
+    :rtype: dict
+    """
+    # Calculate the difference between the adjusted precip (snowprecip)
+    # and pet, or between the original precip and pet without snowmelt
+    snowprecip, snowmelt, snowpack = snowmelt_data or (None, None, None)
+    if snowmelt_data is not None:
         precip_minus_pet = snowprecip - pet
     else:
-        # Calculate the difference between the original precip and pet
         precip_minus_pet = timeseries["precipitation"].to_numpy() - pet
 
     # Calculate the twi weighted mean
@@ -147,7 +414,482 @@ def preprocess(config_data, parameters, timeseries, twi):
     return preprocessed_data
 
 
-def run_topmodel(parameters, twi, preprocessed_data):
+def run_ensemble(config_data, parameters, parameter_sets, timeseries, twi):
+    """Preprocess data, run Topmodel for all parameter sets at once with
+    TopmodelBatch, and write the predicted flow of each parameter set.
+
+    :param config_data: A ConfigParser object that behaves much like a
+                        dictionary.
+    :type config_data: ConfigParser
+    :param parameters: The parameters for the model.
+    :type parameters: dict
+    :param parameter_sets: A dataframe of parameter sets.
+    :type parameter_sets: pandas.DataFrame
+    :param timeseries: A dataframe of all the timeseries data.
+    :type timeseries: pandas.DataFrame
+    :param twi: A dataframe of all the twi data.
+    :type twi: pandas.DataFrame
+    """
+    with instrument.stage("preprocess"):
+        preprocessed_data = preprocess_ensemble(config_data,
+                                                parameters,
+                                                parameter_sets,
+                                                timeseries,
+                                                twi)
+    with instrument.stage("run"):
+        topmodel_data = run_topmodel_ensemble(parameter_sets,
+                                              twi,
+                                              preprocessed_data)
+    with instrument.stage("postprocess"):
+        write_output_ensemble(config_data,
+                              timeseries,
+                              parameter_sets,
+                              topmodel_data)
+
+
+def preprocess_ensemble(config_data, parameters, parameter_sets, timeseries,
+                        twi):
+    """Preprocess data for an ensemble run.
+
+    Preprocessing is the same as preprocess(), but only depends on the
+    latitude and the snowmelt parameters, so it is done once for each unique
+    combination of those parameters rather than once for each parameter set.
+
+    :return preprocessed_data: A dict of the calculated variables from
+                               preprocessing, where precip_minus_pet is of
+                               size len(timeseries) x len(parameter_sets).
+    :rtype: dict
+    """
+    names = [
+        "latitude",
+        "snowmelt_temperature_cutoff",
+        "snowmelt_rate_coeff_with_rain",
+        "snowmelt_rate_coeff",
+    ]
+    precip_minus_pet = utils.nans((len(timeseries), len(parameter_sets)))
+    groups = parameter_sets.groupby(names, sort=False).groups
+    for members in groups.values():
+        preprocessed_data = preprocess(
+            config_data,
+            parametersfile.get_parameter_set(parameters,
+                                             parameter_sets,
+                                             members[0]),
+            timeseries,
+            twi
+        )
+        columns = parameter_sets.index.get_indexer(members)
+        precip_minus_pet[:, columns] = (
+            preprocessed_data["precip_minus_pet"][:, None]
+        )
+
+    preprocessed_data["precip_minus_pet"] = precip_minus_pet
+    for name in ["pet", "snowprecip", "snowmelt", "snowpack"]:
+        preprocessed_data[name] = None
+
+    return preprocessed_data
+
+
+def run_topmodel_ensemble(parameter_sets, twi, preprocessed_data):
+    """Run TopmodelBatch for all parameter sets.
+
+    :param parameter_sets: A dataframe of parameter sets.
+    :type parameter_sets: pandas.DataFrame
+    :param twi: A dataframe of all the twi data.
+    :type twi: pandas.DataFrame
+    :param preprocessed_data: A dict from preprocess_ensemble().
+    :type: dict
+    :return topmodel_data: A dict of the flow predicted and the saturation
+                           deficit averages, each of size len(timeseries) x
+                           len(parameter_sets).
+    :rtype: dict
+    """
+    topmodel = TopmodelBatch(
+        scaling_parameter=parameter_sets["scaling_parameter"].to_numpy(),
+        saturated_hydraulic_conductivity=(
+            parameter_sets["saturated_hydraulic_conductivity"].to_numpy()
+        ),
+        macropore_fraction=parameter_sets["macropore_fraction"].to_numpy(),
+        soil_depth_total=parameter_sets["soil_depth_total"].to_numpy(),
+        soil_depth_ab_horizon=(
+            parameter_sets["soil_depth_ab_horizon"].to_numpy()
+        ),
+        field_capacity_fraction=(
+            parameter_sets["field_capacity_fraction"].to_numpy()
+        ),
+        latitude=parameter_sets["latitude"].to_numpy(),
+        basin_area_total=parameter_sets["basin_area_total"].to_numpy(),
+        impervious_area_fraction=(
+            parameter_sets["impervious_area_fraction"].to_numpy()
+        ),
+        flow_initial=parameter_sets["flow_initial"].to_numpy(),
+        twi_values=twi["twi"].to_numpy(),
+        twi_saturated_areas=twi["proportion"].to_numpy(),
+        twi_mean=preprocessed_data["twi_weighted_mean"],
+        precip_available=preprocessed_data["precip_minus_pet"],
+        timestep_daily_fraction=preprocessed_data["timestep_daily_fraction"],
+    )
+    topmodel.run()
+
+    topmodel_data = {
+        "flow_predicted": topmodel.flow_predicted,
+        "saturation_deficit_avgs": topmodel.saturation_deficit_avgs,
+    }
+
+    return topmodel_data
+
+
+def write_output_ensemble(config_data, timeseries, parameter_sets,
+                          topmodel_data):
+    """Write the flow predicted of each parameter set to a csv file with one
+    column per member.
+    """
+    df = pd.DataFrame(
+        topmodel_data["flow_predicted"],
+        index=timeseries.index,
+        columns=["flow_predicted_{}".format(member)
+                 for member in parameter_sets.index],
+    )
+    write_output_csv(df=df,
+                     filename=PurePath(
+                         config_data["Outputs"]["output_dir"],
+                         config_data["Outputs"].get(
+                             "output_filename_ensemble",
+                             "output_ensemble.csv")),
+                     compression=get_output_compression(config_data))
+
+
+def forecast(configfile, options):
+    """Read inputs, run Topmodel on the historical timeseries, and run a
+    forecast of each scenario timeseries from the state at the end of the
+    historical timeseries, see run_forecast(), and write the forecast
+    percentile bands and members to *.csv files.
+
+    :param configfile: The file path to the model config file.
+    :type configfile: string
+    :param options: The options sent from the cli
+    :type options: Click.obj
+    :return forecast_data: A dict from run_forecast().
+    :rtype: dict
+    """
+    config_data = modelconfigfile.read(configfile)
+    scenarios_file = getattr(options, "scenarios", None)
+    if scenarios_file:
+        config_data["Inputs"]["forecast_timeseries_file"] = scenarios_file
+
+    parameters, timeseries, twi = read_input_files(config_data)
+    scenarios = read_forecast_timeseries(config_data)
+    forecast_data = run_forecast(config_data,
+                                 parameters,
+                                 timeseries,
+                                 twi,
+                                 scenarios)
+    write_output_forecast(config_data, forecast_data)
+
+    return forecast_data
+
+
+def read_forecast_timeseries(config_data):
+    """Read the scenario timeseries files of a forecast, such as one file
+    of each weather trace.
+
+    :param config_data: A ConfigParser object that behaves much like a
+                        dictionary.
+    :type config_data: ConfigParser
+    :return scenarios: A dict of the timeseries dataframe of each scenario,
+                       keyed by the file name without the suffix.
+    :rtype: dict
+    """
+    value = config_data["Inputs"].get("forecast_timeseries_file", "").strip()
+    filepaths = modelconfigfile.get_filepaths(value)
+    if not filepaths:
+        raise ValueError(
+            "No forecast timeseries files: set forecast_timeseries_file of "
+            "the model config file to a file, a list of files, or a glob "
+            "pattern such as traces/trace_*.csv"
+        )
+
+    date_format = (
+        config_data["Inputs"].get("timeseries_date_format", "").strip() or None
+    )
+    scenarios = {}
+    for filepath in filepaths:
+        timeseries = timeseriesfile.read(filepath, date_format=date_format)
+        if timeseries is None:
+            raise ValueError(
+                "Invalid forecast timeseries file: {}".format(filepath)
+            )
+        scenarios[PurePath(filepath).stem] = timeseries
+
+    return scenarios
+
+
+def get_forecast_percentiles(config_data):
+    """Return the percentiles of the forecast bands, defaults to 5, 25, 50,
+    75, 95."""
+    value = config_data["Options"].get("option_forecast_percentiles",
+                                       "5, 25, 50, 75, 95")
+
+    return [float(item) for item in value.split(",") if item.strip()]
+
+
+def run_forecast(config_data, parameters, timeseries, twi, scenarios):
+    """Run Topmodel on the historical timeseries once, then run all the
+    scenario timeseries as one TopmodelBatch from the model state, and
+    snowpack, at the end of the historical timeseries.
+
+    Each scenario must start one timestep after the historical timeseries
+    ends, and all scenarios must have the same dates.
+
+    :param config_data: A ConfigParser object that behaves much like a
+                        dictionary.
+    :type config_data: ConfigParser
+    :param parameters: The parameters for the model.
+    :type parameters: dict
+    :param timeseries: A dataframe of the historical timeseries data.
+    :type timeseries: pandas.DataFrame
+    :param twi: A dataframe of all the twi data.
+    :type twi: pandas.DataFrame
+    :param scenarios: A dict of the timeseries dataframe of each scenario,
+                      such as from read_forecast_timeseries().
+    :type scenarios: dict
+    :return forecast_data: A dict of the flow predicted of the historical
+                           timeseries, the state at the end of the
+                           historical timeseries, the flow predicted of
+                           each scenario as a dataframe with a column per
+                           scenario, and the percentile bands of the flow
+                           predicted, see get_forecast_bands().
+    :rtype: dict
+    """
+    if not scenarios:
+        raise ValueError("No forecast scenarios")
+    dates = None
+    for name, scenario in scenarios.items():
+        timeseriesfile.check_continuity(timeseries, scenario, name)
+        if dates is not None and not scenario.index.equals(dates):
+            raise ValueError(
+                "Invalid forecast scenario: {}\n"
+                "All scenarios must have the same dates".format(name)
+            )
+        dates = scenario.index
+
+    # Spin up the model on the historical timeseries
+    with instrument.stage("history"):
+        preprocessed_data = preprocess(config_data, parameters, timeseries,
+                                       twi)
+        topmodel = create_topmodel(parameters, twi, preprocessed_data)
+        topmodel.run()
+        state = topmodel.get_state()
+        snowpack_initial = (
+            preprocessed_data["snowpack"][-1]
+            if preprocessed_data["snowpack"] is not None else 0
+        )
+        state["snowpack"] = snowpack_initial
+
+    # Precip minus pet of each scenario, from the snowpack at the end of the
+    # historical timeseries
+    with instrument.stage("preprocess"):
+        timestep_daily_fraction = preprocessed_data["timestep_daily_fraction"]
+        precip_minus_pet = utils.nans((len(dates), len(scenarios)))
+        for column, scenario in enumerate(scenarios.values()):
+            pet = preprocess_pet(parameters, scenario, timestep_daily_fraction)
+            if config_data["Options"].getboolean("option_snowmelt"):
+                snowprecip, _, _ = preprocess_snowmelt(
+                    parameters,
+                    scenario,
+                    timestep_daily_fraction,
+                    snowpack_initial=snowpack_initial
+                )
+            else:
+                snowprecip = scenario["precipitation"].to_numpy()
+            precip_minus_pet[:, column] = snowprecip - pet
+
+    with instrument.stage("run"):
+        values = {name: parameters[name]["value"] for name in [
+            "scaling_parameter",
+            "saturated_hydraulic_conductivity",
+            "macropore_fraction",
+            "soil_depth_total",
+            "soil_depth_ab_horizon",
+            "field_capacity_fraction",
+            "latitude",
+            "basin_area_total",
+            "impervious_area_fraction",
+            "flow_initial",
+        ]}
+        topmodel_batch = TopmodelBatch(
+            twi_values=twi["twi"].to_numpy(),
+            twi_saturated_areas=twi["proportion"].to_numpy(),
+            twi_mean=preprocessed_data["twi_weighted_mean"],
+            precip_available=precip_minus_pet,
+            timestep_daily_fraction=timestep_daily_fraction,
+            initial_state=state,
+            **values
+        )
+        topmodel_batch.run()
+
+    flows = pd.DataFrame(topmodel_batch.flow_predicted,
+                         index=dates,
+                         columns=list(scenarios))
+
+    forecast_data = {
+        "history_flow_predicted": pd.Series(topmodel.flow_predicted,
+                                            index=timeseries.index,
+                                            name="flow_predicted"),
+        "state": state,
+        "flow_predicted": flows,
+        "bands": get_forecast_bands(flows,
+                                    get_forecast_percentiles(config_data)),
+    }
+
+    return forecast_data
+
+
+def get_forecast_bands(flows, percentiles):
+    """Return the percentile bands and the mean of the flow predicted of the
+    scenarios of each timestep.
+
+    :param flows: A dataframe of the flow predicted with a column per
+                  scenario.
+    :type flows: pandas.DataFrame
+    :param percentiles: The percentiles, from 0 to 100.
+    :type percentiles: list
+    :return bands: A dataframe with a column per percentile, such as p5 and
+                   p50, and a mean column.
+    :rtype: pandas.DataFrame
+    """
+    values = np.percentile(flows.to_numpy(), percentiles, axis=1).T
+    bands = pd.DataFrame(values,
+                         index=flows.index,
+                         columns=["p{:g}".format(percentile)
+                                  for percentile in percentiles])
+    bands["mean"] = flows.mean(axis=1)
+
+    return bands
+
+
+def write_output_forecast(config_data, forecast_data):
+    """Write the percentile bands and the flow predicted of each scenario of
+    a forecast to *.csv files."""
+    compression = get_output_compression(config_data)
+    with instrument.stage("postprocess"):
+        write_output_csv(df=forecast_data["bands"],
+                         filename=PurePath(
+                             config_data["Outputs"]["output_dir"],
+                             config_data["Outputs"].get(
+                                 "output_filename_forecast",
+                                 "output_forecast.csv")),
+                         compression=compression)
+        write_output_csv(df=forecast_data["flow_predicted"],
+                         filename=PurePath(
+                             config_data["Outputs"]["output_dir"],
+                             config_data["Outputs"].get(
+                                 "output_filename_forecast_members",
+                                 "output_forecast_members.csv")),
+                         compression=compression)
+
+
+def create_output_matrices(config_data, timeseries, twi):
+    """Create memory-mapped output matrices for Topmodel to write into.
+
+    Returns None, and Topmodel allocates the output matrices in memory,
+    unless the output matrices are written in the *.npy format.
+
+    :param config: A ConfigParser object that behaves much like a dictionary.
+    :type config: ConfigParser
+    :param timeseries: A dataframe of all the timeseries data.
+    :type timeseries: Pandas.DataFrame
+    :param twi: A dataframe of all the twi data.
+    :type twi: Pandas.DataFrame
+    :return output_matrices: A dict of matrix names and numpy memmaps
+    :rtype: dict
+    """
+    if not (config_data["Options"].getboolean("option_write_output_matrices")
+            and get_output_format(config_data) == "csv"
+            and get_output_matrices_format(config_data) == "npy"):
+        return None
+
+    filepaths = get_output_matrices_filepaths(config_data, suffix=".npy")
+    output_matrices = matrixfile.create(
+        filepath=PurePath(
+            config_data["Outputs"]["output_dir"],
+            config_data["Outputs"].get("output_filename_matrices_metadata",
+                                       "output_matrices.json")
+        ),
+        filepaths=filepaths,
+        dates=timeseries.index,
+        bins=twi["bin"].to_numpy(),
+    )
+
+    return output_matrices
+
+
+def create_temporary_matrices(config_data, timeseries, twi):
+    """Create the output matrices in temporary files of the output
+    directory, see matrixfile.create_temporary(), for a streamed model run
+    whose matrices are not written as *.npy files.
+
+    :return output_matrices: A dict of matrix names and numpy memmaps
+    :rtype: dict
+    """
+    return matrixfile.create_temporary(
+        names=["saturation_deficit_locals",
+               "unsaturated_zone_storages",
+               "root_zone_storages"],
+        shape=(len(timeseries), len(twi)),
+        directory=config_data["Outputs"]["output_dir"]
+    )
+
+
+def get_output_format(config_data):
+    """Return the format of the output files, csv or hdf5."""
+    return (
+        config_data["Outputs"].get("output_format", "csv").lower().strip()
+    )
+
+
+def is_streamed_output(config_data):
+    """Return True if output csv files are streamed while Topmodel runs."""
+    return (
+        get_output_format(config_data) == "csv"
+        and config_data["Options"].getboolean("option_stream_output",
+                                              fallback=False)
+    )
+
+
+def get_output_matrices_format(config_data):
+    """Return the file format of the output matrices, csv or npy."""
+    return (
+        config_data["Options"].get("option_output_matrices_format", "csv")
+        .lower().strip()
+    )
+
+
+def get_output_matrices_filepaths(config_data, suffix=None):
+    """Return a dict of the output matrix names and file paths.
+
+    :param config: A ConfigParser object that behaves much like a dictionary.
+    :type config: ConfigParser
+    :param suffix: Optional file suffix to replace the configured suffix.
+    :type suffix: string
+    :return filepaths: A dict of matrix names and file paths
+    :rtype: dict
+    """
+    filepaths = {}
+    for name in ["saturation_deficit_locals",
+                 "unsaturated_zone_storages",
+                 "root_zone_storages"]:
+        filepath = PurePath(
+            config_data["Outputs"]["output_dir"],
+            config_data["Outputs"]["output_filename_{}".format(name)]
+        )
+        if suffix:
+            filepath = filepath.with_suffix(suffix)
+        filepaths[name] = filepath
+
+    return filepaths
+
+
+def run_topmodel(parameters, twi, preprocessed_data, output_matrices=None):
     """Run Topmodel.
 
     :param parameters: The parameters for the model.
@@ -157,10 +899,136 @@ def run_topmodel(parameters, twi, preprocessed_data):
     :param preprocessed_data: A dict of the calculated variables from
                               preprocessing.
     :type: dict
+    :param output_matrices: Optional dict of preallocated matrices, such as
+                            numpy memmaps, for Topmodel to write into.
+    :type: dict
+    :return topmodel_data: A dict of relevant data results from Topmodel
+    :rtype: dict
+    """
+    topmodel = create_topmodel(parameters,
+                               twi,
+                               preprocessed_data,
+                               output_matrices)
+
+    # Run Topmodel
+    topmodel.run()
+
+    return get_topmodel_data(topmodel)
+
+
+def run_topmodel_streaming(config_data,
+                           parameters,
+                           timeseries,
+                           twi,
+                           preprocessed_data,
+                           output_matrices=None):
+    """Run Topmodel in chunks of timesteps and write the output rows of each
+    chunk as soon as it is calculated.
+
+    Output rows are written to the output file, and to the output matrices
+    files if output matrices are written in the *.csv format, using the same
+    column names and headers as postprocess(). The chunk size is set by
+    option_stream_chunksize.
+
+    Memory is then bounded by the chunk size for the output rows and
+    matrices, if the output matrices are memmaps, see compute_model(), but
+    the one value per timestep arrays of the timeseries, the preprocessed
+    data, and the flows are still held in memory.
+
+    :param config: A ConfigParser object that behaves much like a dictionary.
+    :type config: ConfigParser
+    :param parameters: The parameters for the model.
+    :type parameters: Dict
+    :param timeseries: A dataframe of all the timeseries data.
+    :type timeseries: Pandas.DataFrame
+    :param twi: A dataframe of all the twi data.
+    :type twi: Pandas.DataFrame
+    :param preprocessed_data: A dict of the calculated variables from
+                              preprocessing.
+    :type: dict
+    :param output_matrices: Optional dict of preallocated matrices, such as
+                            numpy memmaps, for Topmodel to write into.
+    :type: dict
     :return topmodel_data: A dict of relevant data results from Topmodel
     :rtype: dict
     """
-    # Initialize Topmodel
+    topmodel = create_topmodel(parameters,
+                               twi,
+                               preprocessed_data,
+                               output_matrices)
+    topmodel_data = get_topmodel_data(topmodel)
+
+    chunksize = config_data["Options"].getint("option_stream_chunksize",
+                                              fallback=1000)
+    compression = get_output_compression(config_data)
+    date_format = outputfile.get_date_format(timeseries.index)
+    columns = get_output_dataframe(
+        *slice_data(timeseries, preprocessed_data, topmodel_data, 0, 0)
+    ).columns
+
+    with ExitStack() as stack:
+        output_writer = stack.enter_context(
+            outputfile.StreamWriter(
+                filepath=PurePath(config_data["Outputs"]["output_dir"],
+                                  config_data["Outputs"]["output_filename"]),
+                columns=columns,
+                index_label=timeseries.index.name,
+                date_format=date_format,
+                compression=compression)
+        )
+
+        matrices_writers = {}
+        if (config_data["Options"].getboolean("option_write_output_matrices")
+                and get_output_matrices_format(config_data) == "csv"):
+            header = get_output_matrices_header(topmodel.num_twi_increments)
+            filepaths = get_output_matrices_filepaths(config_data)
+            for name, filepath in filepaths.items():
+                matrices_writers[name] = stack.enter_context(
+                    outputfile.StreamWriter(
+                        filepath=filepath,
+                        columns=header,
+                        index_label=timeseries.index.name,
+                        date_format=date_format,
+                        compression=compression)
+                )
+
+        for start, stop in topmodel.run_chunks(chunksize):
+            timeseries_chunk, preprocessed_chunk, topmodel_chunk = (
+                slice_data(timeseries,
+                           preprocessed_data,
+                           topmodel_data,
+                           start,
+                           stop)
+            )
+            output_writer.write(
+                index=timeseries_chunk.index,
+                values=get_output_dataframe(timeseries_chunk,
+                                            preprocessed_chunk,
+                                            topmodel_chunk)
+            )
+            for name, writer in matrices_writers.items():
+                writer.write(index=timeseries_chunk.index,
+                             values=topmodel_chunk[name])
+
+    return topmodel_data
+
+
+def create_topmodel(parameters, twi, preprocessed_data, output_matrices=None):
+    """Initialize Topmodel.
+
+    :param parameters: The parameters for the model.
+    :type parameters: Dict
+    :param twi: A dataframe of all the twi data.
+    :type twi: Pandas.DataFrame
+    :param preprocessed_data: A dict of the calculated variables from
+                              preprocessing.
+    :type: dict
+    :param output_matrices: Optional dict of preallocated matrices, such as
+                            numpy memmaps, for Topmodel to write into.
+    :type: dict
+    :return topmodel: An initialized Topmodel
+    :rtype: Topmodel
+    """
     topmodel = Topmodel(
         scaling_parameter=parameters["scaling_parameter"]["value"],
         saturated_hydraulic_conductivity=(
@@ -178,13 +1046,21 @@ def run_topmodel(parameters, twi, preprocessed_data):
         twi_saturated_areas=twi["proportion"].to_numpy(),
         twi_mean=preprocessed_data["twi_weighted_mean"],
         precip_available=preprocessed_data["precip_minus_pet"],
-        timestep_daily_fraction=preprocessed_data["timestep_daily_fraction"]
+        timestep_daily_fraction=preprocessed_data["timestep_daily_fraction"],
+        **(output_matrices or {})
     )
 
-    # Run Topmodel
-    topmodel.run()
+    return topmodel
+
 
-    # Return a dict of relevant calculated values
+def get_topmodel_data(topmodel):
+    """Return a dict of relevant calculated values from Topmodel.
+
+    :param topmodel: A Topmodel
+    :type topmodel: Topmodel
+    :return topmodel_data: A dict of relevant data results from Topmodel
+    :rtype: dict
+    """
     topmodel_data = {
         "flow_predicted": topmodel.flow_predicted,
         "saturation_deficit_avgs": topmodel.saturation_deficit_avgs,
@@ -196,41 +1072,108 @@ def run_topmodel(parameters, twi, preprocessed_data):
     return topmodel_data
 
 
-def postprocess(config_data, timeseries, preprocessed_data, topmodel_data):
+def slice_data(timeseries, preprocessed_data, topmodel_data, start, stop):
+    """Return a tuple of the timeseries, preprocessed data, and Topmodel
+    data for the rows between the start and stop timestep indices.
+    """
+    timeseries_chunk = timeseries.iloc[start:stop]
+
+    preprocessed_chunk = {}
+    for key, value in preprocessed_data.items():
+        if hasattr(value, "__len__") and len(value) == len(timeseries):
+            value = value[start:stop]
+        preprocessed_chunk[key] = value
+
+    topmodel_chunk = {
+        key: value[start:stop] for key, value in topmodel_data.items()
+    }
+
+    return timeseries_chunk, preprocessed_chunk, topmodel_chunk
+
+
+def postprocess(config_data,
+                timeseries,
+                preprocessed_data,
+                topmodel_data,
+                parameters,
+                twi):
     """Postprocess data for output.
 
-    Output csv files
+    Output csv files, or a single HDF5 file
     Plot timseries
-    """
-    # Get output timeseries data
-    output_df = get_output_dataframe(timeseries,
-                                     preprocessed_data,
-                                     topmodel_data)
-
-    # Get output comparison stats
-    output_comparison_data = get_comparison_data(output_df)
 
-    # Write output data
-    write_output_csv(df=output_df,
-                     filename=PurePath(
-                         config_data["Outputs"]["output_dir"],
-                         config_data["Outputs"]["output_filename"]))
+    When the output is streamed, the output csv files are already written,
+    and the full output dataframe is only built for the plots and the html
+    report, so a streamed run without plots does not build it.
+    """
+    # Get output timeseries data and comparison stats, unless not needed
+    output_df = None
+    if not is_streamed_output(config_data) or is_plotted_output(config_data):
+        output_df = get_output_dataframe(timeseries,
+                                         preprocessed_data,
+                                         topmodel_data)
+        output_comparison_data = get_comparison_data(output_df)
+
+    # Write output data, unless already streamed while Topmodel ran
+    write_matrices = (
+        config_data["Options"].getboolean("option_write_output_matrices")
+    )
+    compression = get_output_compression(config_data)
+    if get_output_format(config_data) == "hdf5":
+        write_output_hdf5(config_data,
+                          output_df,
+                          topmodel_data if write_matrices else None,
+                          parameters,
+                          twi)
+    elif not is_streamed_output(config_data):
+        write_output_csv(df=output_df,
+                         filename=PurePath(
+                             config_data["Outputs"]["output_dir"],
+                             config_data["Outputs"]["output_filename"]),
+                         compression=compression)
 
     # Write output data matrices
-    if config_data["Options"].getboolean("option_write_output_matrices"):
-        write_output_matrices_csv(config_data, timeseries, topmodel_data)
+    if write_matrices and get_output_format(config_data) == "csv":
+        if get_output_matrices_format(config_data) == "npy":
+            write_output_matrices_npy(topmodel_data)
+        elif not is_streamed_output(config_data):
+            write_output_matrices_csv(config_data,
+                                      timeseries,
+                                      topmodel_data,
+                                      compression=compression)
+
+    # Write saturation deficit maps of the selected timesteps
+    with instrument.stage("saturation_maps"):
+        write_output_saturation_maps(config_data,
+                                     timeseries,
+                                     topmodel_data,
+                                     twi)
+
+    if not is_plotted_output(config_data):
+        return
 
     # Plot output data
-    plot_output_data(df=output_df,
-                     comparison_data=output_comparison_data,
-                     path=config_data["Outputs"]["output_dir"])
+    with instrument.stage("plots"):
+        plot_output_data(df=output_df,
+                         comparison_data=output_comparison_data,
+                         path=config_data["Outputs"]["output_dir"],
+                         jobs=get_plot_jobs(config_data))
 
     # Write report of output data
-    write_output_report(df=output_df,
-                        comparison_data=output_comparison_data,
-                        filename=PurePath(
-                            config_data["Outputs"]["output_dir"],
-                            config_data["Outputs"]["output_report"]))
+    report_data = config_data["Outputs"].get("output_report_data", "").strip()
+    with instrument.stage("report"):
+        write_output_report(df=output_df,
+                            comparison_data=output_comparison_data,
+                            filename=PurePath(
+                                config_data["Outputs"]["output_dir"],
+                                config_data["Outputs"]["output_report"]),
+                            max_points=get_report_max_points(config_data),
+                            compression=get_report_compression(config_data),
+                            data_filename=(
+                                PurePath(config_data["Outputs"]["output_dir"],
+                                         report_data)
+                                if report_data else None
+                            ))
 
 
 def get_output_dataframe(timeseries, preprocessed_data, topmodel_data):
@@ -282,7 +1225,20 @@ def get_comparison_data(output_df):
     return output_comparison_data
 
 
-def write_output_csv(df, filename):
+def get_output_compression(config_data):
+    """Return the compression of output csv files, none | gzip | zstd."""
+    return (
+        config_data["Options"].get("option_output_compression", "none")
+        .lower().strip()
+    )
+
+
+def get_output_matrices_header(num_twi_bins):
+    """Return the header of the output matrices, one column per twi bin."""
+    return ["bin_{}".format(i) for i in range(1, num_twi_bins+1)]
+
+
+def write_output_csv(df, filename, compression="none"):
     """Write output timeseries to csv file.
 
     Creating a pandas Dataframe to ease of saving a csv.
@@ -297,11 +1253,17 @@ def write_output_csv(df, filename):
         "saturation_deficit_avgs": "saturation_deficit_avgs (mm/day)",
         "snowprecip": "snowprecip (mm/day)",
     }
-    df.to_csv(filename,
-              float_format="%.2f")
+    filename = outputfile.get_filepath(filename, compression)
+    with instrument.stage("csv:{}".format(PurePath(filename).name)), \
+            outputfile.open_file(filename, compression) as f:
+        df.to_csv(f,
+                  float_format="%.2f")
 
 
-def write_output_matrices_csv(config_data, timeseries, topmodel_data):
+def write_output_matrices_csv(config_data,
+                              timeseries,
+                              topmodel_data,
+                              compression="none"):
     """Write output matrices.
 
     Matrices are of size: len(timeseries) x len(twi_bins)
@@ -312,57 +1274,198 @@ def write_output_matrices_csv(config_data, timeseries, topmodel_data):
          root_zone_storages
     """
     num_cols = topmodel_data["saturation_deficit_locals"].shape[1]
-    header = ["bin_{}".format(i) for i in range(1, num_cols+1)]
+    header = get_output_matrices_header(num_cols)
 
-    saturation_deficit_locals_df = (
-        pd.DataFrame(topmodel_data["saturation_deficit_locals"],
-                     index=timeseries.index)
-    )
+    filepaths = get_output_matrices_filepaths(config_data)
+    for name, filepath in filepaths.items():
+        matrix_df = pd.DataFrame(topmodel_data[name], index=timeseries.index)
 
-    unsaturated_zone_storages_df = (
-        pd.DataFrame(topmodel_data["unsaturated_zone_storages"],
-                     index=timeseries.index)
-    )
+        filename = outputfile.get_filepath(filepath, compression)
+        with instrument.stage("csv:{}".format(PurePath(filename).name)), \
+                outputfile.open_file(filename, compression) as f:
+            matrix_df.to_csv(f,
+                             float_format="%.2f",
+                             header=header)
 
-    root_zone_storages_df = (
-        pd.DataFrame(topmodel_data["root_zone_storages"],
-                     index=timeseries.index)
-    )
 
-    saturation_deficit_locals_df.to_csv(
-        PurePath(
-            config_data["Outputs"]["output_dir"],
-            config_data["Outputs"]["output_filename_saturation_deficit_locals"]
-        ),
-        float_format="%.2f",
-        header=header,
-    )
+def write_output_matrices_npy(topmodel_data):
+    """Write output matrices.
 
-    unsaturated_zone_storages_df.to_csv(
-        PurePath(
-            config_data["Outputs"]["output_dir"],
-            config_data["Outputs"]["output_filename_unsaturated_zone_storages"]
-        ),
-        float_format="%.2f",
-        header=header,
+    Topmodel writes directly into the memory-mapped *.npy files created by
+    create_output_matrices(), so only flush the matrices to disk.
+    """
+    with instrument.stage("npy:flush"):
+        matrixfile.flush({
+            "saturation_deficit_locals": (
+                topmodel_data["saturation_deficit_locals"]
+            ),
+            "unsaturated_zone_storages": (
+                topmodel_data["unsaturated_zone_storages"]
+            ),
+            "root_zone_storages": topmodel_data["root_zone_storages"],
+        })
+
+
+def write_output_hdf5(config_data, output_df, topmodel_data, parameters, twi):
+    """Write all outputs in a single HDF5 file.
+
+    The file contains the output timeseries, the output matrices if
+    topmodel_data is not None, and the run metadata of the parameters,
+    the model configuration and the twi data.
+    """
+    matrices = None
+    if topmodel_data is not None:
+        matrices = {
+            name: topmodel_data[name] for name in ["saturation_deficit_locals",
+                                                   "unsaturated_zone_storages",
+                                                   "root_zone_storages"]
+        }
+
+    filepath = PurePath(
+        config_data["Outputs"]["output_dir"],
+        config_data["Outputs"].get("output_filename_hdf5", "output.h5")
     )
+    with instrument.stage("hdf5:{}".format(filepath.name)):
+        hdf5file.write(
+            filepath=filepath,
+            output_df=output_df,
+            matrices=matrices,
+            bins=twi["bin"].to_numpy(),
+            parameters=parameters,
+            config_data=config_data,
+            twi=twi,
+        )
 
-    root_zone_storages_df.to_csv(
-        PurePath(
-            config_data["Outputs"]["output_dir"],
-            config_data["Outputs"]["output_filename_root_zone_storages"]
-        ),
-        float_format="%.2f",
-        header=header,
+
+def get_saturation_maps_indices(config_data, timeseries):
+    """Return the timestep indices of the saturation maps from the dates of
+    the option_saturation_maps_dates option.
+
+    The option is empty for no maps, all for a map of every timestep, or a
+    list of dates separated by commas or new lines.
+
+    :return indices: The timestep indices.
+    :rtype: list
+    """
+    value = (
+        config_data["Options"].get("option_saturation_maps_dates", "").strip()
     )
+    if not value:
+        return []
+    if value.lower() == "all":
+        return list(range(len(timeseries)))
+
+    dates = pd.to_datetime([item.strip()
+                            for item in value.replace("\n", ",").split(",")
+                            if item.strip()])
+    indices = timeseries.index.get_indexer(dates)
+    if (indices < 0).any():
+        raise ValueError(
+            "Invalid saturation maps dates: {}\n"
+            "Dates must be in the timeseries".format(
+                [str(date.date()) for date in dates[indices < 0]])
+        )
+
+    return list(indices)
+
+
+def write_output_saturation_maps(config_data, timeseries, topmodel_data, twi):
+    """Write maps of the saturation deficit of each cell for the selected
+    timesteps, if the model configuration has a twi bin raster file.
+
+    Maps are written to a compressed *.npz file, or to an uncompressed
+    memory-mapped *.npy file if output_filename_saturation_maps has a *.npy
+    suffix, or to the HDF5 file when output_format = hdf5. See mapfile.
+    """
+    filepath = config_data["Inputs"].get("twi_bin_raster_file", "").strip()
+    indices = get_saturation_maps_indices(config_data, timeseries)
+    if not filepath or not indices:
+        return
+
+    bin_raster = mapfile.read_bin_raster(filepath)
+    bins = twi["bin"].to_numpy()
+    mapfile.check_bin_raster(bin_raster, bins)
+
+    output_dir = config_data["Outputs"]["output_dir"]
+    if get_output_format(config_data) == "hdf5":
+        hdf5file.write_maps(
+            filepath=PurePath(
+                output_dir,
+                config_data["Outputs"].get("output_filename_hdf5",
+                                           "output.h5")
+            ),
+            bin_raster=bin_raster,
+            bins=bins,
+            matrix=topmodel_data["saturation_deficit_locals"],
+            dates=timeseries.index,
+            indices=indices,
+        )
+    else:
+        mapfile.write(
+            filepath=PurePath(
+                output_dir,
+                config_data["Outputs"].get(
+                    "output_filename_saturation_maps",
+                    "output_saturation_maps.npz")
+            ),
+            metadata_filepath=PurePath(
+                output_dir,
+                config_data["Outputs"].get(
+                    "output_filename_saturation_maps_metadata",
+                    "output_saturation_maps.json")
+            ),
+            bin_raster=bin_raster,
+            bins=bins,
+            matrix=topmodel_data["saturation_deficit_locals"],
+            dates=timeseries.index,
+            indices=indices,
+        )
 
 
-def plot_output_data(df, comparison_data, path):
-    """Plot output timeseries."""
+def set_plot_options(config_data, plots=None, plot_jobs=None):
+    """Override the plot options of a model configuration, such as from the
+    cli. Options that are None are left as configured.
+
+    :param config_data: A ConfigParser object that behaves much like a
+                        dictionary.
+    :type config_data: ConfigParser
+    :param plots: Write output plots and the html report.
+    :type plots: bool
+    :param plot_jobs: Number of processes that render plots.
+    :type plot_jobs: int
+    """
+    if plots is not None:
+        config_data["Options"]["option_plots"] = "yes" if plots else "no"
+    if plot_jobs is not None:
+        config_data["Options"]["option_plot_jobs"] = str(plot_jobs)
+
+
+def is_plotted_output(config_data):
+    """Return True if output plots and the html report are written."""
+    return config_data["Options"].getboolean("option_plots", fallback=True)
+
+
+def get_plot_jobs(config_data):
+    """Return the number of processes that render plots, defaults to the
+    number of cpus."""
+    jobs = config_data["Options"].get("option_plot_jobs", "").strip()
+
+    return int(jobs) if jobs else None
+
+
+def get_plots(df, comparison_data, path):
+    """Return a list of (plot function, keyword arguments) tuples of the
+    output plots, one per output png file."""
+    # Imported here since matplotlib is slow to import and only needed
+    # when plots are written
+    from topmodelpy import plots
+
+    dates = df.index.to_pydatetime()
+    output_plots = []
     for key, series in df.iteritems():
         filename = PurePath(path, "{}.png".format(key.split(" ")[0]))
-        plots.plot_timeseries(
-            dates=df.index.to_pydatetime(),
+        output_plots.append((plots.plot_timeseries, dict(
+            dates=dates,
             values=series.values,
             mean=series.mean(),
             median=series.median(),
@@ -370,67 +1473,195 @@ def plot_output_data(df, comparison_data, path):
             max=series.max(),
             min=series.min(),
             label="{} (mm/day)".format(key),
-            filename=filename)
+            filename=filename)))
 
-    plots.plot_flow_duration_curve(
+    output_plots.append((plots.plot_flow_duration_curve, dict(
         values=df["flow_predicted"].to_numpy(),
         label="flow_predicted (mm/day)",
-        filename=PurePath(path, "flow_duration_curve.png"))
+        filename=PurePath(path, "flow_duration_curve.png"))))
 
     if "flow_observed" in df.columns:
-        plots.plot_timeseries_comparison(
-            dates=df.index.to_pydatetime(),
+        output_plots.append((plots.plot_timeseries_comparison, dict(
+            dates=dates,
             observed=df["flow_observed"].to_numpy(),
             modeled=df["flow_predicted"].to_numpy(),
             absolute_error=comparison_data["absolute_error"],
             nash_sutcliffe=comparison_data["nash_sutcliffe"],
             mean_squared_error=comparison_data["mean_squared_error"],
             label="flow (mm/day)",
-            filename=PurePath(path, "flow_observed_vs_flow_predicted.png"))
+            filename=PurePath(path, "flow_observed_vs_flow_predicted.png"))))
 
-        plots.plot_flow_duration_curve_comparison(
+        output_plots.append((plots.plot_flow_duration_curve_comparison, dict(
             observed=df["flow_observed"].to_numpy(),
             modeled=df["flow_predicted"].to_numpy(),
             label="flow (mm/day)",
-            filename=PurePath(path, "flow_duration_curved_observed_vs_predicted.png"))
-
-
-def write_output_report(df, comparison_data, filename):
-    """Write an html web page with interactive plots."""
-    plots_html_data = {}
-    for key, value in df.iteritems():
-        plots_html_data[key] = plots.plot_timeseries_html(
-            dates=df.index.to_pydatetime(),
-            values=value,
-            label="{} (mm/day)".format(key))
-
-    flow_duration_curve_data = {
-        "flow_duration_curve_html": plots.plot_flow_duration_curve_html(
-            values=df["flow_predicted"].to_numpy(),
-            label="flow_predicted (mm/day)")
-    }
+            filename=PurePath(path,
+                              "flow_duration_curved_observed_vs_predicted.png"))))
 
-    if comparison_data:
-        comparison_plot_html = plots.plot_timeseries_comparison_html(
-            dates=df.index.to_pydatetime(),
-            observed=df["flow_observed"].to_numpy(),
-            modeled=df["flow_predicted"].to_numpy(),
-            absolute_error=comparison_data["absolute_error"],
-            label="flow (mm/day)")
-        comparison_data.update({"comparison_plot_html": comparison_plot_html})
-
-        flow_duration_curve_comparison_hmtl = (
-            plots.plot_flow_duration_curve_comparison_html(
-                observed=df["flow_observed"].to_numpy(),
-                modeled=df["flow_predicted"].to_numpy(),
-                label="flow (mm/day)")
-        )
-        flow_duration_curve_data.update(
-            {"flow_duration_curve_comparison_html": flow_duration_curve_comparison_hmtl}
-        )
+    return output_plots
+
+
+def plot_output_data(df, comparison_data, path, jobs=None):
+    """Plot output timeseries.
+
+    Plots are rendered with the Agg canvas across a pool of processes.
+    The wall and cpu time of plots rendered in the pool are timed in the
+    worker processes, without their memory.
+
+    :param jobs: Maximum number of plots rendered at once, defaults to the
+                 number of cpus. With 1 job, plots are rendered in this
+                 process.
+    :type jobs: int
+    """
+    output_plots = get_plots(df, comparison_data, path)
+
+    jobs = jobs or os.cpu_count() or 1
+    jobs = min(jobs, len(output_plots))
+    if jobs == 1:
+        for plot, kwargs in output_plots:
+            with instrument.stage("png:{}".format(kwargs["filename"].name)):
+                plot(**kwargs)
+        return
+
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = [executor.submit(instrument.timed_call, plot, **kwargs)
+                   for plot, kwargs in output_plots]
+        for future, (plot, kwargs) in zip(futures, output_plots):
+            wall_seconds, cpu_seconds = future.result()
+            instrument.record("png:{}".format(kwargs["filename"].name),
+                              wall_seconds,
+                              cpu_seconds)
+
+
+def get_run_profile(config_data):
+    """Return the run profile option, no | yes | memory, where memory also
+    traces the peak memory of each stage."""
+    return (
+        config_data["Options"].get("option_run_profile", "no").lower().strip()
+    )
+
+
+def is_cached_run(config_data):
+    """Return True if the results of the stages of a model run are cached,
+    see pipeline. Model runs of a parameters table are not cached."""
+    return (
+        config_data["Options"].getboolean("option_cache", fallback=False)
+        and not config_data["Inputs"].get("parameters_table_file", "").strip()
+    )
+
+
+def get_report_max_points(config_data):
+    """Return the maximum number of points of each interactive report plot,
+    or None for all points."""
+    max_points = config_data["Options"].getint("option_report_max_points",
+                                               fallback=2000)
+
+    return max_points or None
+
+
+def get_report_compression(config_data):
+    """Return the compression of the data payload of the html report, none
+    or deflate."""
+    return (
+        config_data["Options"].get("option_report_compression", "deflate")
+        .lower().strip()
+    )
+
+
+def write_output_report(df, comparison_data, filename, max_points=None,
+                        compression="deflate", data_filename=None):
+    """Write an html web page with interactive plots.
+
+    All plots are drawn in the browser from a single data payload, see
+    report.render_report().
+
+    :param max_points: Maximum number of points of each plot, see
+                       utils.lttb(), None for all points.
+    :type max_points: int
+    :param compression: Compression of the data payload, none or deflate.
+    :type compression: string
+    :param data_filename: Optional file path to write the full resolution
+                          output data to, linked from the report.
+    :type data_filename: string
+    """
+    from topmodelpy import report
+
+    if data_filename:
+        report.save_data(df=df, filename=data_filename)
 
     report.save(df=df,
-                plots=plots_html_data,
                 comparison_data=comparison_data,
-                flow_duration_curve_data=flow_duration_curve_data,
-                filename=filename)
+                filename=filename,
+                max_points=max_points,
+                compression=compression,
+                data_filename=data_filename)
+
+
+def compute_twi_file(dem_filepath,
+                     twi_filepath,
+                     num_bins=30,
+                     bin_method="fixed",
+                     cellsize=None,
+                     nodata=None,
+                     min_slope=0.0001,
+                     tile_rows=256,
+                     twi_raster=None,
+                     bin_raster=None,
+                     work_dir=None):
+    """Compute the twi of each cell of a DEM and write the binned twi file.
+
+    :param dem_filepath: File path of the DEM, *.tif or *.npy.
+    :type dem_filepath: string
+    :param twi_filepath: File path of the twi file to write.
+    :type twi_filepath: string
+    :param num_bins: Number of twi bins.
+    :type num_bins: int
+    :param bin_method: Twi bin method, fixed or quantile, see twihistogram.
+    :type bin_method: string
+    :param cellsize: DEM cell size in meters, required for *.npy DEMs.
+    :type cellsize: float
+    :param nodata: Optional DEM nodata value.
+    :type nodata: float
+    :param min_slope: Minimum slope, tan(beta), of flats and pits.
+    :type min_slope: float
+    :param tile_rows: Number of DEM rows processed at a time.
+    :type tile_rows: int
+    :param twi_raster: Optional *.npy file path to save the twi of each cell.
+    :type twi_raster: string
+    :param bin_raster: Optional *.npy file path to save the twi bin id of
+                       each cell, for maps of the saturation deficit of each
+                       cell, see mapfile.
+    :type bin_raster: string
+    :param work_dir: Optional directory of intermediate rasters, defaults to
+                     a temporary directory.
+    :type work_dir: string
+    """
+    with demfile.read(dem_filepath, cellsize=cellsize, nodata=nodata) as dem, \
+            tempfile.TemporaryDirectory(dir=work_dir) as tmp_dir:
+        tmp_dir = Path(tmp_dir)
+        twi_raster = twi_raster or tmp_dir / "twi.npy"
+        twi_cells = np.lib.format.open_memmap(str(twi_raster),
+                                              mode="w+",
+                                              dtype=np.float32,
+                                              shape=dem.shape)
+        terrain.compute_twi(dem,
+                            twi_cells,
+                            tmp_dir,
+                            min_slope=min_slope,
+                            tile_rows=tile_rows)
+        twi_cells.flush()
+
+        bin_cells = None
+        if bin_raster:
+            bin_cells = np.lib.format.open_memmap(str(bin_raster),
+                                                  mode="w+",
+                                                  dtype=np.uint16,
+                                                  shape=dem.shape)
+
+        twi, _ = twihistogram.bin_twi(twi_cells,
+                                      num_bins=num_bins,
+                                      method=bin_method,
+                                      tile_rows=tile_rows,
+                                      bin_raster=bin_cells)
+        twifile.write(twi_filepath, twi)
+        del twi_cells, bin_cells
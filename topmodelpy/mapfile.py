@@ -0,0 +1,248 @@
+"""Module that contains functions to write and read maps of the saturation
+deficit of each cell for selected timesteps.
+
+Topmodel calculates the local saturation deficit of each twi bin. A bin
+raster of the twi bin id of each cell, 0 for nodata cells, from the twi
+command maps the saturation deficit of each bin back to the cells, where a
+saturation deficit of 0 means the cell is saturated. Each map is a gather of
+the saturation deficit of each bin by the bin raster, one strip of rows at a
+time.
+
+Maps of size len(dates) x raster rows x raster columns are saved with a
+small json sidecar file of the dates, by default to a compressed numpy zip
+file (*.npz) of one deflate compressed array per map, which is written one
+strip of rows at a time and read one map at a time, see CompressedMaps.
+A file path with a *.npy suffix saves the maps uncompressed to a
+memory-mapped numpy binary file instead, which reads any part of any map
+without decompressing it, but takes 4 bytes per cell of each map on disk.
+Maps are also written in a HDF5 file, see hdf5file.write_maps().
+"""
+
+import json
+from pathlib import Path
+import zipfile
+
+import numpy as np
+
+from .terrain import iter_strips
+
+
+class CompressedMaps:
+    """Maps of a compressed numpy zip file (*.npz), opened without loading
+    them into memory; indexing by map loads and decompresses one map.
+
+    :param filepath: File path of the maps (*.npz).
+    :type filepath: string
+    """
+    def __init__(self, filepath):
+        self.npz = np.load(str(filepath))
+        self.num_maps = len(self.npz.files)
+        if self.num_maps:
+            with self.npz.zip.open(get_map_name(0) + ".npy") as f:
+                np.lib.format.read_magic(f)
+                shape = np.lib.format.read_array_header_1_0(f)[0]
+        else:
+            shape = (0, 0)
+        self.shape = (self.num_maps,) + tuple(shape)
+
+    def __len__(self):
+        return self.num_maps
+
+    def __getitem__(self, index):
+        if not -self.num_maps <= index < self.num_maps:
+            raise IndexError("map index out of range: {}".format(index))
+        return self.npz[get_map_name(index % self.num_maps)]
+
+    def close(self):
+        self.npz.close()
+
+
+def get_map_name(index):
+    """Return the name of the array of a map in a compressed maps file."""
+    return "map_{}".format(index)
+
+
+def read_bin_raster(filepath):
+    """Open a bin raster without loading it into memory.
+
+    :param filepath: File path of the bin raster (*.npy).
+    :type filepath: string
+    :return: The bin raster.
+    :rtype: numpy.memmap
+    """
+    return np.load(str(filepath), mmap_mode="r")
+
+
+def get_lookup(bins, values):
+    """Return a lookup array of the value of each bin id, indexed by bin id,
+    with nan for bin id 0.
+
+    :param bins: The twi bin ids of the values.
+    :type bins: numpy.ndarray
+    :param values: The values of each bin, such as one row of the
+                   saturation deficit locals matrix.
+    :type values: numpy.ndarray
+    :return: The lookup array.
+    :rtype: numpy.ndarray
+    """
+    bins = np.asarray(bins, dtype=int)
+    lookup = np.full(bins.max() + 1, np.nan, dtype=np.float32)
+    lookup[bins] = values
+
+    return lookup
+
+
+def check_bin_raster(bin_raster, bins, tile_rows=256):
+    """Check that all bin ids of a bin raster are twi bin ids.
+
+    :param bin_raster: The bin raster.
+    :type bin_raster: numpy.ndarray
+    :param bins: The twi bin ids.
+    :type bins: numpy.ndarray
+    :param tile_rows: Number of rows of each strip.
+    :type tile_rows: int
+    """
+    valid = np.zeros(int(max(bins)) + 1, dtype=bool)
+    valid[np.asarray(bins, dtype=int)] = True
+    valid[0] = True
+    for start, stop in iter_strips(bin_raster.shape[0], tile_rows):
+        ids = bin_raster[start:stop]
+        if ids.max() >= len(valid) or not valid[ids].all():
+            raise ValueError(
+                "Invalid bin raster: bin ids {} are not twi bins\n"
+                "The bin raster and the twi file must be from the same twi "
+                "command".format(np.setdiff1d(ids, np.flatnonzero(valid)))
+            )
+
+
+def iter_maps(bin_raster, bins, matrix, indices, tile_rows=256):
+    """Yield strips of rows of the map of each selected timestep.
+
+    Yields a tuple of the index of the map in indices, the (start, stop) rows
+    of the strip, and an array of the strip of the map.
+
+    :param bin_raster: The bin raster.
+    :type bin_raster: numpy.ndarray
+    :param bins: The twi bin ids of the matrix columns.
+    :type bins: numpy.ndarray
+    :param matrix: Matrix of size len(timeseries) x len(twi_bins), such as
+                   the saturation deficit locals.
+    :type matrix: numpy.ndarray
+    :param indices: The timestep indices of the maps.
+    :type indices: list
+    :param tile_rows: Number of rows of each strip.
+    :type tile_rows: int
+    """
+    lookups = [get_lookup(bins, matrix[i]) for i in indices]
+    for start, stop in iter_strips(bin_raster.shape[0], tile_rows):
+        ids = np.asarray(bin_raster[start:stop])
+        for k, lookup in enumerate(lookups):
+            yield k, start, stop, lookup[ids]
+
+
+def write_compressed(filepath, bin_raster, bins, matrix, indices,
+                     tile_rows=256):
+    """Write maps of the selected timesteps to a compressed numpy zip file
+    (*.npz), streaming the strips of each map into its compressed array, so
+    at most one strip is held in memory.
+
+    :param filepath: File path of the maps (*.npz).
+    :type filepath: string
+    :param bin_raster: The bin raster.
+    :type bin_raster: numpy.ndarray
+    :param bins: The twi bin ids of the matrix columns.
+    :type bins: numpy.ndarray
+    :param matrix: Matrix of size len(timeseries) x len(twi_bins).
+    :type matrix: numpy.ndarray
+    :param indices: The timestep indices of the maps.
+    :type indices: list
+    :param tile_rows: Number of rows of each strip.
+    :type tile_rows: int
+    """
+    header = {
+        "descr": np.lib.format.dtype_to_descr(np.dtype(np.float32)),
+        "fortran_order": False,
+        "shape": tuple(bin_raster.shape),
+    }
+    with zipfile.ZipFile(str(filepath), "w",
+                         compression=zipfile.ZIP_DEFLATED) as archive:
+        for k, i in enumerate(indices):
+            with archive.open(get_map_name(k) + ".npy", "w",
+                              force_zip64=True) as f:
+                np.lib.format.write_array_header_1_0(f, header)
+                for _, _, _, strip in iter_maps(bin_raster, bins, matrix,
+                                                [i], tile_rows):
+                    f.write(strip.tobytes())
+
+
+def write(filepath, metadata_filepath, bin_raster, bins, matrix, dates,
+          indices, tile_rows=256):
+    """Write maps of the selected timesteps to a compressed *.npz file, or
+    to an uncompressed memory-mapped *.npy file if the file path has a *.npy
+    suffix, and write the json sidecar file.
+
+    :param filepath: File path of the maps (*.npz or *.npy).
+    :type filepath: string
+    :param metadata_filepath: File path of the json sidecar file.
+    :type metadata_filepath: string
+    :param bin_raster: The bin raster.
+    :type bin_raster: numpy.ndarray
+    :param bins: The twi bin ids of the matrix columns.
+    :type bins: numpy.ndarray
+    :param matrix: Matrix of size len(timeseries) x len(twi_bins).
+    :type matrix: numpy.ndarray
+    :param dates: The dates of the matrix rows.
+    :type dates: pandas.DatetimeIndex
+    :param indices: The timestep indices of the maps.
+    :type indices: list
+    :param tile_rows: Number of rows of each strip.
+    :type tile_rows: int
+    """
+    if Path(filepath).suffix.lower() == ".npy":
+        maps = np.lib.format.open_memmap(
+            str(filepath),
+            mode="w+",
+            dtype=np.float32,
+            shape=(len(indices),) + tuple(bin_raster.shape)
+        )
+        for k, start, stop, strip in iter_maps(bin_raster, bins, matrix,
+                                               indices, tile_rows):
+            maps[k, start:stop] = strip
+        maps.flush()
+        del maps
+    else:
+        write_compressed(filepath, bin_raster, bins, matrix, indices,
+                         tile_rows)
+
+    metadata = {
+        "shape": [len(indices)] + list(bin_raster.shape),
+        "dtype": "float32",
+        "dates": [dates[i].isoformat() for i in indices],
+        "maps": Path(filepath).name,
+    }
+    with open(metadata_filepath, "w") as f:
+        json.dump(metadata, f, indent=2)
+
+
+def read(metadata_filepath):
+    """Read the json sidecar file and open the maps read-only without
+    loading them into memory.
+
+    :param metadata_filepath: File path of the json sidecar file.
+    :type metadata_filepath: string
+    :return: Tuple of the maps, as CompressedMaps for a *.npz file or a
+             numpy memmap for a *.npy file, and dict of metadata from the
+             json sidecar file.
+    :rtype: tuple
+    """
+    metadata_filepath = Path(metadata_filepath)
+    with open(metadata_filepath, "r") as f:
+        metadata = json.load(f)
+
+    filepath = metadata_filepath.parent / metadata["maps"]
+    if filepath.suffix.lower() == ".npy":
+        maps = np.load(str(filepath), mmap_mode="r")
+    else:
+        maps = CompressedMaps(filepath)
+
+    return maps, metadata
@@ -0,0 +1,171 @@
+"""Module that contains functions to write and read output matrices as
+memory-mapped numpy binary files (*.npy).
+
+Matrices are of size: len(timeseries) x len(twi_bins)
+
+Each matrix is saved as a standard numpy *.npy file that Topmodel writes
+directly into during a model run, so matrices larger than memory are
+possible. Downstream tools can open the matrices without parsing using
+numpy.load(filename, mmap_mode="r"). A small json sidecar file contains the
+dates (rows) and twi bin ids (columns) of the matrices. Dates of a regular
+timestep are stored as their start, frequency, and number of periods, so
+the sidecar stays small for long runs, and other dates as a list.
+"""
+
+import json
+from pathlib import Path
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+
+def get_dates_metadata(dates):
+    """Return the json sidecar metadata of the dates of the matrix rows.
+
+    :param dates: The dates of the matrix rows.
+    :type dates: pandas.DatetimeIndex
+    :return: A dict of the start, frequency, and number of periods of dates
+             of a regular timestep, otherwise a dict of a list of the dates.
+    :rtype: dict
+    """
+    dates = pd.DatetimeIndex(dates)
+    steps = np.unique(np.diff(dates.asi8))
+    if len(dates) != 1 and not (len(steps) == 1 and steps[0] > 0):
+        return {"values": [date.isoformat() for date in dates]}
+
+    freq = None
+    if len(steps):
+        timestep = pd.Timedelta(int(steps[0]))
+        freq = pd.tseries.frequencies.to_offset(timestep).freqstr
+
+    return {
+        "start": dates[0].isoformat(),
+        "freq": freq,
+        "periods": len(dates),
+    }
+
+
+def get_dates(dates_metadata):
+    """Return the dates of the matrix rows from the json sidecar metadata,
+    see get_dates_metadata().
+
+    :param dates_metadata: The dates metadata of the json sidecar file.
+    :type dates_metadata: dict
+    :rtype: pandas.DatetimeIndex
+    """
+    if "values" in dates_metadata:
+        return pd.DatetimeIndex(dates_metadata["values"])
+
+    return pd.date_range(start=dates_metadata["start"],
+                         periods=dates_metadata["periods"],
+                         freq=dates_metadata["freq"] or "D")
+
+
+def create(filepath, filepaths, dates, bins, dtype="float64"):
+    """Create memory-mapped *.npy files filled with nan values and write
+    the json sidecar file.
+
+    :param filepath: File path of the json sidecar file.
+    :type filepath: string
+    :param filepaths: A dict of matrix names and file paths to create.
+    :type filepaths: dict
+    :param dates: The dates of the matrix rows.
+    :type dates: pandas.DatetimeIndex
+    :param bins: The twi bin ids of the matrix columns.
+    :type bins: numpy.ndarray
+    :param dtype: The data type of each matrix.
+    :type dtype: string
+    :return matrices: A dict of matrix names and numpy memmaps.
+    :rtype: dict
+    """
+    shape = (len(dates), len(bins))
+
+    matrices = {}
+    for name, path in filepaths.items():
+        matrix = np.lib.format.open_memmap(str(path),
+                                           mode="w+",
+                                           dtype=dtype,
+                                           shape=shape)
+        matrix[:] = np.nan
+        matrices[name] = matrix
+
+    metadata = {
+        "shape": list(shape),
+        "dtype": str(np.dtype(dtype)),
+        "dates": get_dates_metadata(dates),
+        "bins": [int(value) for value in bins],
+        "matrices": {
+            name: Path(path).name for name, path in filepaths.items()
+        },
+    }
+
+    with open(filepath, "w") as f:
+        json.dump(metadata, f, indent=2)
+
+    return matrices
+
+
+def create_temporary(names, shape, directory=None, dtype="float64"):
+    """Create memory-mapped matrices filled with nan values in temporary
+    files, such as for matrices that are not written as output but should
+    not be held in memory.
+
+    The files are removed as soon as they are created, on platforms that
+    allow it, and their disk space is freed when the matrices are garbage
+    collected.
+
+    :param names: The matrix names.
+    :type names: list
+    :param shape: The shape of each matrix.
+    :type shape: tuple
+    :param directory: Optional directory of the temporary files, defaults to
+                      the system temporary directory.
+    :type directory: string
+    :param dtype: The data type of each matrix.
+    :type dtype: string
+    :return matrices: A dict of matrix names and numpy memmaps.
+    :rtype: dict
+    """
+    matrices = {}
+    for name in names:
+        with tempfile.TemporaryFile(dir=directory) as f:
+            matrix = np.memmap(f, mode="w+", dtype=dtype, shape=shape)
+        matrix[:] = np.nan
+        matrices[name] = matrix
+
+    return matrices
+
+
+def flush(matrices):
+    """Flush memory-mapped matrices to disk.
+
+    :param matrices: A dict of matrix names and numpy memmaps.
+    :type matrices: dict
+    """
+    for matrix in matrices.values():
+        matrix.flush()
+
+
+def read(filepath):
+    """Read the json sidecar file and open each matrix read-only without
+    loading it into memory.
+
+    :param filepath: File path of the json sidecar file.
+    :type filepath: string
+    :return: Tuple of dict of matrix names and numpy memmaps, and dict of
+             metadata from the json sidecar file, with the dates as a
+             pandas.DatetimeIndex.
+    :rtype: tuple
+    """
+    filepath = Path(filepath)
+    with open(filepath, "r") as f:
+        metadata = json.load(f)
+    metadata["dates"] = get_dates(metadata["dates"])
+
+    matrices = {}
+    for name, filename in metadata["matrices"].items():
+        matrices[name] = np.load(str(filepath.parent / filename),
+                                 mmap_mode="r")
+
+    return matrices, metadata
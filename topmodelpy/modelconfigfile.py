@@ -8,7 +8,9 @@ three sections:
 """
 
 from configparser import ConfigParser, ExtendedInterpolation
+import glob
 from pathlib import Path
+import re
 
 from .exceptions import (ModelConfigFileErrorInvalidSection,
                          ModelConfigFileErrorInvalidFilePath,
@@ -63,14 +65,52 @@ def check_config_sections(config):
 
 
 def check_config_filepaths(config):
-    """Check that all the filepaths are valid."""
+    """Check that all the filepaths are valid.
+
+    Keys ending in _dir are directories and keys ending in _file are input
+    files, so output keys such as output_filename_run_profile are not
+    checked. A file value can be a glob pattern or a list of file paths, see
+    get_filepaths(), in which case each file path must be valid.
+    """
     for section in config.sections():
         for key in config[section]:
             value = config[section][key]
-            if value and (key.endswith("dir") or key.endswith("file")):
+            if value and key.endswith("_dir"):
                 filepath = Path(value)
                 if not filepath.exists() and not filepath.is_file():
                     raise ModelConfigFileErrorInvalidFilePath(value)
+            elif value and key.endswith("_file"):
+                filepaths = get_filepaths(value)
+                if not filepaths:
+                    raise ModelConfigFileErrorInvalidFilePath(value)
+                for filepath in filepaths:
+                    if not filepath.is_file():
+                        raise ModelConfigFileErrorInvalidFilePath(filepath)
+
+
+def get_filepaths(value):
+    """Return a list of file paths from a config file value.
+
+    The value can be a single file path, a glob pattern such as
+    timeseries_*.csv, or a list of file paths and glob patterns separated
+    by commas or new lines. Glob patterns are expanded in sorted order.
+
+    :param value: A config file value.
+    :type value: string
+    :return: A list of file paths.
+    :rtype: list
+    """
+    filepaths = []
+    for item in re.split(r"[,\n]", value):
+        item = item.strip()
+        if not item:
+            continue
+        if any(char in item for char in "*?["):
+            filepaths.extend(Path(path) for path in sorted(glob.glob(item)))
+        else:
+            filepaths.append(Path(item))
+
+    return filepaths
 
 
 def check_config_options(config):
@@ -78,6 +118,15 @@ def check_config_options(config):
     valid_options = {
         "pet": ["hamon"],
         "snowmelt": ["yes", "no"],
+        "output_matrices_format": ["csv", "npy"],
+        "stream_output": ["yes", "no"],
+        "output_compression": ["none", "gzip", "zstd"],
+        "output_format": ["csv", "hdf5"],
+        "twi_bin_method": ["fixed", "quantile"],
+        "plots": ["yes", "no"],
+        "report_compression": ["none", "deflate"],
+        "run_profile": ["no", "yes", "memory"],
+        "cache": ["yes", "no"],
     }
 
     options = {
@@ -85,6 +134,36 @@ def check_config_options(config):
         "snowmelt": (
             config["Options"]["option_snowmelt"].lower().strip()
         ),
+        "output_matrices_format": (
+            config["Options"].get("option_output_matrices_format", "csv")
+            .lower().strip()
+        ),
+        "stream_output": (
+            config["Options"].get("option_stream_output", "no")
+            .lower().strip()
+        ),
+        "output_compression": (
+            config["Options"].get("option_output_compression", "none")
+            .lower().strip()
+        ),
+        "output_format": (
+            config["Outputs"].get("output_format", "csv").lower().strip()
+        ),
+        "twi_bin_method": (
+            config["Options"].get("option_twi_bin_method", "fixed")
+            .lower().strip()
+        ),
+        "plots": (
+            config["Options"].get("option_plots", "yes").lower().strip()
+        ),
+        "report_compression": (
+            config["Options"].get("option_report_compression", "deflate")
+            .lower().strip()
+        ),
+        "run_profile": (
+            config["Options"].get("option_run_profile", "no").lower().strip()
+        ),
+        "cache": config["Options"].get("option_cache", "no").lower().strip(),
     }
 
     for key in valid_options.keys() and options.keys():
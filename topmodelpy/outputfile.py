@@ -0,0 +1,136 @@
+"""Module that contains functions to write output files in csv format.
+
+Output rows can be written in chunks as the model produces them with a
+StreamWriter, instead of building a full pandas.DataFrame and formatting
+everything in one to_csv call, so the formatted output is bounded by the
+chunk size and output files can be inspected while a model run is still
+going.
+
+Output files can optionally be compressed with gzip, or with zstd when the
+zstandard package is installed.
+"""
+
+import gzip
+
+import pandas as pd
+
+from .exceptions import DependencyErrorMissingPackage
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+COMPRESSION_SUFFIXES = {
+    "none": "",
+    "gzip": ".gz",
+    "zstd": ".zst",
+}
+
+
+def get_filepath(filepath, compression="none"):
+    """Return the file path with the suffix of the compression appended.
+
+    :param filepath: File path of the output file.
+    :type filepath: string
+    :param compression: Compression of the output file, none | gzip | zstd
+    :type compression: string
+    :rtype: string
+    """
+    filepath = str(filepath)
+    suffix = COMPRESSION_SUFFIXES[compression]
+    if not filepath.endswith(suffix):
+        filepath = filepath + suffix
+
+    return filepath
+
+
+def open_file(filepath, compression="none"):
+    """Open a text file for writing with optional compression.
+
+    :param filepath: File path of the output file.
+    :type filepath: string
+    :param compression: Compression of the output file, none | gzip | zstd
+    :type compression: string
+    :return: A file object of text.
+    :rtype: file object
+    """
+    if compression == "gzip":
+        return gzip.open(filepath, "wt", newline="")
+
+    if compression == "zstd":
+        if zstandard is None:
+            raise DependencyErrorMissingPackage(
+                "zstandard", "option_output_compression = zstd")
+        return zstandard.open(filepath, "wt", newline="")
+
+    return open(filepath, "w", newline="")
+
+
+def get_date_format(index):
+    """Return a date format that matches how pandas writes the index.
+
+    Dates are written without a time when all times are at midnight.
+    Determining the format from the full index keeps the format the same
+    across all chunks.
+
+    :param index: The dates of all rows.
+    :type index: pandas.DatetimeIndex
+    :rtype: string
+    """
+    if (index == index.normalize()).all():
+        return "%Y-%m-%d"
+
+    return "%Y-%m-%d %H:%M:%S"
+
+
+class StreamWriter:
+    """Class that writes rows of output data in chunks to a csv file."""
+
+    def __init__(self,
+                 filepath,
+                 columns,
+                 index_label="date",
+                 date_format=None,
+                 float_format="%.2f",
+                 compression="none"):
+        self.filepath = get_filepath(filepath, compression)
+        self.columns = list(columns)
+        self.date_format = date_format
+        self.float_format = float_format
+        self.num_rows = 0
+
+        self._file = open_file(self.filepath, compression)
+        self._file.write(",".join([index_label] + self.columns) + "\n")
+        self._file.flush()
+
+    def write(self, index, values):
+        """Write a chunk of rows and flush it to the file.
+
+        :param index: The dates of the rows, ignored for a dataframe.
+        :type index: pandas.DatetimeIndex
+        :param values: A 2d array, or a dataframe, of size
+                       len(index) x len(columns).
+        :type values: numpy.ndarray or pandas.DataFrame
+        """
+        if isinstance(values, pd.DataFrame):
+            chunk = values[self.columns]
+        else:
+            chunk = pd.DataFrame(values, index=index, columns=self.columns)
+        chunk.to_csv(self._file,
+                     header=False,
+                     date_format=self.date_format,
+                     float_format=self.float_format)
+        self._file.flush()
+        self.num_rows += len(chunk)
+
+    def close(self):
+        """Close the file."""
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -1,6 +1,16 @@
-"""Module that contains functions to read a parameters file in csv format."""
+"""Module that contains functions to read a parameters file in csv format,
+and a parameters table of many parameter sets in csv or parquet format.
+
+A parameters table has one row per parameter set and one column per
+parameter name. Parameters that are not columns of the table take their
+value from the parameters file.
+"""
 
 import csv
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
 
 from .exceptions import (ParametersFileErrorInvalidHeader,
                          ParametersFileErrorInvalidScalingParameter,
@@ -9,7 +19,9 @@ from .exceptions import (ParametersFileErrorInvalidHeader,
                          ParametersFileErrorInvalidSoilDepthAB,
                          ParametersFileErrorInvalidFieldCapacity,
                          ParametersFileErrorInvalidMacropore,
-                         ParametersFileErrorInvalidImperviousArea,)
+                         ParametersFileErrorInvalidImperviousArea,
+                         ParametersFileErrorMissingValues,
+                         DependencyErrorMissingPackage,)
 
 
 def read(filepath):
@@ -66,6 +78,153 @@ def read_in(filestream):
     return data
 
 
+def read_table(filepath, parameters):
+    """Read a parameters table of many parameter sets.
+
+    The table is in csv format, or in parquet format if the file has a
+    .parquet suffix. Parameters that are not columns of the table take their
+    value from the parameters dict of a parameters file. All parameter sets
+    are checked at once.
+
+    :param filepath: File path of the parameters table.
+    :type filepath: string
+    :param parameters: A dict from the parameters file.
+    :type parameters: dict
+    :return parameter_sets: A dataframe with one row per parameter set,
+                            indexed by member, and one column per parameter.
+    :rtype: pandas.DataFrame
+    """
+    try:
+        if Path(filepath).suffix.lower() == ".parquet":
+            table = read_parquet(filepath)
+        else:
+            with open(filepath) as f:
+                table = read_table_in(f)
+        parameter_sets = get_parameter_sets(parameters, table)
+        check_data(get_parameter_set(parameters, parameter_sets))
+        return parameter_sets
+    except (ParametersFileErrorInvalidHeader,
+            ParametersFileErrorInvalidScalingParameter,
+            ParametersFileErrorInvalidLatitude,
+            ParametersFileErrorInvalidSoilDepthTotal,
+            ParametersFileErrorInvalidSoilDepthAB,
+            ParametersFileErrorInvalidFieldCapacity,
+            ParametersFileErrorInvalidMacropore,
+            ParametersFileErrorInvalidImperviousArea,
+            ParametersFileErrorMissingValues,) as err:
+        print(err)
+
+
+def read_table_in(filestream):
+    """Read and process a filestream of a comma-delimited parameters table.
+
+    :param filestream: A filestream of text.
+    :type filestream: _io.TextIOWrapper
+    :return table: A dataframe with one row per parameter set.
+    :rtype: pandas.DataFrame
+    """
+    return clean_table(pd.read_csv(filestream))
+
+
+def read_parquet(filepath):
+    """Read a parameters table in parquet format.
+
+    Requires the optional pyarrow package.
+
+    :param filepath: File path of the parameters table.
+    :type filepath: string
+    :return table: A dataframe with one row per parameter set.
+    :rtype: pandas.DataFrame
+    """
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        raise DependencyErrorMissingPackage(
+            "pyarrow", "parameters_table_file = *.parquet")
+
+    return clean_table(pd.read_parquet(filepath))
+
+
+def clean_table(table):
+    """Return a parameters table with lower case column names, float values,
+    and indexed by the optional member column.
+
+    :param table: A dataframe with one row per parameter set.
+    :type table: pandas.DataFrame
+    :return table: A dataframe with one row per parameter set.
+    :rtype: pandas.DataFrame
+    """
+    table = table.rename(columns=lambda name: str(name).lower().strip())
+    if "member" in table.columns:
+        table = table.set_index("member")
+    else:
+        table.index.name = "member"
+
+    return table.astype(float)
+
+
+def get_parameter_sets(parameters, table):
+    """Return all parameters of each parameter set, where columns of the
+    table replace the values of the parameters dict. A missing value in the
+    table is an error rather than the value of the parameters dict.
+
+    :param parameters: A dict from the parameters file.
+    :type parameters: dict
+    :param table: A dataframe with one row per parameter set.
+    :type table: pandas.DataFrame
+    :return parameter_sets: A dataframe with one row per parameter set and
+                            one column per parameter name of the parameters
+                            dict.
+    :rtype: pandas.DataFrame
+    """
+    names = list(parameters.keys())
+    if not set(table.columns) <= set(names):
+        raise ParametersFileErrorInvalidHeader(list(table.columns), names)
+    check_missing_values(table)
+
+    parameter_sets = pd.DataFrame(
+        {name: parameters[name]["value"] for name in names},
+        index=table.index,
+    )
+    parameter_sets[table.columns] = table
+
+    return parameter_sets
+
+
+def get_parameter_set(parameters, parameter_sets, member=None):
+    """Return a parameters dict with the values of one parameter set, or
+    arrays of the values of all parameter sets if member is None.
+
+    :param parameters: A dict from the parameters file.
+    :type parameters: dict
+    :param parameter_sets: A dataframe of parameter sets.
+    :type parameter_sets: pandas.DataFrame
+    :param member: Optional member of the parameter set.
+    :return data: A dict like the dict from the parameters file.
+    :rtype: dict
+    """
+    data = {}
+    for name, parameter in parameters.items():
+        if member is None:
+            value = parameter_sets[name].to_numpy()
+        else:
+            value = float(parameter_sets.at[member, name])
+        data[name] = dict(parameter, value=value)
+
+    return data
+
+
+def check_missing_values(table):
+    """Check for any missing values in a parameters table.
+
+    :param table: A dataframe with one row per parameter set.
+    :type table: pandas.DataFrame
+    """
+    missing_rows = table.isna().to_numpy().any(axis=1)
+    if missing_rows.any():
+        raise ParametersFileErrorMissingValues(table[missing_rows])
+
+
 def check_header(header, valid_header):
     """Check that column names in header line match what is expected.
 
@@ -81,6 +240,9 @@ def check_header(header, valid_header):
 def check_data(data):
     """Check that all data values from the file are valid.
 
+    Values can be arrays of the values of many parameter sets, see
+    get_parameter_set(), which are checked as array operations.
+
     :param data: A dict that contains all the data from the file.
     :type data: dict
     """
@@ -99,11 +261,13 @@ def check_scaling_parameter(value):
     Valid scaling parameter value is:
         scaling_parameter > 0
 
-    :param value: scaling parameter value.
-    :type value: float
+    :param value: scaling parameter value, or an array of values.
+    :type value: float or numpy.ndarray
     """
-    if not value > 0:
-        raise ParametersFileErrorInvalidScalingParameter(value)
+    valid = np.asarray(value) > 0
+    if not np.all(valid):
+        raise ParametersFileErrorInvalidScalingParameter(
+            first_invalid(value, valid))
 
 
 def check_latitude(value):
@@ -111,11 +275,12 @@ def check_latitude(value):
     Valid latitude value are:
       90 >= latitude >= 0
 
-    :param value: latitude value.
-    :type value: float
+    :param value: latitude value, or an array of values.
+    :type value: float or numpy.ndarray
     """
-    if not value >= 0 or not value <= 90:
-        raise ParametersFileErrorInvalidLatitude(value)
+    valid = (np.asarray(value) >= 0) & (np.asarray(value) <= 90)
+    if not np.all(valid):
+        raise ParametersFileErrorInvalidLatitude(first_invalid(value, valid))
 
 
 def check_soil_depth_total(value):
@@ -123,11 +288,13 @@ def check_soil_depth_total(value):
     Valid soil depth value are:
       soil_depth_total > 0
 
-    :param value: soil depth total value.
-    :type value: float
+    :param value: soil depth total value, or an array of values.
+    :type value: float or numpy.ndarray
     """
-    if not value > 0:
-        raise ParametersFileErrorInvalidSoilDepthTotal(value)
+    valid = np.asarray(value) > 0
+    if not np.all(valid):
+        raise ParametersFileErrorInvalidSoilDepthTotal(
+            first_invalid(value, valid))
 
 
 def check_soil_depth_ab_horizon(value, soil_depth_total):
@@ -136,11 +303,17 @@ def check_soil_depth_ab_horizon(value, soil_depth_total):
       soil_depth_ab_horizon > 0
       soil_depth_ab_horizon < soil_depth_total
 
-    :param value: soil depth ab horizon value.
-    :type value: float
+    :param value: soil depth ab horizon value, or an array of values.
+    :type value: float or numpy.ndarray
     """
-    if not value > 0 or not value < soil_depth_total:
-        raise ParametersFileErrorInvalidSoilDepthAB(value, soil_depth_total)
+    valid = (
+        (np.asarray(value) > 0)
+        & (np.asarray(value) < np.asarray(soil_depth_total))
+    )
+    if not np.all(valid):
+        raise ParametersFileErrorInvalidSoilDepthAB(
+            first_invalid(value, valid),
+            first_invalid(soil_depth_total, valid))
 
 
 def check_field_capacity(value):
@@ -148,11 +321,13 @@ def check_field_capacity(value):
     Valid field capacity fraction value are:
       0 <= field_capacity <= 1
 
-    :param value: field capacity value.
-    :type value: float
+    :param value: field capacity value, or an array of values.
+    :type value: float or numpy.ndarray
     """
-    if not value > 0 or not value < 1:
-        raise ParametersFileErrorInvalidFieldCapacity(value)
+    valid = (np.asarray(value) > 0) & (np.asarray(value) < 1)
+    if not np.all(valid):
+        raise ParametersFileErrorInvalidFieldCapacity(
+            first_invalid(value, valid))
 
 
 def check_macropore(value):
@@ -160,11 +335,12 @@ def check_macropore(value):
     Valid macropore fraction value are:
       0 <= macropore <= 1
 
-    :param value: macropore value.
-    :type value: float
+    :param value: macropore value, or an array of values.
+    :type value: float or numpy.ndarray
     """
-    if not value > 0 or not value < 1:
-        raise ParametersFileErrorInvalidMacropore(value)
+    valid = (np.asarray(value) > 0) & (np.asarray(value) < 1)
+    if not np.all(valid):
+        raise ParametersFileErrorInvalidMacropore(first_invalid(value, valid))
 
 
 def check_impervious_area(value):
@@ -172,8 +348,27 @@ def check_impervious_area(value):
     Valid impervious_area fraction value are:
       0 <= impervious_area_fraction <= 1
 
-    :param value: impervious area value.
-    :type value: float
+    :param value: impervious area value, or an array of values.
+    :type value: float or numpy.ndarray
+    """
+    valid = (np.asarray(value) > 0) & (np.asarray(value) < 1)
+    if not np.all(valid):
+        raise ParametersFileErrorInvalidImperviousArea(
+            first_invalid(value, valid))
+
+
+def first_invalid(value, valid):
+    """Return the first invalid value of a value or an array of values.
+
+    :param value: A value or an array of values.
+    :type value: float or numpy.ndarray
+    :param valid: A boolean array of which values are valid.
+    :type valid: numpy.ndarray
+    :return: The first invalid value.
+    :rtype: float
     """
-    if not value > 0 or not value < 1:
-        raise ParametersFileErrorInvalidImperviousArea(value)
+    values = np.broadcast_to(np.asarray(value, dtype=float), np.shape(valid))
+    if values.ndim == 0:
+        return value
+
+    return values[~np.asarray(valid)][0].item()
@@ -0,0 +1,402 @@
+"""Module that contains a model run as a small DAG of named stages, whose
+results are cached on disk, so a model run only reruns the stages whose
+inputs changed since a previous run.
+
+The stages and the stages they depend on:
+
+    read         parameters, timeseries, and twi input files
+    pet          timeseries
+    snowmelt     timeseries, only if option_snowmelt is on
+    run          timeseries, twi, pet, snowmelt
+    postprocess  read, run, output files, plots, and the html report
+
+The key of a stage is a hash of the model configuration and parameter values
+that the stage uses, and of the keys of the stages and data it depends on,
+so a changed stage changes the keys of all the stages after it. The read
+stage is keyed by the modification time and size of the input files, and
+the other stages by a hash of the timeseries and twi data, so editing a
+parameter in the parameters file only reruns the stages that use it.
+Changing an output option reruns only postprocess, and changing a snowmelt
+parameter reruns snowmelt, run, and postprocess. Postprocess also depends
+on the read stage, since it reads input files of its own, such as the twi
+bin raster of the saturation maps, so any changed input file reruns it.
+The twi weighted mean and other preprocessed data are cheap and are
+recalculated from the cached stages.
+
+Results are pickled in a cache directory, .topmodelpy_cache in the output
+directory by default. The postprocess stage caches the modification time
+and size of the output files it wrote, and reruns if an output file changed
+or is missing. Whether each stage was a cache hit is recorded on the run
+profile, see instrument.annotate().
+
+Output csv files are not streamed while Topmodel runs, since the run stage
+is cached as a whole, and model runs of a parameters table are not cached,
+see main.run_ensemble().
+"""
+
+import hashlib
+import json
+import os
+from pathlib import Path
+import pickle
+import tempfile
+
+import pandas as pd
+
+from topmodelpy import __version__, instrument, main, modelconfigfile
+
+
+# Version of the cached results, increment when the results of a stage change
+CACHE_VERSION = 1
+
+CACHE_DIRNAME = ".topmodelpy_cache"
+
+# Maximum number of cached results of each stage
+MAX_ENTRIES = 8
+
+SNOWMELT_PARAMETER_NAMES = [
+    "snowmelt_temperature_cutoff",
+    "snowmelt_rate_coeff_with_rain",
+    "snowmelt_rate_coeff",
+]
+
+# Options that do not change any output
+IGNORED_OPTIONS = ["option_plot_jobs", "option_run_profile", "option_cache"]
+
+
+class DiskCache:
+    """Cache of pickled stage results in a directory, one file per stage
+    name and key.
+
+    :param directory: The cache directory, created if it does not exist.
+    :type directory: string
+    :param max_entries: Maximum number of cached results of each stage, the
+                        least recently used are removed.
+    :type max_entries: int
+    """
+    def __init__(self, directory, max_entries=MAX_ENTRIES):
+        self.directory = Path(directory)
+        self.max_entries = max_entries
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def get_filepath(self, name, key):
+        return self.directory / "{}-{}.pkl".format(name, key)
+
+    def get(self, name, key):
+        """Return a cached result.
+
+        :return: Tuple of True and the result, or False and None if the
+                 result is not cached.
+        :rtype: tuple
+        """
+        filepath = self.get_filepath(name, key)
+        try:
+            with open(filepath, "rb") as f:
+                value = pickle.load(f)
+        except FileNotFoundError:
+            return False, None
+        except Exception:
+            # A truncated or outdated cache file is a cache miss
+            return False, None
+        # Mark as recently used
+        os.utime(filepath)
+
+        return True, value
+
+    def set(self, name, key, value):
+        """Cache a result, replacing the cache file atomically."""
+        fd, tmp_filepath = tempfile.mkstemp(dir=self.directory,
+                                            suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_filepath, self.get_filepath(name, key))
+        except BaseException:
+            os.unlink(tmp_filepath)
+            raise
+        self.prune(name)
+
+    def prune(self, name):
+        """Remove the least recently used results of a stage beyond
+        max_entries."""
+        filepaths = sorted(self.directory.glob("{}-*.pkl".format(name)),
+                           key=lambda filepath: filepath.stat().st_mtime_ns,
+                           reverse=True)
+        for filepath in filepaths[self.max_entries:]:
+            filepath.unlink()
+
+
+class Pipeline:
+    """Stages of a model run whose results are cached by key.
+
+    :param cache: The cache of the stage results.
+    :type cache: DiskCache
+
+    Attributes:
+        keys: dict of the key of each stage that ran.
+        status: dict of hit or miss of each stage that ran.
+    """
+    def __init__(self, cache):
+        self.cache = cache
+        self.keys = {}
+        self.status = {}
+
+    def get_key(self, name, params=None, dependencies=()):
+        """Return the key of a stage, a hash of the stage name, its
+        parameters, and the keys of the stages it depends on."""
+        data = json.dumps([CACHE_VERSION,
+                           __version__,
+                           name,
+                           params,
+                           [self.keys[dependency]
+                            for dependency in dependencies]],
+                          sort_keys=True,
+                          default=str)
+
+        return hashlib.sha256(data.encode("utf-8")).hexdigest()[:32]
+
+    def add_data(self, name, data):
+        """Add the key of data that stages depend on, a hash of the data.
+
+        :param name: Name of the data.
+        :type name: string
+        :param data: The data.
+        :type data: pandas.DataFrame
+        """
+        self.keys[name] = hash_dataframe(data)
+
+    def run_stage(self, name, function, params=None, dependencies=(),
+                  check=None):
+        """Return the cached result of a stage, or run and cache the stage.
+
+        :param name: Name of the stage.
+        :type name: string
+        :param function: Function without arguments that returns the result
+                         of the stage.
+        :type function: function
+        :param params: Json serializable parameters of the stage.
+        :type params: dict
+        :param dependencies: Names of the stages the stage depends on, which
+                             must have run.
+        :type dependencies: list
+        :param check: Optional function of a cached result that returns
+                      False if the result is no longer valid.
+        :type check: function
+        :return: The result of the stage.
+        """
+        key = self.get_key(name, params, dependencies)
+        hit, value = self.cache.get(name, key)
+        if hit and (check is None or check(value)):
+            status = "hit"
+        else:
+            value = function()
+            self.cache.set(name, key, value)
+            status = "miss"
+
+        self.keys[name] = key
+        self.status[name] = status
+        instrument.annotate(cache=status)
+
+        return value
+
+
+def hash_dataframe(df):
+    """Return a hash of the index, columns, and values of a dataframe."""
+    digest = hashlib.sha256(
+        pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes()
+    )
+    digest.update(repr(df.columns.tolist()).encode("utf-8"))
+
+    return digest.hexdigest()[:32]
+
+
+def get_cache_dir(config_data):
+    """Return the cache directory of a model configuration."""
+    return Path(config_data["Outputs"]["output_dir"], CACHE_DIRNAME)
+
+
+def get_files(directory):
+    """Return a dict of the modification time and size of each file in a
+    directory."""
+    files = {}
+    for entry in os.scandir(directory):
+        if entry.is_file():
+            stat = entry.stat()
+            files[entry.name] = (stat.st_mtime_ns, stat.st_size)
+
+    return files
+
+
+def get_inputs_params(config_data):
+    """Return the parameters of the read stage, the input configuration
+    and the modification time and size of each input file."""
+    files = {}
+    for key, value in config_data["Inputs"].items():
+        if not key.endswith("_file") or not value.strip():
+            continue
+        for filepath in modelconfigfile.get_filepaths(value):
+            stat = Path(filepath).stat()
+            files[str(Path(filepath).resolve())] = [stat.st_mtime_ns,
+                                                    stat.st_size]
+
+    return {
+        "inputs": dict(config_data["Inputs"]),
+        "files": files,
+        "twi_bins": config_data["Options"].get("option_twi_bins", ""),
+        "twi_bin_method": (
+            config_data["Options"].get("option_twi_bin_method", "")
+        ),
+    }
+
+
+def get_parameter_values(parameters, names=None):
+    """Return a dict of parameter names and values."""
+    return {name: parameter["value"] for name, parameter in parameters.items()
+            if names is None or name in names}
+
+
+def read_inputs(config_data):
+    """Read the input files, see main.read_input_files()."""
+    inputs = main.read_input_files(config_data)
+    if any(data is None for data in inputs):
+        raise ValueError("Invalid input files")
+
+    return inputs
+
+
+def write_outputs(config_data, timeseries, preprocessed_data, topmodel_data,
+                  parameters, twi):
+    """Postprocess a model run, see main.postprocess(), and return the
+    modification time and size of the output files that were written."""
+    output_dir = config_data["Outputs"]["output_dir"]
+    before = get_files(output_dir)
+
+    # Topmodel ran in memory, so copy the output matrices into the *.npy
+    # files that postprocess flushes
+    output_matrices = main.create_output_matrices(config_data, timeseries,
+                                                  twi)
+    if output_matrices:
+        for name, matrix in output_matrices.items():
+            matrix[:] = topmodel_data[name]
+        topmodel_data = dict(topmodel_data, **output_matrices)
+
+    main.postprocess(config_data,
+                     timeseries,
+                     preprocessed_data,
+                     topmodel_data,
+                     parameters,
+                     twi)
+
+    after = get_files(output_dir)
+
+    return {name: stat for name, stat in after.items()
+            if before.get(name) != stat}
+
+
+def is_unchanged(config_data, files):
+    """Return True if the output files of the postprocess stage are
+    unchanged."""
+    return files == {
+        name: stat
+        for name, stat in get_files(config_data["Outputs"]["output_dir"])
+        .items() if name in files
+    }
+
+
+def run_model(config_data, cache_dir=None):
+    """Read inputs, preprocess data, run Topmodel, and postprocess results,
+    reusing the cached results of the stages whose inputs did not change.
+
+    :param config_data: A ConfigParser object that behaves much like a
+                        dictionary.
+    :type config_data: ConfigParser
+    :param cache_dir: The cache directory, defaults to .topmodelpy_cache in
+                      the output directory.
+    :type cache_dir: string
+    :return pipeline: The pipeline, with the cache status of each stage.
+    :rtype: Pipeline
+    """
+    # The run stage is cached as a whole, so output is not streamed
+    config_data["Options"]["option_stream_output"] = "no"
+    pipeline = Pipeline(DiskCache(cache_dir or get_cache_dir(config_data)))
+
+    with instrument.stage("read"):
+        parameters, timeseries, twi = pipeline.run_stage(
+            "read",
+            lambda: read_inputs(config_data),
+            params=get_inputs_params(config_data)
+        )
+    pipeline.add_data("timeseries", timeseries)
+    pipeline.add_data("twi", twi)
+
+    with instrument.stage("preprocess"):
+        timestep_daily_fraction = main.get_timestep_daily_fraction(timeseries)
+        dependencies = ["timeseries", "twi", "pet"]
+        with instrument.stage("pet"):
+            pet = pipeline.run_stage(
+                "pet",
+                lambda: main.preprocess_pet(parameters,
+                                            timeseries,
+                                            timestep_daily_fraction),
+                params={
+                    "option_pet": config_data["Options"]["option_pet"],
+                    "latitude": parameters["latitude"]["value"],
+                },
+                dependencies=["timeseries"]
+            )
+
+        snowmelt_data = None
+        if config_data["Options"].getboolean("option_snowmelt"):
+            dependencies.append("snowmelt")
+            with instrument.stage("snowmelt"):
+                snowmelt_data = pipeline.run_stage(
+                    "snowmelt",
+                    lambda: main.preprocess_snowmelt(parameters,
+                                                     timeseries,
+                                                     timestep_daily_fraction),
+                    params=get_parameter_values(parameters,
+                                                SNOWMELT_PARAMETER_NAMES),
+                    dependencies=["timeseries"]
+                )
+
+        preprocessed_data = main.get_preprocessed_data(timeseries,
+                                                       twi,
+                                                       timestep_daily_fraction,
+                                                       pet,
+                                                       snowmelt_data)
+
+    with instrument.stage("run"):
+        topmodel_data = pipeline.run_stage(
+            "run",
+            lambda: main.run_topmodel(parameters, twi, preprocessed_data),
+            params={
+                name: value
+                for name, value in get_parameter_values(parameters).items()
+                if name not in SNOWMELT_PARAMETER_NAMES
+            },
+            dependencies=dependencies
+        )
+
+    with instrument.stage("postprocess"):
+        pipeline.run_stage(
+            "postprocess",
+            lambda: write_outputs(config_data,
+                                  timeseries,
+                                  preprocessed_data,
+                                  topmodel_data,
+                                  parameters,
+                                  twi),
+            params={
+                "parameters": get_parameter_values(parameters),
+                "outputs": dict(config_data["Outputs"]),
+                "options": {
+                    name: value
+                    for name, value in config_data["Options"].items()
+                    if name not in IGNORED_OPTIONS
+                },
+            },
+            dependencies=["read", "run"],
+            check=lambda files: is_unchanged(config_data, files)
+        )
+
+    return pipeline
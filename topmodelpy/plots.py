@@ -1,10 +1,18 @@
 """Module of functions for generating plots.
 
+Each plot is drawn on its own explicit Figure with an Agg canvas rather than
+through pyplot, so plots render the same in any process or thread, without a
+display, and each figure is cleared and released as soon as it is saved,
+see figure(). The interactive plots of the html report are drawn in the
+browser, see report. Axes that several plots share, such as the flow duration
+curve axes, are set up by the same template functions.
 """
 
-import matplotlib.pyplot as plt
+from contextlib import contextmanager
+
+from matplotlib.backends.backend_agg import FigureCanvasAgg
 import matplotlib.dates as mdates
-import mpld3
+from matplotlib.figure import Figure
 from pandas.plotting import register_matplotlib_converters
 
 from topmodelpy import hydrocalcs
@@ -23,104 +31,94 @@ COLORS = {
     "saturation_deficit_avgs": "gray",
 }
 
+STATS_TEXT_PROPERTIES = {
+    "boxstyle": "round",
+    "facecolor": "white",
+    "alpha": 0.5
+}
 
-class MousePositionDatePlugin(mpld3.plugins.PluginBase):
-    """Plugin for displaying mouse position with a datetime x axis."""
-
-    JAVASCRIPT = """
-    mpld3.register_plugin("mousepositiondate", MousePositionDatePlugin);
-    MousePositionDatePlugin.prototype = Object.create(mpld3.Plugin.prototype);
-    MousePositionDatePlugin.prototype.constructor = MousePositionDatePlugin;
-    MousePositionDatePlugin.prototype.requiredProps = [];
-    MousePositionDatePlugin.prototype.defaultProps = {
-    fontsize: 12,
-    xfmt: "%Y-%m-%d %H:%M:%S",
-    yfmt: ".2f"
-    };
-    function MousePositionDatePlugin(fig, props) {
-    mpld3.Plugin.call(this, fig, props);
-    }
-    MousePositionDatePlugin.prototype.draw = function() {
-    var fig = this.fig;
-    var xfmt = d3.time.format(this.props.xfmt);
-    var yfmt = d3.format(this.props.yfmt);
-    var coords = fig.canvas.append("text").attr("class", "mpld3-coordinates").style("text-anchor", "end").style("font-size", this.props.fontsize).attr("x", this.fig.width - 5).attr("y", this.fig.height - 5);
-    for (var i = 0; i < this.fig.axes.length; i++) {
-      var update_coords = function() {
-        var ax = fig.axes[i];
-        return function() {
-          var pos = d3.mouse(this);
-          x = ax.xdom.invert(pos[0]);
-          y = ax.ydom.invert(pos[1]);
-          coords.text("(" + xfmt(x) + ", " + yfmt(y) + ")");
-        };
-      }();
-      fig.axes[i].baseaxes.on("mousemove", update_coords).on("mouseout", function() {
-        coords.text("");
-      });
-    }
-    };
+# Explicitly using matplotlibs new default color palette (blue and orange)
+OBSERVED_COLOR = "#1f77b4"
+MODELED_COLOR = "#ff7f0e"
+
+
+@contextmanager
+def figure(width, height, nrows=1, sharex=False, facecolor=None):
+    """Create a figure and its axes, and clear the figure when done so its
+    memory is released without waiting for garbage collection.
+
+    :param width: Width of the figure in inches.
+    :type width: float
+    :param height: Height of the figure in inches.
+    :type height: float
+    :param nrows: Number of rows of axes.
+    :type nrows: int
+    :param sharex: Share the x axis between rows of axes.
+    :type sharex: bool
+    :param facecolor: Optional face color of the axes.
+    :type facecolor: string
     """
-
-    def __init__(self, fontsize=14, xfmt="%Y-%m-%d %H:%M:%S", yfmt=".2f"):
-        self.dict_ = {
-            "type": "mousepositiondate",
-            "fontsize": fontsize,
-            "xfmt": xfmt,
-            "yfmt": yfmt
-        }
-
-
-def plot_timeseries_html(dates, values, label):
-    """Return an html string of the figure"""
-
-    fig, ax = plt.subplots(subplot_kw=dict(facecolor="#EEEEEE"))
-    fig.set_size_inches(10, 6)
-
+    fig = Figure(figsize=(width, height))
+    FigureCanvasAgg(fig)
+    subplot_kw = dict(facecolor=facecolor) if facecolor else None
+    axes = fig.subplots(nrows, 1, sharex=sharex, subplot_kw=subplot_kw)
+    try:
+        yield fig, axes
+    finally:
+        fig.clear()
+
+
+def get_color(label):
+    """Return the color of a label, see COLORS, or black."""
     colorstr = "k"
     for key, value in COLORS.items():
         if key in label:
             colorstr = value
 
-    label = label.replace("_", " ").capitalize()
+    return colorstr
 
-    ax.grid(color="white", linestyle="solid")
-    ax.set_title("{}".format(label), fontsize=20)
 
-    ax.plot(dates, values, color=colorstr, linewidth=2)
+def get_title(label):
+    """Return a label as a title, such as Flow predicted (mm/day)."""
+    return label.replace("_", " ").capitalize()
 
-    # Connect plugin
-    mpld3.plugins.connect(fig, MousePositionDatePlugin())
-
-    return mpld3.fig_to_html(fig)
 
+def add_legend(ax):
+    """Add a semi-transparent legend of the lines of an axes."""
+    handles, labels = ax.get_legend_handles_labels()
+    legend = ax.legend(handles, labels, fancybox=True)
+    legend.get_frame().set_alpha(0.5)
 
-def plot_timeseries_comparison_html(dates, observed, modeled, absolute_error, label):
-    """Return an html string of the figure"""
 
-    fig, axes = plt.subplots(2, 1, sharex=True, subplot_kw=dict(facecolor="#EEEEEE"))
-    fig.set_size_inches(10, 8)
+def add_stats_text(ax, text):
+    """Add a text box of stats to the top left corner of an axes."""
+    ax.text(0.05,
+            0.95,
+            text,
+            transform=ax.transAxes,
+            fontsize=14,
+            verticalalignment="top",
+            horizontalalignment="left",
+            bbox=STATS_TEXT_PROPERTIES)
 
-    # Connect plugin
-    mpld3.plugins.connect(fig, MousePositionDatePlugin())
 
+def plot_comparison_axes(axes, dates, observed, modeled, absolute_error,
+                         label):
+    """Template of the observed vs. modeled axes and the absolute error axes
+    of a comparison plot."""
     # Plot comparison on first row
     axes[0].grid(True)
     axes[0].set_title("Observed flow vs. Modeled flow")
     axes[0].set_xlabel("Date")
     axes[0].set_ylabel(label)
 
-    # Explicitly using matplotlibs new default color palette (blue and orange)
-    axes[0].plot(dates, observed, linewidth=2, color="#1f77b4",
+    axes[0].plot(dates, observed, linewidth=2, color=OBSERVED_COLOR,
                  label="Observed")
-    axes[0].plot(dates, modeled, linewidth=2, color="#ff7f0e",
+    axes[0].plot(dates, modeled, linewidth=2, color=MODELED_COLOR,
                  label="Modeled")
+    add_legend(axes[0])
 
-    # Legend
-    handles, labels = axes[0].get_legend_handles_labels()
-    legend = axes[0].legend(handles, labels, fancybox=True)
-    legend.get_frame().set_alpha(0.5)
-
+    # Plot absolute error on second row
     axes[1].grid(True)
     axes[1].set_title("Absolute Error: Observed - Modeled")
     axes[1].set_xlabel("Date")
@@ -128,69 +126,26 @@ def plot_timeseries_comparison_html(dates, observed, modeled, absolute_error, la
 
     axes[1].plot(dates, absolute_error, linewidth=2, color="black")
 
-    # Rotate and align the tick labels so they look better
-    fig.autofmt_xdate()
-    axes[1].fmt_xdata = mdates.DateFormatter("%Y-%m-%d")
-
-    return mpld3.fig_to_html(fig)
-
-
-def plot_flow_duration_curve_html(values, label):
-    """Return an html string of the figure"""
-
-    fig, ax = plt.subplots(subplot_kw=dict(facecolor="#EEEEEE"))
-    fig.set_size_inches(10, 6)
-
-    label = label.replace("_", " ").capitalize()
 
-    ax.grid(color="white", linestyle="solid")
-    ax.set_title("Flow Duration Curve: Observed vs. Modeled", fontsize=20)
+def flow_duration_axes(ax, label, title):
+    """Template of the axes of a flow duration curve."""
+    ax.grid()
+    ax.set_title(title)
     ax.set_xlabel("Exceedance Probability (%)")
     ax.set_ylabel(label)
     ax.set_yscale("log")
 
-    probabilities, values_sorted = hydrocalcs.flow_duration(values)
-
-    ax.plot(probabilities, values_sorted, linewidth=2)
-
-    # Connect plugin
-    mpld3.plugins.connect(fig, MousePositionDatePlugin())
-
-    return mpld3.fig_to_html(fig)
-
-
-def plot_flow_duration_curve_comparison_html(observed, modeled, label):
-    """Plot flow duration curve."""
-
-    fig, ax = plt.subplots(subplot_kw=dict(facecolor="#EEEEEE"))
-    fig.set_size_inches(10, 6)
-
-    label = label.replace("_", " ").capitalize()
-
-    ax.grid(color="white", linestyle="solid")
-    ax.set_title("Flow Duration Curve: Observed vs. Modeled", fontsize=20)
-    ax.set_xlabel("Exceedance Probability (%)")
-    ax.set_ylabel(label)
-    ax.set_yscale("log")
 
+def plot_flow_duration_comparison_lines(ax, observed, modeled):
+    """Plot the observed and modeled flow duration curves on an axes."""
     observed_prob, observed_sorted = hydrocalcs.flow_duration(observed)
     modeled_prob, modeled_sorted = hydrocalcs.flow_duration(modeled)
 
-    # Explicitly using matplotlibs new default color palette (blue and orange)
-    ax.plot(observed_prob, observed_sorted, linewidth=2, color="#1f77b4",
-            label="Observed")
-    ax.plot(modeled_prob, modeled_sorted, linewidth=2, color="#ff7f0e",
-            label="Modeled")
-
-    # Legend
-    handles, labels = ax.get_legend_handles_labels()
-    legend = ax.legend(handles, labels, fancybox=True)
-    legend.get_frame().set_alpha(0.5)
-
-    # Connect plugin
-    mpld3.plugins.connect(fig, MousePositionDatePlugin())
-
-    return mpld3.fig_to_html(fig)
+    ax.plot(observed_prob, observed_sorted, linewidth=2,
+            color=OBSERVED_COLOR, label="Observed")
+    ax.plot(modeled_prob, modeled_sorted, linewidth=2,
+            color=MODELED_COLOR, label="Modeled")
+    add_legend(ax)
 
 
 def plot_timeseries(dates,
@@ -203,54 +158,33 @@ def plot_timeseries(dates,
                     label,
                     filename):
     """Plot timeseries."""
-    fig, ax = plt.subplots()
-    fig.set_size_inches(12, 10)
-
-    colorstr = "k"
-    for key, value in COLORS.items():
-        if key in label:
-            colorstr = value
-
-    label = label.replace("_", " ").capitalize()
-
-    ax.grid()
-    ax.set_title(label)
-    ax.set_xlabel("Date")
-    ax.set_ylabel(label)
+    with figure(12, 10) as (fig, ax):
+        colorstr = get_color(label)
+        label = get_title(label)
 
-    ax.plot(dates, values, linewidth=2, color=colorstr)
+        ax.grid()
+        ax.set_title(label)
+        ax.set_xlabel("Date")
+        ax.set_ylabel(label)
 
-    # Rotate and align the tick labels so they look better
-    fig.autofmt_xdate()
-    ax.fmt_xdata = mdates.DateFormatter("%Y-%m-%d")
+        ax.plot(dates, values, linewidth=2, color=colorstr)
 
-    # Add text of descriptive stats to figure
-    text = (
-        "Mean = {0:.2f}\n"
-        "Median = {1:.2f}\n"
-        "Mode = {2:.2f}\n"
-        "Max = {3:.2f}\n"
-        "Min = {4:.2f}"
-        "".format(mean, median, mode, max, min)
-    )
+        # Rotate and align the tick labels so they look better
+        fig.autofmt_xdate()
+        ax.fmt_xdata = mdates.DateFormatter("%Y-%m-%d")
 
-    patch_properties = {
-        "boxstyle": "round",
-        "facecolor": "white",
-        "alpha": 0.5
-    }
+        # Add text of descriptive stats to figure
+        text = (
+            "Mean = {0:.2f}\n"
+            "Median = {1:.2f}\n"
+            "Mode = {2:.2f}\n"
+            "Max = {3:.2f}\n"
+            "Min = {4:.2f}"
+            "".format(mean, median, mode, max, min)
+        )
+        add_stats_text(ax, text)
 
-    ax.text(0.05,
-            0.95,
-            text,
-            transform=ax.transAxes,
-            fontsize=14,
-            verticalalignment="top",
-            horizontalalignment="left",
-            bbox=patch_properties)
-
-    plt.savefig(filename, format="png")
-    plt.close()
+        fig.savefig(filename, format="png")
 
 
 def plot_timeseries_comparison(dates,
@@ -262,128 +196,43 @@ def plot_timeseries_comparison(dates,
                                label,
                                filename):
     """Plot difference between timeseries."""
+    with figure(12, 10, nrows=2, sharex=True) as (fig, axes):
+        plot_comparison_axes(axes, dates, observed, modeled, absolute_error,
+                             get_title(label))
 
-    fig, axes = plt.subplots(2, 1, sharex=True)
-    fig.set_size_inches(12, 10)
-
-    label = label.replace("_", " ").capitalize()
-
-    # Plot comparison on first row
-    axes[0].grid(True)
-    axes[0].set_title("Observed flow vs. Modeled flow")
-    axes[0].set_xlabel("Date")
-    axes[0].set_ylabel(label)
-
-    # Explicitly using matplotlibs new default color palette (blue and orange)
-    axes[0].plot(dates, observed, linewidth=2, color="#1f77b4",
-                 label="Observed")
-    axes[0].plot(dates, modeled, linewidth=2, color="#ff7f0e",
-                 label="Modeled")
-
-    # Legend
-    handles, labels = axes[0].get_legend_handles_labels()
-    legend = axes[0].legend(handles, labels, fancybox=True)
-    legend.get_frame().set_alpha(0.5)
-
-    # Add text of stats to figure
-    text_nash_sutcliffe = (
-        "Nash-Sutcliffe = {:.2f}"
-        "".format(nash_sutcliffe)
-    )
-
-    patch_properties = {
-        "boxstyle": "round",
-        "facecolor": "white",
-        "alpha": 0.5
-    }
-
-    axes[0].text(0.05,
-                 0.95,
-                 text_nash_sutcliffe,
-                 transform=axes[0].transAxes,
-                 fontsize=14,
-                 verticalalignment="top",
-                 horizontalalignment="left",
-                 bbox=patch_properties)
-
-    # Plot absolute error on second row
-    axes[1].grid(True)
-    axes[1].set_title("Absolute Error: Observed - Modeled")
-    axes[1].set_xlabel("Date")
-    axes[1].set_ylabel("Error (mm/day)")
-
-    axes[1].plot(dates, absolute_error, linewidth=2, color="black")
-
-    # Rotate and align the tick labels so they look better
-    fig.autofmt_xdate()
-    axes[1].fmt_xdata = mdates.DateFormatter("%Y-%m-%d")
+        # Add text of stats to figure
+        add_stats_text(axes[0],
+                       "Nash-Sutcliffe = {:.2f}".format(nash_sutcliffe))
 
-    # Add text of stats to figure
-    text_mse = (
-        "Mean Squared Error = {:.2f}"
-        "".format(mean_squared_error)
-    )
+        # Rotate and align the tick labels so they look better
+        fig.autofmt_xdate()
+        axes[1].fmt_xdata = mdates.DateFormatter("%Y-%m-%d")
 
-    axes[1].text(0.05,
-                 0.95,
-                 text_mse,
-                 transform=axes[1].transAxes,
-                 fontsize=14,
-                 verticalalignment="top",
-                 horizontalalignment="left",
-                 bbox=patch_properties)
+        # Add text of stats to figure
+        add_stats_text(axes[1],
+                       "Mean Squared Error = {:.2f}".format(mean_squared_error))
 
-    plt.savefig(filename, format="png")
-    plt.close()
+        fig.savefig(filename, format="png")
 
 
 def plot_flow_duration_curve(values, label, filename):
     """Plot flow duration curve."""
-    fig, ax = plt.subplots()
-    fig.set_size_inches(12, 10)
+    with figure(12, 10) as (fig, ax):
+        flow_duration_axes(ax, get_title(label), "Flow Duration Curve")
 
-    label = label.replace("_", " ").capitalize()
+        probabilities, values_sorted = hydrocalcs.flow_duration(values)
 
-    ax.grid()
-    ax.set_title("Flow Duration Curve")
-    ax.set_xlabel("Exceedance Probability (%)")
-    ax.set_ylabel(label)
-    ax.set_yscale("log")
+        ax.plot(probabilities, values_sorted, linewidth=2)
 
-    probabilities, values_sorted = hydrocalcs.flow_duration(values)
-
-    ax.plot(probabilities, values_sorted, linewidth=2)
-
-    plt.savefig(filename, format="png")
-    plt.close()
+        fig.savefig(filename, format="png")
 
 
 def plot_flow_duration_curve_comparison(observed, modeled, label, filename):
     """Plot flow duration curve."""
-    fig, ax = plt.subplots()
-    fig.set_size_inches(12, 10)
-
-    label = label.replace("_", " ").capitalize()
-
-    ax.grid()
-    ax.set_title("Flow Duration Curve: Observed vs. Modeled")
-    ax.set_xlabel("Exceedance Probability (%)")
-    ax.set_ylabel(label)
-    ax.set_yscale("log")
-
-    observed_prob, observed_sorted = hydrocalcs.flow_duration(observed)
-    modeled_prob, modeled_sorted = hydrocalcs.flow_duration(modeled)
-
-    # Explicitly using matplotlibs new default color palette (blue and orange)
-    ax.plot(observed_prob, observed_sorted, linewidth=2, color="#1f77b4",
-            label="Observed")
-    ax.plot(modeled_prob, modeled_sorted, linewidth=2, color="#ff7f0e",
-            label="Modeled")
-
-    # Legend
-    handles, labels = ax.get_legend_handles_labels()
-    legend = ax.legend(handles, labels, fancybox=True)
-    legend.get_frame().set_alpha(0.5)
+    with figure(12, 10) as (fig, ax):
+        flow_duration_axes(ax,
+                           get_title(label),
+                           "Flow Duration Curve: Observed vs. Modeled")
+        plot_flow_duration_comparison_lines(ax, observed, modeled)
 
-    plt.savefig(filename, format="png")
-    plt.close()
+        fig.savefig(filename, format="png")
@@ -0,0 +1,265 @@
+"""Module that contains functions to profile a model run, to find where the
+time of a slow run goes, such as Topmodel.run(), pandas csv parsing, or
+matplotlib.
+
+The cprofile profiler is deterministic: it records every function call,
+and writes the profile to a *.prof file, which is read with pstats or
+viewers such as snakeviz, and a table of the functions with the most time
+and of the time of each package. The pyinstrument profiler is a low
+overhead sampling profiler, if the optional pyinstrument package is
+installed, and writes an interactive *.html call tree and a text call tree.
+
+Plots rendered in a pool of processes are not profiled, so profile model
+runs with plots rendered in the model process, see main.set_plot_options().
+"""
+
+from io import StringIO
+import os
+from pathlib import Path
+import pstats
+import sys
+import sysconfig
+
+from topmodelpy.exceptions import DependencyErrorMissingPackage
+
+
+PROFILERS = ["cprofile", "pyinstrument"]
+
+# Default file path of the profile of each profiler
+PROFILE_FILEPATHS = {
+    "cprofile": "topmodelpy.prof",
+    "pyinstrument": "topmodelpy.html",
+}
+
+SORT_KEYS = ["tottime", "cumtime"]
+
+
+def import_pyinstrument():
+    """Import the optional pyinstrument package.
+
+    :return: The pyinstrument module.
+    :rtype: module
+    """
+    try:
+        import pyinstrument
+    except ImportError:
+        raise DependencyErrorMissingPackage("pyinstrument",
+                                            "--profiler pyinstrument")
+
+    return pyinstrument
+
+
+def get_short_filename(filename):
+    """Return the file name of a function relative to the longest matching
+    sys.path directory, such as pandas/io/parsers/readers.py."""
+    filename = str(filename)
+    prefixes = [os.path.join(os.path.abspath(path), "")
+                for path in sys.path if path]
+    matches = [prefix for prefix in prefixes if filename.startswith(prefix)]
+    if not matches:
+        return filename
+
+    return filename[len(max(matches, key=len)):]
+
+
+def get_package(filename):
+    """Return the top level package of a file name, python for the standard
+    library, or built-in for built-in functions."""
+    filename = str(filename)
+    if filename == "~":
+        return "built-in"
+    stdlib = os.path.join(sysconfig.get_paths()["stdlib"], "")
+    if (filename.startswith("<")
+            or (filename.startswith(stdlib)
+                and "site-packages" not in filename)):
+        return "python"
+
+    short_filename = get_short_filename(filename)
+    if os.path.isabs(short_filename):
+        return "python"
+
+    return Path(short_filename).parts[0].replace(".py", "")
+
+
+def get_package_times(stats):
+    """Return a dict of the time in the functions of each package.
+
+    The time in built-in functions, such as numpy ufuncs or the png encoder,
+    is attributed to the packages of the functions that call them.
+
+    :param stats: Profile statistics.
+    :type stats: pstats.Stats
+    :return: Dict of package names and seconds.
+    :rtype: dict
+    """
+    packages = {}
+    for (filename, _, _), values in stats.stats.items():
+        _, _, tottime, _, callers = values
+        shares = {get_package(filename): tottime}
+        if get_package(filename) == "built-in" and callers:
+            shares = {}
+            for (caller_filename, _, _), caller_values in callers.items():
+                package = get_package(caller_filename)
+                shares[package] = shares.get(package, 0.0) + caller_values[2]
+        for package, seconds in shares.items():
+            packages[package] = packages.get(package, 0.0) + seconds
+
+    return packages
+
+
+def format_stats(stats, top=25, sort="tottime"):
+    """Format a table of the functions with the most time, and a table of
+    the packages with the most time, see get_package_times().
+
+    :param stats: Profile statistics.
+    :type stats: pstats.Stats
+    :param top: Number of functions and packages in the tables.
+    :type top: int
+    :param sort: Sort the functions by the time in the function itself,
+                 tottime, or in the function and the functions it calls,
+                 cumtime.
+    :type sort: string
+    :return: The tables.
+    :rtype: string
+    """
+    if sort not in SORT_KEYS:
+        raise ValueError(
+            "Invalid sort: {}\n"
+            "Valid sorts: {}".format(sort, SORT_KEYS)
+        )
+
+    rows = []
+    for (filename, lineno, name), values in stats.stats.items():
+        _, ncalls, tottime, cumtime, _ = values
+        rows.append({
+            "ncalls": ncalls,
+            "tottime": tottime,
+            "cumtime": cumtime,
+            "function": "{}:{}({})".format(get_short_filename(filename),
+                                           lineno,
+                                           name),
+        })
+    rows.sort(key=lambda row: row[sort], reverse=True)
+
+    lines = [
+        "Total time: {:.3f} s".format(stats.total_tt),
+        "",
+        "Top {} functions by {}:".format(top, sort),
+        "{:>10} {:>10} {:>10}  {}".format("ncalls", "tottime", "cumtime",
+                                          "function"),
+    ]
+    for row in rows[:top]:
+        lines.append("{ncalls:>10} {tottime:>10.3f} {cumtime:>10.3f}  "
+                     "{function}".format(**row))
+
+    lines.extend(["", "Top {} packages by tottime:".format(top),
+                  "{:>10} {:>7}  {}".format("tottime", "percent", "package")])
+    packages = sorted(get_package_times(stats).items(),
+                      key=lambda item: item[1],
+                      reverse=True)
+    for package, tottime in packages[:top]:
+        lines.append("{:>10.3f} {:>6.1f}%  {}".format(
+            tottime,
+            100 * tottime / stats.total_tt if stats.total_tt else 0.0,
+            package))
+
+    return "\n".join(lines)
+
+
+def profile_cprofile(function, filepath, top=25, sort="tottime", **kwargs):
+    """Call a function with the cProfile profiler, write the profile to a
+    *.prof file, and write a table of the functions with the most time to
+    a *.txt file of the same name, see format_stats().
+
+    :param function: The function to profile.
+    :type function: function
+    :param filepath: File path of the profile (*.prof).
+    :type filepath: string
+    :param top: Number of functions in the table.
+    :type top: int
+    :param sort: Sort of the functions in the table, tottime or cumtime.
+    :type sort: string
+    :return: Tuple of the return value of the function and the table.
+    :rtype: tuple
+    """
+    # Imported here since the profiler is only needed with --profile
+    import cProfile
+
+    profiler = cProfile.Profile()
+    try:
+        result = profiler.runcall(function, **kwargs)
+    finally:
+        profiler.dump_stats(str(filepath))
+
+    table = format_stats(pstats.Stats(profiler, stream=StringIO()), top, sort)
+    with open(Path(filepath).with_suffix(".txt"), "w") as f:
+        f.write(table + "\n")
+
+    return result, table
+
+
+def profile_pyinstrument(function, filepath, **kwargs):
+    """Call a function with the pyinstrument sampling profiler, write the
+    call tree to an *.html file, and write a text call tree to a *.txt file
+    of the same name.
+
+    :param function: The function to profile.
+    :type function: function
+    :param filepath: File path of the call tree (*.html).
+    :type filepath: string
+    :return: Tuple of the return value of the function and the text call
+             tree.
+    :rtype: tuple
+    """
+    pyinstrument = import_pyinstrument()
+
+    profiler = pyinstrument.Profiler()
+    profiler.start()
+    try:
+        result = function(**kwargs)
+    finally:
+        profiler.stop()
+
+    with open(filepath, "w") as f:
+        f.write(profiler.output_html())
+    text = profiler.output_text(unicode=False, color=False)
+    with open(Path(filepath).with_suffix(".txt"), "w") as f:
+        f.write(text)
+
+    return result, text
+
+
+def profile(function, filepath, profiler="cprofile", top=25, sort="tottime",
+            **kwargs):
+    """Call a function with a profiler, see profile_cprofile() and
+    profile_pyinstrument().
+
+    :param function: The function to profile.
+    :type function: function
+    :param filepath: File path of the profile, *.prof for cprofile and
+                     *.html for pyinstrument, see PROFILE_FILEPATHS.
+    :type filepath: string
+    :param profiler: The profiler, cprofile or pyinstrument.
+    :type profiler: string
+    :param top: Number of functions in the cprofile table.
+    :type top: int
+    :param sort: Sort of the functions in the cprofile table.
+    :type sort: string
+    :return: Tuple of the return value of the function and the report of
+             the profiler.
+    :rtype: tuple
+    """
+    if profiler not in PROFILERS:
+        raise ValueError(
+            "Invalid profiler: {}\n"
+            "Valid profilers: {}".format(profiler, PROFILERS)
+        )
+
+    if profiler == "pyinstrument":
+        return profile_pyinstrument(function, filepath, **kwargs)
+
+    return profile_cprofile(function,
+                            filepath,
+                            top=top,
+                            sort=sort,
+                            **kwargs)
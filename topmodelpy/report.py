@@ -1,37 +1,284 @@
 """Module that contains functions to render an html file.
 
+The report embeds the output data once, as a single columnar payload that
+is shared by all interactive plots. The payload is a binary blob of a date
+array (float64 milliseconds since the epoch) followed by one float32 array
+per output column, optionally compressed with deflate (zlib), and base64
+encoded, along with a small json header of the name, type, and length of
+each array. A small renderer in the report template decodes the payload in
+the browser and draws every chart from it, so the report size grows with
+the output data rather than with the number of plots.
+
+Series longer than max_points are downsampled with the largest triangle
+three buckets algorithm, see utils.lttb(). The rows kept are the union of
+the rows kept for each column, so all columns share one date array.
 """
 
+import base64
+from pathlib import PurePath
+import zlib
+
 from jinja2 import PackageLoader, Environment
+import numpy as np
+
+from topmodelpy import hydrocalcs, plots, utils
+
+
+COMPRESSIONS = ["none", "deflate"]
+
+
+def get_index(df, columns, max_points=None):
+    """Return the row indices of the report data, the union of the rows kept
+    for each column when downsampled to max_points.
+
+    :param df: Dataframe of the output data
+    :type df: pandas.DataFrame
+    :param columns: Dictionary of the arrays of each column
+    :type columns: dict
+    :param max_points: Maximum number of points of each column, None for all
+    :type max_points: int
+    :return: Array of row indices
+    :rtype: numpy.ndarray
+    """
+    if not max_points or len(df) <= max_points:
+        return np.arange(len(df))
+
+    x = get_dates(df)
+    index = [utils.lttb(x, values, max_points) for values in columns.values()]
+
+    return np.unique(np.concatenate(index))
+
+
+def get_dates(df):
+    """Return the dates of the output data as milliseconds since the epoch."""
+    return df.index.values.astype("datetime64[ms]").astype(np.int64) * 1.0
+
+
+def get_payload_arrays(df, comparison_data, max_points=None):
+    """Return a list of (name, array) tuples of the report data.
+
+    Arrays are the date, each output column, the absolute error of the
+    comparison, and the exceedance probability and sorted values of each
+    flow duration curve.
+
+    :param df: Dataframe of the output data
+    :type df: pandas.DataFrame
+    :param comparison_data: Comparison statistics, see
+                            main.get_comparison_data()
+    :type comparison_data: dict
+    :param max_points: Maximum number of points of each series, None for all
+    :type max_points: int
+    :return: List of (name, array) tuples, the date array first
+    :rtype: list
+    """
+    columns = {key: value.to_numpy(dtype=float) for key, value in df.items()}
+    if comparison_data:
+        columns["absolute_error"] = np.asarray(
+            comparison_data["absolute_error"], dtype=float)
+
+    index = get_index(df, columns, max_points)
+    arrays = [("date", get_dates(df)[index])]
+    for key, values in columns.items():
+        arrays.append((key, values[index]))
+
+    flow_duration_keys = ["flow_predicted"]
+    if comparison_data:
+        flow_duration_keys.append("flow_observed")
+    for key in flow_duration_keys:
+        probabilities, values_sorted = hydrocalcs.flow_duration(columns[key])
+        probabilities = np.asarray(probabilities)
+        if max_points and len(values_sorted) > max_points:
+            kept = utils.lttb(probabilities, values_sorted, max_points)
+            probabilities, values_sorted = probabilities[kept], values_sorted[kept]
+        arrays.append(("flow_duration_probability_" + key, probabilities))
+        arrays.append(("flow_duration_" + key, values_sorted))
+
+    return arrays
+
 
+def encode_payload(arrays, compression="deflate"):
+    """Encode arrays as a single report payload.
 
-def render_report(df, plots, comparison_data, flow_duration_curve_data, filename):
+    :param arrays: List of (name, array) tuples, the date array first
+    :type arrays: list
+    :param compression: Compression of the payload, none or deflate
+    :type compression: string
+    :return: Dictionary of the compression, the name, dtype, and length of
+             each array, and the base64 encoded data
+    :rtype: dict
+    """
+    if compression not in COMPRESSIONS:
+        raise ValueError(
+            "Invalid report compression: {}\n"
+            "Valid report compressions: {}".format(compression, COMPRESSIONS)
+        )
+
+    header = []
+    blobs = []
+    for name, array in arrays:
+        dtype = "float64" if name == "date" else "float32"
+        header.append({"name": name, "dtype": dtype, "length": len(array)})
+        little_endian = "<f8" if dtype == "float64" else "<f4"
+        blobs.append(np.asarray(array, dtype=little_endian).tobytes())
+
+    data = b"".join(blobs)
+    if compression == "deflate":
+        data = zlib.compress(data, 6)
+
+    return {
+        "compression": compression,
+        "arrays": header,
+        "data": base64.b64encode(data).decode("ascii"),
+    }
+
+
+def get_charts(df, comparison_data):
+    """Return a dictionary of the chart specification of each chart of the
+    report, keyed by the html id of the chart.
+
+    :param df: Dataframe of the output data
+    :type df: pandas.DataFrame
+    :param comparison_data: Comparison statistics, see
+                            main.get_comparison_data()
+    :type comparison_data: dict
+    :return: Dictionary of chart specifications
+    :rtype: dict
+    """
+    charts = {}
+    for i, key in enumerate(df.columns):
+        label = "{} (mm/day)".format(key)
+        charts["chart-{}".format(i)] = {
+            "title": plots.get_title(label),
+            "x": "date",
+            "xtype": "date",
+            "lines": [{"y": key, "color": plots.get_color(label)}],
+        }
+
+    charts["chart-flow-duration-curve"] = {
+        "title": "Flow Duration Curve",
+        "x": "flow_duration_probability_flow_predicted",
+        "xlabel": "Exceedance Probability (%)",
+        "ylabel": plots.get_title("flow_predicted (mm/day)"),
+        "logy": True,
+        "lines": [{"y": "flow_duration_flow_predicted",
+                   "x": "flow_duration_probability_flow_predicted",
+                   "color": plots.OBSERVED_COLOR}],
+    }
+
+    if comparison_data:
+        charts["chart-comparison"] = {
+            "title": "Observed flow vs. Modeled flow",
+            "x": "date",
+            "xtype": "date",
+            "xlabel": "Date",
+            "ylabel": "flow (mm/day)",
+            "lines": [
+                {"y": "flow_observed", "color": plots.OBSERVED_COLOR,
+                 "label": "Observed"},
+                {"y": "flow_predicted", "color": plots.MODELED_COLOR,
+                 "label": "Modeled"},
+            ],
+        }
+        charts["chart-absolute-error"] = {
+            "title": "Absolute Error: Observed - Modeled",
+            "x": "date",
+            "xtype": "date",
+            "xlabel": "Date",
+            "ylabel": "Error (mm/day)",
+            "height": 250,
+            "lines": [{"y": "absolute_error", "color": "black"}],
+        }
+        charts["chart-flow-duration-curve-comparison"] = {
+            "title": "Flow Duration Curve: Observed vs. Modeled",
+            "x": "flow_duration_probability_flow_observed",
+            "xlabel": "Exceedance Probability (%)",
+            "ylabel": "Flow (mm/day)",
+            "logy": True,
+            "lines": [
+                {"y": "flow_duration_flow_observed",
+                 "x": "flow_duration_probability_flow_observed",
+                 "color": plots.OBSERVED_COLOR, "label": "Observed"},
+                {"y": "flow_duration_flow_predicted",
+                 "x": "flow_duration_probability_flow_predicted",
+                 "color": plots.MODELED_COLOR, "label": "Modeled"},
+            ],
+        }
+
+    return charts
+
+
+def render_report(df, comparison_data, max_points=None, compression="deflate",
+                  data_filename=None):
     """Render an html page of the model output data.
 
-    :param data: Data to fill template with
-    :param type: dictionary
-    :param template_filename: The filename of the template to fill
-    :type template_filename: string
+    :param df: Dataframe of the output data
+    :type df: pandas.DataFrame
+    :param comparison_data: Comparison statistics, see
+                            main.get_comparison_data()
+    :type comparison_data: dict
+    :param max_points: Maximum number of points of each series, None for all
+    :type max_points: int
+    :param compression: Compression of the data payload, none or deflate
+    :type compression: string
+    :param data_filename: Optional file path of the full resolution output
+                          data, see save_data(), to link to
+    :type data_filename: string
     """
     loader = PackageLoader("topmodelpy", "templates")
     env = Environment(loader=loader)
     template = env.get_template("report_template.html")
 
+    payload = encode_payload(
+        get_payload_arrays(df, comparison_data, max_points),
+        compression=compression)
+
     return template.render(df=df,
-                           plots=plots,
                            comparison_data=comparison_data,
-                           flow_duration_curve_data=flow_duration_curve_data)
+                           charts=get_charts(df, comparison_data),
+                           payload=payload,
+                           data_link=(PurePath(data_filename).name
+                                      if data_filename else None))
 
 
-def save(df, plots, comparison_data, flow_duration_curve_data, filename):
-    """Save summary as a restructured text file.
+def save(df, comparison_data, filename, max_points=None, compression="deflate",
+         data_filename=None):
+    """Save an html report of the model output data.
 
-    :param data: Data to fill template with
-    :param type: dictionary
+    :param df: Dataframe of the output data
+    :type df: pandas.DataFrame
+    :param comparison_data: Comparison statistics, see
+                            main.get_comparison_data()
+    :type comparison_data: dict
     :param filename: The full path with filename of the output file to write
     :type filename: string
+    :param max_points: Maximum number of points of each series, None for all
+    :type max_points: int
+    :param compression: Compression of the data payload, none or deflate
+    :type compression: string
+    :param data_filename: Optional file path of the full resolution output
+                          data, see save_data(), to link to
+    :type data_filename: string
     """
     with open(filename, "w") as f:
         f.write(
-            render_report(df, plots, comparison_data, flow_duration_curve_data, filename)
+            render_report(df, comparison_data, max_points, compression,
+                          data_filename)
         )
+
+
+def save_data(df, filename):
+    """Save the full resolution output data as a compressed numpy file
+    (*.npz) with a date array and an array of each column, that is read with
+    numpy.load().
+
+    :param df: Dataframe of the output data
+    :type df: pandas.DataFrame
+    :param filename: The full path with filename of the output file to write
+    :type filename: string
+    """
+    arrays = {"date": df.index.values}
+    for key, value in df.items():
+        arrays[key] = value.to_numpy()
+
+    with open(filename, "wb") as f:
+        np.savez_compressed(f, **arrays)
@@ -0,0 +1,421 @@
+"""Module that contains a long-running local model server, which runs model
+configuration files on a pool of warm worker processes.
+
+Each worker process imports the model modules, pandas, and numpy once when
+the server starts, and reads input files through the InputCache of the
+process, see batch, so a model run pays neither interpreter and import
+start-up nor input file parsing after the first run of an input file. Runs
+return the predicted flows and the metrics, see api.run(), and do not write
+output files.
+
+The server has a small json api over local http, on a host and port or on a
+Unix socket:
+
+    POST /run     {"config": "modelconfig.ini",
+                   "parameters": {"scaling_parameter": 12}}
+                  returns {"dates": [...], "flows": [...], "metrics": {...},
+                           "seconds": 0.1}
+    GET  /stats   returns the number of requests, throughput, and latency
+    GET  /health  returns {"status": "ok"}
+
+At most jobs runs are run at once, one per worker process, and at most
+max_queue more runs wait in the queue. Requests beyond that are rejected
+with 503, so callers can back off. Runs of an invalid model configuration
+file, input file, or parameter return 400, and other failures return 500.
+If a worker process dies, its request returns 500 and the pool of workers
+is replaced, so later requests still run.
+
+A Unix socket path is only replaced if it is a stale socket, one that no
+server accepts connections on, and only the socket that the server created
+is removed on shutdown; any other file at the path is left as it is.
+"""
+
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import os
+import socket
+import socketserver
+import stat
+import threading
+import time
+
+from topmodelpy import __version__
+from topmodelpy.exceptions import (ServerErrorInvalidSocketPath,
+                                   TopmodelpyException)
+
+
+# Errors of a run that are caused by the request, such as an invalid model
+# configuration file, input file, or parameter, rather than by the server
+REQUEST_ERRORS = (ValueError, TopmodelpyException)
+
+
+def warm_up():
+    """Import the modules of a model run in a worker process."""
+    from topmodelpy import api, batch, main  # noqa: F401
+
+
+def run_request(configfile, parameters=None):
+    """Run a model configuration file, reading input files through the cache
+    of this process, with optional overrides of the parameter values.
+
+    :param configfile: File path of the model configuration file.
+    :type configfile: string
+    :param parameters: Optional dict of parameter names and values that
+                       override the values of the parameters file.
+    :type parameters: dict
+    :return: A dict of the dates and predicted flows, the metrics, and the
+             seconds of the model run.
+    :rtype: dict
+    """
+    from topmodelpy import api, batch, main, modelconfigfile
+
+    start = time.perf_counter()
+    config_data = modelconfigfile.read(configfile)
+    if config_data is None:
+        raise ValueError("Invalid model config file: {}".format(configfile))
+    inputs = main.read_input_files(config_data,
+                                   cache=batch.get_input_cache())
+    if any(data is None for data in inputs):
+        raise ValueError(
+            "Invalid input files of model config file: {}".format(configfile)
+        )
+    parameters_data, timeseries, twi = inputs
+
+    parameters_data = dict(parameters_data)
+    for name, value in (parameters or {}).items():
+        if name not in parameters_data:
+            raise ValueError(
+                "Invalid parameter: {}\n"
+                "Valid parameters: {}".format(name, list(parameters_data))
+            )
+        parameters_data[name] = dict(parameters_data[name], value=value)
+
+    results = api.run(
+        parameters_data,
+        timeseries,
+        twi,
+        snowmelt=config_data["Options"].getboolean("option_snowmelt")
+    )
+
+    return {
+        "dates": results.flows.index.strftime("%Y-%m-%dT%H:%M:%S").tolist(),
+        "flows": results.flows.tolist(),
+        "metrics": {key: float(value)
+                    for key, value in results.metrics.items()},
+        "seconds": time.perf_counter() - start,
+    }
+
+
+class Stats:
+    """Counts, throughput, and latency of the requests of a server.
+
+    :param max_latencies: Number of the most recent latencies kept for the
+                          latency percentiles.
+    :type max_latencies: int
+    """
+    def __init__(self, max_latencies=1000):
+        self.lock = threading.Lock()
+        self.started = time.monotonic()
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.pending = 0
+        self.latencies = deque(maxlen=max_latencies)
+
+    def to_dict(self, jobs):
+        """Return the stats as a dict.
+
+        :param jobs: Number of worker processes, to split the pending
+                     requests into running and queued requests.
+        :type jobs: int
+        """
+        with self.lock:
+            uptime = time.monotonic() - self.started
+            latencies = sorted(self.latencies)
+            data = {
+                "uptime_seconds": uptime,
+                "completed": self.completed,
+                "failed": self.failed,
+                "rejected": self.rejected,
+                "running": min(self.pending, jobs),
+                "queued": max(self.pending - jobs, 0),
+                "throughput_per_second": (
+                    (self.completed + self.failed) / uptime if uptime else 0.0
+                ),
+            }
+
+        data["latency_seconds"] = {
+            "p50": get_percentile(latencies, 50),
+            "p95": get_percentile(latencies, 95),
+            "max": latencies[-1] if latencies else None,
+        }
+
+        return data
+
+
+def get_percentile(values, percentile):
+    """Return the nearest rank percentile of sorted values, or None."""
+    if not values:
+        return None
+    rank = int(round(percentile / 100 * (len(values) - 1)))
+
+    return values[rank]
+
+
+class ModelServer:
+    """A pool of warm worker processes that run requests, with a
+    concurrency limit and a bounded queue.
+
+    :param jobs: Number of worker processes, the maximum number of runs at
+                 once, defaults to the number of cpus.
+    :type jobs: int
+    :param max_queue: Maximum number of runs waiting for a worker.
+    :type max_queue: int
+    """
+    def __init__(self, jobs=None, max_queue=100):
+        self.jobs = jobs or os.cpu_count() or 1
+        self.max_queue = max_queue
+        self.slots = threading.BoundedSemaphore(self.jobs + max_queue)
+        self.stats = Stats()
+        self.lock = threading.Lock()
+        self.executor = self.create_executor()
+
+    def create_executor(self):
+        """Return a pool of warm worker processes."""
+        executor = ProcessPoolExecutor(max_workers=self.jobs,
+                                       initializer=warm_up)
+        # Start all workers now, rather than on the first requests
+        for future in [executor.submit(time.sleep, 0.1)
+                       for _ in range(self.jobs)]:
+            future.result()
+
+        return executor
+
+    def restart(self, executor):
+        """Replace a broken pool of worker processes, such as after a worker
+        was killed, unless another request already replaced it."""
+        with self.lock:
+            if self.executor is executor:
+                self.executor = self.create_executor()
+        executor.shutdown(wait=False)
+
+    def run(self, configfile, parameters=None):
+        """Run a request on a worker process, waiting in the queue if all
+        workers are busy.
+
+        :return: Tuple of the http status code and the response dict.
+        :rtype: tuple
+        """
+        if not self.slots.acquire(blocking=False):
+            with self.stats.lock:
+                self.stats.rejected += 1
+            return 503, {"error": "Server is busy, the queue is full"}
+
+        start = time.perf_counter()
+        with self.stats.lock:
+            self.stats.pending += 1
+        executor = self.executor
+        try:
+            result = executor.submit(run_request,
+                                     configfile,
+                                     parameters).result()
+            status, response = 200, result
+        except BrokenProcessPool as err:
+            self.restart(executor)
+            status, response = 500, {"error": str(err)}
+        except REQUEST_ERRORS as err:
+            status, response = 400, {"error": str(err) or type(err).__name__}
+        except Exception as err:
+            status, response = 500, {"error": str(err) or type(err).__name__}
+        finally:
+            self.slots.release()
+
+        with self.stats.lock:
+            self.stats.pending -= 1
+            if status == 200:
+                self.stats.completed += 1
+            else:
+                self.stats.failed += 1
+            self.stats.latencies.append(time.perf_counter() - start)
+
+        return status, response
+
+    def get_stats(self):
+        """Return the stats of the server, see Stats.to_dict()."""
+        data = self.stats.to_dict(self.jobs)
+        data["jobs"] = self.jobs
+        data["max_queue"] = self.max_queue
+
+        return data
+
+    def close(self):
+        """Shut down the worker processes."""
+        self.executor.shutdown(wait=True)
+
+
+class RequestHandler(BaseHTTPRequestHandler):
+    """Handler of the json api of a ModelServer, see the module docs."""
+
+    server_version = "topmodelpy/{}".format(__version__)
+
+    def do_GET(self):
+        if self.path == "/stats":
+            self.send_json(200, self.server.model_server.get_stats())
+        elif self.path == "/health":
+            self.send_json(200, {"status": "ok"})
+        else:
+            self.send_json(404, {"error": "Not found: {}".format(self.path)})
+
+    def do_POST(self):
+        if self.path != "/run":
+            self.send_json(404, {"error": "Not found: {}".format(self.path)})
+            return
+
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            request = json.loads(self.rfile.read(length) or b"{}")
+            configfile = request["config"]
+            parameters = request.get("parameters") or {}
+            if (not isinstance(configfile, str)
+                    or not isinstance(parameters, dict)):
+                raise ValueError
+        except (ValueError, KeyError, TypeError):
+            self.send_json(400, {
+                "error": "Invalid request, expected a json object with a "
+                         "config file path and optional parameters"
+            })
+            return
+
+        self.send_json(*self.server.model_server.run(configfile, parameters))
+
+    def send_json(self, status, data):
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def address_string(self):
+        # Clients of a Unix socket have no address
+        return self.client_address[0] if self.client_address else "unix"
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+class HTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+
+class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def remove_stale_socket(socket_path):
+    """Remove a Unix socket left at the path by a server that is no longer
+    running.
+
+    :param socket_path: File path of the Unix socket.
+    :type socket_path: string
+    :raises ServerErrorInvalidSocketPath: If the path is not a socket, or a
+                                          server accepts connections on it.
+    """
+    try:
+        mode = os.stat(socket_path).st_mode
+    except FileNotFoundError:
+        return
+    if not stat.S_ISSOCK(mode):
+        raise ServerErrorInvalidSocketPath(
+            socket_path, "Path exists and is not a socket")
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(str(socket_path))
+        except ConnectionRefusedError:
+            os.unlink(socket_path)
+            return
+    raise ServerErrorInvalidSocketPath(
+        socket_path, "Socket is in use by a running server")
+
+
+def remove_socket(server):
+    """Remove the Unix socket of an http server, if the socket at its path
+    is still the socket that the server created."""
+    try:
+        status = os.stat(server.server_address)
+    except FileNotFoundError:
+        return
+    # Inode numbers are reused, so check the file type too
+    if (stat.S_ISSOCK(status.st_mode)
+            and (status.st_dev, status.st_ino) == server.socket_id):
+        os.unlink(server.server_address)
+
+
+def create_server(model_server, host="127.0.0.1", port=8765, socket_path=None,
+                  verbose=False):
+    """Create an http server of a ModelServer, on a host and port, or on a
+    Unix socket.
+
+    :param model_server: The model server.
+    :type model_server: ModelServer
+    :param host: Host of the http server.
+    :type host: string
+    :param port: Port of the http server, 0 for any free port.
+    :type port: int
+    :param socket_path: Optional file path of a Unix socket to serve on
+                        instead of the host and port; a stale socket at the
+                        path is replaced, see remove_stale_socket().
+    :type socket_path: string
+    :param verbose: Log each request to stderr.
+    :type verbose: bool
+    :return: The http server.
+    :rtype: socketserver.BaseServer
+    """
+    if socket_path:
+        remove_stale_socket(socket_path)
+        server = UnixHTTPServer(str(socket_path), RequestHandler)
+        status = os.stat(socket_path)
+        server.socket_id = (status.st_dev, status.st_ino)
+    else:
+        server = HTTPServer((host, port), RequestHandler)
+    server.model_server = model_server
+    server.verbose = verbose
+
+    return server
+
+
+def get_address(server):
+    """Return the address of an http server, for messages."""
+    if isinstance(server, UnixHTTPServer):
+        return "unix:{}".format(server.server_address)
+    host, port = server.server_address[:2]
+
+    return "http://{}:{}".format(host, port)
+
+
+def serve(host="127.0.0.1", port=8765, socket_path=None, jobs=None,
+          max_queue=100, verbose=False, callback=None):
+    """Serve model runs until interrupted.
+
+    :param callback: Optional function called with the http server once it
+                     is ready.
+    :type callback: function
+    """
+    model_server = ModelServer(jobs=jobs, max_queue=max_queue)
+    try:
+        server = create_server(model_server, host, port, socket_path, verbose)
+        try:
+            if callback:
+                callback(server)
+            server.serve_forever()
+        finally:
+            server.server_close()
+            if isinstance(server, UnixHTTPServer):
+                remove_socket(server)
+    finally:
+        model_server.close()
@@ -0,0 +1,284 @@
+"""Module that runs Topmodel on forcing rows as they arrive, such as real-time
+weather data written to stdin or to a named pipe.
+
+Each row of date, temperature, precipitation, and optional pet is run
+through pet, snowmelt, and one Topmodel timestep, and a row of the flow
+predicted is written as soon as it is computed. Only the current model
+state, the snowpack, and the date of the last row are kept, so memory does
+not grow with the number of rows, and a stream may run indefinitely.
+
+The rows are in the format of a timeseries file, with an optional header:
+
+    date, temperature (celsius),precipitation (mm/day),pet (mm/day)
+    1980-01-22,-1.9,2.5,0.39
+
+Without a header, the columns are date, temperature, precipitation, and
+optional pet, in that order. Columns of the header that are not used, such
+as flow_observed, are ignored. Blank lines are skipped.
+"""
+
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from topmodelpy import hydrocalcs, main, modelconfigfile, parametersfile
+from topmodelpy.exceptions import TimeseriesStreamErrorInvalidRow
+
+
+# Column names of a timeseries file, and their short names
+COLUMN_NAMES = {
+    "temperature (celsius)": "temperature",
+    "precipitation (mm/day)": "precipitation",
+    "pet (mm/day)": "pet",
+    "temperature": "temperature",
+    "precipitation": "precipitation",
+    "pet": "pet",
+}
+
+# Columns of a stream without a header
+DEFAULT_COLUMNS = ["temperature", "precipitation", "pet"]
+
+
+class ModelStream:
+    """Topmodel that is run one timestep at a time, with pet and snowmelt
+    calculated for each timestep as in main.preprocess().
+
+    :param parameters: The parameters for the model.
+    :type parameters: dict
+    :param twi: A dataframe of all the twi data.
+    :type twi: pandas.DataFrame
+    :param timestep_daily_fraction: Model timestep as a fraction of a day,
+                                    1 for daily timesteps.
+    :type timestep_daily_fraction: float
+    :param snowmelt: Calculate snowmelt and the adjusted precipitation.
+    :type snowmelt: bool
+    """
+    def __init__(self, parameters, twi, timestep_daily_fraction=1,
+                 snowmelt=False):
+        self.parameters = parameters
+        self.timestep_daily_fraction = timestep_daily_fraction
+        self.timestep = timedelta(days=timestep_daily_fraction)
+        self.snowmelt = snowmelt
+        self.snowpack = 0
+        self.date = None
+
+        preprocessed_data = {
+            "twi_weighted_mean": hydrocalcs.weighted_mean(
+                values=twi["twi"],
+                weights=twi["proportion"]
+            ),
+            "precip_minus_pet": np.zeros(1),
+            "timestep_daily_fraction": timestep_daily_fraction,
+        }
+        self.topmodel = main.create_topmodel(parameters,
+                                             twi,
+                                             preprocessed_data)
+
+    def step(self, date, temperature, precipitation, pet=None):
+        """Run one timestep, which must be one timestep after the previous
+        timestep.
+
+        :param date: The date of the timestep.
+        :type date: datetime.datetime
+        :param temperature: Temperature, in degrees Celsius.
+        :type temperature: float
+        :param precipitation: Precipitation, in millimeters per day.
+        :type precipitation: float
+        :param pet: Optional pet, in millimeters per day, otherwise
+                    calculated with the hamon method.
+        :type pet: float
+        :return: A dict of the outputs of the timestep.
+        :rtype: dict
+        """
+        if self.date is not None and date != self.date + self.timestep:
+            raise ValueError(
+                "Discontinuity: {} does not follow {} by one timestep of {}"
+                "".format(date, self.date, self.timestep)
+            )
+
+        if pet is None:
+            pet = hydrocalcs.pet(dates=[date],
+                                 temperatures=[temperature],
+                                 latitude=self.parameters["latitude"]["value"],
+                                 method="hamon")[0]
+        pet = pet * self.timestep_daily_fraction
+
+        outputs = {"date": date}
+        if self.snowmelt:
+            snowprecip, _, snowpack = hydrocalcs.snowmelt(
+                np.array([precipitation]),
+                np.array([temperature]) * (9/5) + 32,
+                self.parameters["snowmelt_temperature_cutoff"]["value"],
+                self.parameters["snowmelt_rate_coeff_with_rain"]["value"],
+                self.parameters["snowmelt_rate_coeff"]["value"],
+                self.timestep_daily_fraction,
+                snowpack_initial=self.snowpack
+            )
+            self.snowpack = snowpack[0]
+            precipitation = snowprecip[0]
+            outputs["snowprecip"] = precipitation
+
+        precip_minus_pet = precipitation - pet
+        flow_predicted = self.topmodel.step(precip_minus_pet)
+        self.date = date
+
+        outputs["pet"] = pet
+        outputs["precip_minus_pet"] = precip_minus_pet
+        outputs["flow_predicted"] = flow_predicted
+        outputs["saturation_deficit_avgs"] = (
+            self.topmodel.saturation_deficit_avgs[0]
+        )
+
+        return outputs
+
+
+def create_stream(config_data, timestep_daily_fraction=1):
+    """Return a ModelStream of the parameters file and the twi file of the
+    model configuration file; the timeseries file is not read.
+
+    :param config_data: A ConfigParser object of the model config file.
+    :type config_data: ConfigParser
+    :param timestep_daily_fraction: Model timestep as a fraction of a day.
+    :type timestep_daily_fraction: float
+    :rtype: ModelStream
+    """
+    parameters = parametersfile.read(config_data["Inputs"]["parameters_file"])
+    twi = main.read_twi_file(config_data)
+
+    return ModelStream(
+        parameters,
+        twi,
+        timestep_daily_fraction=timestep_daily_fraction,
+        snowmelt=config_data["Options"].getboolean("option_snowmelt")
+    )
+
+
+def parse_date(text, date_format=None):
+    """Return a datetime of the text of a date, with the strftime format if
+    given, otherwise any format that pandas reads."""
+    if date_format:
+        return datetime.strptime(text, date_format)
+
+    return pd.Timestamp(text).to_pydatetime()
+
+
+def get_columns(fields):
+    """Return the short column names of the fields of a header row, or None
+    for the fields that are not used."""
+    return [COLUMN_NAMES.get(field.strip().lower()) for field in fields[1:]]
+
+
+def iter_rows(lines, date_format=None):
+    """Yield the date, temperature, precipitation, and pet of each row of the
+    lines; pet is None if there is no pet column.
+
+    :param lines: Lines of text, such as a file object.
+    :type lines: iterable
+    :param date_format: Optional strftime format of the dates.
+    :type date_format: string
+    :return: Tuples of line number, line, and a dict of the row.
+    :rtype: generator
+    """
+    columns = None
+    for line_number, line in enumerate(lines, start=1):
+        fields = line.strip().split(",")
+        if not fields[0]:
+            continue
+        if columns is None and fields[0].strip().lower() == "date":
+            columns = get_columns(fields)
+            missing = {"temperature", "precipitation"}.difference(columns)
+            if missing:
+                raise TimeseriesStreamErrorInvalidRow(
+                    line_number, line,
+                    "Missing columns: {}".format(", ".join(sorted(missing)))
+                )
+            continue
+        if columns is None:
+            columns = DEFAULT_COLUMNS
+
+        try:
+            row = {"date": parse_date(fields[0].strip(), date_format),
+                   "pet": None}
+            for name, field in zip(columns, fields[1:]):
+                if name is not None and field.strip():
+                    row[name] = float(field)
+            if "temperature" not in row or "precipitation" not in row:
+                raise ValueError("Missing temperature or precipitation")
+        except ValueError as err:
+            raise TimeseriesStreamErrorInvalidRow(line_number, line, err)
+
+        yield line_number, line, row
+
+
+def format_row(outputs, names):
+    """Return a csv line of the outputs of a timestep."""
+    date = outputs["date"]
+    date_format = ("%Y-%m-%d" if date.time() == datetime.min.time()
+                   else "%Y-%m-%d %H:%M:%S")
+    values = ["{:.2f}".format(outputs[name]) for name in names]
+
+    return ",".join([date.strftime(date_format)] + values) + "\n"
+
+
+def run_stream(model_stream, infile, outfile, date_format=None):
+    """Run the model stream on each row of the input file as it arrives, and
+    write and flush a csv row of the outputs of each timestep to the output
+    file.
+
+    Lines are read with readline(), rather than by iterating over the file,
+    which reads ahead in blocks, so a row from a pipe is run as soon as its
+    line is complete.
+
+    :param model_stream: The model stream.
+    :type model_stream: ModelStream
+    :param infile: Input file object, such as sys.stdin or a named pipe.
+    :type infile: file object
+    :param outfile: Output file object, such as sys.stdout.
+    :type outfile: file object
+    :param date_format: Optional strftime format of the dates.
+    :type date_format: string
+    :return: The number of timesteps run.
+    :rtype: int
+    """
+    names = ["pet", "precip_minus_pet", "flow_predicted",
+             "saturation_deficit_avgs"]
+    if model_stream.snowmelt:
+        names.insert(0, "snowprecip")
+    outfile.write(",".join(["date"] + names) + "\n")
+    outfile.flush()
+
+    num_timesteps = 0
+    for line_number, line, row in iter_rows(iter(infile.readline, ""),
+                                            date_format=date_format):
+        try:
+            outputs = model_stream.step(**row)
+        except ValueError as err:
+            raise TimeseriesStreamErrorInvalidRow(line_number, line, err)
+        outfile.write(format_row(outputs, names))
+        outfile.flush()
+        num_timesteps += 1
+
+    return num_timesteps
+
+
+def stream(configfile, infile, outfile, timestep_hours=24):
+    """Read the model configuration file, and run a model stream on the rows
+    of the input file, see run_stream().
+
+    :param configfile: The file path to the model config file.
+    :type configfile: string
+    :param timestep_hours: The model timestep, in hours.
+    :type timestep_hours: float
+    :return: The number of timesteps run.
+    :rtype: int
+    """
+    config_data = modelconfigfile.read(configfile)
+    model_stream = create_stream(config_data,
+                                 timestep_daily_fraction=timestep_hours / 24)
+    date_format = (
+        config_data["Inputs"].get("timeseries_date_format", "").strip()
+        or None
+    )
+
+    return run_stream(model_stream, infile, outfile, date_format=date_format)
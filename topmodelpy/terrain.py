@@ -0,0 +1,336 @@
+"""Module that contains functions to compute the topographic wetness index
+(TWI) of each cell of a digital elevation model (DEM).
+
+    twi = ln(a / tan(beta))
+
+where a is the upslope contributing area per unit contour width and
+tan(beta) is the local slope.
+
+Flow direction uses the D8 method, where each cell drains to the steepest
+downslope of its 8 neighbors. Cells without a downslope neighbor, such as
+outlets at the edge of the DEM and pits, drain nowhere, so the DEM should be
+hydrologically conditioned (pits filled) beforehand.
+
+All rasters are numpy arrays or memmaps of the same shape as the DEM, and
+are processed in strips of rows (tiles) with a one row halo, so DEMs larger
+than memory are possible. Flow accumulation visits cells in topological
+order, upstream to downstream, one frontier of cells at a time, as
+vectorized numpy operations on chunks of cells. Frontiers are queued in
+temporary files, so memory is bounded by the chunk size rather than by the
+number of cells, but the cells of a chunk are scattered across the rasters,
+so flow accumulation reads and writes the rasters at random when they do not
+fit in the page cache.
+"""
+
+import tempfile
+
+import numpy as np
+
+
+# D8 neighbor (row, column) offsets, indexed by flow direction
+D8_OFFSETS = [(-1, -1), (-1, 0), (-1, 1),
+              (0, -1), (0, 1),
+              (1, -1), (1, 0), (1, 1)]
+
+# Flow directions of cells that drain nowhere and of nodata cells
+NO_FLOW = 254
+NODATA = 255
+
+
+def iter_strips(num_rows, tile_rows):
+    """Yield the (start, stop) rows of each strip of rows.
+
+    :param num_rows: Number of rows of the raster.
+    :type num_rows: int
+    :param tile_rows: Number of rows of each strip.
+    :type tile_rows: int
+    """
+    for start in range(0, num_rows, tile_rows):
+        yield start, min(start + tile_rows, num_rows)
+
+
+def read_strip(read_rows, num_rows, start, stop, fill_value):
+    """Read a strip of rows with a one row halo above and below, and a one
+    column halo left and right, filling the halo outside the raster.
+
+    :param read_rows: Function that reads rows (start, stop) of a raster.
+    :type read_rows: function
+    :param num_rows: Number of rows of the raster.
+    :type num_rows: int
+    :param start: First row of the strip.
+    :type start: int
+    :param stop: Row of the strip up to, exclusive.
+    :type stop: int
+    :param fill_value: Value of the halo outside the raster.
+    :return: Array of size (stop - start + 2) x (num_columns + 2).
+    :rtype: numpy.ndarray
+    """
+    halo_start = max(start - 1, 0)
+    halo_stop = min(stop + 1, num_rows)
+    rows = read_rows(halo_start, halo_stop)
+
+    strip = np.full((stop - start + 2, rows.shape[1] + 2),
+                    fill_value,
+                    dtype=rows.dtype)
+    offset = 1 - (start - halo_start)
+    strip[offset:offset + len(rows), 1:-1] = rows
+
+    return strip
+
+
+def flow_direction(dem, directions, slopes, tile_rows=256):
+    """Compute the D8 flow direction and slope of each cell.
+
+    :param dem: The DEM, see demfile.Dem.
+    :type dem: demfile.Dem
+    :param directions: Array of the DEM shape to write the flow directions
+                       into, as uint8 indices of D8_OFFSETS, NO_FLOW or
+                       NODATA.
+    :type directions: numpy.ndarray
+    :param slopes: Array of the DEM shape to write the slope, tan(beta), of
+                   the flow direction into; 0 for cells that drain nowhere.
+    :type slopes: numpy.ndarray
+    :param tile_rows: Number of rows of each strip.
+    :type tile_rows: int
+    """
+    num_rows, num_columns = dem.shape
+    for start, stop in iter_strips(num_rows, tile_rows):
+        strip = read_strip(dem.read_rows, num_rows, start, stop, np.nan)
+        center = strip[1:-1, 1:-1]
+
+        best_drop = np.zeros_like(center)
+        best_direction = np.full(center.shape, NO_FLOW, dtype=np.uint8)
+        for direction, (row, column) in enumerate(D8_OFFSETS):
+            neighbor = strip[1 + row:strip.shape[0] - 1 + row,
+                             1 + column:strip.shape[1] - 1 + column]
+            distance = dem.cellsize * np.hypot(row, column)
+            with np.errstate(invalid="ignore"):
+                drop = (center - neighbor) / distance
+                steeper = drop > best_drop
+            best_drop[steeper] = drop[steeper]
+            best_direction[steeper] = direction
+
+        nodata = np.isnan(center)
+        best_direction[nodata] = NODATA
+        best_drop[nodata] = np.nan
+
+        directions[start:stop] = best_direction
+        slopes[start:stop] = best_drop
+
+
+def flow_indegree(directions, indegree, tile_rows=256):
+    """Compute the number of neighbors that drain into each cell.
+
+    :param directions: Flow directions from flow_direction().
+    :type directions: numpy.ndarray
+    :param indegree: Array of the DEM shape to write the number of upslope
+                     neighbors into, as uint8.
+    :type indegree: numpy.ndarray
+    :param tile_rows: Number of rows of each strip.
+    :type tile_rows: int
+    """
+    num_rows = directions.shape[0]
+    for start, stop in iter_strips(num_rows, tile_rows):
+        strip = read_strip(lambda start, stop: directions[start:stop],
+                           num_rows, start, stop, NODATA)
+
+        count = np.zeros((stop - start, strip.shape[1] - 2), dtype=np.uint8)
+        for direction, (row, column) in enumerate(D8_OFFSETS):
+            # The neighbor opposite to a direction drains into the cell if
+            # its flow direction is that direction
+            neighbor = strip[1 - row:strip.shape[0] - 1 - row,
+                             1 - column:strip.shape[1] - 1 - column]
+            count += neighbor == direction
+
+        indegree[start:stop] = count
+
+
+class FrontierFile:
+    """Queue of the flat indices of a frontier of cells in a temporary file,
+    appended and read back in chunks, so a frontier does not have to fit in
+    memory.
+
+    :param directory: Optional directory of the temporary file, defaults to
+                      the system temporary directory.
+    :type directory: string
+    """
+    def __init__(self, directory=None):
+        self.file = tempfile.TemporaryFile(dir=directory)
+        self.size = 0
+
+    def append(self, cells):
+        np.asarray(cells, dtype=np.int64).tofile(self.file)
+        self.size += len(cells)
+
+    def iter_chunks(self, chunksize):
+        """Yield the cells of the queue in chunks of at most chunksize
+        cells."""
+        self.file.flush()
+        for start in range(0, self.size, chunksize):
+            self.file.seek(start * np.dtype(np.int64).itemsize)
+            yield np.fromfile(self.file,
+                              dtype=np.int64,
+                              count=min(chunksize, self.size - start))
+
+    def clear(self):
+        self.file.seek(0)
+        self.file.truncate()
+        self.size = 0
+
+    def close(self):
+        self.file.close()
+
+
+def flow_accumulation(directions,
+                      indegree,
+                      accumulation,
+                      tile_rows=256,
+                      chunksize=1000000,
+                      work_dir=None):
+    """Compute the number of cells that drain through each cell, including
+    the cell itself.
+
+    Cells are visited in topological order: the first frontier is all cells
+    without upslope neighbors, and a cell joins the next frontier once all of
+    its upslope neighbors are visited. Each frontier is queued in a temporary
+    file, see FrontierFile, and processed in chunks of cells as vectorized
+    numpy operations, so memory is bounded by the chunk size.
+
+    :param directions: Flow directions from flow_direction().
+    :type directions: numpy.ndarray
+    :param indegree: Number of upslope neighbors from flow_indegree(), which
+                     is decremented to 0 for all cells.
+    :type indegree: numpy.ndarray
+    :param accumulation: Array of the DEM shape to write the flow
+                         accumulation into; 0 for nodata cells.
+    :type accumulation: numpy.ndarray
+    :param tile_rows: Number of rows of each strip.
+    :type tile_rows: int
+    :param chunksize: Number of cells of each chunk of a frontier.
+    :type chunksize: int
+    :param work_dir: Optional directory of the frontier files.
+    :type work_dir: pathlib.Path
+    """
+    num_rows, num_columns = directions.shape
+
+    # Offset of the flat index of the downslope cell of each flow direction
+    offsets = np.zeros(256, dtype=np.int64)
+    for direction, (row, column) in enumerate(D8_OFFSETS):
+        offsets[direction] = row * num_columns + column
+
+    frontier = FrontierFile(work_dir)
+    next_frontier = FrontierFile(work_dir)
+    try:
+        for start, stop in iter_strips(num_rows, tile_rows):
+            valid = directions[start:stop] != NODATA
+            accumulation[start:stop] = valid
+            frontier.append(
+                np.flatnonzero(valid & (indegree[start:stop] == 0))
+                + start * num_columns
+            )
+
+        flat_directions = directions.reshape(-1)
+        flat_indegree = indegree.reshape(-1)
+        flat_accumulation = accumulation.reshape(-1)
+        while frontier.size:
+            for cells in frontier.iter_chunks(chunksize):
+                cell_directions = flat_directions[cells]
+                draining = cell_directions < len(D8_OFFSETS)
+                cells = cells[draining]
+                downslope = cells + offsets[cell_directions[draining]]
+
+                downslope, inverse = np.unique(downslope, return_inverse=True)
+                flat_accumulation[downslope] += np.bincount(
+                    inverse, weights=flat_accumulation[cells])
+                flat_indegree[downslope] -= (
+                    np.bincount(inverse).astype(np.uint8)
+                )
+                next_frontier.append(downslope[flat_indegree[downslope] == 0])
+
+            frontier.clear()
+            frontier, next_frontier = next_frontier, frontier
+    finally:
+        frontier.close()
+        next_frontier.close()
+
+
+def topographic_wetness_index(accumulation,
+                              slopes,
+                              cellsize,
+                              twi,
+                              min_slope=0.0001,
+                              tile_rows=256):
+    """Compute the topographic wetness index of each cell.
+
+    The upslope contributing area per unit contour width is the flow
+    accumulation times the cell size. Slopes less than min_slope, such as
+    flats and cells that drain nowhere, are set to min_slope.
+
+    :param accumulation: Flow accumulation from flow_accumulation().
+    :type accumulation: numpy.ndarray
+    :param slopes: Slopes from flow_direction().
+    :type slopes: numpy.ndarray
+    :param cellsize: Cell size in meters.
+    :type cellsize: float
+    :param twi: Array of the DEM shape to write the twi into; nan for nodata
+                cells.
+    :type twi: numpy.ndarray
+    :param min_slope: Minimum slope, tan(beta).
+    :type min_slope: float
+    :param tile_rows: Number of rows of each strip.
+    :type tile_rows: int
+    """
+    for start, stop in iter_strips(accumulation.shape[0], tile_rows):
+        area = accumulation[start:stop] * cellsize
+        slope = np.fmax(slopes[start:stop], min_slope)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            strip_twi = np.log(area / slope)
+        strip_twi[np.isnan(slopes[start:stop])] = np.nan
+        twi[start:stop] = strip_twi
+
+
+def compute_twi(dem, twi, work_dir, min_slope=0.0001, tile_rows=256):
+    """Compute the topographic wetness index of each cell of a DEM.
+
+    Intermediate rasters are memory-mapped files in work_dir.
+
+    :param dem: The DEM, see demfile.Dem.
+    :type dem: demfile.Dem
+    :param twi: Array of the DEM shape to write the twi into, for example a
+                numpy memmap.
+    :type twi: numpy.ndarray
+    :param work_dir: Directory of the intermediate rasters.
+    :type work_dir: pathlib.Path
+    :param min_slope: Minimum slope, tan(beta).
+    :type min_slope: float
+    :param tile_rows: Number of rows of each strip.
+    :type tile_rows: int
+    """
+    def create(name, dtype):
+        return np.lib.format.open_memmap(str(work_dir / (name + ".npy")),
+                                         mode="w+",
+                                         dtype=dtype,
+                                         shape=dem.shape)
+
+    directions = create("directions", np.uint8)
+    slopes = create("slopes", np.float32)
+    flow_direction(dem, directions, slopes, tile_rows=tile_rows)
+
+    indegree = create("indegree", np.uint8)
+    flow_indegree(directions, indegree, tile_rows=tile_rows)
+
+    accumulation = create("accumulation", np.float64)
+    flow_accumulation(directions,
+                      indegree,
+                      accumulation,
+                      tile_rows=tile_rows,
+                      work_dir=work_dir)
+    del indegree, directions
+
+    topographic_wetness_index(accumulation,
+                              slopes,
+                              dem.cellsize,
+                              twi,
+                              min_slope=min_slope,
+                              tile_rows=tile_rows)
+
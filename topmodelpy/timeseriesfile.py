@@ -1,4 +1,14 @@
-"""Module that contains functions to read a timeseries file in csv format."""
+"""Module that contains functions to read a timeseries file in csv format.
+
+The pyarrow csv engine is used when the pyarrow package is installed,
+otherwise the default pandas csv engine is used. Dates are parsed with an
+explicit date format when one is given, otherwise the date format is
+inferred by pandas.
+
+A timeseries can also be split across multiple files, for example one file
+per year, that are read lazily in date order and checked for continuity
+across file boundaries.
+"""
 
 import numpy as np
 import pandas as pd
@@ -6,22 +16,52 @@ import pandas as pd
 from .exceptions import (TimeseriesFileErrorInvalidHeader,
                          TimeseriesFileErrorMissingDates,
                          TimeseriesFileErrorMissingValues,
-                         TimeseriesFileErrorInvalidTimestep)
+                         TimeseriesFileErrorInvalidTimestep,
+                         TimeseriesFileErrorDiscontinuity)
 
 
-def read(filepath):
+def read(filepath, date_format=None):
     """Read data file
     Open file and create a file object to process with
     read_file_in(filestream).
 
     :param filepath: File path to data file.
     :type param: string
+    :param date_format: Optional strftime format of the dates,
+                        e.g. "%Y-%m-%d".
+    :type date_format: string
     :return data: A dataframe of all the timeseries data.
     :rtype: Pandas.DataFrame
     """
     try:
         with open(filepath, "r") as f:
-            data = read_in(f)
+            data = read_in(f, date_format=date_format)
+        return data
+    except TimeseriesFileErrorInvalidHeader as err:
+        print(err)
+    except TimeseriesFileErrorMissingDates as err:
+        print(err)
+    except TimeseriesFileErrorMissingValues as err:
+        print(err)
+    except Exception as err:
+        print(err)
+
+
+def read_many(filepaths, date_format=None):
+    """Read multiple data files into a single timeseries.
+    Files are read in date order with iter_read(filepaths) and
+    concatenated.
+
+    :param filepaths: File paths to data files.
+    :type param: list
+    :param date_format: Optional strftime format of the dates,
+                        e.g. "%Y-%m-%d".
+    :type date_format: string
+    :return data: A dataframe of all the timeseries data.
+    :rtype: Pandas.DataFrame
+    """
+    try:
+        data = pd.concat(list(iter_read(filepaths, date_format=date_format)))
         return data
     except TimeseriesFileErrorInvalidHeader as err:
         print(err)
@@ -29,11 +69,58 @@ def read(filepath):
         print(err)
     except TimeseriesFileErrorMissingValues as err:
         print(err)
+    except TimeseriesFileErrorDiscontinuity as err:
+        print(err)
     except Exception as err:
         print(err)
 
 
-def read_in(filestream):
+def iter_read(filepaths, date_format=None):
+    """Lazily read multiple data files in date order.
+    Files are sorted by their first date, without reading the whole file,
+    and then read one at a time. Each file is checked for continuity with
+    the previous file: no gaps in dates and the same timestep.
+
+    :param filepaths: File paths to data files.
+    :type param: list
+    :param date_format: Optional strftime format of the dates,
+                        e.g. "%Y-%m-%d".
+    :type date_format: string
+    :return: A generator of dataframes of the timeseries data of each file.
+    :rtype: generator
+    """
+    filepaths = sorted(filepaths,
+                       key=lambda filepath: read_first_date(filepath,
+                                                            date_format))
+    previous = None
+    for filepath in filepaths:
+        with open(filepath, "r") as f:
+            data = read_in(f, date_format=date_format)
+
+        if previous is not None:
+            check_continuity(previous, data, filepath)
+
+        yield data
+        previous = data
+
+
+def read_first_date(filepath, date_format=None):
+    """Read the first date of a data file without reading the whole file.
+
+    :param filepath: File path to data file.
+    :type param: string
+    :param date_format: Optional strftime format of the dates.
+    :type date_format: string
+    :rtype: pandas.Timestamp
+    """
+    with open(filepath, "r") as f:
+        f.readline()
+        first_row = f.readline()
+
+    return pd.to_datetime(first_row.split(",")[0].strip(), format=date_format)
+
+
+def read_in(filestream, date_format=None, engine=None):
     """Read and process a filestream.
     Read and process a filestream of a comma-delimited parameter file.
     This function takes a filestream of text as input which allows for
@@ -41,6 +128,11 @@ def read_in(filestream):
 
     :param filestream: A filestream of text.
     :type filestream: _io.TextIOWrapper
+    :param date_format: Optional strftime format of the dates,
+                        e.g. "%Y-%m-%d".
+    :type date_format: string
+    :param engine: Optional pandas csv engine, defaults to get_engine().
+    :type engine: string
     :return data: A dict that contains all the data from the file.
     :rtype: dict
     """
@@ -51,8 +143,15 @@ def read_in(filestream):
         "flow_observed (mm/day)": "flow_observed",
     }
 
-    data = pd.read_csv(filestream, index_col=0, parse_dates=True, dtype=float)
+    if engine is None:
+        engine = get_engine()
+
+    data = pd.read_csv(filestream, engine=engine)
     data.columns = data.columns.str.strip()
+    dates = data.pop(data.columns[0])
+    data.index = pd.DatetimeIndex(pd.to_datetime(dates, format=date_format),
+                                  name=dates.name)
+    data = data.astype(float)
     check_header(data.columns.values.tolist(), list(column_short_names))
     check_missing_dates(data)
     check_missing_values(data)
@@ -62,6 +161,23 @@ def read_in(filestream):
     return data
 
 
+def get_engine():
+    """Return the fastest available pandas csv engine.
+
+    The pyarrow engine requires the pyarrow package and pandas >= 1.4.
+    """
+    major, minor = pd.__version__.split(".")[:2]
+    if (int(major), int(minor)) < (1, 4):
+        return "c"
+
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return "c"
+
+    return "pyarrow"
+
+
 def check_header(header, valid_header):
     """Check that column names in header line match what is expected.
 
@@ -77,19 +193,36 @@ def check_header(header, valid_header):
 
 def check_missing_dates(data):
     """Check for any missing dates."""
-    if data.index.isna().any():
-        missing_indices = np.where(data.index.isna())[0]
+    missing_dates = data.index.isna()
+    if missing_dates.any():
+        missing_indices = np.flatnonzero(missing_dates)
         timestamps_near_missing = data.index[missing_indices - 1]
         raise TimeseriesFileErrorMissingDates(timestamps_near_missing.values)
 
 
 def check_missing_values(data):
     """Check for any missing data values."""
-    if data.isna().values.any():
-        missing_values = data[data.isna().any(axis=1)]
+    missing_rows = data.isna().to_numpy().any(axis=1)
+    if missing_rows.any():
+        missing_values = data[missing_rows]
         raise TimeseriesFileErrorMissingValues(missing_values)
 
 
+def check_continuity(previous, data, filepath):
+    """Check that data continues one timestep after the previous data ends,
+    with the same timestep as the previous data.
+    """
+    previous_timestep = previous.index[1] - previous.index[0]
+    timestep = data.index[1] - data.index[0]
+    if (timestep != previous_timestep
+            or data.index[0] != previous.index[-1] + previous_timestep):
+        raise TimeseriesFileErrorDiscontinuity(filepath,
+                                               previous.index[-1],
+                                               data.index[0],
+                                               timestep,
+                                               previous_timestep)
+
+
 def check_timestep(data):
     """Check that the timestep is 1 day or less."""
     timestep = (data.index[1] - data.index[0]).days
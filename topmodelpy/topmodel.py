@@ -42,7 +42,10 @@ class Topmodel:
                  precip_available,
                  flow_initial=1,
                  timestep_daily_fraction=1,
-                 soil_depth_roots=1):
+                 soil_depth_roots=1,
+                 saturation_deficit_locals=None,
+                 unsaturated_zone_storages=None,
+                 root_zone_storages=None):
 
         # Check and assign timestep daily fraction
         if timestep_daily_fraction > 1:
@@ -101,16 +104,20 @@ class Topmodel:
         self.saturation_deficit_avg = None
 
         # Soil zone storages
-        self.unsaturated_zone_storages = utils.nans((self.num_timesteps,
-                                                     self.num_twi_increments))
-        self.root_zone_storages = utils.nans((self.num_timesteps,
-                                              self.num_twi_increments))
+        # Note: the matrices of size num_timesteps x num_twi_increments can
+        # be preallocated by the caller, for example as numpy memmaps, so
+        # that the model writes directly into them during self.run()
+        matrix_shape = (self.num_timesteps, self.num_twi_increments)
+        self.unsaturated_zone_storages = self._check_matrix(
+            unsaturated_zone_storages, matrix_shape)
+        self.root_zone_storages = self._check_matrix(
+            root_zone_storages, matrix_shape)
         self.unsaturated_zone_storage = None
         self.root_zone_storage = None
 
         # Variables used in self.run() method
-        self.saturation_deficit_locals = utils.nans((self.num_timesteps,
-                                                     self.num_twi_increments))
+        self.saturation_deficit_locals = self._check_matrix(
+            saturation_deficit_locals, matrix_shape)
 
         self.saturation_deficit_local = None
         self.precip_for_evaporation = None
@@ -128,6 +135,23 @@ class Topmodel:
         # Initialize model
         self._initialize()
 
+    @staticmethod
+    def _check_matrix(matrix, shape):
+        """Return a matrix filled with nan values if matrix is None,
+        otherwise check that the preallocated matrix has the correct shape.
+        """
+        if matrix is None:
+            return utils.nans(shape)
+
+        if matrix.shape != shape:
+            raise ValueError(
+                "Incorrect matrix shape: {}\n"
+                "Matrix shape must be (num_timesteps, num_twi_increments): {}"
+                "".format(matrix.shape, shape)
+            )
+
+        return matrix
+
     def _initialize(self):
         """Initialize model soil parameters, storage deficit, and
         unsaturated zone and root zone storages.
@@ -221,309 +245,372 @@ class Topmodel:
             np.ones(self.num_twi_increments) * self.root_zone_storage_max
         )
 
+    def get_state(self):
+        """Return a copy of the model state after the last timestep that
+        was run, such as to start a forecast from it, see
+        TopmodelBatch(initial_state).
+
+        :return state: A dict of the watershed average saturation deficit,
+                       and the unsaturated zone and root zone storages of
+                       each twi increment.
+        :rtype: dict
+        """
+        return {
+            "saturation_deficit_avg": self.saturation_deficit_avg,
+            "unsaturated_zone_storage": self.unsaturated_zone_storage.copy(),
+            "root_zone_storage": self.root_zone_storage.copy(),
+        }
+
+    def step(self, precip_available):
+        """Calculate water fluxes and flow prediction of one more timestep
+        from the current state, such as for input that arrives one timestep
+        at a time.
+
+        The model must be created with a precip_available array of one
+        timestep, which is overwritten by each step, so memory does not grow
+        with the number of steps, and the saved variables of interest, such
+        as self.flow_predicted[0], are those of the last step.
+
+        :param precip_available: Precipitation minus pet of the timestep.
+        :type precip_available: float
+        :return flow_predicted: The flow predicted of the timestep.
+        :rtype: float
+        """
+        if self.num_timesteps != 1:
+            raise ValueError(
+                "Incorrect number of timesteps: {}\n"
+                "Topmodel.step() requires a model of 1 timestep"
+                "".format(self.num_timesteps)
+            )
+        self.precip_available[0] = precip_available
+        self._run_timestep(0)
+
+        return self.flow_predicted[0]
+
     def run(self):
         """Calculate water fluxes and flow prediction."""
 
         # Start of timestep loop
         for i in range(self.num_timesteps):
-            # Initialize predicted flows, precipitation in excess
-            # of evapotranspiration and field-capacity storage, and
-            # local saturation deficit
-            self.flow_predicted_overland = 0
-            self.flow_predicted_vertical_drainage_flux = 0
-            self.precip_excesses = np.zeros(self.num_twi_increments)
-            self.saturation_deficit_local = utils.nans(self.num_twi_increments)
-
-            # Assign water available for evapotranspiration and
-            # water available for recharge based on how precipitation
-            # compares to potential evapotranspiration
-            # If precip_available < 0 => moisture has to be taken out of soil
-            # to meet the pet demand
-            # If precip_available > 0 => then surplus precip soaks into the
-            # ground to recharge soil moisture and any left over after that
-            # runs off as streamflow
-            # If precip_available = 0 => no surplus precip
-            self.precip_for_evaporation = 0
-            self.precip_for_recharge = 0
-            if self.precip_available[i] < 0:
-                self.precip_for_evaporation = (
-                    -1 * self.precip_available[i]
-                )
-            elif self.precip_available[i] > 0:
-                self.precip_for_recharge = self.precip_available[i]
-
-            # Start of twi increments loop
-            for j in range(self.num_twi_increments):
-
-                # Local saturation/storage/drainage deficit
-                # =========================================
-                # Calculate the local saturation deficit
-                self.saturation_deficit_local[j] = (
-                    self.saturation_deficit_avg
-                    + self.scaling_parameter * (self.twi_mean
-                                                - self.twi_values[j])
-                )
+            self._run_timestep(i)
 
-                # If local saturation deficit is less than zero, meaning soil
-                # is overly saturated, then set the local saturation deficit
-                # to zero meaning soil is saturated and water table is at the
-                # land surface
-                if self.saturation_deficit_local[j] < 0:
-                    self.saturation_deficit_local[j] = 0
-
-                # If the unsaturated zone storage is greater than the local
-                # saturation deficit, update the root zone storage with the
-                # difference and assign the local saturation deficit to the
-                # unsaturated zone storage
-                if self.unsaturated_zone_storage[j] > self.saturation_deficit_local[j]:
-                    self.root_zone_storage[j] = (
-                        self.root_zone_storage[j]
-                        + (self.unsaturated_zone_storage[j]
-                           - self.saturation_deficit_local[j])
-                    )
-                    self.unsaturated_zone_storage[j] = self.saturation_deficit_local[j]
+    def run_chunks(self, chunksize):
+        """Calculate water fluxes and flow prediction in chunks of timesteps.
 
-                    # If root zone storage is greater than the maximum
-                    # soil root zone storage, then assign the difference to
-                    # excess precipitation and assign the root zone storage
-                    # to the maximum root zone storage
-                    if self.root_zone_storage[j] > self.root_zone_storage_max:
-                        self.precip_excesses[j] = (
-                            self.root_zone_storage[j] - self.root_zone_storage_max
-                        )
-                        self.root_zone_storage[j] = self.root_zone_storage_max
+        Yields a tuple of the (start, stop) timestep indices of each chunk
+        after it is calculated, so results of the chunk can be consumed, for
+        example written to file, while the model is still running.
 
-                # Precipitation
-                # =============
-                # If there is precipitation available, then process the
-                # precipitation by calculating the excess precipitation and
-                # adding it to an array of precipitation excesses over all twi
-                # increments
-                if self.precip_for_recharge > 0:
-                    self.precip_excess = (
-                        self.precip_for_recharge
-                        - (self.saturation_deficit_local[j]
-                           - self.unsaturated_zone_storage[j])
-                        - (self.root_zone_storage_max
-                           - self.root_zone_storage[j])
-                    )
+        :param chunksize: Number of timesteps in each chunk.
+        :type chunksize: int
+        """
+        for start in range(0, self.num_timesteps, chunksize):
+            stop = min(start + chunksize, self.num_timesteps)
+            for i in range(start, stop):
+                self._run_timestep(i)
+
+            yield start, stop
+
+    def _run_timestep(self, i):
+        """Calculate water fluxes and flow prediction for timestep i."""
+        # Initialize predicted flows, precipitation in excess
+        # of evapotranspiration and field-capacity storage, and
+        # local saturation deficit
+        self.flow_predicted_overland = 0
+        self.flow_predicted_vertical_drainage_flux = 0
+        self.precip_excesses = np.zeros(self.num_twi_increments)
+        self.saturation_deficit_local = utils.nans(self.num_twi_increments)
+
+        # Assign water available for evapotranspiration and
+        # water available for recharge based on how precipitation
+        # compares to potential evapotranspiration
+        # If precip_available < 0 => moisture has to be taken out of soil
+        # to meet the pet demand
+        # If precip_available > 0 => then surplus precip soaks into the
+        # ground to recharge soil moisture and any left over after that
+        # runs off as streamflow
+        # If precip_available = 0 => no surplus precip
+        self.precip_for_evaporation = 0
+        self.precip_for_recharge = 0
+        if self.precip_available[i] < 0:
+            self.precip_for_evaporation = (
+                -1 * self.precip_available[i]
+            )
+        elif self.precip_available[i] > 0:
+            self.precip_for_recharge = self.precip_available[i]
+
+        # Start of twi increments loop
+        for j in range(self.num_twi_increments):
+
+            # Local saturation/storage/drainage deficit
+            # =========================================
+            # Calculate the local saturation deficit
+            self.saturation_deficit_local[j] = (
+                self.saturation_deficit_avg
+                + self.scaling_parameter * (self.twi_mean
+                                            - self.twi_values[j])
+            )
+
+            # If local saturation deficit is less than zero, meaning soil
+            # is overly saturated, then set the local saturation deficit
+            # to zero meaning soil is saturated and water table is at the
+            # land surface
+            if self.saturation_deficit_local[j] < 0:
+                self.saturation_deficit_local[j] = 0
+
+            # If the unsaturated zone storage is greater than the local
+            # saturation deficit, update the root zone storage with the
+            # difference and assign the local saturation deficit to the
+            # unsaturated zone storage
+            if self.unsaturated_zone_storage[j] > self.saturation_deficit_local[j]:
+                self.root_zone_storage[j] = (
+                    self.root_zone_storage[j]
+                    + (self.unsaturated_zone_storage[j]
+                       - self.saturation_deficit_local[j])
+                )
+                self.unsaturated_zone_storage[j] = self.saturation_deficit_local[j]
+
+                # If root zone storage is greater than the maximum
+                # soil root zone storage, then assign the difference to
+                # excess precipitation and assign the root zone storage
+                # to the maximum root zone storage
+                if self.root_zone_storage[j] > self.root_zone_storage_max:
                     self.precip_excesses[j] = (
-                        self.precip_excesses[j] + self.precip_excess
+                        self.root_zone_storage[j] - self.root_zone_storage_max
                     )
+                    self.root_zone_storage[j] = self.root_zone_storage_max
+
+            # Precipitation
+            # =============
+            # If there is precipitation available, then process the
+            # precipitation by calculating the excess precipitation and
+            # adding it to an array of precipitation excesses over all twi
+            # increments
+            if self.precip_for_recharge > 0:
+                self.precip_excess = (
+                    self.precip_for_recharge
+                    - (self.saturation_deficit_local[j]
+                       - self.unsaturated_zone_storage[j])
+                    - (self.root_zone_storage_max
+                       - self.root_zone_storage[j])
+                )
+                self.precip_excesses[j] = (
+                    self.precip_excesses[j] + self.precip_excess
+                )
+
+                # If the excess precipitation calculated is less than 0.0,
+                # then reset the excess precipitation to 0.0
+                if self.precip_excess < 0:
+                    self.precip_excess = 0
 
-                    # If the excess precipitation calculated is less than 0.0,
-                    # then reset the excess precipitation to 0.0
-                    if self.precip_excess < 0:
-                        self.precip_excess = 0
+                self.precip_excess_diff = (
+                    abs(self.precip_excess
+                        - self.precip_for_recharge)
+                )
 
-                    self.precip_excess_diff = (
-                        abs(self.precip_excess
-                            - self.precip_for_recharge)
+                if not self.precip_excess_diff <= 1E-20:
+                    # Calculate the root zone storage amount from the
+                    # differences between
+                    # 1. (1 - self.macropore_fraction): the amount that is
+                    # not bypassing the soil root zone
+                    # 2. (self.precip_for_recharge
+                    #     - self.precip_excess): the amount that is
+                    # available without any excess
+                    self.root_zone_storage[j] = (
+                        self.root_zone_storage[j]
+                        + (1.0 - self.macropore_fraction)
+                        * (self.precip_for_recharge - self.precip_excess)
                     )
 
-                    if not self.precip_excess_diff <= 1E-20:
-                        # Calculate the root zone storage amount from the
-                        # differences between
-                        # 1. (1 - self.macropore_fraction): the amount that is
-                        # not bypassing the soil root zone
-                        # 2. (self.precip_for_recharge
-                        #     - self.precip_excess): the amount that is
-                        # available without any excess
-                        self.root_zone_storage[j] = (
-                            self.root_zone_storage[j]
-                            + (1.0 - self.macropore_fraction)
-                            * (self.precip_for_recharge - self.precip_excess)
-                        )
+                    # Calculate the unsaturated zone storage amount from
+                    # the amount bypassing the soil root zone and the
+                    # amount that is available without any excess
 
-                        # Calculate the unsaturated zone storage amount from
-                        # the amount bypassing the soil root zone and the
-                        # amount that is available without any excess
+                    self.unsaturated_zone_storage[j] = (
+                        self.unsaturated_zone_storage[j]
+                        + self.macropore_fraction
+                        * (self.precip_for_recharge
+                           - self.precip_excess)
+                    )
 
+                    # If the root zone storage is greater than the maximum
+                    # soil root zone storage, then added the difference
+                    # to the unsaturated zone storage and assign the root
+                    # zone storage to the maximum root zone storage
+                    if self.root_zone_storage[j] > self.root_zone_storage_max:
                         self.unsaturated_zone_storage[j] = (
                             self.unsaturated_zone_storage[j]
-                            + self.macropore_fraction
-                            * (self.precip_for_recharge
-                               - self.precip_excess)
+                            + (self.root_zone_storage[j]
+                               - self.root_zone_storage_max)
                         )
-
-                        # If the root zone storage is greater than the maximum
-                        # soil root zone storage, then added the difference
-                        # to the unsaturated zone storage and assign the root
-                        # zone storage to the maximum root zone storage
-                        if self.root_zone_storage[j] > self.root_zone_storage_max:
-                            self.unsaturated_zone_storage[j] = (
-                                self.unsaturated_zone_storage[j]
-                                + (self.root_zone_storage[j]
-                                   - self.root_zone_storage_max)
+                        self.root_zone_storage[j] = self.root_zone_storage_max
+                    else:
+                        # If the unsaturated zone storage is greater than
+                        # the local saturation deficit, update the root
+                        # zone storage with the difference and assign the
+                        # local saturation deficit to the unsaturated zone
+                        # storage (same step preformed in calculation of
+                        # the local saturation deficit above)
+                        if self.unsaturated_zone_storage[j] > self.saturation_deficit_local[j]:
+                            self.root_zone_storage[j] = (
+                                self.root_zone_storage[j]
+                                + (self.unsaturated_zone_storage[j]
+                                   - self.saturation_deficit_local[j])
                             )
-                            self.root_zone_storage[j] = self.root_zone_storage_max
-                        else:
-                            # If the unsaturated zone storage is greater than
-                            # the local saturation deficit, update the root
-                            # zone storage with the difference and assign the
-                            # local saturation deficit to the unsaturated zone
-                            # storage (same step preformed in calculation of
-                            # the local saturation deficit above)
-                            if self.unsaturated_zone_storage[j] > self.saturation_deficit_local[j]:
-                                self.root_zone_storage[j] = (
-                                    self.root_zone_storage[j]
-                                    + (self.unsaturated_zone_storage[j]
-                                       - self.saturation_deficit_local[j])
-                                )
-                                self.unsaturated_zone_storage[j] = self.saturation_deficit_local[j]
-
-                # Drainage from unsaturated zone storage
-                # ======================================
-                # If there is water availble for vertical drainage, then
-                # calculate the vertical drainage flux (millimeters/day)
-                # equation 23 in Wolock, 1993
-                # Note: self.vertical_drainage_flux_initial =
-                # self.saturated_hydraulic_conductivity
-                # * self.timestep_daily_fraction
-                if self.saturation_deficit_local[j] > 0:
-                    self.vertical_drainage_flux = (
-                        self.vertical_drainage_flux_initial
-                        * (self.unsaturated_zone_storage[j]
-                           / self.saturation_deficit_local[j])
-                    )
+                            self.unsaturated_zone_storage[j] = self.saturation_deficit_local[j]
+
+            # Drainage from unsaturated zone storage
+            # ======================================
+            # If there is water availble for vertical drainage, then
+            # calculate the vertical drainage flux (millimeters/day)
+            # equation 23 in Wolock, 1993
+            # Note: self.vertical_drainage_flux_initial =
+            # self.saturated_hydraulic_conductivity
+            # * self.timestep_daily_fraction
+            if self.saturation_deficit_local[j] > 0:
+                self.vertical_drainage_flux = (
+                    self.vertical_drainage_flux_initial
+                    * (self.unsaturated_zone_storage[j]
+                       / self.saturation_deficit_local[j])
+                )
 
-                    # If the vertical drainage flux is greater than the soil
-                    # water available for drainage (unsaturated_zone_storage),
-                    # then assign the vertical drainage flux to the
-                    # unsaturated_zone_storage
-                    if self.vertical_drainage_flux > self.unsaturated_zone_storage[j]:
-                        self.vertical_drainage_flux = self.unsaturated_zone_storage[j]
-
-                    # Update the unsaturated zone storage by removing the
-                    # vertical drainage flux amount from the amount of soil
-                    # water available to drain
-                    self.unsaturated_zone_storage[j] = self.unsaturated_zone_storage[j] - self.vertical_drainage_flux
-
-                    # Calculate the predicted vertical drainage flux from the
-                    # vertical drainage amount and the current saturated
-                    # land-surface area in the watershed
-                    self.flow_predicted_vertical_drainage_flux = (
-                        self.flow_predicted_vertical_drainage_flux
-                        + (self.vertical_drainage_flux
-                           * self.twi_saturated_areas[j])
-                    )
+                # If the vertical drainage flux is greater than the soil
+                # water available for drainage (unsaturated_zone_storage),
+                # then assign the vertical drainage flux to the
+                # unsaturated_zone_storage
+                if self.vertical_drainage_flux > self.unsaturated_zone_storage[j]:
+                    self.vertical_drainage_flux = self.unsaturated_zone_storage[j]
+
+                # Update the unsaturated zone storage by removing the
+                # vertical drainage flux amount from the amount of soil
+                # water available to drain
+                self.unsaturated_zone_storage[j] = self.unsaturated_zone_storage[j] - self.vertical_drainage_flux
+
+                # Calculate the predicted vertical drainage flux from the
+                # vertical drainage amount and the current saturated
+                # land-surface area in the watershed
+                self.flow_predicted_vertical_drainage_flux = (
+                    self.flow_predicted_vertical_drainage_flux
+                    + (self.vertical_drainage_flux
+                       * self.twi_saturated_areas[j])
+                )
 
-                # Evaporation from soil root zone storage
-                # =======================================
-                # If there is precipitation available for evaporation,
-                # then compute evaporation.
-                if self.precip_for_evaporation > 0:
-                    self.evaporation = self.precip_for_evaporation
-
-                    # If the precipitation available for evapotranspiration is
-                    # greater than the soil root zone storage amount, then
-                    # assign all the water in the soil root zone storage to the
-                    # precipitation available for evapotranspiration
-                    if self.evaporation > self.root_zone_storage[j]:
-                        self.evaporation = self.root_zone_storage[j]
-
-                    # Calculate the amount of water in the soil root zone
-                    # storage by removing the amount available for
-                    # evapotranspiration
-                    # note: soil root zone storage will be depleted (equal 0.0)
-                    # if the condition above is true where the precipitation
-                    # available for evapotranspiration is greater than the soil
-                    # root zone storage amount
-                    self.root_zone_storage[j] = (
-                        self.root_zone_storage[j] - self.evaporation
-                    )
+            # Evaporation from soil root zone storage
+            # =======================================
+            # If there is precipitation available for evaporation,
+            # then compute evaporation.
+            if self.precip_for_evaporation > 0:
+                self.evaporation = self.precip_for_evaporation
+
+                # If the precipitation available for evapotranspiration is
+                # greater than the soil root zone storage amount, then
+                # assign all the water in the soil root zone storage to the
+                # precipitation available for evapotranspiration
+                if self.evaporation > self.root_zone_storage[j]:
+                    self.evaporation = self.root_zone_storage[j]
+
+                # Calculate the amount of water in the soil root zone
+                # storage by removing the amount available for
+                # evapotranspiration
+                # note: soil root zone storage will be depleted (equal 0.0)
+                # if the condition above is true where the precipitation
+                # available for evapotranspiration is greater than the soil
+                # root zone storage amount
+                self.root_zone_storage[j] = (
+                    self.root_zone_storage[j] - self.evaporation
+                )
 
-                # Overland flow
-                # =============
-                # If the excess precipitation is greater than zero, then
-                # calculate the predicted overland flow from the amount of
-                # excess precipitation and the saturated area for the current
-                # twi increment
-                if self.precip_excesses[j] > 0:
-                    self.flow_predicted_overland = (
-                        self.flow_predicted_overland
-                        + (self.precip_excesses[j]
-                           * self.twi_saturated_areas[j])
-                    )
+            # Overland flow
+            # =============
+            # If the excess precipitation is greater than zero, then
+            # calculate the predicted overland flow from the amount of
+            # excess precipitation and the saturated area for the current
+            # twi increment
+            if self.precip_excesses[j] > 0:
+                self.flow_predicted_overland = (
+                    self.flow_predicted_overland
+                    + (self.precip_excesses[j]
+                       * self.twi_saturated_areas[j])
+                )
 
-                # Saving variables of interest
-                # ============================
-                self.unsaturated_zone_storages[i][j] = self.unsaturated_zone_storage[j]
-                self.root_zone_storages[i][j] = self.root_zone_storage[j]
-                self.saturation_deficit_locals[i][j] = self.saturation_deficit_local[j]
+            # Saving variables of interest
+            # ============================
+            self.unsaturated_zone_storages[i][j] = self.unsaturated_zone_storage[j]
+            self.root_zone_storages[i][j] = self.root_zone_storage[j]
+            self.saturation_deficit_locals[i][j] = self.saturation_deficit_local[j]
 
-                # END OF TWI INCREMENTS LOOP
+            # END OF TWI INCREMENTS LOOP
 
-            # CONTINUE TIMESTEP LOOP
+        # CONTINUE TIMESTEP LOOP
 
-            # Subsurface flow (base flow)
-            # ===========================
+        # Subsurface flow (base flow)
+        # ===========================
 
-            # Calculate the subsurface flow rate - equation 30 in Wolock, 1993
-            self.subsurface_flow_rate_ratio = (
-                self.saturation_deficit_avg / self.scaling_parameter
-            )
-
-            if self.subsurface_flow_rate_ratio > 100:
-                self.flow_predicted_subsurface = 0
-            else:
-                self.flow_predicted_subsurface = (
-                    self.flow_subsurface_max
-                    * math.exp(-1 * self.subsurface_flow_rate_ratio)
-                )
+        # Calculate the subsurface flow rate - equation 30 in Wolock, 1993
+        self.subsurface_flow_rate_ratio = (
+            self.saturation_deficit_avg / self.scaling_parameter
+        )
 
-            # Update the average watershed saturation deficit with the
-            # subsurface flow and the vertical drainage flux
-            self.saturation_deficit_avg = (
-                self.saturation_deficit_avg
-                - self.flow_predicted_vertical_drainage_flux
-                + self.flow_predicted_subsurface
+        if self.subsurface_flow_rate_ratio > 100:
+            self.flow_predicted_subsurface = 0
+        else:
+            self.flow_predicted_subsurface = (
+                self.flow_subsurface_max
+                * math.exp(-1 * self.subsurface_flow_rate_ratio)
             )
 
-            if self.saturation_deficit_avg < 0:
-                self.saturation_deficit_avg = 0
+        # Update the average watershed saturation deficit with the
+        # subsurface flow and the vertical drainage flux
+        self.saturation_deficit_avg = (
+            self.saturation_deficit_avg
+            - self.flow_predicted_vertical_drainage_flux
+            + self.flow_predicted_subsurface
+        )
 
-            # Impervious area flow
-            # ====================
-            # Calculate the contribution of impervious areas to streamflow -
-            # equation 37 in Wolock, 1993
-            self.flow_predicted_impervious_area = (
-                self.impervious_area_fraction * self.precip_for_recharge
-            )
+        if self.saturation_deficit_avg < 0:
+            self.saturation_deficit_avg = 0
 
-            # Total flow
-            # ==========
-            # Calculate the total flow in a given timestep
-            # Equation 1 in Wolock, 1993
-            self.flow_predicted_total = (
-                self.flow_predicted_subsurface
-                + self.flow_predicted_overland
-            )
+        # Impervious area flow
+        # ====================
+        # Calculate the contribution of impervious areas to streamflow -
+        # equation 37 in Wolock, 1993
+        self.flow_predicted_impervious_area = (
+            self.impervious_area_fraction * self.precip_for_recharge
+        )
 
-            # Channel routing
-            # ===============
-            # Calculate the flow delivered to the stream
-            self.flow_predicted_stream = (
-                self.flow_predicted_total
-                * (1 - self.impervious_area_fraction)
-                + self.flow_predicted_impervious_area
-            )
+        # Total flow
+        # ==========
+        # Calculate the total flow in a given timestep
+        # Equation 1 in Wolock, 1993
+        self.flow_predicted_total = (
+            self.flow_predicted_subsurface
+            + self.flow_predicted_overland
+        )
 
-            if self.flow_predicted_stream < 0:
-                self.flow_predicted_stream = 0
+        # Channel routing
+        # ===============
+        # Calculate the flow delivered to the stream
+        self.flow_predicted_stream = (
+            self.flow_predicted_total
+            * (1 - self.impervious_area_fraction)
+            + self.flow_predicted_impervious_area
+        )
 
-            # Adjust the flow delivered to the stream by the
-            # channel travel time
-            self.flow_predicted_stream = (
-                self.flow_predicted_stream / self.channel_travel_time
-            )
+        if self.flow_predicted_stream < 0:
+            self.flow_predicted_stream = 0
 
-            # Final predicted flow
-            # ====================
-            # Append the flow delivered to the stream to the final flow
-            # predicted array
-            self.flow_predicted[i] = self.flow_predicted_stream
+        # Adjust the flow delivered to the stream by the
+        # channel travel time
+        self.flow_predicted_stream = (
+            self.flow_predicted_stream / self.channel_travel_time
+        )
 
-            # Saving variables of interest
-            # ============================
-            self.saturation_deficit_avgs[i] = self.saturation_deficit_avg
+        # Final predicted flow
+        # ====================
+        # Append the flow delivered to the stream to the final flow
+        # predicted array
+        self.flow_predicted[i] = self.flow_predicted_stream
+
+        # Saving variables of interest
+        # ============================
+        self.saturation_deficit_avgs[i] = self.saturation_deficit_avg
@@ -0,0 +1,384 @@
+"""TopmodelBatch class
+Class that runs Topmodel for many parameter sets (members) at once.
+
+Each timestep is calculated for all members and all twi increments as numpy
+array operations, rather than looping over twi increments one member at a
+time. The calculations follow Topmodel._run_timestep() step by step, with the
+conditionals of each twi increment written as masks, so each member gives the
+same results as a Topmodel run with its parameter set.
+
+Members are the parameter sets, or the columns of precip_available, such as
+the weather traces of a forecast that all start from the same initial
+state, see Topmodel.get_state().
+
+Model state is of size num_members x num_twi_increments. Only the flow
+predicted and the watershed average saturation deficit are saved for each
+timestep, as arrays of size num_timesteps x num_members; the soil zone
+storage matrices of Topmodel are not saved.
+
+:authors: 2019 by Jeremiah Lant, see AUTHORS
+:license: CC0 1.0, see LICENSE file for details
+"""
+
+import numpy as np
+
+from . import utils
+
+
+class TopmodelBatch:
+    """Class that represents a Topmodel based rainfall-runoff model
+    implementation by David Wolock, for many parameter sets at once.
+
+    Parameters are scalars or arrays of size num_members. precip_available is
+    an array of size num_timesteps, or num_timesteps x num_members when the
+    precipitation available differs between members. initial_state is an
+    optional dict of the watershed average saturation deficit and the
+    unsaturated zone and root zone storages to start all members from, see
+    Topmodel.get_state(), rather than the state from flow_initial.
+    """
+    def __init__(self,
+                 scaling_parameter,
+                 saturated_hydraulic_conductivity,
+                 macropore_fraction,
+                 soil_depth_total,
+                 soil_depth_ab_horizon,
+                 field_capacity_fraction,
+                 latitude,
+                 basin_area_total,
+                 impervious_area_fraction,
+                 twi_values,
+                 twi_saturated_areas,
+                 twi_mean,
+                 precip_available,
+                 flow_initial=1,
+                 timestep_daily_fraction=1,
+                 soil_depth_roots=1,
+                 initial_state=None):
+
+        # Check and assign timestep daily fraction
+        if timestep_daily_fraction > 1:
+            raise ValueError(
+                "Incorrect timestep: {}\n"
+                "Timestep daily fraction must be less than or equal to 1."
+                "".format(timestep_daily_fraction)
+            )
+        self.timestep_daily_fraction = timestep_daily_fraction
+
+        # Precip available as num_timesteps x 1, or x num_members
+        precip_available = np.asarray(precip_available, dtype=float)
+        if precip_available.ndim == 1:
+            precip_available = precip_available[:, np.newaxis]
+
+        # Assign parameters as arrays of size num_members
+        parameters = np.broadcast_arrays(
+            *[np.atleast_1d(np.asarray(value, dtype=float)) for value in (
+                scaling_parameter,
+                saturated_hydraulic_conductivity,
+                macropore_fraction,
+                soil_depth_total,
+                soil_depth_ab_horizon,
+                field_capacity_fraction,
+                latitude,
+                basin_area_total,
+                impervious_area_fraction,
+                flow_initial,
+                soil_depth_roots,
+                np.ones(precip_available.shape[1]),
+            )]
+        )
+        (self.scaling_parameter,
+         self.saturated_hydraulic_conductivity,
+         self.macropore_fraction,
+         self.soil_depth_total,
+         self.soil_depth_ab_horizon,
+         self.field_capacity_fraction,
+         self.latitude,
+         self.basin_area_total,
+         self.impervious_area_fraction,
+         flow_initial,
+         soil_depth_roots) = [parameter.copy() for parameter
+                              in parameters[:-1]]
+        self.num_members = len(self.scaling_parameter)
+
+        # Assign twi
+        self.twi_values = np.asarray(twi_values, dtype=float)
+        self.twi_saturated_areas = np.asarray(twi_saturated_areas, dtype=float)
+        self.twi_mean = twi_mean
+        self.num_twi_increments = len(self.twi_values)
+
+        # Assign precip available as num_timesteps x num_members
+        self.precip_available = np.broadcast_to(
+            precip_available, (len(precip_available), self.num_members))
+        self.num_timesteps = len(self.precip_available)
+
+        # Initialize output arrays with nan
+        self.flow_predicted = utils.nans(
+            (self.num_timesteps, self.num_members))
+        self.saturation_deficit_avgs = utils.nans(
+            (self.num_timesteps, self.num_members))
+
+        # Soil hydraulic variables
+        # Note: soil depth of root zone has default value of 1 meter
+        self.soil_depth_roots = soil_depth_roots
+        self.flow_initial = flow_initial * self.timestep_daily_fraction
+
+        # Initialize model
+        self._initialize()
+        if initial_state is not None:
+            self._initialize_state(initial_state)
+
+    def _initialize(self):
+        """Initialize model soil parameters, channel routing parameters,
+        storage deficit, and unsaturated zone and root zone storages.
+
+        See the methods of the same name in Topmodel.
+        """
+        # Soil hydraulic parameters
+        self.soil_depth_roots = np.minimum(self.soil_depth_roots,
+                                           self.soil_depth_total)
+        self.soil_depth_c_horizon = (
+            self.soil_depth_total - self.soil_depth_ab_horizon
+        )
+        self.vertical_drainage_flux_initial = (
+            self.saturated_hydraulic_conductivity
+            * self.timestep_daily_fraction
+        )
+        self.transmissivity_saturated_max = (
+            self.soil_depth_ab_horizon * 100
+            * self.saturated_hydraulic_conductivity
+            + self.soil_depth_c_horizon * self.saturated_hydraulic_conductivity
+        )
+        self.flow_subsurface_max = (
+            self.transmissivity_saturated_max * np.exp(-1 * self.twi_mean)
+            * self.timestep_daily_fraction
+        )
+        self.root_zone_storage_max = (
+            self.soil_depth_roots * 1000 * self.field_capacity_fraction
+        )
+
+        # Channel routing parameters
+        self.channel_velocity_avg = 10 * self.timestep_daily_fraction
+        self.channel_length_max = 2 * np.sqrt(self.basin_area_total / np.pi)
+        self.channel_travel_time = np.maximum(
+            self.channel_length_max / self.channel_velocity_avg, 1)
+
+        # Watershed average storage deficit
+        self.saturation_deficit_avg = (
+            -1 * np.log(self.flow_initial / self.flow_subsurface_max)
+            * self.scaling_parameter
+        )
+
+        # Unsaturated zone storage and root zone storage
+        shape = (self.num_members, self.num_twi_increments)
+        self.unsaturated_zone_storage = np.zeros(shape)
+        self.root_zone_storage = (
+            np.ones(shape) * self.root_zone_storage_max[:, np.newaxis]
+        )
+
+    def _initialize_state(self, initial_state):
+        """Start all members from an initial state, see
+        Topmodel.get_state()."""
+        shape = (self.num_members, self.num_twi_increments)
+        self.saturation_deficit_avg = np.broadcast_to(
+            np.asarray(initial_state["saturation_deficit_avg"], dtype=float),
+            (self.num_members,)
+        ).copy()
+        self.unsaturated_zone_storage = np.broadcast_to(
+            np.asarray(initial_state["unsaturated_zone_storage"],
+                       dtype=float),
+            shape
+        ).copy()
+        self.root_zone_storage = np.broadcast_to(
+            np.asarray(initial_state["root_zone_storage"], dtype=float),
+            shape
+        ).copy()
+
+    def run(self):
+        """Calculate water fluxes and flow prediction."""
+        for i in range(self.num_timesteps):
+            self._run_timestep(i)
+
+    def _run_timestep(self, i):
+        """Calculate water fluxes and flow prediction for timestep i for all
+        members.
+
+        Member parameters are columns of size num_members x 1, so they
+        broadcast against the state of size num_members x num_twi_increments.
+        """
+        scaling_parameter = self.scaling_parameter[:, np.newaxis]
+        macropore_fraction = self.macropore_fraction[:, np.newaxis]
+        root_zone_storage_max = self.root_zone_storage_max[:, np.newaxis]
+        unsaturated_zone_storage = self.unsaturated_zone_storage
+        root_zone_storage = self.root_zone_storage
+        precip_excesses = np.zeros_like(unsaturated_zone_storage)
+
+        # Water available for evapotranspiration and recharge
+        precip_available = self.precip_available[i]
+        precip_for_evaporation = np.where(precip_available < 0,
+                                          -1 * precip_available,
+                                          0.0)
+        precip_for_recharge = np.where(precip_available > 0,
+                                       precip_available,
+                                       0.0)
+        recharge = precip_for_recharge[:, np.newaxis]
+
+        # Local saturation/storage/drainage deficit
+        # =========================================
+        saturation_deficit_local = np.maximum(
+            self.saturation_deficit_avg[:, np.newaxis]
+            + scaling_parameter * (self.twi_mean - self.twi_values),
+            0
+        )
+
+        mask = unsaturated_zone_storage > saturation_deficit_local
+        root_zone_storage = np.where(
+            mask,
+            root_zone_storage
+            + (unsaturated_zone_storage - saturation_deficit_local),
+            root_zone_storage
+        )
+        unsaturated_zone_storage = np.where(mask,
+                                            saturation_deficit_local,
+                                            unsaturated_zone_storage)
+
+        mask = mask & (root_zone_storage > root_zone_storage_max)
+        precip_excesses = np.where(mask,
+                                   root_zone_storage - root_zone_storage_max,
+                                   precip_excesses)
+        root_zone_storage = np.where(mask,
+                                     root_zone_storage_max,
+                                     root_zone_storage)
+
+        # Precipitation
+        # =============
+        recharging = recharge > 0
+        precip_excess = (
+            recharge
+            - (saturation_deficit_local - unsaturated_zone_storage)
+            - (root_zone_storage_max - root_zone_storage)
+        )
+        precip_excesses = np.where(recharging,
+                                   precip_excesses + precip_excess,
+                                   precip_excesses)
+        precip_excess = np.maximum(precip_excess, 0)
+
+        mask = recharging & ~(np.abs(precip_excess - recharge) <= 1E-20)
+        root_zone_storage = np.where(
+            mask,
+            root_zone_storage
+            + (1.0 - macropore_fraction) * (recharge - precip_excess),
+            root_zone_storage
+        )
+        unsaturated_zone_storage = np.where(
+            mask,
+            unsaturated_zone_storage
+            + macropore_fraction * (recharge - precip_excess),
+            unsaturated_zone_storage
+        )
+
+        mask_over = mask & (root_zone_storage > root_zone_storage_max)
+        unsaturated_zone_storage = np.where(
+            mask_over,
+            unsaturated_zone_storage
+            + (root_zone_storage - root_zone_storage_max),
+            unsaturated_zone_storage
+        )
+        root_zone_storage = np.where(mask_over,
+                                     root_zone_storage_max,
+                                     root_zone_storage)
+
+        mask = (
+            mask & ~mask_over
+            & (unsaturated_zone_storage > saturation_deficit_local)
+        )
+        root_zone_storage = np.where(
+            mask,
+            root_zone_storage
+            + (unsaturated_zone_storage - saturation_deficit_local),
+            root_zone_storage
+        )
+        unsaturated_zone_storage = np.where(mask,
+                                            saturation_deficit_local,
+                                            unsaturated_zone_storage)
+
+        # Drainage from unsaturated zone storage
+        # ======================================
+        mask = saturation_deficit_local > 0
+        vertical_drainage_flux = np.minimum(
+            self.vertical_drainage_flux_initial[:, np.newaxis]
+            * np.divide(unsaturated_zone_storage,
+                        saturation_deficit_local,
+                        out=np.zeros_like(unsaturated_zone_storage),
+                        where=mask),
+            unsaturated_zone_storage
+        )
+        unsaturated_zone_storage = np.where(
+            mask,
+            unsaturated_zone_storage - vertical_drainage_flux,
+            unsaturated_zone_storage
+        )
+        flow_predicted_vertical_drainage_flux = np.where(
+            mask,
+            vertical_drainage_flux * self.twi_saturated_areas,
+            0.0
+        ).sum(axis=1)
+
+        # Evaporation from soil root zone storage
+        # =======================================
+        evaporation = np.minimum(precip_for_evaporation[:, np.newaxis],
+                                 root_zone_storage)
+        root_zone_storage = np.where(precip_for_evaporation[:, np.newaxis] > 0,
+                                     root_zone_storage - evaporation,
+                                     root_zone_storage)
+
+        # Overland flow
+        # =============
+        flow_predicted_overland = np.where(
+            precip_excesses > 0,
+            precip_excesses * self.twi_saturated_areas,
+            0.0
+        ).sum(axis=1)
+
+        self.unsaturated_zone_storage = unsaturated_zone_storage
+        self.root_zone_storage = root_zone_storage
+
+        # Subsurface flow (base flow)
+        # ===========================
+        subsurface_flow_rate_ratio = (
+            self.saturation_deficit_avg / self.scaling_parameter
+        )
+        flow_predicted_subsurface = np.where(
+            subsurface_flow_rate_ratio > 100,
+            0.0,
+            self.flow_subsurface_max
+            * np.exp(-1 * np.minimum(subsurface_flow_rate_ratio, 100))
+        )
+
+        self.saturation_deficit_avg = np.maximum(
+            self.saturation_deficit_avg
+            - flow_predicted_vertical_drainage_flux
+            + flow_predicted_subsurface,
+            0
+        )
+
+        # Impervious area flow, total flow, and channel routing
+        # =====================================================
+        flow_predicted_impervious_area = (
+            self.impervious_area_fraction * precip_for_recharge
+        )
+        flow_predicted_total = (
+            flow_predicted_subsurface + flow_predicted_overland
+        )
+        flow_predicted_stream = np.maximum(
+            flow_predicted_total * (1 - self.impervious_area_fraction)
+            + flow_predicted_impervious_area,
+            0
+        )
+        flow_predicted_stream = (
+            flow_predicted_stream / self.channel_travel_time
+        )
+
+        # Saving variables of interest
+        # ============================
+        self.flow_predicted[i] = flow_predicted_stream
+        self.saturation_deficit_avgs[i] = self.saturation_deficit_avg
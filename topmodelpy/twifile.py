@@ -1,8 +1,14 @@
-"""Module that contains functions to read a twi file in csv format."""
+"""Module that contains functions to read and write a twi file in csv
+format, and to read a raster of the twi of each cell (*.npy) as a twi file.
+"""
+
+from pathlib import Path
 
 import numpy as np
 import pandas as pd
 
+from . import twihistogram
+
 from .exceptions import (TwiFileErrorInvalidHeader,
                          TwiFileErrorMissingValues,
                          TwiFileErrorInvalidProportion)
@@ -32,6 +38,58 @@ def read(filepath):
         print(err)
 
 
+def read_raster(filepath, num_bins=30, method="fixed"):
+    """Read a raster of the twi of each cell, such as from the twi command,
+    and bin it into the same data as a twi file.
+
+    The raster is memory-mapped and binned in strips of rows, see
+    twihistogram.
+
+    :param filepath: File path to the raster (*.npy).
+    :type param: string
+    :param num_bins: Number of twi bins.
+    :type num_bins: int
+    :param method: Twi bin method, fixed or quantile.
+    :type method: string
+    :return data: A dataframe with bin, twi, proportion, and cells columns.
+    :rtype: pandas.DataFrame
+    """
+    try:
+        raster = np.load(str(filepath), mmap_mode="r")
+        data, _ = twihistogram.bin_twi(raster, num_bins=num_bins,
+                                       method=method)
+        check_proportion(data)
+        return data
+    except TwiFileErrorInvalidProportion as err:
+        print(err)
+    except Exception as err:
+        print(err)
+
+
+def is_raster(filepath):
+    """Return True if a twi file path is a raster of the twi of each cell.
+
+    :param filepath: File path to data file.
+    :type param: string
+    :rtype: bool
+    """
+    return Path(filepath).suffix.lower() == ".npy"
+
+
+def write(filepath, data):
+    """Write a twi file.
+
+    :param filepath: File path to data file.
+    :type filepath: string
+    :param data: A dataframe with bin, twi, proportion, and cells columns.
+    :type data: pandas.DataFrame
+    """
+    data.to_csv(filepath,
+                columns=["bin", "twi", "proportion", "cells"],
+                index=False,
+                float_format="%.9g")
+
+
 def read_in(filestream):
     """Read and process a filestream.
     Read and process a filestream of a comma-delimited parameter file.
@@ -0,0 +1,312 @@
+"""Module that contains functions to bin a raster of the twi of each cell
+into the twi table of a twi file, without reading the raster into memory.
+
+The raster is read in strips of rows (tiles). Bin edges are either of equal
+width between the minimum and maximum twi, or approximate quantiles so that
+each bin has about the same number of cells. Quantiles are estimated in a
+first pass from a uniform random sample of cells of fixed size. A second pass
+counts the cells of each bin and sums their twi, which gives the mean twi of
+each bin and the proportion-weighted mean twi of the table. An optional
+third pass writes a raster of the bin id of each cell, see mapfile.
+
+A raster is a numpy array or memmap, or any object with a shape attribute
+and a read_rows(start, stop) method such as demfile.Dem. Nan values are
+nodata cells.
+"""
+
+import numpy as np
+import pandas as pd
+
+from .terrain import iter_strips
+
+
+BIN_METHODS = ["fixed", "quantile"]
+
+# Maximum number of bins, since bin ids are written as uint16 and 0 is the
+# bin id of nodata cells
+MAX_BINS = np.iinfo(np.uint16).max
+
+
+def read_rows(raster, start, stop):
+    """Read a strip of rows of a raster as floats.
+
+    :param raster: A raster.
+    :type raster: numpy.ndarray or demfile.Dem
+    :param start: First row to read.
+    :type start: int
+    :param stop: Row to read up to, exclusive.
+    :type stop: int
+    :return: Array of the strip of rows.
+    :rtype: numpy.ndarray
+    """
+    if hasattr(raster, "read_rows"):
+        return raster.read_rows(start, stop)
+    return np.asarray(raster[start:stop], dtype=float)
+
+
+def iter_values(raster, tile_rows=256):
+    """Yield the twi values of the cells of each strip of rows, without
+    nodata cells.
+
+    :param raster: A raster.
+    :type raster: numpy.ndarray or demfile.Dem
+    :param tile_rows: Number of rows of each strip.
+    :type tile_rows: int
+    """
+    for start, stop in iter_strips(raster.shape[0], tile_rows):
+        values = read_rows(raster, start, stop).ravel()
+        yield values[~np.isnan(values)]
+
+
+def check_range(minimum, maximum):
+    """Check that a raster has valid cells, from the minimum and maximum twi
+    of its valid cells, which are inf and -inf without valid cells."""
+    if minimum > maximum:
+        raise ValueError(
+            "Invalid twi raster: no valid cells, all cells are nodata"
+        )
+
+
+def check_num_bins(num_bins):
+    """Check that the number of bins is between 1 and MAX_BINS."""
+    if not 1 <= num_bins <= MAX_BINS:
+        raise ValueError(
+            "Invalid number of twi bins: {}\n"
+            "Valid number of twi bins: 1 <= bins <= {}".format(num_bins,
+                                                               MAX_BINS)
+        )
+
+
+def fixed_edges(raster, num_bins=30, tile_rows=256):
+    """Return num_bins + 1 bin edges of equal width between the minimum and
+    maximum twi.
+
+    :param raster: A raster.
+    :type raster: numpy.ndarray or demfile.Dem
+    :param num_bins: Number of bins.
+    :type num_bins: int
+    :param tile_rows: Number of rows of each strip.
+    :type tile_rows: int
+    :return edges: The bin edges.
+    :rtype: numpy.ndarray
+    """
+    minimum, maximum = np.inf, -np.inf
+    for values in iter_values(raster, tile_rows):
+        if values.size:
+            minimum = min(minimum, values.min())
+            maximum = max(maximum, values.max())
+    check_range(minimum, maximum)
+
+    return np.linspace(minimum, maximum, num_bins + 1)
+
+
+def quantile_edges(raster,
+                   num_bins=30,
+                   tile_rows=256,
+                   sample_size=1000000,
+                   seed=0):
+    """Return bin edges at approximate quantiles of the twi, so each bin has
+    about the same number of cells.
+
+    Quantiles are computed from a uniform random sample of sample_size
+    cells, kept in a single pass by giving each cell a random key and keeping
+    the cells with the smallest keys. The outer edges are the exact minimum
+    and maximum twi. Duplicate edges, from many cells of the same twi, are
+    dropped, so there can be fewer than num_bins bins.
+
+    :param raster: A raster.
+    :type raster: numpy.ndarray or demfile.Dem
+    :param num_bins: Number of bins.
+    :type num_bins: int
+    :param tile_rows: Number of rows of each strip.
+    :type tile_rows: int
+    :param sample_size: Number of cells of the sample.
+    :type sample_size: int
+    :param seed: Seed of the random keys.
+    :type seed: int
+    :return edges: The bin edges.
+    :rtype: numpy.ndarray
+    """
+    rng = np.random.default_rng(seed)
+    minimum, maximum = np.inf, -np.inf
+    sample = np.empty(0)
+    keys = np.empty(0)
+    for values in iter_values(raster, tile_rows):
+        if not values.size:
+            continue
+        minimum = min(minimum, values.min())
+        maximum = max(maximum, values.max())
+
+        sample = np.concatenate([sample, values])
+        keys = np.concatenate([keys, rng.random(values.size)])
+        if sample.size > sample_size:
+            keep = np.argpartition(keys, sample_size)[:sample_size]
+            sample, keys = sample[keep], keys[keep]
+    check_range(minimum, maximum)
+
+    edges = np.quantile(sample, np.linspace(0, 1, num_bins + 1))
+    edges[0], edges[-1] = minimum, maximum
+
+    return np.unique(edges)
+
+
+def get_edges(raster, num_bins=30, method="fixed", tile_rows=256):
+    """Return the bin edges of a bin method, see BIN_METHODS.
+
+    :param raster: A raster.
+    :type raster: numpy.ndarray or demfile.Dem
+    :param num_bins: Number of bins.
+    :type num_bins: int
+    :param method: Bin method, fixed or quantile.
+    :type method: string
+    :param tile_rows: Number of rows of each strip.
+    :type tile_rows: int
+    :return edges: The bin edges.
+    :rtype: numpy.ndarray
+    """
+    check_num_bins(num_bins)
+    if method == "fixed":
+        return fixed_edges(raster, num_bins, tile_rows)
+    elif method == "quantile":
+        return quantile_edges(raster, num_bins, tile_rows)
+
+    raise ValueError(
+        "Invalid twi bin method: {}\n"
+        "Valid twi bin methods: {}".format(method, BIN_METHODS)
+    )
+
+
+def digitize(values, edges):
+    """Return the index of the bin of each value, where the last bin
+    includes the maximum edge.
+
+    :param values: Array of twi values.
+    :type values: numpy.ndarray
+    :param edges: The bin edges.
+    :type edges: numpy.ndarray
+    :return: Array of bin indices, 0 to len(edges) - 2.
+    :rtype: numpy.ndarray
+    """
+    return np.clip(np.searchsorted(edges, values, side="right") - 1,
+                   0,
+                   len(edges) - 2)
+
+
+def histogram(raster, edges, tile_rows=256):
+    """Count the cells and sum the twi of the cells of each bin.
+
+    :param raster: A raster.
+    :type raster: numpy.ndarray or demfile.Dem
+    :param edges: The bin edges.
+    :type edges: numpy.ndarray
+    :param tile_rows: Number of rows of each strip.
+    :type tile_rows: int
+    :return: Tuple of arrays of the number of cells and the sum of the twi
+             of each bin.
+    :rtype: tuple
+    """
+    num_bins = len(edges) - 1
+    cells = np.zeros(num_bins)
+    sums = np.zeros(num_bins)
+    for values in iter_values(raster, tile_rows):
+        index = digitize(values, edges)
+        cells += np.bincount(index, minlength=num_bins)
+        sums += np.bincount(index, weights=values, minlength=num_bins)
+
+    return cells, sums
+
+
+def get_table(cells, sums):
+    """Return the twi table of a twi file from a histogram.
+
+    Rows are ordered from the highest twi bin to the lowest twi bin, and
+    bins without cells are dropped. The twi of each bin is the mean twi of
+    its cells.
+
+    :param cells: Number of cells of each bin, from lowest to highest bin.
+    :type cells: numpy.ndarray
+    :param sums: Sum of the twi of each bin, from lowest to highest bin.
+    :type sums: numpy.ndarray
+    :return data: A dataframe with bin, twi, proportion, and cells columns.
+    :rtype: pandas.DataFrame
+    """
+    keep = cells[::-1] > 0
+    cells = cells[::-1][keep]
+    sums = sums[::-1][keep]
+    data = pd.DataFrame({
+        "bin": np.arange(1, len(cells) + 1, dtype=float),
+        "twi": sums / cells,
+        "proportion": cells / cells.sum(),
+        "cells": cells,
+    })
+
+    return data
+
+
+def get_bin_ids(cells):
+    """Return the bin id in the twi table of each bin of a histogram, see
+    get_table(), or 0 for bins without cells.
+
+    :param cells: Number of cells of each bin, from lowest to highest bin.
+    :type cells: numpy.ndarray
+    :return: Array of bin ids.
+    :rtype: numpy.ndarray
+    """
+    has_cells = cells > 0
+    bin_ids = np.cumsum(has_cells[::-1])[::-1]
+
+    return np.where(has_cells, bin_ids, 0).astype(np.uint16)
+
+
+def write_bin_raster(raster, edges, cells, bin_raster, tile_rows=256):
+    """Write the bin id in the twi table of each cell, or 0 for nodata cells.
+
+    :param raster: A raster.
+    :type raster: numpy.ndarray or demfile.Dem
+    :param edges: The bin edges.
+    :type edges: numpy.ndarray
+    :param cells: Number of cells of each bin, from histogram().
+    :type cells: numpy.ndarray
+    :param bin_raster: Array of the raster shape to write the bin ids into,
+                       as uint16.
+    :type bin_raster: numpy.ndarray
+    :param tile_rows: Number of rows of each strip.
+    :type tile_rows: int
+    """
+    bin_ids = get_bin_ids(cells)
+    for start, stop in iter_strips(raster.shape[0], tile_rows):
+        values = read_rows(raster, start, stop)
+        nodata = np.isnan(values)
+        ids = bin_ids[digitize(np.where(nodata, edges[0], values), edges)]
+        ids[nodata] = 0
+        bin_raster[start:stop] = ids
+
+
+def bin_twi(raster, num_bins=30, method="fixed", tile_rows=256,
+            bin_raster=None):
+    """Bin a raster of the twi of each cell into a twi table.
+
+    :param raster: A raster.
+    :type raster: numpy.ndarray or demfile.Dem
+    :param num_bins: Number of bins.
+    :type num_bins: int
+    :param method: Bin method, fixed or quantile.
+    :type method: string
+    :param tile_rows: Number of rows of each strip.
+    :type tile_rows: int
+    :param bin_raster: Optional array of the raster shape to write the bin
+                       id in the twi table of each cell into, see
+                       write_bin_raster().
+    :type bin_raster: numpy.ndarray
+    :return: Tuple of a dataframe with bin, twi, proportion, and cells
+             columns, and the proportion-weighted mean twi.
+    :rtype: tuple
+    """
+    edges = get_edges(raster, num_bins, method, tile_rows)
+    cells, sums = histogram(raster, edges, tile_rows)
+    twi_weighted_mean = sums.sum() / cells.sum()
+
+    if bin_raster is not None:
+        write_bin_raster(raster, edges, cells, bin_raster, tile_rows)
+
+    return get_table(cells, sums), twi_weighted_mean
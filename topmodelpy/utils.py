@@ -16,3 +16,57 @@ def nans(shape, dtype=float):
     array[:] = np.nan
 
     return array
+
+
+def lttb(x, y, max_points):
+    """Return the indices of the points of a series kept by the largest
+    triangle three buckets (LTTB) downsampling algorithm.
+
+    The first and last points are always kept. The points in between are
+    split into max_points - 2 buckets, and from each bucket the point that
+    forms the largest triangle with the point kept from the previous bucket
+    and the mean point of the next bucket is kept, which preserves the peaks
+    and the visual shape of the series. Nan values of y are never kept, so
+    gaps of a series are not preserved.
+
+    :param x: Array of increasing x values, such as dates as numbers.
+    :type x: numpy.ndarray
+    :param y: Array of y values.
+    :type y: numpy.ndarray
+    :param max_points: Maximum number of points to keep, at least 3.
+    :type max_points: int
+    :return: Array of the indices of the kept points, in increasing order.
+    :rtype: numpy.ndarray
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    valid = np.flatnonzero(~np.isnan(y))
+    if len(valid) <= max_points:
+        return valid
+    if max_points < 3:
+        raise ValueError(
+            "Invalid max points: {}\n"
+            "Max points must be at least 3".format(max_points)
+        )
+
+    x, y = x[valid], y[valid]
+    edges = np.linspace(1, len(x) - 1, max_points - 1).astype(int)
+
+    indices = np.empty(max_points, dtype=int)
+    indices[0], indices[-1] = 0, len(x) - 1
+    for i in range(max_points - 2):
+        start, stop = edges[i], edges[i + 1]
+        if i + 2 < len(edges):
+            next_x = x[stop:edges[i + 2]].mean()
+            next_y = y[stop:edges[i + 2]].mean()
+        else:
+            next_x, next_y = x[-1], y[-1]
+
+        previous = indices[i]
+        areas = np.abs(
+            (x[previous] - next_x) * (y[start:stop] - y[previous])
+            - (x[previous] - x[start:stop]) * (next_y - y[previous])
+        )
+        indices[i + 1] = start + np.argmax(areas)
+
+    return valid[indices]
@@ -0,0 +1,293 @@
+"""Module that contains functions to watch a model configuration file and its
+input files for changes, such as to rerun a model each time a parameter is
+edited by hand during calibration.
+
+Changes are watched with inotify on Linux, through ctypes, so a change is
+seen as soon as the file is written, and by polling the modification time
+and size of the files on other platforms, or on file systems without
+inotify such as network file systems. The directories of the files are
+watched, rather than the files, since editors often save a file by writing
+a new file and renaming it over the old file.
+
+Editors and scripts may write a file in several steps, so events are
+collected until the files are quiet for a short debounce time, and all the
+changed files are returned at once.
+"""
+
+from configparser import ConfigParser, ExtendedInterpolation
+import ctypes
+import ctypes.util
+import os
+from pathlib import Path
+import select
+import struct
+import sys
+import time
+
+from topmodelpy import modelconfigfile
+
+
+# Seconds without changes before the changed files are returned
+DEBOUNCE_SECONDS = 0.2
+
+# Inotify event masks, see inotify(7)
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_WATCH_MASK = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_TO
+                 | IN_CREATE | IN_DELETE)
+
+# Header of an inotify event: wd, mask, cookie, and the length of the name
+INOTIFY_EVENT = struct.Struct("iIII")
+
+
+def get_watched_filepaths(configfile):
+    """Return the model configuration file and its input files.
+
+    The model configuration file is read without checking it, so the files
+    are still watched while the model configuration file is edited.
+
+    :param configfile: File path of the model configuration file.
+    :type configfile: string
+    :return: A sorted list of absolute file paths.
+    :rtype: list
+    """
+    filepaths = {Path(configfile).resolve()}
+    config = ConfigParser(interpolation=ExtendedInterpolation())
+    try:
+        config.read(configfile)
+        items = list(config["Inputs"].items())
+    except Exception:
+        items = []
+    for key, value in items:
+        if key.endswith("_file") and value.strip():
+            filepaths.update(filepath.resolve() for filepath
+                             in modelconfigfile.get_filepaths(value))
+
+    return sorted(filepaths)
+
+
+def get_stat(filepath):
+    """Return the modification time and size of a file, or None if the file
+    does not exist."""
+    try:
+        stat = os.stat(filepath)
+    except OSError:
+        return None
+
+    return stat.st_mtime_ns, stat.st_size
+
+
+def load_inotify():
+    """Load the inotify functions of the C library.
+
+    :return: The C library, or None if inotify is not available.
+    :rtype: ctypes.CDLL
+    """
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6",
+                           use_errno=True)
+        libc.inotify_init1.argtypes = [ctypes.c_int]
+        libc.inotify_add_watch.argtypes = [ctypes.c_int,
+                                           ctypes.c_char_p,
+                                           ctypes.c_uint32]
+    except (OSError, AttributeError):
+        return None
+
+    return libc
+
+
+class PollingWatcher:
+    """Watcher of files that polls the modification time and size of each
+    file.
+
+    :param filepaths: The file paths to watch.
+    :type filepaths: list
+    :param interval: Seconds between polls.
+    :type interval: float
+    """
+    def __init__(self, filepaths, interval=1.0):
+        self.filepaths = [Path(filepath) for filepath in filepaths]
+        self.interval = interval
+        self.stats = self.get_stats()
+
+    def get_stats(self):
+        return {filepath: get_stat(filepath) for filepath in self.filepaths}
+
+    def poll(self):
+        """Return the files that changed since the last poll."""
+        stats = self.get_stats()
+        changed = {filepath for filepath in self.filepaths
+                   if stats[filepath] != self.stats[filepath]}
+        self.stats = stats
+
+        return changed
+
+    def wait(self, timeout=None):
+        """Wait until files change.
+
+        :param timeout: Optional seconds to wait.
+        :type timeout: float
+        :return: The set of changed file paths, empty after the timeout.
+        :rtype: set
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        changed = self.poll()
+        while not changed:
+            if deadline is not None and time.monotonic() >= deadline:
+                return set()
+            time.sleep(self.interval)
+            changed = self.poll()
+
+        # Collect the changes of a file that is written in several steps
+        while True:
+            time.sleep(DEBOUNCE_SECONDS)
+            more = self.poll()
+            if not more:
+                return changed
+            changed.update(more)
+
+    def close(self):
+        pass
+
+
+class InotifyWatcher:
+    """Watcher of files with inotify, which watches the directories of the
+    files.
+
+    :param filepaths: The file paths to watch.
+    :type filepaths: list
+    :param libc: The C library, see load_inotify().
+    :type libc: ctypes.CDLL
+    """
+    def __init__(self, filepaths, libc):
+        self.filepaths = {Path(filepath) for filepath in filepaths}
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.directories = {}
+        try:
+            for directory in {filepath.parent for filepath in self.filepaths}:
+                wd = libc.inotify_add_watch(self.fd,
+                                            os.fsencode(directory),
+                                            IN_WATCH_MASK)
+                if wd < 0:
+                    raise OSError(ctypes.get_errno(),
+                                  "inotify_add_watch failed",
+                                  str(directory))
+                self.directories[wd] = directory
+        except OSError:
+            self.close()
+            raise
+
+    def read_events(self):
+        """Return the watched files of the pending events."""
+        changed = set()
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return changed
+
+        offset = 0
+        while offset < len(data):
+            wd, _, _, length = INOTIFY_EVENT.unpack_from(data, offset)
+            offset += INOTIFY_EVENT.size
+            name = data[offset:offset + length].rstrip(b"\0")
+            offset += length
+            if wd in self.directories and name:
+                filepath = self.directories[wd] / os.fsdecode(name)
+                if filepath in self.filepaths:
+                    changed.add(filepath)
+
+        return changed
+
+    def wait(self, timeout=None):
+        """Wait until files change, see PollingWatcher.wait()."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        changed = set()
+        while not changed:
+            remaining = (None if deadline is None
+                         else max(deadline - time.monotonic(), 0))
+            if not select.select([self.fd], [], [], remaining)[0]:
+                return set()
+            changed = self.read_events()
+
+        # Collect the changes of a file that is written in several steps
+        while select.select([self.fd], [], [], DEBOUNCE_SECONDS)[0]:
+            changed.update(self.read_events())
+
+        return changed
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+def get_watcher(filepaths, interval=1.0, polling=False):
+    """Return an inotify watcher if inotify is available, otherwise a
+    polling watcher.
+
+    :param filepaths: The file paths to watch.
+    :type filepaths: list
+    :param interval: Seconds between polls of a polling watcher.
+    :type interval: float
+    :param polling: Always return a polling watcher.
+    :type polling: bool
+    :return: The watcher.
+    :rtype: InotifyWatcher or PollingWatcher
+    """
+    libc = None if polling else load_inotify()
+    if libc is not None:
+        try:
+            return InotifyWatcher(filepaths, libc)
+        except OSError:
+            # Such as the limit of inotify watches of the user
+            pass
+
+    return PollingWatcher(filepaths, interval=interval)
+
+
+def iter_changes(configfile, interval=1.0, polling=False, timeout=None):
+    """Yield the changed files each time the model configuration file or its
+    input files change.
+
+    Changes made while the caller handles a change, such as during a model
+    run, are yielded next. The input files are looked up again after each
+    change, since the model configuration file may have changed them.
+
+    :param configfile: File path of the model configuration file.
+    :type configfile: string
+    :param interval: Seconds between polls of a polling watcher.
+    :type interval: float
+    :param polling: Poll the files even if inotify is available.
+    :type polling: bool
+    :param timeout: Optional seconds to wait for a change, after which the
+                    iteration stops.
+    :type timeout: float
+    :return: Sets of the changed file paths.
+    :rtype: generator
+    """
+    filepaths = get_watched_filepaths(configfile)
+    watcher = get_watcher(filepaths, interval=interval, polling=polling)
+    try:
+        while True:
+            changed = watcher.wait(timeout)
+            if not changed:
+                return
+            yield changed
+
+            new_filepaths = get_watched_filepaths(configfile)
+            if new_filepaths != filepaths:
+                watcher.close()
+                filepaths = new_filepaths
+                watcher = get_watcher(filepaths,
+                                      interval=interval,
+                                      polling=polling)
+    finally:
+        watcher.close()